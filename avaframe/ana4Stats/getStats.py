@@ -12,6 +12,7 @@ import pandas as pd
 
 from avaframe.in3Utils import fileHandlerUtils as fU
 import avaframe.in2Trans.ascUtils as IOf
+import avaframe.ana4Stats.getStatsCython as getStatsC
 from avaframe.in3Utils import cfgUtils
 from avaframe.in3Utils import cfgHandling
 
@@ -56,7 +57,7 @@ def extractMaxValues(inputDir, avaDir, varPar, restrictType='', nameScenario='',
     simDF = cfgUtils.createConfigurationInfo(avaDir, standardCfg='')
 
     # load peakFiles of all simulations and generate dataframe
-    peakFilesDF = fU.makeSimDF(inputDir, avaDir=avaDir)
+    peakFilesDF = fU.makeSimDF(inputDir, avaDir=avaDir, useIndex=True)
     nSims = len(peakFilesDF['simName'])
     # initialize peakValues dictionary
     peakValues = {}
@@ -122,3 +123,223 @@ def extractMaxValues(inputDir, avaDir, varPar, restrictType='', nameScenario='',
             peakValues.pop(peakFilesDF['simName'][m], None)
 
     return peakValues
+
+
+def computeEnsembleStats(peakFiles, cfgStats, outDir, outName):
+    """ Compute statistics for each cell over an ensemble of result rasters
+
+        The rasters are processed tile by tile (bands of rows), the number of rows of a tile is chosen so
+        that the statistics arrays of one tile need about tileMemory MB. For each tile, the rows of all
+        rasters are read one raster after the other and added to the statistics, so the ensemble never needs
+        to fit in memory. The mean and variance are computed with Welford's algorithm, the quantiles are
+        approximated with the P-square algorithm (see updateP2Quantiles). Rows of npy rasters are read
+        directly from disk, asc rasters are scanned up to the rows of the tile for each tile, so npy files
+        are much faster for large rasters.
+
+        Parameters
+        -----------
+        peakFiles: list
+            paths to the result rasters (asc or npy) - all with the same extent
+        cfgStats: configparser section
+            ENSEMBLESTATS section of the getStats configuration, here peakLims, quantiles, tileMemory
+        outDir: pathlib path
+            path to directory where the statistics rasters are saved
+        outName: str
+            name of the statistics rasters: outName_mean, outName_var, outName_prob_limX, outName_qX
+
+        Returns
+        --------
+        statFiles: dict
+            paths to the statistics rasters (npy files) with keys mean, var, prob_limX and qX
+    """
+
+    nMembers = len(peakFiles)
+    if nMembers == 0:
+        message = 'No result rasters provided for the ensemble statistics'
+        log.error(message)
+        raise FileNotFoundError(message)
+
+    # all rasters need to have the same extent
+    header = IOf.readASCheader(peakFiles[0])
+    for peakFile in peakFiles:
+        if not IOf.isEqualASCheader(IOf.readASCheader(peakFile), header):
+            message = 'Result raster %s does not have the same extent as %s' % (peakFile, peakFiles[0])
+            log.error(message)
+            raise AssertionError(message)
+    nRows = header['nrows']
+    nCols = header['ncols']
+    header['nodata_value'] = np.nan
+
+    peakLims = [peakLim.strip() for peakLim in cfgStats['peakLims'].split('|') if peakLim.strip() != '']
+    quantiles = [quantile.strip() for quantile in cfgStats['quantiles'].split('|') if quantile.strip() != '']
+
+    # number of rows of a tile according to the memory needed per cell
+    bytesPerCell = getTileBytesPerCell(len(peakLims), len(quantiles))
+    tileRows = int(cfgStats.getfloat('tileMemory') * 2**20 / (bytesPerCell * nCols))
+    tileRows = min(max(tileRows, 1), nRows)
+    log.info('Computing ensemble statistics of %d rasters in tiles of %d rows (%d tiles)' %
+             (nMembers, tileRows, -(-nRows // tileRows)))
+
+    # create the statistics rasters (npy files that are filled tile by tile)
+    outDir = pathlib.Path(outDir)
+    statNames = ['mean', 'var'] + ['prob_lim%s' % peakLim for peakLim in peakLims] + \
+        ['q%s' % quantile for quantile in quantiles]
+    statFiles = {}
+    statRasters = {}
+    for statName in statNames:
+        statFiles[statName] = outDir / ('%s_%s.npy' % (outName, statName))
+        statRasters[statName] = IOf.createNpyRaster(header, statFiles[statName])
+
+    for rowStart in range(0, nRows, tileRows):
+        rowEnd = min(rowStart + tileRows, nRows)
+        tileShape = (rowEnd - rowStart, nCols)
+
+        # initialize the statistics of the tile
+        count = np.zeros(tileShape, dtype=np.int32)
+        mean = np.zeros(tileShape)
+        m2 = np.zeros(tileShape)
+        exceedCounts = [np.zeros(tileShape, dtype=np.int32) for _ in peakLims]
+        p2States = [initializeP2Quantiles(tileShape, float(quantile)) for quantile in quantiles]
+
+        for peakFile in peakFiles:
+            data = IOf.readRasterWindow(peakFile, rowStart, rowEnd)['rasterData']
+
+            # update count, mean and sum of squared differences (Welford)
+            valid = ~np.isnan(data)
+            count += valid
+            delta = np.where(valid, data - mean, 0.)
+            mean += np.divide(delta, count, out=np.zeros(tileShape), where=valid)
+            m2 += delta * np.where(valid, data - mean, 0.)
+
+            # update number of rasters exceeding the thresholds
+            for peakLim, exceedCount in zip(peakLims, exceedCounts):
+                exceedCount += data > float(peakLim)
+
+            # update quantile estimates
+            for p2State in p2States:
+                updateP2Quantiles(p2State, data)
+
+        # save the statistics of the tile
+        noData = count == 0
+        statRasters['mean'][rowStart:rowEnd] = np.where(noData, np.nan, mean)
+        statRasters['var'][rowStart:rowEnd] = np.divide(m2, count, out=np.full(tileShape, np.nan),
+                                                        where=~noData)
+        for peakLim, exceedCount in zip(peakLims, exceedCounts):
+            statRasters['prob_lim%s' % peakLim][rowStart:rowEnd] = exceedCount / nMembers
+        for quantile, p2State in zip(quantiles, p2States):
+            statRasters['q%s' % quantile][rowStart:rowEnd] = fetchP2Quantiles(p2State)
+        log.debug('Ensemble statistics computed for rows %d to %d' % (rowStart, rowEnd))
+
+    for statName in statNames:
+        statRasters[statName].flush()
+        log.info('Ensemble statistics %s written to: %s' % (statName, statFiles[statName]))
+
+    return statFiles
+
+
+def getTileBytesPerCell(nPeakLims, nQuantiles):
+    """ Get the number of bytes per cell of the arrays allocated for one tile in computeEnsembleStats
+
+        Parameters
+        -----------
+        nPeakLims: int
+            number of thresholds of the exceedance probabilities
+        nQuantiles: int
+            number of quantiles
+
+        Returns
+        --------
+        bytesPerCell: int
+            number of bytes per cell
+    """
+
+    floatSize = np.dtype(np.float64).itemsize
+    intSize = np.dtype(np.int32).itemsize
+    # count, mean and sum of squared differences (Welford)
+    welfordBytes = intSize + 2 * floatSize
+    # temporary arrays of the Welford update: valid mask, delta, data - mean, np.where and their product
+    tempBytes = np.dtype(bool).itemsize + 4 * floatSize
+    # P-square state of a quantile: heights, positions and desired positions of five markers and the count
+    p2Bytes = 3 * 5 * floatSize + intSize
+    # tile of one raster
+    dataBytes = floatSize
+
+    bytesPerCell = welfordBytes + tempBytes + dataBytes + nPeakLims * intSize + nQuantiles * p2Bytes
+
+    return bytesPerCell
+
+
+def initializeP2Quantiles(shape, quantile):
+    """ Initialize the state of the P-square quantile estimation for each cell of an array
+
+        The P-square algorithm (Jain and Chlamtac, 1985) estimates a quantile of a sequence of values without
+        storing them: five markers (the minimum, the quantile, the maximum and two intermediate quantiles)
+        are updated with each new value
+
+        Parameters
+        -----------
+        shape: tuple
+            shape of the arrays of values
+        quantile: float
+            quantile to estimate (between 0 and 1)
+
+        Returns
+        --------
+        p2State: dict
+            quantile, shape, number of values (count), heights, positions and desired positions of the
+            markers
+    """
+
+    nCells = int(np.prod(shape))
+    p2State = {'quantile': quantile, 'shape': shape,
+               'count': np.zeros(nCells, dtype=np.int32),
+               'heights': np.zeros((5, nCells)),
+               'positions': np.repeat(np.arange(1., 6.)[:, np.newaxis], nCells, axis=1),
+               'desired': np.repeat(np.array([1., 1. + 2. * quantile, 1. + 4. * quantile, 3. + 2. * quantile,
+                                              5.])[:, np.newaxis], nCells, axis=1),
+               'increments': np.array([0., quantile / 2., quantile, (1. + quantile) / 2., 1.])}
+
+    return p2State
+
+
+def updateP2Quantiles(p2State, data):
+    """ Add the values of data to the P-square quantile estimation of each cell (nan values are ignored)
+
+        Parameters
+        -----------
+        p2State: dict
+            state of the quantile estimation (see initializeP2Quantiles), updated in place
+        data: numpy array
+            new value of each cell
+    """
+
+    values = np.ascontiguousarray(data, dtype=np.float64).ravel()
+    getStatsC.updateP2QuantilesC(values, p2State['count'], p2State['heights'], p2State['positions'],
+                                 p2State['desired'], p2State['increments'])
+
+
+def fetchP2Quantiles(p2State):
+    """ Fetch the quantile estimate of each cell from the P-square quantile estimation
+
+        Parameters
+        -----------
+        p2State: dict
+            state of the quantile estimation (see initializeP2Quantiles)
+
+        Returns
+        --------
+        quantileValues: numpy array
+            estimated quantile of each cell (exact for up to five values, nan for cells without values)
+    """
+
+    count = p2State['count']
+    quantileValues = p2State['heights'][2].copy()
+    quantileValues[count == 0] = np.nan
+    # exact quantile of cells with up to five values
+    for nValues in range(1, 6):
+        cells = np.nonzero(count == nValues)[0]
+        if cells.size > 0:
+            quantileValues[cells] = np.quantile(p2State['heights'][:nValues, cells], p2State['quantile'],
+                                                axis=0)
+
+    return quantileValues.reshape(p2State['shape'])
@@ -0,0 +1,102 @@
+#!python
+# cython: boundscheck=False, wraparound=False, cdivision=True, linetrace=False, profile=False
+"""
+    functions to update per cell statistics of ensembles of rasters
+    to build: go to repository containing this file and run:
+    python setup.py build_ext --inplace
+"""
+
+# Load modules
+import logging
+import numpy as np
+cimport numpy as np
+
+# create local logger
+# change log level in calling module to DEBUG to see log messages
+log = logging.getLogger(__name__)
+
+
+def updateP2QuantilesC(double[:] values, int[:] count, double[:, :] heights, double[:, :] positions,
+                       double[:, :] desired, double[:] increments):
+    """ Add one value per cell to the P-square quantile estimation (nan values are ignored)
+
+    The first five values of each cell are stored in the heights (sorted once there are five), then the five
+    markers are updated with each new value (Jain and Chlamtac, 1985). All arrays are updated in place
+
+    Parameters
+    -----------
+    values: 1D numpy array
+        new value of each cell
+    count: 1D numpy array
+        number of values of each cell
+    heights: 2D numpy array
+        heights of the five markers of each cell (shape (5, number of cells))
+    positions: 2D numpy array
+        positions of the five markers of each cell
+    desired: 2D numpy array
+        desired positions of the five markers of each cell
+    increments: 1D numpy array
+        increments of the desired positions of the five markers
+    """
+    cdef Py_ssize_t nCells = values.shape[0]
+    cdef Py_ssize_t c, i, j, k
+    cdef double value, tmp, offset, sign, parabolic
+    cdef double hBelow, hMarker, hAbove, nBelow, nMarker, nAbove
+
+    with nogil:
+        for c in range(nCells):
+            value = values[c]
+            if value != value:
+                continue
+            if count[c] < 5:
+                # store the first five values and sort them (insertion sort)
+                heights[count[c], c] = value
+                count[c] = count[c] + 1
+                if count[c] == 5:
+                    for i in range(1, 5):
+                        tmp = heights[i, c]
+                        j = i - 1
+                        while j >= 0 and heights[j, c] > tmp:
+                            heights[j + 1, c] = heights[j, c]
+                            j = j - 1
+                        heights[j + 1, c] = tmp
+                continue
+            count[c] = count[c] + 1
+
+            # find the interval of the new value, extend the extreme markers and shift the positions above
+            if value < heights[0, c]:
+                heights[0, c] = value
+            if value > heights[4, c]:
+                heights[4, c] = value
+            k = 0
+            for i in range(1, 4):
+                if value >= heights[i, c]:
+                    k = i
+            for i in range(k + 1, 5):
+                positions[i, c] = positions[i, c] + 1.
+            for i in range(5):
+                desired[i, c] = desired[i, c] + increments[i]
+
+            # adjust the heights of the middle markers if they are off their desired positions
+            for i in range(1, 4):
+                offset = desired[i, c] - positions[i, c]
+                if ((offset >= 1. and positions[i + 1, c] - positions[i, c] > 1.) or
+                        (offset <= -1. and positions[i - 1, c] - positions[i, c] < -1.)):
+                    sign = 1. if offset > 0. else -1.
+                    hBelow = heights[i - 1, c]
+                    hMarker = heights[i, c]
+                    hAbove = heights[i + 1, c]
+                    nBelow = positions[i - 1, c]
+                    nMarker = positions[i, c]
+                    nAbove = positions[i + 1, c]
+                    # piecewise parabolic prediction, linear if it is not between the neighbours
+                    parabolic = hMarker + sign / (nAbove - nBelow) * (
+                        (nMarker - nBelow + sign) * (hAbove - hMarker) / (nAbove - nMarker) +
+                        (nAbove - nMarker - sign) * (hMarker - hBelow) / (nMarker - nBelow))
+                    if hBelow < parabolic < hAbove:
+                        heights[i, c] = parabolic
+                    elif sign > 0.:
+                        heights[i, c] = hMarker + (hAbove - hMarker) / (nAbove - nMarker)
+                    else:
+                        heights[i, c] = hMarker - (hBelow - hMarker) / (nBelow - nMarker)
+                    positions[i, c] = nMarker + sign
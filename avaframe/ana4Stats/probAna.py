@@ -7,7 +7,9 @@ exceed a particular threshold
 
 import numpy as np
 import logging
+import multiprocessing
 import pathlib
+from multiprocessing.pool import ThreadPool
 from scipy.stats import qmc
 
 import avaframe.out3Plot.plotUtils as pU
@@ -368,10 +370,10 @@ def probAnalysis(avaDir, cfg, modName, parametersDict='', inputDir='', probConf=
     # if matching sims found - perform analysis
     if inputDir == '':
         inputDir = avaDir / 'Outputs' / modName / 'peakFiles'
-        peakFilesDF = fU.makeSimDF(inputDir, avaDir=avaDir)
+        peakFilesDF = fU.makeSimDF(inputDir, avaDir=avaDir, useIndex=True)
     else:
         inputDirPF = inputDir / 'peakFiles'
-        peakFilesDF = fU.makeSimDF(inputDirPF, avaDir=avaDir)
+        peakFilesDF = fU.makeSimDF(inputDirPF, avaDir=avaDir, useIndex=True)
 
     if len(peakFilesDF) == 0:
         message = 'No peak files found in %s' % str(inputDir)
@@ -385,63 +387,191 @@ def probAnalysis(avaDir, cfg, modName, parametersDict='', inputDir='', probConf=
     nRows = header['nrows']
     nCols = header['ncols']
 
-    # Initialise array for computations
-    probSum = np.zeros((nRows, nCols))
-    count = 0
+    # result types and thresholds of the probability maps - all computed in one pass over the peak files
+    peakVarLims = fetchPeakVarLims(cfg['GENERAL'])
+    peakVars = list(dict.fromkeys([peakVar for peakVar, _ in peakVarLims]))
+
+    # only take simulations that match filter criteria from parametersDict and the desired peak field parameters
+    simNameSet = set(simNameList)
+    selected = [m for m in range(len(peakFilesDF['names']))
+                if ((peakFilesDF['simName'][m] in simNameSet) or filtering == False)
+                and peakFilesDF['resType'][m] in peakVars]
+    fileNames = [peakFilesDF['files'][m] for m in selected]
+    resTypes = [peakFilesDF['resType'][m] for m in selected]
+
+    # Initialise arrays for computations - number of peak fields exceeding each threshold
+    probSums = {peakVarLim: np.zeros((nRows, nCols), dtype=np.int32) for peakVarLim in peakVarLims}
+    counts = {peakVar: 0 for peakVar in peakVars}
+    exceeds = np.zeros((nRows, nCols), dtype=bool)
+
+    # Loop through peakFiles (read in parallel threads) and count the cells exceeding the thresholds
+    nThreads = getNumberOfThreads(cfg['GENERAL']['nThreads'], len(fileNames))
+    log.info('Reading %d peak files using %d threads' % (len(fileNames), nThreads))
+    with ThreadPool(nThreads) as pool:
+        # files are read in batches so that only a few peak fields are kept in memory at once
+        batchSize = 4 * nThreads
+        for batchStart in range(0, len(fileNames), batchSize):
+            batchFiles = fileNames[batchStart:batchStart + batchSize]
+            batchResTypes = resTypes[batchStart:batchStart + batchSize]
+            fileDatas = pool.imap(lambda fileName: readPeakField(fileName, refData), batchFiles)
+            for fileName, peakVar, fileData in zip(batchFiles, batchResTypes, fileDatas):
+                log.info('File Name: %s , simulation parameter %s ' % (fileName, peakVar))
+
+                # Check if peak values exceed desired thresholds
+                data = np.flipud(fileData['rasterData'])
+                for peakVarLim in peakVarLims:
+                    if peakVarLim[0] == peakVar:
+                        np.greater(data, float(peakVarLim[1]), out=exceeds)
+                        probSums[peakVarLim] += exceeds
+                counts[peakVar] = counts[peakVar] + 1
+
+    # contour lines are fetched for the first peak field parameter and threshold - after the counting pass
+    # so that the reading threads are not held up by the contour computation
+    if cfg['GENERAL'].getboolean('fetchContours'):
+        contourVar, contourLim = peakVarLims[0]
+        contourFiles = [fileName for fileName, peakVar in zip(fileNames, resTypes) if peakVar == contourVar]
+        contourDict = fetchContoursPeakFields(contourFiles, refData, contourLim, nThreads)
+    else:
+        contourDict = {}
+
+    avaName = avaDir.name
+    for peakVar, peakLim in peakVarLims:
+        # Create probability map ranging from 0-1
+        probMap = probSums[(peakVar, peakLim)] / counts[peakVar]
+        unit = pU.cfgPlotUtils['unit%s' % peakVar]
+        log.info('probability analysis performed for peak parameter: %s and a peak value '
+                 'threshold of: %s %s' % (peakVar, peakLim, unit))
+        log.info('%s peak fields added to analysis' % counts[peakVar])
+
+        # # Save to .asc file - the name is parsed by fU.getProbMapInfo
+        outFileName = '%s_prob_%s_%s_lim%s.asc' % (avaName, probConf, peakVar, peakLim)
+        outFile = outDir / outFileName
+        IOf.writeResultToAsc(header, probMap, outFile)
+        log.info('Prob result written to %s' % outFile)
+    analysisPerformed = True
+
+    return analysisPerformed, contourDict
+
+
+def fetchPeakVarLims(cfgGeneral):
+    """ fetch the peak field parameters and thresholds of the probability maps
+
+        peakVar and peakLim can contain several values separated by |, each peakVar is paired with the
+        peakLim at the same position, if only one peakLim is given it is used for all peakVars
+
+        Parameters
+        -----------
+        cfgGeneral: configparser section
+            GENERAL section of the probAna configuration, here peakVar, peakLim
+
+        Returns
+        --------
+        peakVarLims: list
+            list of tuples (peakVar, peakLim), peakLim as string (as used in the output file names)
+    """
+
+    peakVars = [peakVar.strip() for peakVar in cfgGeneral['peakVar'].split('|')]
+    peakLims = [peakLim.strip() for peakLim in str(cfgGeneral['peakLim']).split('|')]
+    if len(peakLims) == 1:
+        peakLims = peakLims * len(peakVars)
+    elif len(peakLims) != len(peakVars):
+        message = ('One peakLim per peakVar or a single peakLim needs to be provided - peakVar: %s, peakLim: %s' %
+                   (cfgGeneral['peakVar'], cfgGeneral['peakLim']))
+        log.error(message)
+        raise AssertionError(message)
+
+    return list(zip(peakVars, peakLims))
+
+
+def getNumberOfThreads(nThreads, nFiles):
+    """ get the number of threads used to read the peak files
+
+        Parameters
+        -----------
+        nThreads: str
+            auto (number of CPU cores) or number of threads
+        nFiles: int
+            number of peak files
+
+        Returns
+        --------
+        nThreads: int
+            number of threads (at least 1 and not more than the number of files)
+    """
+
+    if nThreads == 'auto':
+        nThreads = multiprocessing.cpu_count()
+    else:
+        nThreads = int(nThreads)
+
+    return max(1, min(nThreads, nFiles))
+
+
+def fetchContoursPeakFields(fileNames, refData, contourLim, nThreads):
+    """ fetch the contour lines of peak fields for a threshold
+
+        the peak fields are read in parallel threads, the contour lines are computed in the main thread
+        as fetchContourCoords uses pyplot, which is not thread safe
+
+        Parameters
+        -----------
+        fileNames: list
+            list of paths to peak fields
+        refData: dict
+            raster dictionary of the reference peak field
+        contourLim: str
+            threshold of the contour lines
+        nThreads: int
+            number of threads used to read the peak files
+
+        Returns
+        --------
+        contourDict: dict
+            dictionary with the contour line dictionary of each peak field (file name as key)
+    """
+
+    xGrid, yGrid, _, _ = gT.makeCoordGridFromHeader(refData['header'])
     contourDict = {}
+    with ThreadPool(nThreads) as pool:
+        # files are read in batches so that only a few peak fields are kept in memory at once
+        batchSize = 4 * nThreads
+        for batchStart in range(0, len(fileNames), batchSize):
+            batchFiles = fileNames[batchStart:batchStart + batchSize]
+            fileDatas = pool.imap(lambda fileName: readPeakField(fileName, refData), batchFiles)
+            for fileName, fileData in zip(batchFiles, fileDatas):
+                contourDict[fileName.stem] = pU.fetchContourCoords(xGrid, yGrid, fileData['rasterData'],
+                                                                   float(contourLim))
 
-    # Loop through peakFiles and compute probability
-    for m in range(len(peakFilesDF['names'])):
-
-        # only take simulations that match filter criteria from parametersDict
-        if (peakFilesDF['simName'][m] in simNameList) or filtering == False:
-            # Load peak field for desired peak field parameter
-            if peakFilesDF['resType'][m] == cfg['GENERAL']['peakVar']:
-
-                # Load data
-                fileName = peakFilesDF['files'][m]
-                dataLim = np.zeros((nRows, nCols))
-                fileData = IOf.readRaster(fileName)
-
-                # check if extent is the same as first loaded dataset
-                # if not - remesh and print warning
-                if fileData['header']['nrows'] != nRows or fileData['header']['ncols'] != nCols:
-                    log.warning('datasets used to create probMap do not match in extent - remeshing: %s to cellSize %s' %
-                        (fileName, header['cellsize']))
-                    data, _ = gT.resizeData(fileData, refData)
-                data = np.flipud(fileData['rasterData'])
+    return contourDict
 
-                # fetch contourline info
-                xGrid, yGrid, _, _ = gT.makeCoordGridFromHeader(refData['header'])
-                contourDictXY = pU.fetchContourCoords(xGrid, yGrid, fileData['rasterData'], float(cfg['GENERAL']['peakLim']))
-                contourDict[fileName.stem] = contourDictXY
 
-                log.info('File Name: %s , simulation parameter %s ' % (fileName, cfg['GENERAL']['peakVar']))
+def readPeakField(fileName, refData):
+    """ read a peak field and remesh it to the extent of the reference peak field if required
 
-                # Check if peak values exceed desired threshold
-                dataLim[data > float(cfg['GENERAL']['peakLim'])] = 1.0
-                probSum = probSum + dataLim
-                count = count + 1
+        Parameters
+        -----------
+        fileName: pathlib path
+            path to peak field
+        refData: dict
+            raster dictionary of the reference peak field
 
-    # Create probability map ranging from 0-1
-    probMap = probSum / count
-    unit = pU.cfgPlotUtils['unit%s' % cfg['GENERAL']['peakVar']]
-    log.info('probability analysis performed for peak parameter: %s and a peak value '
-             'threshold of: %s %s' % (cfg['GENERAL']['peakVar'], cfg['GENERAL']['peakLim'], unit))
-    log.info('%s peak fields added to analysis' % count)
+        Returns
+        --------
+        fileData: dict
+            raster dictionary of the peak field with the extent of refData
+    """
 
-    # # Save to .asc file
-    avaName = avaDir.name
-    outFileName = '%s_prob_%s_%s_lim%s.asc' % (avaName,
-                                               probConf,
-                                               cfg['GENERAL']['peakVar'],
-                                               cfg['GENERAL']['peakLim'])
-    outFile = outDir / outFileName
-    IOf.writeResultToAsc(header, probMap, outFile)
-    log.info('Prob result written to %s' % outFile)
-    analysisPerformed = True
+    fileData = IOf.readRaster(fileName)
 
-    return analysisPerformed, contourDict
+    # check if extent is the same as first loaded dataset
+    # if not - remesh and print warning
+    if (fileData['header']['nrows'] != refData['header']['nrows'] or
+            fileData['header']['ncols'] != refData['header']['ncols']):
+        log.warning('datasets used to create probMap do not match in extent - remeshing: %s to cellSize %s' %
+                    (fileName, refData['header']['cellsize']))
+        gT.resizeData(fileData, refData)
+
+    return fileData
 
 
 def makeDictFromVars(cfg):
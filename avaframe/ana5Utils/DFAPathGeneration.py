@@ -58,8 +58,8 @@ def generateAveragePath(avalancheDir, pathFromPart, simName, dem, addVelocityInf
         x, y coord of the initial particles or flow thickness field
     """
     if pathFromPart:
-        particlesList, timeStepInfo = particleTools.readPartFromPickle(avalancheDir, simName=simName, flagAvaDir=True,
-                                                                       comModule='com1DFA')
+        particlesList, timeStepInfo = particleTools.readParticles(avalancheDir, simName=simName, flagAvaDir=True,
+                                                                  comModule='com1DFA')
         particlesIni = particlesList[0]
         log.info('Using particles to generate avalanche path profile')
         # postprocess to extract path and energy line
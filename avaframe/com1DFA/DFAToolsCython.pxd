@@ -6,46 +6,46 @@
     python setup.py build_ext --inplace
 """
 
-cpdef double norm(double , double , double)
+cpdef double norm(double , double , double) noexcept nogil
 
-cpdef double norm2(double , double , double)
+cpdef double norm2(double , double , double) noexcept nogil
 
-cpdef (double, double, double) normalize(double , double , double)
+cpdef (double, double, double) normalize(double , double , double) noexcept nogil
 
-cpdef (double, double, double) crossProd(double , double , double, double , double , double)
+cpdef (double, double, double) crossProd(double , double , double, double , double , double) noexcept nogil
 
-cpdef double scalProd(double , double , double, double , double , double)
+cpdef double scalProd(double , double , double, double , double , double) noexcept nogil
 
-cpdef (int) getCells(double, double, int, int, double)
+cpdef (int) getCells(double, double, int, int, double) noexcept nogil
 
-cpdef (double, double, double, double) getWeights(double, double, int, double, int, int)
+cpdef (double, double, double, double) getWeights(double, double, int, double, int, int) noexcept nogil
 
-cpdef (int, int, int, double, double, double, double) getCellAndWeights(double, double, int, int, double, int)
+cpdef (int, int, int, double, double, double, double) getCellAndWeights(double, double, int, int, double, int) noexcept nogil
 
 cpdef (double, double, double, double) reprojectVelocity(double , double , double, double,
-                                                         double , double , double, int)
+                                                         double , double , double, int) noexcept nogil
 
 cpdef (double, double, int, int, int, double, double, double, double) normalProjectionIteratrive(
   double , double , double, double[:,:], double[:,:], double[:,:],
   double[:,:], double, int, int, int,
-  int, double)
+  int, double) noexcept nogil
 
 cpdef (double, double, int, int, int, double, double, double, double) samosProjectionIteratrive(
   double , double , double, double[:,:], double[:,:], double[:,:],
-  double[:,:], double csz, int, int, int, int)
+  double[:,:], double csz, int, int, int, int) noexcept nogil
 
 cpdef (double, double, double, int, int, int, double, double, double, double) distConservProjectionIteratrive(
   double , double , double, double[:,:], double[:,:], double[:,:],
   double[:,:], double , double , double, double, int, int, int,
-  int, double)
+  int, double) noexcept nogil
 
 cpdef double[:] projOnRaster(double[:], double[:], double[:, :], double, int,
                  int, int)
 
-cpdef double getScalar(int, int, double , double , double, double, double[:, :])
+cpdef double getScalar(int, int, double , double , double, double, double[:, :]) noexcept nogil
 
 cpdef (double, double, double) getVector(
   int, int, double , double , double, double,
-  double[:, :], double[:, :], double[:, :])
+  double[:, :], double[:, :], double[:, :]) noexcept nogil
 
-cpdef double SamosATfric(double , double , double, double , double , double, double , double , double, double)
+cpdef double SamosATfric(double , double , double, double , double , double, double , double , double, double) noexcept nogil
@@ -97,7 +97,7 @@ def pointsToRasterC(double[:] xArray, double[:] yArray, double[:] zArray, Z0, do
     return Z1
 
 
-cpdef double norm(double x, double y, double z):
+cpdef double norm(double x, double y, double z) noexcept nogil:
   """ Compute the Euclidean norm of the vector (x, y, z).
 
   (x, y, z) can be numpy arrays.
@@ -118,7 +118,7 @@ cpdef double norm(double x, double y, double z):
   """
   return math.sqrt(x*x + y*y + z*z)
 
-cpdef double norm2(double x, double y, double z):
+cpdef double norm2(double x, double y, double z) noexcept nogil:
   """ Compute the Euclidean norm2 (square of the norm) of the vector (x, y, z).
 
   (x, y, z) can be numpy arrays.
@@ -140,7 +140,7 @@ cpdef double norm2(double x, double y, double z):
   return x*x + y*y + z*z
 
 
-cpdef (double, double, double) normalize(double x, double y, double z):
+cpdef (double, double, double) normalize(double x, double y, double z) noexcept nogil:
   """ Normalize vector (x, y, z) for the Euclidean norm.
 
   (x, y, z) can be np arrays.
@@ -172,7 +172,7 @@ cpdef (double, double, double) normalize(double x, double y, double z):
   return xn, yn, zn
 
 
-cpdef (double, double, double) crossProd(double ux, double uy, double uz, double vx, double vy, double vz):
+cpdef (double, double, double) crossProd(double ux, double uy, double uz, double vx, double vy, double vz) noexcept nogil:
   """ Compute cross product of vector u = (ux, uy, uz) and v = (vx, vy, vz).
   """
   cdef double wx = uy * vz - uz * vy
@@ -181,13 +181,13 @@ cpdef (double, double, double) crossProd(double ux, double uy, double uz, double
   return wx, wy, wz
 
 
-cpdef double scalProd(double ux, double uy, double uz, double vx, double vy, double vz):
+cpdef double scalProd(double ux, double uy, double uz, double vx, double vy, double vz) noexcept nogil:
   """ Compute scalar product of vector u = (ux, uy, uz) and v = (vx, vy, vz).
   """
   return ux*vx + uy*vy + uz*vz
 
 
-cpdef (int) getCells(double x, double y, int ncols, int nrows, double csz):
+cpdef (int) getCells(double x, double y, int ncols, int nrows, double csz) noexcept nogil:
   """ Locate point on grid (find the index of the grid cell containing the point).
 
   Parameters
@@ -228,7 +228,7 @@ cpdef (int) getCells(double x, double y, int ncols, int nrows, double csz):
   return iCell
 
 
-cpdef (double, double, double, double) getWeights(double x, double y, int iCell, double csz, int ncols, int interpOption):
+cpdef (double, double, double, double) getWeights(double x, double y, int iCell, double csz, int ncols, int interpOption) noexcept nogil:
   """ Get weight for interpolation from grid to single point location
 
   3 Options available : 0: nearest neighbour interpolation
@@ -291,7 +291,7 @@ cpdef (double, double, double, double) getWeights(double x, double y, int iCell,
   return w[0], w[1], w[2], w[3]
 
 
-cpdef (int, int, int, double, double, double, double) getCellAndWeights(double x, double y, int ncols, int nrows, double csz, int interpOption):
+cpdef (int, int, int, double, double, double, double) getCellAndWeights(double x, double y, int ncols, int nrows, double csz, int interpOption) noexcept nogil:
   """ Get cell and weight for interpolation from grid to single point location
 
   3 Options available : 0: nearest neighbour interpolation
@@ -334,7 +334,7 @@ cpdef (int, int, int, double, double, double, double) getCellAndWeights(double x
 
 
 cpdef (double, double, double, double) reprojectVelocity(double uxNew, double uyNew, double uzNew, double nxNew,
-                                                         double nyNew, double nzNew, double velMagMin, int keep):
+                                                         double nyNew, double nzNew, double velMagMin, int keep) noexcept nogil:
   """ Reproject velocity vector on the topography
   Parameters
   ----------
@@ -377,7 +377,7 @@ cpdef (double, double, double, double) reprojectVelocity(double uxNew, double uy
 cpdef (double, double, int, int, int, double, double, double, double) normalProjectionIteratrive(
   double xOld, double yOld, double zOld, double[:,:] ZDEM, double[:,:] nxArray, double[:,:] nyArray,
   double[:,:] nzArray, double csz, int ncols, int nrows, int interpOption,
-  int reprojectionIterations, double threshold):
+  int reprojectionIterations, double threshold) noexcept nogil:
   """ Find the orthogonal projection of a point on a mesh
 
   Iterative method to find the projection of a point on a surface defined by its mesh
@@ -476,7 +476,7 @@ cpdef (double, double, int, int, int, double, double, double, double) normalProj
 
 cpdef (double, double, int, int, int, double, double, double, double) samosProjectionIteratrive(
   double xOld, double yOld, double zOld, double[:,:] ZDEM, double[:,:] nxArray, double[:,:] nyArray,
-  double[:,:] nzArray, double csz, int ncols, int nrows, int interpOption, int reprojectionIterations):
+  double[:,:] nzArray, double csz, int ncols, int nrows, int interpOption, int reprojectionIterations) noexcept nogil:
   """ Find the projection of a point on a mesh (comes from samos)
 
   Iterative method to find the projection of a point on a surface defined by its mesh (samos way)
@@ -577,7 +577,7 @@ cpdef (double, double, int, int, int, double, double, double, double) samosProje
 cpdef (double, double, double, int, int, int, double, double, double, double) distConservProjectionIteratrive(
   double xPrev, double yPrev, double zPrev, double[:,:] ZDEM, double[:,:] nxArray, double[:,:] nyArray,
   double[:,:] nzArray, double xOld, double yOld, double zOld, double csz, int ncols, int nrows, int interpOption,
-  int reprojectionIterations, double threshold):
+  int reprojectionIterations, double threshold) noexcept nogil:
   """ Find the projection of a point on a mesh conserving the distance
   with the previous time step position
 
@@ -733,7 +733,7 @@ cpdef double[:] projOnRaster(double[:] xArray, double[:] yArray, double[:, :] vA
   return v
 
 
-cpdef double getScalar(int Lx0, int Ly0, double w0, double w1, double w2, double w3, double[:, :] V):
+cpdef double getScalar(int Lx0, int Ly0, double w0, double w1, double w2, double w3, double[:, :] V) noexcept nogil:
   """ Interpolate scalar field from grid to single point location
 
   Originaly created to get the normal vector at location (x,y) given the
@@ -768,7 +768,7 @@ cpdef double getScalar(int Lx0, int Ly0, double w0, double w1, double w2, double
 
 cpdef (double, double, double) getVector(
   int Lx0, int Ly0, double w0, double w1, double w2, double w3,
-  double[:, :] Nx, double[:, :] Ny, double[:, :] Nz):
+  double[:, :] Nx, double[:, :] Ny, double[:, :] Nz) noexcept nogil:
   """ Interpolate vector field from grid to single point location
 
   Originally created to get the normal vector at location (x,y) given the
@@ -816,7 +816,7 @@ cpdef (double, double, double) getVector(
 
 
 cpdef double SamosATfric(double rho, double tau0, double Rs0, double mu, double kappa, double B, double R,
-                         double v, double p, double h):
+                         double v, double p, double h) noexcept nogil:
   """ Get tau (basal friction stress) for samos friction type
 
   Parameters
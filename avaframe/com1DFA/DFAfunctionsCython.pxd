@@ -6,17 +6,17 @@
     python setup.py build_ext --inplace
 """
 
-cpdef (double, double) computeEntMassAndForce(double, double, double, double, double, double, double)
+cpdef (double, double) computeEntMassAndForce(double, double, double, double, double, double, double) noexcept nogil
 
-cpdef double computeDetMass(double, double, double, double)
+cpdef double computeDetMass(double, double, double, double) noexcept nogil
 
-cpdef double computeResForce(double, double, double, double, double, double, int)
+cpdef double computeResForce(double, double, double, double, double, double, int) noexcept nogil
 
 cdef (double, double, double) addArtificialViscosity(double, double, double, double, double, double, double, double,
                                                      int, int, double, double, double, double,
-                                                     double[:, :], double[:, :], double[:, :],  double, double, double)
+                                                     double[:, :], double[:, :], double[:, :],  double, double, double) noexcept nogil
 
 cpdef (double, double, double, double) account4FrictionForce(double, double, double, double, double, double, double,
                                                              int)
 
-cpdef double computePressure(double, double)
+cpdef double computePressure(double, double) noexcept nogil
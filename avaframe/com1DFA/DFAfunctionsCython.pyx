@@ -11,6 +11,7 @@ import copy
 import logging
 import numpy as np
 import cython
+from cython.parallel import prange
 cimport numpy as np
 from libc cimport math as math
 
@@ -27,10 +28,13 @@ import avaframe.in3Utils.geoTrans as geoTrans
 log = logging.getLogger(__name__)
 
 
-def computeForceC(cfg, particles, fields, dem, int frictType):
+def computeForceC(cfg, particles, fields, dem, int frictType, workspace=None):
   """ compute forces acting on the particles (without the SPH component)
 
   Cython implementation implementation
+  The loop on particles can be shared between several threads (nThreads in the configuration).
+  Each particle only writes to its own entries, the update of the entrainment mass raster
+  (shared cells) is done afterwards in a serial loop, so results do not depend on the number of threads
 
   Parameters
   ----------
@@ -44,6 +48,8 @@ def computeForceC(cfg, particles, fields, dem, int frictType):
       dictionary with dem information
   frictType: int
     identifier for friction law to be used
+  workspace: dict
+    optional, preallocated buffers (see com1DFA.initializeWorkspace), if None the outputs are allocated
 
   Returns
   -------
@@ -101,6 +107,7 @@ def computeForceC(cfg, particles, fields, dem, int frictType):
   cdef double dt = particles['dt']
   cdef double mu0 = cfg.getfloat('mu0wetsnow')
   cdef double xsiWetSnow = cfg.getfloat('xsiwetsnow')
+  cdef int nThreads = cfg.getint('nThreads')
   cdef int nPart = particles['nPart']
   cdef double csz = dem['header']['cellsize']
   cdef int nrows = dem['header']['nrows']
@@ -110,8 +117,7 @@ def computeForceC(cfg, particles, fields, dem, int frictType):
   cdef double[:, :] nyArray = dem['Ny']
   cdef double[:, :] nzArray = dem['Nz']
   cdef double[:, :] areaRatser = dem['areaRaster']
-  cdef np.ndarray[np.uint8_t, ndim = 1, cast=True] outOfDEM
-  outOfDEM = np.array(dem['outOfDEM'], dtype=bool)
+  cdef np.uint8_t[:] outOfDEM
   # read particles and fields
   cdef double[:] mass = particles['m']
   cdef double[:] hArray = particles['h']
@@ -132,15 +138,35 @@ def computeForceC(cfg, particles, fields, dem, int frictType):
   cdef double[:, :] cResRaster = fields['cResRaster']
   cdef int[:] indXDEM = particles['indXDEM']
   cdef int[:] indYDEM = particles['indYDEM']
-  # initialize outputs
-  cdef double[:] forceX = np.zeros(nPart, dtype=np.float64)
-  cdef double[:] forceY = np.zeros(nPart, dtype=np.float64)
-  cdef double[:] forceZ = np.zeros(nPart, dtype=np.float64)
-  cdef double[:] forceFrict = np.zeros(nPart, dtype=np.float64)
-  cdef double[:] dM = np.zeros(nPart, dtype=np.float64)
-  cdef double[:] dMDet = np.zeros(nPart, dtype=np.float64)
-  cdef double[:] gEff = np.zeros(nPart, dtype=np.float64)
-  cdef double[:] curvAcc = np.zeros(nPart, dtype=np.float64)
+  # initialize outputs (the force arrays are set to 0 for each particle in the loop)
+  cdef double[:] forceX
+  cdef double[:] forceY
+  cdef double[:] forceZ
+  cdef double[:] forceFrict
+  cdef double[:] dM
+  cdef double[:] dMDet
+  cdef double[:] gEff
+  cdef double[:] curvAcc
+  if workspace is None:
+    outOfDEM = np.array(dem['outOfDEM'], dtype=np.uint8)
+    forceX = np.empty(nPart, dtype=np.float64)
+    forceY = np.empty(nPart, dtype=np.float64)
+    forceZ = np.empty(nPart, dtype=np.float64)
+    forceFrict = np.empty(nPart, dtype=np.float64)
+    dM = np.empty(nPart, dtype=np.float64)
+    dMDet = np.empty(nPart, dtype=np.float64)
+    gEff = np.empty(nPart, dtype=np.float64)
+    curvAcc = np.empty(nPart, dtype=np.float64)
+  else:
+    outOfDEM = workspace['outOfDEM']
+    forceX = workspace['forceX'][:nPart]
+    forceY = workspace['forceY'][:nPart]
+    forceZ = workspace['forceZ'][:nPart]
+    forceFrict = workspace['forceFrict'][:nPart]
+    dM = workspace['dM'][:nPart]
+    dMDet = workspace['dMDet'][:nPart]
+    gEff = workspace['gEff'][:nPart]
+    curvAcc = workspace['curvAcc'][:nPart]
   # declare intermediate step variables
   cdef int indCellX, indCellY
   cdef double areaPart, areaCell, areaEntrPart, cResCell, cResPart, uMag, uMagRes, m, dm, h, entrMassCell, entrEnthCell, dEnergyEntr, dis
@@ -148,15 +174,23 @@ def computeForceC(cfg, particles, fields, dem, int frictType):
   cdef double x, y, z, xEnd, yEnd, zEnd, ux, uy, uz, uxDir, uyDir, uzDir, totalEnthalpy, enthalpy, dTotalEnthalpy
   cdef double nx, ny, nz, nxEnd, nyEnd, nzEnd, nxAvg, nyAvg, nzAvg
   cdef double gravAccNorm, accNormCurv, effAccNorm, gravAccTangX, gravAccTangY, gravAccTangZ, forceBotTang, sigmaB, tau
-  # variables for interpolation
+  cdef double mu
+  # variables for interpolation (scalars and not arrays so that they are thread private)
   cdef int Lx0, Ly0, LxEnd0, LyEnd0, iCell, iCellEnd
-  cdef double w[4]
-  cdef double wEnd[4]
+  cdef double w0, w1, w2, w3
+  cdef double wEnd0, wEnd1, wEnd2, wEnd3
   cdef int k
 
   force = {}
   # loop on particles
-  for k in range(nPart):
+  for k in prange(nPart, nogil=True, num_threads=nThreads, schedule='static'):
+      forceX[k] = 0
+      forceY[k] = 0
+      forceZ[k] = 0
+      forceFrict[k] = 0
+      dM[k] = 0
+      dMDet[k] = 0
+      curvAcc[k] = 0
       m = mass[k]
       x = xArray[k]
       y = yArray[k]
@@ -167,22 +201,23 @@ def computeForceC(cfg, particles, fields, dem, int frictType):
       ux = uxArray[k]
       uy = uyArray[k]
       uz = uzArray[k]
+      totalEnthalpy = totalEnthalpyArray[k]
       indCellX = indXDEM[k]
       indCellY = indYDEM[k]
       # deduce area
       areaPart = m / (h * rho)
 
       # get cell and weights
-      Lx0, Ly0, iCell, w[0], w[1], w[2], w[3] = DFAtlsC.getCellAndWeights(x, y, ncols, nrows, csz, interpOption)
+      Lx0, Ly0, iCell, w0, w1, w2, w3 = DFAtlsC.getCellAndWeights(x, y, ncols, nrows, csz, interpOption)
 
       # get normal at the particle location
-      nx, ny, nz = DFAtlsC.getVector(Lx0, Ly0, w[0], w[1], w[2], w[3], nxArray, nyArray, nzArray)
+      nx, ny, nz = DFAtlsC.getVector(Lx0, Ly0, w0, w1, w2, w3, nxArray, nyArray, nzArray)
       nx, ny, nz = DFAtlsC.normalize(nx, ny, nz)
 
       if viscOption == 1:
         # add artificial viscosity
         ux, uy, uz = addArtificialViscosity(m, h, dt, rho, ux, uy, uz, subgridMixingFactor, Lx0, Ly0,
-                                            w[0], w[1], w[2], w[3], VX, VY, VZ, nx, ny, nz)
+                                            w0, w1, w2, w3, VX, VY, VZ, nx, ny, nz)
 
       # get normal at the particle estimated end location
       xEnd = x + dt * ux
@@ -193,30 +228,28 @@ def computeForceC(cfg, particles, fields, dem, int frictType):
         # Project vertically on the dem
         iCellEnd = DFAtlsC.getCells(xEnd, yEnd, ncols, nrows, csz)
         if iCellEnd >= 0 and outOfDEM[iCellEnd] == 0:
-          LxEnd0, LyEnd0, iCellEnd, wEnd[0], wEnd[1], wEnd[2], wEnd[3] = DFAtlsC.getCellAndWeights(xEnd, yEnd, ncols, nrows, csz, interpOption)
+          LxEnd0, LyEnd0, iCellEnd, wEnd0, wEnd1, wEnd2, wEnd3 = DFAtlsC.getCellAndWeights(xEnd, yEnd, ncols, nrows, csz, interpOption)
       elif reprojMethod == 1:
         # project trying to keep the travelled distance constant
-        xEnd, yEnd, zEnd, iCellEnd, LxEnd0, LyEnd0, wEnd[0], wEnd[1], wEnd[2], wEnd[3] = DFAtlsC.distConservProjectionIteratrive(
+        xEnd, yEnd, zEnd, iCellEnd, LxEnd0, LyEnd0, wEnd0, wEnd1, wEnd2, wEnd3 = DFAtlsC.distConservProjectionIteratrive(
           x, y, z, ZDEM, nxArray, nyArray, nzArray, xEnd, yEnd, zEnd, csz, ncols, nrows, interpOption,
           reprojectionIterations, thresholdProjection)
       elif reprojMethod == 2:
         # project using samos method
-        xEnd, yEnd, iCellEnd, LxEnd0, LyEnd0, wEnd[0], wEnd[1], wEnd[2], wEnd[3] = DFAtlsC.samosProjectionIteratrive(
+        xEnd, yEnd, iCellEnd, LxEnd0, LyEnd0, wEnd0, wEnd1, wEnd2, wEnd3 = DFAtlsC.samosProjectionIteratrive(
           xEnd, yEnd, zEnd, ZDEM, nxArray, nyArray, nzArray, csz, ncols, nrows, interpOption, reprojectionIterations)
 
-      if iCellEnd < 0:
-        # if not on the DEM take x, y as end point
-        LxEnd0 = Lx0
-        LyEnd0 = Ly0
-        wEnd = w
-      elif outOfDEM[iCellEnd]:
-        # if in a noData area from the DEM take x, y as end point
+      if iCellEnd < 0 or outOfDEM[iCellEnd]:
+        # if not on the DEM or in a noData area from the DEM take x, y as end point
         LxEnd0 = Lx0
         LyEnd0 = Ly0
-        wEnd = w
+        wEnd0 = w0
+        wEnd1 = w1
+        wEnd2 = w2
+        wEnd3 = w3
 
       # get the normal at this location
-      nxEnd, nyEnd, nzEnd = DFAtlsC.getVector(LxEnd0, LyEnd0, wEnd[0], wEnd[1], wEnd[2], wEnd[3], nxArray, nyArray, nzArray)
+      nxEnd, nyEnd, nzEnd = DFAtlsC.getVector(LxEnd0, LyEnd0, wEnd0, wEnd1, wEnd2, wEnd3, nxArray, nyArray, nzArray)
       nxEnd, nyEnd, nzEnd = DFAtlsC.normalize(nxEnd, nyEnd, nzEnd)
       # get average of those normals
       nxAvg = nx + nxEnd
@@ -274,7 +307,6 @@ def computeForceC(cfg, particles, fields, dem, int frictType):
             tau = muVoellmy * sigmaB + rho * uMag * uMag * gravAcc / xsiVoellmy
           elif frictType == 4:
             # add enthalpy dependent mu if wetSnow is activated
-            totalEnthalpy = totalEnthalpyArray[k]
             enthalpy = totalEnthalpy - gravAcc * z - 0.5 * uMag * uMag
             mu = mu0 * math.exp(-enthalpy / enthRef)
             tau = mu * sigmaB + rho * uMag * uMag * gravAcc / xsiWetSnow
@@ -407,7 +439,7 @@ def computeForceC(cfg, particles, fields, dem, int frictType):
 cpdef (double, double) computeEntMassAndForce(double dt, double entrMassCell,
                                               double areaPart, double uMag,
                                               double tau, double entEroEnergy,
-                                              double rhoEnt):
+                                              double rhoEnt) noexcept nogil:
   """ compute force component due to entrained mass
 
   Parameters
@@ -459,7 +491,7 @@ cpdef (double, double) computeEntMassAndForce(double dt, double entrMassCell,
   return dm, areaEntrPart
 
 cpdef double computeDetMass(double dt, double detCell,
-                                              double areaPart, double uMag):
+                                              double areaPart, double uMag) noexcept nogil:
   """ compute detrained mass
 
   Parameters
@@ -487,14 +519,15 @@ cpdef double computeDetMass(double dt, double detCell,
   else:
       dmDet = 0
 
-  if dmDet > 0 or np.isnan(dmDet):
-      log.error('uMag, dt or areaPart is 0')
+  if dmDet > 0 or math.isnan(dmDet):
+      with gil:
+        log.error('uMag, dt or areaPart is 0')
 
   return dmDet
 
 
 cpdef double computeResForce(double hRes, double h, double areaPart, double rho,
-                             double cResCell, double uMag, int explicitFriction):
+                             double cResCell, double uMag, int explicitFriction) noexcept nogil:
   """ compute force component due to resistance
 
   Parameters
@@ -535,7 +568,7 @@ cdef (double, double, double) addArtificialViscosity(double m, double h, double
                                                      double ux, double uy, double uz, double subgridMixingFactor,
                                                      int Lx0, int Ly0, double w0, double w1, double w2, double w3,
                                                      double[:, :] VX, double[:, :] VY, double[:, :] VZ,
-                                                     double nx, double ny, double nz):
+                                                     double nx, double ny, double nz) noexcept nogil:
   """ add artificial viscosity
 
   Add the artificial viscosity in an implicit way and this before adding the other forces.
@@ -581,7 +614,7 @@ cdef (double, double, double) addArtificialViscosity(double m, double h, double
   uz: float
     z component of the uptated with the viscous force
   """
-  cdef double vMeanx, vMeany, vMeanz, vMeanNorm, dvX, dvY, dvZ
+  cdef double vMeanx, vMeany, vMeanz, vMeanNorm, dvX, dvY, dvZ, dvMag, Alat, fDrag
   vMeanx, vMeany, vMeanz = DFAtlsC.getVector(Lx0, Ly0, w0, w1, w2, w3, VX, VY, VZ)
   # compute normal component of the velocity
   vMeanNorm = DFAtlsC.scalProd(vMeanx, vMeany, vMeanz, nx, ny, nz)
@@ -712,17 +745,19 @@ def updatePositionC(cfg, particles, dem, force, fields, int typeStop=0):
   cdef double TotkinEneNew = 0
   cdef double TotpotEneNew = 0
   cdef double totForceSPHNew = 0
-  cdef double[:] mNewArray = np.zeros(nPart, dtype=np.float64)
-  cdef double[:] xNewArray = np.zeros(nPart, dtype=np.float64)
-  cdef double[:] yNewArray = np.zeros(nPart, dtype=np.float64)
-  cdef double[:] zNewArray = np.zeros(nPart, dtype=np.float64)
-  cdef double[:] sNewArray = np.zeros(nPart, dtype=np.float64)
-  cdef double[:] sCorNewArray = np.zeros(nPart, dtype=np.float64)
-  cdef double[:] lNewArray = np.zeros(nPart, dtype=np.float64)
-  cdef double[:] uxArrayNew = np.zeros(nPart, dtype=np.float64)
-  cdef double[:] uyArrayNew = np.zeros(nPart, dtype=np.float64)
-  cdef double[:] uzArrayNew = np.zeros(nPart, dtype=np.float64)
-  cdef double[:] velocityMagArrayNew = np.zeros(nPart, dtype=np.float64)
+  # the new values are written to the spare buffers of the particle container (see
+  # particleTools.getOutputArray), the values of the removed particles are not set
+  cdef double[:] mNewArray = particleTools.getOutputArray(particles, 'm', nPart)
+  cdef double[:] xNewArray = particleTools.getOutputArray(particles, 'x', nPart)
+  cdef double[:] yNewArray = particleTools.getOutputArray(particles, 'y', nPart)
+  cdef double[:] zNewArray = particleTools.getOutputArray(particles, 'z', nPart)
+  cdef double[:] sNewArray = particleTools.getOutputArray(particles, 'trajectoryLengthXY', nPart)
+  cdef double[:] sCorNewArray = particleTools.getOutputArray(particles, 'trajectoryLengthXYCor', nPart)
+  cdef double[:] lNewArray = particleTools.getOutputArray(particles, 'trajectoryLengthXYZ', nPart)
+  cdef double[:] uxArrayNew = particleTools.getOutputArray(particles, 'ux', nPart)
+  cdef double[:] uyArrayNew = particleTools.getOutputArray(particles, 'uy', nPart)
+  cdef double[:] uzArrayNew = particleTools.getOutputArray(particles, 'uz', nPart)
+  cdef double[:] velocityMagArrayNew = particleTools.getOutputArray(particles, 'velocityMag', nPart)
   cdef int[:] keepParticle = np.ones(nPart, dtype=np.int32)
   # declare intermediate step variables
   cdef double m, h, x, y, z, sCor, s, l, ux, uy, uz, nx, ny, nz, dtStop, idfixed
@@ -913,6 +948,7 @@ def updatePositionC(cfg, particles, dem, force, fields, int typeStop=0):
       sNewArray[k] = s
       sCorNewArray[k] = sCor
       mNewArray[k] = m
+      velocityMagArrayNew[k] = 0
     else:
       # idfixed = 0 particles belong to the actual releae area
       xNewArray[k] = xNew
@@ -1072,10 +1108,21 @@ cpdef (double, double, double, double) account4FrictionForce(double ux, double u
   return uxNew, uyNew, uzNew, dtStop
 
 
-def updateFieldsC(cfg, particles, dem, fields):
+def updateFieldsC(cfg, particles, dem, fields, workspace=None):
   """ update fields and particles flow thickness
 
   Cython implementation
+  The rows of the grids are split in nThreads bands. The particles are first
+  sorted by band (counting sort, a particle touching two bands is in both lists,
+  each list is in particle order). Each thread loops on the particles of its band
+  and only adds the values to the grid points of its band, so every grid point is
+  summed up in the particle order: the result does not depend on nThreads and no
+  partial grid per thread is needed.
+  Only the window of cells touched by the particles (bounding box of the
+  particles plus the interpolation stencil) is reset, reduced and used to update
+  the peak fields. With a workspace, the window of the previous call is added so
+  that the cells the flow left are reset to 0 (see workspace['activeWindow'] and
+  workspace['updateWindow']).
 
  Parameters
  ----------
@@ -1087,6 +1134,9 @@ def updateFieldsC(cfg, particles, dem, fields):
      dictionary with dem information
  fields : dict
      fields dictionary
+ workspace: dict
+     optional, preallocated buffers (see com1DFA.initializeWorkspace), if None the grids and particle
+     buffers are allocated
 
  Returns
  -------
@@ -1098,6 +1148,7 @@ def updateFieldsC(cfg, particles, dem, fields):
   # read input parameters
   cdef double rho = cfg.getfloat('rho')
   cdef int interpOption = cfg.getint('interpOption')
+  cdef int nThreads = cfg.getint('nThreads')
   header = dem['header']
   cdef int nrows = header['nrows']
   cdef int ncols = header['ncols']
@@ -1124,24 +1175,88 @@ def updateFieldsC(cfg, particles, dem, fields):
   cdef double[:, :] PTA = fields['pta']
   cdef double[:, :] PKE = fields['pke']
   cdef double[:, :] DMDet = fields['dmDet']
-  # initialize outputs
-  cdef double[:, :] MassBilinear = np.zeros((nrows, ncols))
-  cdef double[:, :] MassDetBilinear = np.zeros((nrows, ncols))
-  cdef double[:, :] VBilinear = np.zeros((nrows, ncols))
-  cdef double[:, :] PBilinear = np.zeros((nrows, ncols))
-  cdef double[:, :] FTBilinear = np.zeros((nrows, ncols))
-  cdef double[:, :] MomBilinearX = np.zeros((nrows, ncols))
-  cdef double[:, :] MomBilinearY = np.zeros((nrows, ncols))
-  cdef double[:, :] MomBilinearZ = np.zeros((nrows, ncols))
-  cdef double[:, :] VXBilinear = np.zeros((nrows, ncols))
-  cdef double[:, :] VYBilinear = np.zeros((nrows, ncols))
-  cdef double[:, :] VZBilinear = np.zeros((nrows, ncols))
-  cdef double[:, :] kineticEnergy = np.zeros((nrows, ncols))
-  cdef double[:, :] travelAngleField = np.zeros((nrows, ncols))
+  # outputs, they are set to 0 in the loops below
+  cdef double[:, :] MassBilinear
+  cdef double[:, :] MassDetBilinear
+  cdef double[:, :] MomBilinearX
+  cdef double[:, :] MomBilinearY
+  cdef double[:, :] MomBilinearZ
+  cdef double[:, :] travelAngleField
+  cdef double[:, :] VBilinear
+  cdef double[:, :] PBilinear
+  cdef double[:, :] FTBilinear
+  cdef double[:, :] VXBilinear
+  cdef double[:, :] VYBilinear
+  cdef double[:, :] VZBilinear
+  cdef double[:, :] kineticEnergy
+  # active window (rows jStart to jEnd-1, columns iStart to iEnd-1)
+  cdef int jStart, jEnd, iStart, iEnd
+  jStart, jEnd, iStart, iEnd = getActiveWindow(xArray, yArray, ncols, nrows, csz)
+  activeWindow = (jStart, jEnd, iStart, iEnd)
+  if workspace is None:
+    # grids outside of the window are never touched, they need to be 0
+    MassBilinear = np.zeros((nrows, ncols))
+    MassDetBilinear = np.zeros((nrows, ncols))
+    MomBilinearX = np.zeros((nrows, ncols))
+    MomBilinearY = np.zeros((nrows, ncols))
+    MomBilinearZ = np.zeros((nrows, ncols))
+    travelAngleField = np.zeros((nrows, ncols))
+    VBilinear = np.zeros((nrows, ncols))
+    PBilinear = np.zeros((nrows, ncols))
+    FTBilinear = np.zeros((nrows, ncols))
+    VXBilinear = np.zeros((nrows, ncols))
+    VYBilinear = np.zeros((nrows, ncols))
+    VZBilinear = np.zeros((nrows, ncols))
+    kineticEnergy = np.zeros((nrows, ncols))
+  else:
+    # cells of the previous window can still hold values, extend the window
+    jStart, jEnd, iStart, iEnd = mergeWindows(activeWindow, workspace.get('activeWindow', (0, nrows, 0, ncols)))
+    workspace['activeWindow'] = activeWindow
+    workspace['updateWindow'] = (jStart, jEnd, iStart, iEnd)
+    MassBilinear = workspace['FM']
+    MassDetBilinear = workspace['massDet']
+    MomBilinearX = workspace['momX']
+    MomBilinearY = workspace['momY']
+    MomBilinearZ = workspace['momZ']
+    travelAngleField = workspace['TA']
+    VBilinear = workspace['FV']
+    PBilinear = workspace['P']
+    FTBilinear = workspace['FT']
+    VXBilinear = workspace['Vx']
+    VYBilinear = workspace['Vy']
+    VZBilinear = workspace['Vz']
+    kineticEnergy = workspace['kineticEnergy']
+  # one band of rows of the window per thread
+  cdef int nBands = max(1, min(nThreads, jEnd - jStart))
+  cdef int bandSize = max(1, (jEnd - jStart + nBands - 1) // nBands)
+  cdef int t, rowStart, rowEnd
+  # particles of each band (particles of band t are bandParticles[bandStart[t]:bandStart[t+1]])
+  cdef int[:] bandStart
+  cdef int[:] bandCursor
+  cdef int[:] bandParticles
+  cdef int n, nStart, nEnd, band, bandLow, bandHigh, rowLow, rowHigh
+  # cell, interpolation weights and travel angle cell of each particle
+  cdef int[:] Lx0Array
+  cdef int[:] Ly0Array
+  cdef int[:] indxTAArray
+  cdef int[:] indyTAArray
+  cdef double[:, :] weights
+  if workspace is None:
+    Lx0Array = np.empty(nPart, dtype=np.intc)
+    Ly0Array = np.empty(nPart, dtype=np.intc)
+    indxTAArray = np.empty(nPart, dtype=np.intc)
+    indyTAArray = np.empty(nPart, dtype=np.intc)
+    weights = np.empty((nPart, 4))
+  else:
+    Lx0Array = workspace['Lx0'][:nPart]
+    Ly0Array = workspace['Ly0'][:nPart]
+    indxTAArray = workspace['indxTA'][:nPart]
+    indyTAArray = workspace['indyTA'][:nPart]
+    weights = workspace['weights'][:nPart]
   # declare intermediate step variables
-  cdef double[:] hBB = np.zeros((nPart))
+  cdef double[:] hBB = particleTools.getOutputArray(particles, 'h', nPart, workspace=workspace)
   cdef double m, dm, h, x, y, z, s, ux, uy, uz, nx, ny, nz, hbb, hLim, areaPart, trajectoryAngle
-  cdef int k, i
+  cdef int k, i, j
   cdef int indx, indy
   cdef int ind1[4]
   cdef int ind2[4]
@@ -1149,42 +1264,119 @@ def updateFieldsC(cfg, particles, dem, fields):
   ind2[:] = [0, 0, 1, 1]
   # variables for interpolation
   cdef int Lx0, Ly0, iCell
-  cdef double w[4]
+  cdef double w0, w1, w2, w3, wi
   cdef double mwi, dmwi
 
-  for k in range(nPart):
-    x = xArray[k]
-    y = yArray[k]
-    ux = uxArray[k]
-    uy = uyArray[k]
-    uz = uzArray[k]
-    m = mass[k]
-    dm = massDet[k]
+  for k in prange(nPart, nogil=True, num_threads=nThreads, schedule='static'):
     # find coordinates in normalized ref (origin (0,0) and cellsize 1)
     # find coordinates of the 4 nearest cornes on the raster
     # prepare for bilinear interpolation
-    Lx0, Ly0, iCell, w[0], w[1], w[2], w[3] = DFAtlsC.getCellAndWeights(x, y, ncols, nrows, csz, interpOption)
+    Lx0, Ly0, iCell, w0, w1, w2, w3 = DFAtlsC.getCellAndWeights(xArray[k], yArray[k], ncols, nrows, csz,
+                                                                interpOption)
+    Lx0Array[k] = Lx0
+    Ly0Array[k] = Ly0
+    weights[k, 0] = w0
+    weights[k, 1] = w1
+    weights[k, 2] = w2
+    weights[k, 3] = w3
     # for the travel angle we simply do a nearest interpolation
-    indx = <int>math.round(x / csz)
-    indy = <int>math.round(y / csz)
-    if computeTA:
-      trajectoryAngle = trajectoryAngleArray[k]
-      travelAngleField[indy, indx] = max(travelAngleField[indy, indx], trajectoryAngle)
-    # add the component of the points value to the 4 neighbour grid points
-    # TODO : check if giving the arrays [0 1 0 1].. is faster
-    for i in range(4):
-      indx = Lx0 + ind1[i]
-      indy = Ly0 + ind2[i]
-      mwi = m * w[i]
-      dmwi = dm * w[i]
-      MassBilinear[indy, indx] = MassBilinear[indy, indx] + mwi
-      MassDetBilinear[indy, indx] = MassDetBilinear[indy, indx] + dmwi  # PS TODO: sinnvoll???
-      MomBilinearX[indy, indx] = MomBilinearX[indy, indx] + mwi * ux
-      MomBilinearY[indy, indx] = MomBilinearY[indy, indx] + mwi * uy
-      MomBilinearZ[indy, indx] = MomBilinearZ[indy, indx] + mwi * uz
-
-  for i in range(ncols):
-    for j in range(nrows):
+    indxTAArray[k] = <int>math.round(xArray[k] / csz)
+    indyTAArray[k] = <int>math.round(yArray[k] / csz)
+
+  if nBands > 1:
+    # sort the particles by band (counting sort on the rows touched by the particles). The list of each
+    # band is filled from the end looping backwards on the particles, so it is in particle order
+    if workspace is None:
+      bandStart = np.zeros(nBands + 1, dtype=np.intc)
+      bandCursor = np.zeros(nBands + 1, dtype=np.intc)
+    else:
+      if np.size(workspace.get('bandStart', [])) < nBands + 1:
+        workspace['bandStart'] = np.zeros(nBands + 1, dtype=np.intc)
+        workspace['bandCursor'] = np.zeros(nBands + 1, dtype=np.intc)
+      bandStart = workspace['bandStart']
+      bandCursor = workspace['bandCursor']
+      bandStart[:] = 0
+    for k in range(nPart):
+      rowLow, rowHigh = getParticleRows(Ly0Array[k], indyTAArray[k], computeTA)
+      bandLow = getRowBand(rowLow, jStart, jEnd, bandSize, nBands)
+      bandHigh = getRowBand(rowHigh, jStart, jEnd, bandSize, nBands)
+      for band in range(bandLow, bandHigh + 1):
+        bandStart[band + 1] = bandStart[band + 1] + 1
+    for band in range(nBands):
+      bandStart[band + 1] = bandStart[band] + bandStart[band + 1]
+      bandCursor[band] = bandStart[band + 1]
+    if workspace is not None and bandStart[nBands] <= np.size(workspace['bandParticles']):
+      bandParticles = workspace['bandParticles']
+    else:
+      bandParticles = np.empty(bandStart[nBands], dtype=np.intc)
+    for k in range(nPart - 1, -1, -1):
+      rowLow, rowHigh = getParticleRows(Ly0Array[k], indyTAArray[k], computeTA)
+      bandLow = getRowBand(rowLow, jStart, jEnd, bandSize, nBands)
+      bandHigh = getRowBand(rowHigh, jStart, jEnd, bandSize, nBands)
+      for band in range(bandLow, bandHigh + 1):
+        bandCursor[band] = bandCursor[band] - 1
+        bandParticles[bandCursor[band]] = k
+
+  # each thread adds the values of the particles of its band to the grid points of its band of rows,
+  # looping on the particles in order: every grid point is summed up in the same order as in a serial
+  # loop, whatever nThreads is, and no partial grids are needed
+  for t in prange(nBands, nogil=True, num_threads=nThreads, schedule='static'):
+    rowStart = jStart + t * bandSize
+    rowEnd = min(rowStart + bandSize, jEnd)
+    # reset the grids of this band
+    for j in range(rowStart, rowEnd):
+      for i in range(iStart, iEnd):
+        MassBilinear[j, i] = 0
+        MassDetBilinear[j, i] = 0
+        MomBilinearX[j, i] = 0
+        MomBilinearY[j, i] = 0
+        MomBilinearZ[j, i] = 0
+        travelAngleField[j, i] = 0
+    if nBands > 1:
+      nStart = bandStart[t]
+      nEnd = bandStart[t + 1]
+    else:
+      nStart = 0
+      nEnd = nPart
+    for n in range(nStart, nEnd):
+      if nBands > 1:
+        k = bandParticles[n]
+      else:
+        k = n
+      Ly0 = Ly0Array[k]
+      # the particle only touches rows Ly0 and Ly0+1
+      if Ly0 + 1 < rowStart or Ly0 >= rowEnd:
+        continue
+      Lx0 = Lx0Array[k]
+      m = mass[k]
+      dm = massDet[k]
+      ux = uxArray[k]
+      uy = uyArray[k]
+      uz = uzArray[k]
+      if computeTA:
+        indy = indyTAArray[k]
+        if indy >= rowStart and indy < rowEnd:
+          indx = indxTAArray[k]
+          trajectoryAngle = trajectoryAngleArray[k]
+          travelAngleField[indy, indx] = max(travelAngleField[indy, indx], trajectoryAngle)
+      # add the component of the points value to the 4 neighbour grid points
+      for i in range(4):
+        indy = Ly0 + ind2[i]
+        if indy < rowStart or indy >= rowEnd:
+          continue
+        indx = Lx0 + ind1[i]
+        wi = weights[k, i]
+        mwi = m * wi
+        dmwi = dm * wi
+        MassBilinear[indy, indx] = MassBilinear[indy, indx] + mwi
+        MassDetBilinear[indy, indx] = MassDetBilinear[indy, indx] + dmwi  # PS TODO: sinnvoll???
+        MomBilinearX[indy, indx] = MomBilinearX[indy, indx] + mwi * ux
+        MomBilinearY[indy, indx] = MomBilinearY[indy, indx] + mwi * uy
+        MomBilinearZ[indy, indx] = MomBilinearZ[indy, indx] + mwi * uz
+
+  # update the fields and the peak fields (rows are independent)
+  for j in prange(jStart, jEnd, nogil=True, num_threads=nThreads, schedule='static'):
+    for i in range(iStart, iEnd):
       m = MassBilinear[j, i]
 
       #PS: TODO: sinnvoll??
@@ -1214,6 +1406,14 @@ def updateFieldsC(cfg, particles, dem, fields):
           kineticEnergy[j, i] = 0.5*m*VBilinear[j, i]*VBilinear[j, i]
           if kineticEnergy[j, i] > PKE[j, i]:
             PKE[j, i] = kineticEnergy[j, i]
+      else:
+        FTBilinear[j, i] = 0
+        VXBilinear[j, i] = 0
+        VYBilinear[j, i] = 0
+        VZBilinear[j, i] = 0
+        VBilinear[j, i] = 0
+        PBilinear[j, i] = 0
+        kineticEnergy[j, i] = 0
 
   fields['FM'] = np.asarray(MassBilinear)
   fields['FV'] = np.asarray(VBilinear)
@@ -1234,11 +1434,11 @@ def updateFieldsC(cfg, particles, dem, fields):
     fields['pke'] = np.asarray(PKE)
 
 
-  for k in range(nPart):
+  for k in prange(nPart, nogil=True, num_threads=nThreads, schedule='static'):
     x = xArray[k]
     y = yArray[k]
-    Lx0, Ly0, iCell, w[0], w[1], w[2], w[3] = DFAtlsC.getCellAndWeights(x, y, ncols, nrows, csz, interpOption)
-    hbb = DFAtlsC.getScalar(Lx0, Ly0, w[0], w[1], w[2], w[3], FTBilinear)
+    Lx0, Ly0, iCell, w0, w1, w2, w3 = DFAtlsC.getCellAndWeights(x, y, ncols, nrows, csz, interpOption)
+    hbb = DFAtlsC.getScalar(Lx0, Ly0, w0, w1, w2, w3, FTBilinear)
     hBB[k] = hbb
 
   particles['h'] = np.asarray(hBB)
@@ -1246,7 +1446,126 @@ def updateFieldsC(cfg, particles, dem, fields):
   return particles, fields
 
 
-cpdef double computePressure(double v, double rho):
+def getActiveWindow(double[:] xArray, double[:] yArray, int ncols, int nrows, double csz):
+  """ Get the window of grid cells touched by the particles
+
+  This is the bounding box of the lower left cells of the particles extended by
+  one cell (interpolation stencil), clipped to the grid
+
+  Parameters
+  ----------
+  xArray: 1D numpy array
+      x coordinate of the particles
+  yArray: 1D numpy array
+      y coordinate of the particles
+  ncols: int
+      number of columns
+  nrows: int
+      number of rows
+  csz: float
+      cellsize of the grid
+
+  Returns
+  -------
+  window: tuple
+      (jStart, jEnd, iStart, iEnd) rows jStart to jEnd-1 and columns iStart to iEnd-1,
+      (0, 0, 0, 0) if there is no particle
+  """
+  cdef int nPart = xArray.shape[0]
+  if nPart == 0:
+    return (0, 0, 0, 0)
+  cdef double xMin = xArray[0]
+  cdef double xMax = xArray[0]
+  cdef double yMin = yArray[0]
+  cdef double yMax = yArray[0]
+  cdef int k
+  for k in range(1, nPart):
+    xMin = min(xMin, xArray[k])
+    xMax = max(xMax, xArray[k])
+    yMin = min(yMin, yArray[k])
+    yMax = max(yMax, yArray[k])
+  cdef int iStart = max(<int>math.floor(xMin / csz), 0)
+  cdef int iEnd = min(<int>math.floor(xMax / csz) + 2, ncols)
+  cdef int jStart = max(<int>math.floor(yMin / csz), 0)
+  cdef int jEnd = min(<int>math.floor(yMax / csz) + 2, nrows)
+  return (jStart, jEnd, iStart, iEnd)
+
+
+def mergeWindows(window1, window2):
+  """ Get the smallest window containing two windows
+
+  Parameters
+  ----------
+  window1: tuple
+      (jStart, jEnd, iStart, iEnd), empty if jStart >= jEnd or iStart >= iEnd
+  window2: tuple
+      (jStart, jEnd, iStart, iEnd), empty if jStart >= jEnd or iStart >= iEnd
+
+  Returns
+  -------
+  window: tuple
+      (jStart, jEnd, iStart, iEnd) window containing window1 and window2
+  """
+  if window1[0] >= window1[1] or window1[2] >= window1[3]:
+    return tuple(window2)
+  if window2[0] >= window2[1] or window2[2] >= window2[3]:
+    return tuple(window1)
+  return (min(window1[0], window2[0]), max(window1[1], window2[1]),
+          min(window1[2], window2[2]), max(window1[3], window2[3]))
+
+
+cpdef (int, int) getParticleRows(int Ly0, int indyTA, bint computeTA) noexcept nogil:
+  """ Get the first and last grid row a particle adds values to in updateFieldsC
+
+  Parameters
+  ----------
+  Ly0: int
+      row of the nearest lower left cell of the particle
+  indyTA: int
+      row of the nearest grid point (travel angle)
+  computeTA: bool
+      True if the travel angle field is computed
+
+  Returns
+  -------
+  rowLow: int
+      first row
+  rowHigh: int
+      last row
+  """
+  if computeTA:
+    return min(Ly0, indyTA), max(Ly0 + 1, indyTA)
+  return Ly0, Ly0 + 1
+
+
+cpdef int getRowBand(int row, int jStart, int jEnd, int bandSize, int nBands) noexcept nogil:
+  """ Get the band of rows (see updateFieldsC) containing a grid row
+
+  Rows outside of the window are attributed to the first or last band
+
+  Parameters
+  ----------
+  row: int
+      grid row
+  jStart: int
+      first row of the window
+  jEnd: int
+      end of the window (last row + 1)
+  bandSize: int
+      number of rows per band
+  nBands: int
+      number of bands
+
+  Returns
+  -------
+  band: int
+      index of the band
+  """
+  row = max(jStart, min(row, jEnd - 1))
+  return min((row - jStart) // bandSize, nBands - 1)
+
+
+cpdef double computePressure(double v, double rho) noexcept nogil:
   """Compute pressure using the p = rho*v² equation
 
   Parameters
@@ -1286,7 +1605,7 @@ def computeTrajectoryAngleC(particles, zPartArray0):
   cdef double[:] zArray = particles['z']
   cdef double[:] sArray = particles['trajectoryLengthXY']
   cdef double[:] z0Array = zPartArray0
-  cdef double[:] gammaArray = np.zeros(nPart)
+  cdef double[:] gammaArray = particleTools.getOutputArray(particles, 'trajectoryAngle', nPart)
   cdef int parentID, j
   cdef double tanGamma, gamma, s, z, z0
   # get particle location
@@ -1310,7 +1629,7 @@ def computeTrajectoryAngleC(particles, zPartArray0):
   return particles
 
 
-def getNeighborsC(particles, dem):
+def getNeighborsC(particles, dem, workspace=None):
     """ Locate particles on DEM and neighbour search grid
 
     Ĺocate each particle in a grid cell (both DEM and neighbour search grid) and build the
@@ -1318,11 +1637,19 @@ def getNeighborsC(particles, dem):
     InCell, IndX and IndY arrays location on the DEM grid.
     See issue #200 and documentation for details
 
+    In incremental mode (workspace given), the arrays of the previous call are kept in the
+    workspace. If the particles did not change in between (same IDs in the same order, i.e. no
+    particle was added, removed or reordered), these arrays are updated: only the cells between
+    the old and new cell of the particles that changed cell are rebuilt. The result is identical
+    to a full rebuild.
+
     Parameters
     ----------
     particles : dict
     dem : dict
       dem dict with neighbour search grid header (information about neighbour search grid)
+    workspace : dict
+      optional, if given the neighbour search arrays are updated from the previous call (incremental mode)
 
     Returns
     -------
@@ -1330,6 +1657,7 @@ def getNeighborsC(particles, dem):
       updated particles dictionary with
       neighbours info indPartInCell and partInCell arrays for neighbour search and
       with InCell, IndX and IndY arrays location on the DEM grid
+      (and inCellNeighbour, index of the neighbour search grid cell of each particle)
     """
     # get DEM grid information
     header = dem['header']
@@ -1346,48 +1674,282 @@ def getNeighborsC(particles, dem):
     cdef int k
     cdef double[:] xArray = particles['x']
     cdef double[:] yArray = particles['y']
-
-    # initialize outputs
     cdef int nCellsNeighbourGrid = nColsNeighbourGrid*nRowsNeighbourGrid
-    cdef int[:] indPartInCell = np.zeros(nCellsNeighbourGrid + 1).astype('intc')
-    cdef int[:] indPartInCell2 = np.zeros(nCellsNeighbourGrid + 1).astype('intc')
-    cdef int[:] partInCell = np.zeros(nPart).astype('intc')
-    cdef int[:] indXDEM = np.zeros(nPart).astype('intc')
-    cdef int[:] indYDEM = np.zeros(nPart).astype('intc')
-    cdef int[:] inCellDEM = np.zeros(nPart).astype('intc')
-    # Count number of particles in each SPH grid cell
-    cdef int indx, indy, ic
+    cdef bint reuse = False
+    if workspace is not None:
+      if workspace.get('neighbourGridSize') != nCellsNeighbourGrid:
+        # buffers of the size of the neighbour search grid
+        workspace['neighbourGridSize'] = nCellsNeighbourGrid
+        workspace['neighbourAffectedCells'] = np.zeros(nCellsNeighbourGrid + 1).astype('intc')
+        workspace['neighbourCount'] = np.zeros(nCellsNeighbourGrid + 1).astype('intc')
+        workspace.pop('neighbourArrays', None)
+      # the arrays of the previous call can be used if the particles are the same (IDs in the same order)
+      if 'neighbourArrays' in workspace and 'ID' in particles:
+        neighbourIDs = workspace['neighbourArrays']['ID']
+        reuse = np.size(neighbourIDs) == nPart and np.array_equal(neighbourIDs, particles['ID'][:nPart])
+    cdef bint rebuild = not reuse
+
+    # initialize outputs (or reuse the ones from the previous call)
+    cdef int[:] indPartInCell
+    cdef int[:] partInCell
+    cdef int[:] indXDEM
+    cdef int[:] indYDEM
+    cdef int[:] inCellDEM
+    cdef int[:] inCellNeighbour
+    if reuse:
+      neighbourArrays = workspace['neighbourArrays']
+      indPartInCell = neighbourArrays['indPartInCell']
+      partInCell = neighbourArrays['partInCell']
+      indXDEM = neighbourArrays['indXDEM']
+      indYDEM = neighbourArrays['indYDEM']
+      inCellDEM = neighbourArrays['inCellDEM']
+      inCellNeighbour = neighbourArrays['inCellNeighbour']
+    else:
+      indPartInCell = np.zeros(nCellsNeighbourGrid + 1).astype('intc')
+      partInCell = np.zeros(nPart).astype('intc')
+      indXDEM = np.zeros(nPart).astype('intc')
+      indYDEM = np.zeros(nPart).astype('intc')
+      inCellDEM = np.zeros(nPart).astype('intc')
+      inCellNeighbour = np.zeros(nPart).astype('intc')
+    # affectedCells is used to flag the cells that need to be rebuilt (incremental mode), indPartInCell2
+    # to count the particles per cell. In incremental mode both are kept in the workspace, affectedCells
+    # is 0 and indPartInCell2 is 0 for all cells that are not flagged between two calls
+    cdef int[:] affectedCells
+    cdef int[:] indPartInCell2
+    if workspace is not None:
+      affectedCells = workspace['neighbourAffectedCells']
+      indPartInCell2 = workspace['neighbourCount']
+    else:
+      indPartInCell2 = np.zeros(nCellsNeighbourGrid + 1).astype('intc')
+    cdef int[:] partToSort
+    cdef int indx, indy, ic, icOld, j, nMoved, nToSort, nAffected
+    # locate particles on the DEM and neighbour search grid
+    nMoved = 0
     for k in range(nPart):
       indx = <int>math.round(xArray[k] / cszNeighbourGrid)
       indy = <int>math.round(yArray[k] / cszNeighbourGrid)
       # get index of cell containing the particle
       ic = indx + nColsNeighbourGrid * indy
-      indPartInCell[ic+1] = indPartInCell[ic+1] + 1
-    for ic in range(nCellsNeighbourGrid):
-      indPartInCell[ic+1] = indPartInCell[ic] + indPartInCell[ic+1]
-      indPartInCell2[ic+1] = indPartInCell[ic+1]
-
-    # make the list of which particles are in which cell
-    for k in range(nPart):
-        indx = <int>math.round(xArray[k] / cszNeighbourGrid)
-        indy = <int>math.round(yArray[k] / cszNeighbourGrid)
-        ic = indx + nColsNeighbourGrid * indy
+      if reuse:
+        icOld = inCellNeighbour[k]
+        if ic != icOld:
+          # all cells between the old and new cell of the particle need to be rebuilt
+          nMoved = nMoved + 1
+          affectedCells[min(ic, icOld)] = affectedCells[min(ic, icOld)] + 1
+          affectedCells[max(ic, icOld) + 1] = affectedCells[max(ic, icOld) + 1] - 1
+      inCellNeighbour[k] = ic
+      indXDEM[k] = <int>math.round(xArray[k] / cszDEM)
+      indYDEM[k] = <int>math.round(yArray[k] / cszDEM)
+      # get index of cell containing the particle
+      inCellDEM[k] = indXDEM[k] + nColsDEM * indYDEM[k]
+
+    # the cells between the old and the new cell of a moving particle form blocks of cells that keep
+    # the same number of particles. The index of the first particle of a block does not change so
+    # each block can be rebuilt independently.
+    nToSort = 0
+    if reuse and nMoved > 0:
+      # flag affected cells and count the particles located in them
+      nAffected = 0
+      for ic in range(nCellsNeighbourGrid):
+        nAffected = nAffected + affectedCells[ic]
+        affectedCells[ic] = nAffected > 0
+        if affectedCells[ic]:
+          nToSort = nToSort + indPartInCell[ic+1] - indPartInCell[ic]
+      affectedCells[nCellsNeighbourGrid] = 0
+      # the blocks span whole rows of the grid, if too many particles are affected a full
+      # rebuild is faster
+      if nToSort > nPart // 4:
+        rebuild = True
+        nToSort = 0
+        indPartInCell[:] = 0
+        affectedCells[:] = 0
+
+    if rebuild:
+      # Count number of particles in each SPH grid cell
+      for k in range(nPart):
+        ic = inCellNeighbour[k]
+        indPartInCell[ic+1] = indPartInCell[ic+1] + 1
+      for ic in range(nCellsNeighbourGrid):
+        indPartInCell[ic+1] = indPartInCell[ic] + indPartInCell[ic+1]
+        indPartInCell2[ic+1] = indPartInCell[ic+1]
+
+      # make the list of which particles are in which cell
+      for k in range(nPart):
+        ic = inCellNeighbour[k]
+        partInCell[indPartInCell2[ic+1]-1] = k
+        indPartInCell2[ic+1] = indPartInCell2[ic+1] - 1
+      if workspace is not None:
+        # the counts are left at the first index of each cell, reset them
+        indPartInCell2[:] = 0
+
+    elif nToSort > 0:
+      # gather the particles located in the affected cells (and reset the flags)
+      partToSort = np.empty(nToSort, dtype=np.intc)
+      j = 0
+      for ic in range(nCellsNeighbourGrid):
+        if affectedCells[ic]:
+          for k in range(indPartInCell[ic], indPartInCell[ic+1]):
+            partToSort[j] = partInCell[k]
+            j = j + 1
+      # sort them by particle index (same order as a full rebuild)
+      partToSort = np.sort(np.asarray(partToSort))
+      # count particles in the affected cells
+      for j in range(nToSort):
+        ic = inCellNeighbour[partToSort[j]]
+        indPartInCell2[ic+1] = indPartInCell2[ic+1] + 1
+      for ic in range(nCellsNeighbourGrid):
+        if affectedCells[ic]:
+          indPartInCell[ic+1] = indPartInCell[ic] + indPartInCell2[ic+1]
+          indPartInCell2[ic+1] = indPartInCell[ic+1]
+      # make the list of which particles are in which (affected) cell
+      for j in range(nToSort):
+        k = partToSort[j]
+        ic = inCellNeighbour[k]
         partInCell[indPartInCell2[ic+1]-1] = k
         indPartInCell2[ic+1] = indPartInCell2[ic+1] - 1
-        indXDEM[k] = <int>math.round(xArray[k] / cszDEM)
-        indYDEM[k] = <int>math.round(yArray[k] / cszDEM)
-        # get index of cell containing the particle
-        inCellDEM[k] = indXDEM[k] + nColsDEM * indYDEM[k]
+      # reset the flags and counts of the affected cells
+      for ic in range(nCellsNeighbourGrid):
+        if affectedCells[ic]:
+          affectedCells[ic] = 0
+          indPartInCell2[ic+1] = 0
 
     particles['inCellDEM'] = np.asarray(inCellDEM)
     particles['indXDEM'] = np.asarray(indXDEM)
     particles['indYDEM'] = np.asarray(indYDEM)
     particles['indPartInCell'] = np.asarray(indPartInCell)
     particles['partInCell'] = np.asarray(partInCell)
+    particles['inCellNeighbour'] = np.asarray(inCellNeighbour)
+    if workspace is not None and not reuse:
+      # keep the arrays for the next call
+      workspace['neighbourArrays'] = {'inCellDEM': particles['inCellDEM'], 'indXDEM': particles['indXDEM'],
+                                      'indYDEM': particles['indYDEM'],
+                                      'indPartInCell': particles['indPartInCell'],
+                                      'partInCell': particles['partInCell'],
+                                      'inCellNeighbour': particles['inCellNeighbour']}
+      if 'ID' in particles:
+        workspace['neighbourArrays']['ID'] = np.array(particles['ID'][:nPart])
 
     return particles
 
 
+def mergeParticlesC(particles, dem, int[:] tooSmall, double sphKernelRadius):
+  """ merge the too small particles with their closest neighbour
+
+  The too small particles are handled one after the other (in the order of tooSmall). Each one is merged
+  with its closest (kept) neighbour if this one is closer than the kernel radius. The merged particle gets
+  the mass averaged position and velocity and the neighbour is removed.
+  The neighbour search grid (same as in getNeighborsC, built from the current positions) is used to find
+  the closest neighbour, only particles in the cells closer than the kernel radius are candidates.
+  Particles that changed cell because of a merge are checked separately.
+
+  Parameters
+  ----------
+  particles : dict
+    particles dictionary (x, y, z, ux, uy, uz and m are updated in place)
+  dem : dict
+    dem dict with neighbour search grid header (information about neighbour search grid)
+  tooSmall : int 1D array
+    index of the particles to merge
+  sphKernelRadius : float
+    kernel radius (max distance between merged particles)
+
+  Returns
+  -------
+  keepParticle : bool 1D array
+    False for the particles that were merged into another one (to remove)
+  nRemoved : int
+    number of particles to remove
+  """
+  # neighbour search grid from the current particle positions
+  gridParticles = getNeighborsC({'nPart': particles['nPart'], 'x': particles['x'], 'y': particles['y']}, dem)
+  headerNeighbourGrid = dem['headerNeighbourGrid']
+  cdef int nColsNeighbourGrid = headerNeighbourGrid['ncols']
+  cdef int nRowsNeighbourGrid = headerNeighbourGrid['nrows']
+  cdef float cszNeighbourGrid = headerNeighbourGrid['cellsize']
+  cdef int[:] indPartInCell = gridParticles['indPartInCell']
+  cdef int[:] partInCell = gridParticles['partInCell']
+  cdef int[:] inCellNeighbour = gridParticles['inCellNeighbour']
+  cdef int nPart = particles['nPart']
+  cdef int nSmall = tooSmall.shape[0]
+  cdef double[:] xArray = particles['x']
+  cdef double[:] yArray = particles['y']
+  cdef double[:] zArray = particles['z']
+  cdef double[:] uxArray = particles['ux']
+  cdef double[:] uyArray = particles['uy']
+  cdef double[:] uzArray = particles['uz']
+  cdef double[:] mArray = particles['m']
+  cdef int[:] keepParticle = np.ones(nPart, dtype=np.intc)
+  # particles that are not located in their grid cell anymore (because they were merged)
+  cdef int[:] isMoved = np.zeros(nPart, dtype=np.intc)
+  cdef int[:] movedPart = np.zeros(nPart, dtype=np.intc)
+  cdef int nMoved = 0
+  cdef int nRemoved = 0
+  cdef int i, k, ind, j, neighbourInd, lx, ly, lxMin, lxMax, lyMin, lyMax, ic
+  cdef double x, y, z, dx, dy, dz, r, rMerge, m1, m2, mNew
+  for i in range(nSmall):
+    ind = tooSmall[i]
+    if keepParticle[ind] == 0:
+      continue
+    x = xArray[ind]
+    y = yArray[ind]
+    z = zArray[ind]
+    # cells that can contain a particle closer than the kernel radius
+    lxMin = max(<int>math.round((x - sphKernelRadius) / cszNeighbourGrid), 0)
+    lxMax = min(<int>math.round((x + sphKernelRadius) / cszNeighbourGrid), nColsNeighbourGrid - 1)
+    lyMin = max(<int>math.round((y - sphKernelRadius) / cszNeighbourGrid), 0)
+    lyMax = min(<int>math.round((y + sphKernelRadius) / cszNeighbourGrid), nRowsNeighbourGrid - 1)
+    # find the closest neighbour (lowest index if several are at the same distance)
+    neighbourInd = -1
+    rMerge = sphKernelRadius
+    for ly in range(lyMin, lyMax + 1):
+      for lx in range(lxMin, lxMax + 1):
+        ic = lx + nColsNeighbourGrid * ly
+        for k in range(indPartInCell[ic], indPartInCell[ic+1]):
+          j = partInCell[k]
+          if j != ind and keepParticle[j] == 1:
+            dx = xArray[j] - x
+            dy = yArray[j] - y
+            dz = zArray[j] - z
+            r = math.sqrt(dx*dx + dy*dy + dz*dz)
+            if r < rMerge or (r == rMerge and neighbourInd >= 0 and j < neighbourInd):
+              rMerge = r
+              neighbourInd = j
+    for k in range(nMoved):
+      j = movedPart[k]
+      if j != ind and keepParticle[j] == 1:
+        dx = xArray[j] - x
+        dy = yArray[j] - y
+        dz = zArray[j] - z
+        r = math.sqrt(dx*dx + dy*dy + dz*dz)
+        if r < rMerge or (r == rMerge and neighbourInd >= 0 and j < neighbourInd):
+          rMerge = r
+          neighbourInd = j
+    # only merge a particle if it is closer than the kernel radius
+    if neighbourInd >= 0:
+      keepParticle[neighbourInd] = 0
+      nRemoved = nRemoved + 1
+      # compute mass averaged values
+      m1 = mArray[ind]
+      m2 = mArray[neighbourInd]
+      mNew = m1 + m2
+      xArray[ind] = (m1*xArray[ind] + m2*xArray[neighbourInd]) / mNew
+      yArray[ind] = (m1*yArray[ind] + m2*yArray[neighbourInd]) / mNew
+      zArray[ind] = (m1*zArray[ind] + m2*zArray[neighbourInd]) / mNew
+      uxArray[ind] = (m1*uxArray[ind] + m2*uxArray[neighbourInd]) / mNew
+      uyArray[ind] = (m1*uyArray[ind] + m2*uyArray[neighbourInd]) / mNew
+      uzArray[ind] = (m1*uzArray[ind] + m2*uzArray[neighbourInd]) / mNew
+      mArray[ind] = mNew
+      # the merged particle might not be located in its grid cell anymore
+      ic = (<int>math.round(xArray[ind] / cszNeighbourGrid)
+            + nColsNeighbourGrid * <int>math.round(yArray[ind] / cszNeighbourGrid))
+      if isMoved[ind] == 0 and ic != inCellNeighbour[ind]:
+        isMoved[ind] = 1
+        movedPart[nMoved] = ind
+        nMoved = nMoved + 1
+
+  return np.asarray(keepParticle).astype(bool), nRemoved
+
+
 def computeCohesionForceC(cfg, particles, force):
   """ compute elastic cohesion forces acting on the particles
   this is computed when the snow slide option is activated (snowSlide = 1
@@ -1689,7 +2251,7 @@ def removedBonds(particles, mask, nRemove, nBondRemove):
   return particles
 
 
-def computeForceSPHC(cfg, particles, force, dem, int sphOption, gradient=0):
+def computeForceSPHC(cfg, particles, force, dem, int sphOption, gradient=0, workspace=None):
   """ Prepare data for C computation of lateral forces (SPH component)
 
   acting on the particles (SPH component)
@@ -1706,6 +2268,8 @@ def computeForceSPHC(cfg, particles, force, dem, int sphOption, gradient=0):
       dictionary with dem information
   sphOption: int
       which sphOption should be use
+  workspace: dict
+    optional, preallocated buffers (see com1DFA.initializeWorkspace), if None the outputs are allocated
   Returns
   -------
   particles : dict
@@ -1721,7 +2285,8 @@ def computeForceSPHC(cfg, particles, force, dem, int sphOption, gradient=0):
   nyArray = dem['Ny']
   nzArray = dem['Nz']
 
-  forceSPHX, forceSPHY, forceSPHZ = computeGradC(cfg, particles, headerNeighbourGrid, headerNormalGrid, nxArray, nyArray, nzArray, gradient, sphOption)
+  forceSPHX, forceSPHY, forceSPHZ = computeGradC(cfg, particles, headerNeighbourGrid, headerNormalGrid, nxArray, nyArray, nzArray, gradient, sphOption,
+                                                 workspace=workspace)
   forceSPHX = np.asarray(forceSPHX)
   forceSPHY = np.asarray(forceSPHY)
   forceSPHZ = np.asarray(forceSPHZ)
@@ -1734,10 +2299,12 @@ def computeForceSPHC(cfg, particles, force, dem, int sphOption, gradient=0):
 
 
 def computeGradC(cfg, particles, headerNeighbourGrid, headerNormalGrid, double[:, :] nxArray, double[:, :] nyArray,
-                 double[:, :] nzArray, gradient, int SPHoption):
+                 double[:, :] nzArray, gradient, int SPHoption, workspace=None):
   """ compute lateral forces acting on the particles (SPH component)
 
   Cython implementation
+  The loop on particles can be shared between several threads (nThreads in the configuration).
+  All threads read the neighbour search arrays and only write the force of their own particles
 
   Parameters
   ----------
@@ -1757,6 +2324,8 @@ def computeGradC(cfg, particles, headerNeighbourGrid, headerNormalGrid, double[:
       z component of the normal vector of the DEM
   gradient : int
     Return the gradient (if 1) or the force associated (if 0, default)
+  workspace: dict
+    optional, preallocated buffers (see com1DFA.initializeWorkspace), if None the outputs are allocated
 
   Returns
   -------
@@ -1775,6 +2344,7 @@ def computeGradC(cfg, particles, headerNeighbourGrid, headerNormalGrid, double[:
   cdef double gravAcc = cfg.getfloat('gravAcc')
   cdef int interpOption = cfg.getint('interpOption')
   cdef int viscOption = cfg.getint('viscOption')
+  cdef int nThreads = cfg.getint('nThreads')
 
   # grid normal raster information
   cdef double cszNormal = headerNormalGrid['cellsize']
@@ -1803,19 +2373,27 @@ def computeGradC(cfg, particles, headerNeighbourGrid, headerNormalGrid, double[:
   cdef double[:] uzArray = particles['uz']
   cdef int N = xArray.shape[0]
 
-  # initialize variables and outputs
-  cdef double[:] GHX = np.zeros(N, dtype=np.float64)
-  cdef double[:] GHY = np.zeros(N, dtype=np.float64)
-  cdef double[:] GHZ = np.zeros(N, dtype=np.float64)
+  # initialize variables and outputs (set to 0 for each particle in the loop)
+  cdef double[:] GHX
+  cdef double[:] GHY
+  cdef double[:] GHZ
+  if workspace is None:
+    GHX = np.empty(N, dtype=np.float64)
+    GHY = np.empty(N, dtype=np.float64)
+    GHZ = np.empty(N, dtype=np.float64)
+  else:
+    GHX = workspace['forceSPHX'][:N]
+    GHY = workspace['forceSPHY'][:N]
+    GHZ = workspace['forceSPHZ'][:N]
   cdef double K1 = 1
   cdef double K2 = 1
   cdef double gravAcc3
   cdef double gradhX, gradhY, gradhZ, uMag, nx, ny, nz, G1, G2, mdwdrr
   cdef double g1, g2, g11, g12, g22, g33
   cdef double x, y, z, ux, uy, uz, vx, vy, wx, wy, uxOrtho, uyOrtho, uzOrtho
-  cdef double dx, dy, dz, dux, duy, duz, dn, r, hr, dwdr, wKernel
+  cdef double dx, dy, dz, dux, duy, duz, dn, r, r1, r2, hr, dwdr, wKernel
   cdef int Lx0, Ly0, iCell
-  cdef double w[4]
+  cdef double w0, w1, w2, w3
   cdef int lInd, rInd
   cdef int indx, indy
   cdef int k, ic, n, p, l, imax, imin, iPstart, iPend
@@ -1826,16 +2404,19 @@ def computeGradC(cfg, particles, headerNeighbourGrid, headerNormalGrid, double[:
   cdef double mk, ml, hk, hl, ck, cl, lambdakl
 
   # loop on particles
-  for k in range(N):
+  for k in prange(N, nogil=True, num_threads=nThreads, schedule='static'):
+    GHX[k] = 0
+    GHY[k] = 0
+    GHZ[k] = 0
     gradhX = 0
     gradhY = 0
     gradhZ = 0
     pikl = 0
     G1 = 0
     G2 = 0
-    m11 = 0
-    m12 = 0
-    m22 = 0
+    K1 = 1
+    K2 = 1
+    gravAcc3 = gravAcc
     x = xArray[k]
     y = yArray[k]
     z = zArray[k]
@@ -1851,8 +2432,8 @@ def computeGradC(cfg, particles, headerNeighbourGrid, headerNormalGrid, double[:
 
     if SPHoption > 1:
         # get normal vector
-        Lx0, Ly0, iCell, w[0], w[1], w[2], w[3] = DFAtlsC.getCellAndWeights(x, y, nColsNormal, nRowsNormal, cszNormal, interpOption)
-        nx, ny, nz = DFAtlsC.getVector(Lx0, Ly0, w[0], w[1], w[2], w[3], nxArray, nyArray, nzArray)
+        Lx0, Ly0, iCell, w0, w1, w2, w3 = DFAtlsC.getCellAndWeights(x, y, nColsNormal, nRowsNormal, cszNormal, interpOption)
+        nx, ny, nz = DFAtlsC.getVector(Lx0, Ly0, w0, w1, w2, w3, nxArray, nyArray, nzArray)
         nx, ny, nz = DFAtlsC.normalize(nx, ny, nz)
         # projection of gravity on normal vector or use the effective gravity (gravity + curvature acceleration part)
         # This was done I computeForce and is passed over here
@@ -1864,16 +2445,16 @@ def computeGradC(cfg, particles, headerNeighbourGrid, headerNormalGrid, double[:
                 uy = 0
                 uz = -(1*nx + 0*ny) / nz
                 ux, uy, uz = DFAtlsC.normalize(ux, uy, uz)
-                K1 = 1
-                K2 = 1
             else:
                 ux, uy, uz = DFAtlsC.normalize(ux, uy, uz)
 
-                uxOrtho, uyOrtho, uzOrtho = DFAtlsC.crossProd(nx, ny, nz, ux, uy, uz)
-                uxOrtho, uyOrtho, uzOrtho = DFAtlsC.normalize(uxOrtho, uyOrtho, uzOrtho)
+            # the local coordinate system needs to be computed for every particle
+            # (also for the non moving ones, the values of the previous particle must not be used)
+            uxOrtho, uyOrtho, uzOrtho = DFAtlsC.crossProd(nx, ny, nz, ux, uy, uz)
+            uxOrtho, uyOrtho, uzOrtho = DFAtlsC.normalize(uxOrtho, uyOrtho, uzOrtho)
 
-                g1 = nx/(nz)
-                g2 = ny/(nz)
+            g1 = nx/(nz)
+            g2 = ny/(nz)
 
     # check if we are on the bottom ot top row!!!
     lInd = -1
@@ -1944,8 +2525,8 @@ def computeGradC(cfg, particles, headerNeighbourGrid, headerNormalGrid, double[:
                             duz = uzArray[l] - uz
                             ck = math.sqrt(gravAcc3*hk)
                             cl = math.sqrt(gravAcc3*hl)
-                            lamdbakl = (ck+cl)/2
-                            pikl = - lamdbakl * DFAtlsC.scalProd(dux, duy, duz, dx, dy, dz) / r
+                            lambdakl = (ck+cl)/2
+                            pikl = - lambdakl * DFAtlsC.scalProd(dux, duy, duz, dx, dy, dz) / r
                         # SPH gradient computation - standard SPH formulation
                         gradhX = gradhX + (flux + pikl)*dwdrr*dx*area
                         gradhY = gradhY + (flux + pikl)*dwdrr*dy*area
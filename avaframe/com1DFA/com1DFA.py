@@ -3,12 +3,15 @@
 """
 
 import copy
+import hashlib
 import logging
 import math
 import os
 import pathlib
 import pickle
 import platform
+import queue
+import shutil
 import time
 from datetime import datetime
 from functools import partial
@@ -61,6 +64,10 @@ import threading
 log = logging.getLogger(__name__)
 cfgAVA = cfgUtils.getGeneralConfig()
 debugPlot = cfgAVA["FLAGS"].getboolean("debugPlot")
+# fields computed by DFAfunC.updateFieldsC: the flow fields are 0 outside of the window of the particles,
+# the peak fields only change inside of it
+flowFieldTypes = ["FT", "FV", "FM", "Vx", "Vy", "Vz", "P", "TA"]
+peakFieldTypes = ["pft", "pfv", "ppr", "pta", "pke"]
 
 
 def com1DFAPreprocess(cfgMain, typeCfgInfo, cfgInfo):
@@ -166,18 +173,42 @@ def com1DFAMain(cfgMain, cfgInfo=""):
         # Get number of CPU Cores wanted
         nCPU = cfgUtils.getNumberOfProcesses(cfgMain, len(simDict))
 
+        # read the DEMs once for all simulations with sharedInputs
+        if any(simDict[key]["cfgSim"]["GENERAL"].getboolean("sharedInputs") for key in simDict):
+            inputSimFiles = prepareSharedInputs(simDict, inputSimFiles, avalancheDir)
+
         # Supply compute task with inputs
         com1DFACoreTaskWithInput = partial(com1DFACoreTask, simDict, inputSimFiles, avalancheDir, outDir)
 
+        # start the most expensive simulations first so that no core waits for a long simulation at the end
+        simCost = com1DFATools.estimateSimCost(simDict, simDFExisting)
+        simNamesSorted = sorted(simDict, key=lambda simName: simCost[simName], reverse=True)
+        log.debug("Simulations sorted by estimated cost: %s" % simNamesSorted)
+
         # Create parallel pool and run
         # with multiprocessing.Pool(processes=nCPU) as pool:
-        with Pool(processes=nCPU) as pool:
-            results = pool.map(com1DFACoreTaskWithInput, simDict)
-            pool.close()
-            pool.join()
-
-        # Split results to according structures
-        for result in results:
+        resultsDict = {}
+        plotDict = {}
+        try:
+            with Pool(processes=nCPU) as pool:
+                results = pool.imap_unordered(com1DFACoreTaskWithInput, simNamesSorted, chunksize=1)
+                for simName, result in results:
+                    resultsDict[simName] = result
+                    log.info("Finished simulation %s (%d of %d)" % (simName, len(resultsDict), len(simDict)))
+                    # plot the peak fields of this simulation while the other simulations are running
+                    if exportFlag:
+                        plotDict.update(
+                            oP.plotAllPeakFields(
+                                avalancheDir, cfgMain["FLAGS"], "com1DFA", demData=result[2], simName=simName
+                            )
+                        )
+                pool.close()
+                pool.join()
+        finally:
+            removeSharedInputs(inputSimFiles)
+
+        # Split results to according structures (in the order of simDict)
+        for result in [resultsDict[simName] for simName in simDict]:
             simDF = pd.concat([simDF, result[0]], axis=0)
             tCPUDF = pd.concat([tCPUDF, result[1]], axis=0)
             dem = result[2]  # only last dem is used
@@ -189,7 +220,14 @@ def com1DFAMain(cfgMain, cfgInfo=""):
 
         # postprocessing: writing report, creating plots
         dem, plotDict, reportDictList, simDFNew = com1DFAPostprocess(
-            simDF, tCPUDF, simDFExisting, cfgMain, dem, reportDictList, exportData=exportFlag
+            simDF,
+            tCPUDF,
+            simDFExisting,
+            cfgMain,
+            dem,
+            reportDictList,
+            exportData=exportFlag,
+            plotDict=plotDict,
         )
 
         return dem, plotDict, reportDictList, simDFNew
@@ -248,10 +286,89 @@ def com1DFACoreTask(simDict, inputSimFiles, avalancheDir, outDir, cuSim):
         raise AssertionError(message)
 
     # return simDF, tCPUDF, simDFExisting, cfg, cfgMain, dem, reportDictList
-    return simDF, tCPUDF, dem, reportDict
+    return cuSim, (simDF, tCPUDF, dem, reportDict)
 
 
-def com1DFAPostprocess(simDF, tCPUDF, simDFExisting, cfgMain, dem, reportDictList, exportData):
+def prepareSharedInputs(simDict, inputSimFiles, avalancheDir):
+    """Read the DEMs of all simulations with sharedInputs once and save their raster data so that it
+    can be memory mapped
+
+    The simulations with sharedInputs then read the DEM with readSharedDEM (see prepareInputData), the
+    raster data is read from the page cache and shared between the simulations running in parallel.
+    The files are only valid for the current call of com1DFAMain and are deleted with
+    removeSharedInputs once all simulations are done
+
+    Parameters
+    ----------
+    simDict: dict
+        dictionary with one key per simulation to perform including its config object
+    inputSimFiles: dict
+        dictionary with input files info
+    avalancheDir: str or pathlib object
+        path to avalanche directory
+
+    Returns
+    -------
+    inputSimFiles: dict
+        dictionary with input files info updated with sharedDEMs: one dem dictionary per DEM path
+        (cfg INPUT DEM) with the path to the raster data (rasterFile) instead of the raster data
+    """
+    sharedDir = pathlib.Path(avalancheDir, "Work", "com1DFA", "sharedInputs")
+    fU.makeADir(sharedDir)
+    sharedDEMs = {}
+    for cuSim in simDict:
+        if not simDict[cuSim]["cfgSim"]["GENERAL"].getboolean("sharedInputs"):
+            continue
+        demPath = simDict[cuSim]["cfgSim"]["INPUT"]["DEM"]
+        if demPath in sharedDEMs:
+            continue
+        demShared = gI.initializeDEM(avalancheDir, demPath=demPath)
+        rasterFile = sharedDir / ("dem_%d.npy" % len(sharedDEMs))
+        np.save(rasterFile, demShared.pop("rasterData"))
+        demShared["rasterFile"] = rasterFile
+        sharedDEMs[demPath] = demShared
+        log.debug("DEM %s shared with all simulations: %s" % (demPath, rasterFile))
+    inputSimFiles["sharedDEMs"] = sharedDEMs
+
+    return inputSimFiles
+
+
+def removeSharedInputs(inputSimFiles):
+    """Delete the raster data files written by prepareSharedInputs
+
+    Parameters
+    ----------
+    inputSimFiles: dict
+        dictionary with input files info, nothing is done if it has no sharedDEMs
+    """
+    for demShared in inputSimFiles.pop("sharedDEMs", {}).values():
+        pathlib.Path(demShared["rasterFile"]).unlink(missing_ok=True)
+        log.debug("Removed shared DEM file: %s" % demShared["rasterFile"])
+
+
+def readSharedDEM(demShared):
+    """Get the dem dictionary of a DEM prepared by prepareSharedInputs
+
+    The raster data is memory mapped in copy on write mode, the file is never modified
+
+    Parameters
+    ----------
+    demShared: dict
+        dem dictionary with the path to the raster data (rasterFile)
+
+    Returns
+    -------
+    demOri: dict
+        dem dictionary with header and data
+    """
+    demOri = copy.deepcopy(demShared)
+    demOri["rasterData"] = np.load(demOri.pop("rasterFile"), mmap_mode="c")
+    return demOri
+
+
+def com1DFAPostprocess(
+    simDF, tCPUDF, simDFExisting, cfgMain, dem, reportDictList, exportData, plotDict=None
+):
     """postprocessing of simulation results: save configuration to csv, create plots and report
 
     Parameters
@@ -271,6 +388,8 @@ def com1DFAPostprocess(simDF, tCPUDF, simDFExisting, cfgMain, dem, reportDictLis
         list of dictionaries for each simulation with info for report creation
     exportData: bool
         if True result fields are exported and plots generated
+    plotDict: dict
+        optional - info on the peak field plots already created while the simulations were running
 
     Returns
     --------
@@ -308,7 +427,11 @@ def com1DFAPostprocess(simDF, tCPUDF, simDFExisting, cfgMain, dem, reportDictLis
     fU.makeADir(reportDir)
     # Generate plots for all peakFiles
     if exportData:
-        plotDict = oP.plotAllPeakFields(avalancheDir, cfgMain["FLAGS"], modName, demData=dem)
+        # only the plots that do not exist yet are created here
+        plotDictAll = oP.plotAllPeakFields(avalancheDir, cfgMain["FLAGS"], modName, demData=dem)
+        for simName, simPlots in (plotDict or {}).items():
+            plotDictAll.setdefault(simName, {}).update(simPlots)
+        plotDict = plotDictAll
     else:
         plotDict = ""
         # create contour line plot
@@ -354,7 +477,8 @@ def com1DFACore(cfg, avaDir, cuSimName, inputSimFiles, outDir, simHash=""):
     infoDict['tCPU']: dict
         info on cpu timing
     particlesList: list
-        list of particle dictionaries for all saving time steps
+        list of particle dictionaries for all saving time steps (only first and last time step
+        if streamResults is True and particles are not tracked)
     """
 
     # select release area input data according to chosen release scenario
@@ -378,16 +502,54 @@ def com1DFACore(cfg, avaDir, cuSimName, inputSimFiles, outDir, simHash=""):
     # for timing the sims
     startTime = time.time()
 
-    # initialize particles, fields, dem
-    particles, fields, dem, reportAreaInfo = initializeSimulation(
-        cfg, outDir, demOri, inputSimLines, cuSimName
-    )
+    # resume from the checkpoint of a previous, interrupted run of this simulation
+    checkpointBool = cfg["GENERAL"].getfloat("checkpointInterval") > 0
+    checkpoint = None
+    if checkpointBool:
+        checkpoint = readCheckpoint(avaDir, simHash)
+
+    if checkpoint is None:
+        # initialize particles, fields, dem
+        particles, fields, dem, reportAreaInfo = initializeSimulation(
+            cfg, outDir, demOri, inputSimLines, cuSimName
+        )
+        writerState = None
+    else:
+        # particles and fields are taken from the checkpoint, only the dem needs to be initialized
+        particles = None
+        fields = None
+        dem = initializeSimulationDem(cfg, demOri, inputSimLines)
+        reportAreaInfo = checkpoint["checkpointInfo"]["reportAreaInfo"]
+        writerState = checkpoint["resultWriter"]
+
+    # optionally write the saved time steps to disk while the simulation runs
+    # (always with checkpoints, they only save the current state)
+    if cfg["EXPORTS"].getboolean("streamResults") or checkpointBool:
+        resultWriter = startResultWriter(cfg, dem, outDir, cuSimName, writerState=writerState)
+    else:
+        resultWriter = None
 
     # ------------------------
     #  Start time step computation
-    Tsave, particlesList, fieldsList, infoDict = DFAIterate(
-        cfg, particles, fields, dem, inputSimLines, simHash=simHash
-    )
+    simulationFailed = True
+    try:
+        Tsave, particlesList, fieldsList, infoDict = DFAIterate(
+            cfg,
+            particles,
+            fields,
+            dem,
+            inputSimLines,
+            simHash=simHash,
+            resultWriter=resultWriter,
+            checkpoint=checkpoint,
+            checkpointInfo={"reportAreaInfo": reportAreaInfo},
+        )
+        simulationFailed = False
+    finally:
+        # always stop the writer thread, if the time loop failed the partial results are discarded
+        # and the error of the time loop is raised
+        if resultWriter is not None:
+            stopResultWriter(resultWriter, discard=simulationFailed)
 
     # write mass balance to File
     writeMBFile(infoDict, avaDir, cuSimName)
@@ -399,20 +561,27 @@ def com1DFACore(cfg, avaDir, cuSimName, inputSimFiles, outDir, simHash=""):
     # (if particles is not in resType, only first and last time step are saved)
     outDirData = outDir / "particles"
     fU.makeADir(outDirData)
-    savePartToPickle(particlesList, outDirData, cuSimName)
+    if resultWriter is None:
+        if cfg["EXPORTS"]["particleFormat"] == "columnar":
+            particleTools.savePartToStore(particlesList, outDirData, cuSimName)
+        else:
+            savePartToPickle(particlesList, outDirData, cuSimName)
 
-    # export particles properties for visulation
-    if cfg["VISUALISATION"].getboolean("writePartToCSV"):
-        particleTools.savePartToCsv(cfg["VISUALISATION"]["visuParticleProperties"], particlesList, outDir)
+        # export particles properties for visulation
+        if cfg["VISUALISATION"].getboolean("writePartToCSV"):
+            particleTools.savePartToCsv(
+                cfg["VISUALISATION"]["visuParticleProperties"], particlesList, outDir
+            )
 
     # write report dictionary
     reportDict = createReportDict(avaDir, cuSimName, relName, inputSimLines, cfg, reportAreaInfo)
     # add time and mass info to report
     reportDict = reportAddTimeMassInfo(reportDict, tCPUDFA, infoDict)
 
-    # Result parameters to be exported
+    # Result parameters to be exported (already done by the result writer if streamResults)
     if cfg["EXPORTS"].getboolean("exportData"):
-        exportFields(cfg, Tsave, fieldsList, dem, outDir, cuSimName)
+        if resultWriter is None:
+            exportFields(cfg, Tsave, fieldsList, dem, outDir, cuSimName)
     else:
         # fetch contourline info
         contDictXY = outCom1DFA.fetchContCoors(
@@ -432,6 +601,9 @@ def com1DFACore(cfg, avaDir, cuSimName, inputSimFiles, outDir, simHash=""):
     cfgTrackPart = cfg["TRACKPARTICLES"]
     # track particles
     if cfgTrackPart.getboolean("trackParticles"):
+        if resultWriter is not None:
+            # only first and last time step are kept in memory - read all saved particles
+            particlesList, _ = particleTools.readParticles(outDir / "particles", simName=cuSimName)
         particlesList, trackedPartProp, track = trackParticles(cfgTrackPart, dem, particlesList)
         if track:
             outDirData = outDir / "particles"
@@ -558,6 +730,8 @@ def prepareInputData(inputSimFiles, cfg):
         - entResInfo : flag dict
         flag if Yes entrainment and/or resistance areas found and used for simulation
         flag True if a Secondary Release file found and activated
+        - sharedDEMs : dict, optional - DEMs already read, only used if sharedInputs is True
+          (see prepareSharedInputs)
 
     cfg: configparser object
         configuration for simType and secondary rel
@@ -589,7 +763,11 @@ def prepareInputData(inputSimFiles, cfg):
     relFile = inputSimFiles["releaseScenario"]
 
     # get dem dictionary - already read DEM with correct mesh cell size
-    demOri = gI.initializeDEM(cfg["GENERAL"]["avalancheDir"], demPath=cfg["INPUT"]["DEM"])
+    sharedDEMs = inputSimFiles.get("sharedDEMs", {})
+    if cfg["GENERAL"].getboolean("sharedInputs") and cfg["INPUT"]["DEM"] in sharedDEMs:
+        demOri = readSharedDEM(sharedDEMs[cfg["INPUT"]["DEM"]])
+    else:
+        demOri = gI.initializeDEM(cfg["GENERAL"]["avalancheDir"], demPath=cfg["INPUT"]["DEM"])
     dOHeader = demOri["header"]
 
     # read data from relThFile if needed, already with correct mesh cell size
@@ -856,7 +1034,7 @@ def reportAddTimeMassInfo(reportDict, tCPUDFA, infoDict):
     return reportDict
 
 
-def initializeMesh(cfg, demOri, num):
+def initializeMesh(cfg, demOri, num, cacheDir=None):
     """Create rectangular mesh
 
     Reads the DEM information, computes the normal vector field and
@@ -869,6 +1047,8 @@ def initializeMesh(cfg, demOri, num):
     num : int
         chose between 4, 6 or 8 (using then 4, 6 or 8 triangles) or
         1 to use the simple cross product method
+    cacheDir : str or pathlib object
+        optional - directory of the mesh cache (see getMeshFromCache), if None the mesh arrays are computed
 
     Returns
     -------
@@ -887,8 +1067,12 @@ def initializeMesh(cfg, demOri, num):
     nRowsDEM = headerDEM["nrows"]
     cszDEM = headerDEM["cellsize"]
 
-    # get normal vector of the grid mesh
-    dem = geoTrans.getNormalMesh(dem, num=num)
+    # get normal vector of the grid mesh and real area of the cells
+    if cacheDir is None:
+        dem = geoTrans.getNormalMesh(dem, num=num)
+        dem = DFAtls.getAreaMesh(dem, num)
+    else:
+        dem = getMeshFromCache(dem, num, cacheDir)
 
     # Prepare SPH grid
     headerNeighbourGrid = {}
@@ -900,8 +1084,6 @@ def initializeMesh(cfg, demOri, num):
     headerNeighbourGrid["yllcenter"] = 0
     dem["headerNeighbourGrid"] = headerNeighbourGrid
 
-    # get real Area
-    dem = DFAtls.getAreaMesh(dem, num)
     projArea = nColsDEM * nRowsDEM * cszDEM * cszDEM
     areaRaster = dem["areaRaster"]
     log.debug("Largest cell area: %.2f m²" % (np.nanmax(areaRaster)))
@@ -911,6 +1093,56 @@ def initializeMesh(cfg, demOri, num):
     return dem
 
 
+def getMeshFromCache(dem, num, cacheDir):
+    """Get the mesh arrays (Nx, Ny, Nz, areaRaster, outOfDEM) of a dem from the mesh cache
+
+    The arrays are stored in cacheDir/mesh_<hash> where hash is computed from the dem values, its header
+    and the normal computation method. If they are not there yet, they are computed and added to the cache.
+    Cached arrays are memory mapped in copy on write mode, the pages are read from disk when they are
+    used and are only copied if a simulation modifies them.
+
+    Parameters
+    ----------
+    dem : dict
+        dictionary with dem information (origin set to 0, 0)
+    num : int
+        chose between 4, 6 or 8 (using then 4, 6 or 8 triangles) or
+        1 to use the simple cross product method
+    cacheDir : str or pathlib object
+        directory of the mesh cache
+
+    Returns
+    -------
+    dem : dict
+        dictionary with dem information completed with the mesh arrays
+    """
+    header = dem["header"]
+    demHash = hashlib.shake_256()
+    demHash.update(
+        ("%d_%d_%r_%d_" % (header["ncols"], header["nrows"], float(header["cellsize"]), int(num))).encode()
+    )
+    demHash.update(np.ascontiguousarray(dem["rasterData"], dtype=np.float64).tobytes())
+    meshPath = pathlib.Path(cacheDir, "mesh_%s" % demHash.hexdigest(10))
+    meshKeys = ["Nx", "Ny", "Nz", "areaRaster", "outOfDEM"]
+    if all((meshPath / ("%s.npy" % key)).is_file() for key in meshKeys):
+        log.debug("Reading mesh from cache: %s" % meshPath)
+        for key in meshKeys:
+            dem[key] = np.load(meshPath / ("%s.npy" % key), mmap_mode="c")
+    else:
+        dem = geoTrans.getNormalMesh(dem, num=num)
+        dem = DFAtls.getAreaMesh(dem, num)
+        # write to a temporary file first, simulations running in parallel might read the cache
+        fU.makeADir(meshPath)
+        for key in meshKeys:
+            tmpPath = meshPath / ("%s_%d.tmp" % (key, os.getpid()))
+            with open(tmpPath, "wb") as fi:
+                np.save(fi, dem[key])
+            os.replace(tmpPath, meshPath / ("%s.npy" % key))
+        log.debug("Mesh added to cache: %s" % meshPath)
+
+    return dem
+
+
 def setDEMoriginToZero(demOri):
     """set origin of DEM to 0,0"""
 
@@ -957,14 +1189,12 @@ def initializeSimulation(cfg, outDir, demOri, inputSimLines, logName):
         dictionary with new dem (lower left center at origin)
     """
     cfgGen = cfg["GENERAL"]
-    methodMeshNormal = cfg.getfloat("GENERAL", "methodMeshNormal")
     thresholdPointInPoly = cfgGen.getfloat("thresholdPointInPoly")
     relThField = inputSimLines["relThField"]
 
     # -----------------------
-    # Initialize mesh
-    log.debug("Initializing Mesh")
-    dem = initializeMesh(cfgGen, demOri, methodMeshNormal)
+    # Initialize mesh and dam
+    dem = initializeSimulationDem(cfg, demOri, inputSimLines)
 
     # ------------------------
     log.debug("Initializing main release area")
@@ -1046,15 +1276,6 @@ def initializeSimulation(cfg, outDir, demOri, inputSimLines, logName):
     )
     particles, fields = initializeFields(cfg, dem, particles, releaseLine)
 
-    # initialize Dam
-    damLine = inputSimLines["damLine"]
-    # FSO: disabled writing of damFootLine inside the initializeWallLines.
-    # This is not threadsafe and leads to errors on multiprocessing
-    # damFootLinePath = outDir / 'dam' / 'damFootLine.shp'
-    # damLine = damCom1DFA.initializeWallLines(cfgGen, dem, damLine, damFootLinePath)
-    damLine = damCom1DFA.initializeWallLines(cfgGen, dem, damLine, "")
-    dem["damLine"] = damLine
-
     # perform initialisation step for redistributing particles
     if cfg["GENERAL"].getboolean("iniStep"):
         startTimeIni = time.time()
@@ -1107,6 +1328,48 @@ def initializeSimulation(cfg, outDir, demOri, inputSimLines, logName):
     return particles, fields, dem, reportAreaInfo
 
 
+def initializeSimulationDem(cfg, demOri, inputSimLines):
+    """Initialize the mesh and the dam of a simulation
+
+    Parameters
+    ----------
+    cfg : configparser object
+        configuration for DFA simulation
+    demOri : dict
+        dictionary with original dem
+    inputSimLines : dict
+        dictionary with input data dictionaries (damLine is used)
+
+    Returns
+    -------
+    dem : dict
+        dictionary with new dem (lower left center at origin) and the dam info
+    """
+    cfgGen = cfg["GENERAL"]
+    methodMeshNormal = cfg.getfloat("GENERAL", "methodMeshNormal")
+
+    log.debug("Initializing Mesh")
+    if cfgGen.getboolean("meshCache"):
+        if cfgGen["meshCacheDir"] != "":
+            meshCacheDir = pathlib.Path(cfgGen["meshCacheDir"])
+        else:
+            meshCacheDir = pathlib.Path(cfgGen["avalancheDir"], "Work", "meshCache")
+    else:
+        meshCacheDir = None
+    dem = initializeMesh(cfgGen, demOri, methodMeshNormal, cacheDir=meshCacheDir)
+
+    # initialize Dam
+    damLine = inputSimLines["damLine"]
+    # FSO: disabled writing of damFootLine inside the initializeWallLines.
+    # This is not threadsafe and leads to errors on multiprocessing
+    # damFootLinePath = outDir / 'dam' / 'damFootLine.shp'
+    # damLine = damCom1DFA.initializeWallLines(cfgGen, dem, damLine, damFootLinePath)
+    damLine = damCom1DFA.initializeWallLines(cfgGen, dem, damLine, "")
+    dem["damLine"] = damLine
+
+    return dem
+
+
 def initializeParticles(cfg, releaseLine, dem, inputSimLines="", logName="", relThField=""):
     """Initialize DFA simulation
 
@@ -1241,6 +1504,8 @@ def initializeParticles(cfg, releaseLine, dem, inputSimLines="", logName="", rel
         particles, _ = geoTrans.projectOnRaster(dem, particles, interp="bilinear")
         particles["m"] = mPartArray
         particles["idFixed"] = idFixed
+    # keep the particle arrays in a container with spare capacity (cheap adding and removing of particles)
+    particles = particleTools.ParticleContainer(particles)
     # initialize enthalpy
     particles["totalEnthalpy"] = TIni * cpIce + gravAcc * particles["z"]
 
@@ -1461,6 +1726,80 @@ def initializeFields(cfg, dem, particles, releaseLine):
     return particles, fields
 
 
+def initializeWorkspace(cfg, particles, fields, dem):
+    """Initialize the work buffers reused at every time step by the force and field computations
+
+    The particle buffers are larger than the current number of particles (growth headroom for
+    entrainment, splitting and secondary release), see :py:func:`updateWorkspace`.
+
+    Parameters
+    ----------
+    cfg: configparser
+        configuration for DFA simulation (GENERAL section)
+    particles : dict
+        particles dictionary at initial time step
+    fields : dict
+        fields dictionary at initial time step
+    dem : dict
+        dictionary with dem information
+
+    Returns
+    -------
+    workspace : dict
+        dictionary with the work buffers
+    """
+    header = dem["header"]
+    ncols = header["ncols"]
+    nrows = header["nrows"]
+    workspace = {"nPartMax": 0}
+    workspace = updateWorkspace(workspace, particles["nPart"])
+    # grids of the particle to grid interpolation (one of each, shared by the threads)
+    gridKeys = ["FM", "massDet", "momX", "momY", "momZ", "TA", "FV", "P", "FT", "Vx", "Vy", "Vz", "kineticEnergy"]
+    for key in gridKeys:
+        workspace[key] = np.zeros((nrows, ncols))
+    workspace["outOfDEM"] = np.array(dem["outOfDEM"], dtype=np.uint8)
+    # window of the grids updated by the particles (see DFAfunC.updateFieldsC), the first time step
+    # covers the whole domain so that the peak values of the initial fields are accounted for
+    workspace["activeWindow"] = (0, nrows, 0, ncols)
+    workspace["updateWindow"] = (0, nrows, 0, ncols)
+    return workspace
+
+
+def updateWorkspace(workspace, nPart, growthFactor=1.5):
+    """Make sure the particle buffers of the workspace can hold nPart particles
+
+    If not, the buffers are reallocated with growthFactor times nPart entries
+
+    Parameters
+    ----------
+    workspace : dict
+        dictionary with the work buffers
+    nPart : int
+        number of particles
+    growthFactor : float
+        headroom factor used when the buffers are (re)allocated
+
+    Returns
+    -------
+    workspace : dict
+        dictionary with the work buffers
+    """
+    if nPart > workspace["nPartMax"]:
+        nPartMax = int(growthFactor * nPart) + 1
+        log.debug("Allocating work buffers for %d particles" % nPartMax)
+        particleKeys = ["forceX", "forceY", "forceZ", "forceFrict", "dM", "dMDet", "gEff", "curvAcc", "h"]
+        for key in particleKeys + ["forceSPHX", "forceSPHY", "forceSPHZ"]:
+            workspace[key] = np.zeros(nPartMax)
+        # cell, interpolation weights and travel angle cell of the particles (see DFAfunC.updateFieldsC)
+        for key in ["Lx0", "Ly0", "indxTA", "indyTA"]:
+            workspace[key] = np.zeros(nPartMax, dtype=np.intc)
+        workspace["weights"] = np.zeros((nPartMax, 4))
+        # particles sorted by band of grid rows, a particle can be in two bands (see DFAfunC.updateFieldsC)
+        workspace["bandParticles"] = np.zeros(2 * nPartMax, dtype=np.intc)
+        workspace["nPartMax"] = nPartMax
+    return workspace
+
+
 def initializeSecRelease(inputSimLines, dem, relRaster, reportAreaInfo):
     """Initialize secondary release area
 
@@ -1653,7 +1992,17 @@ def initializeResistance(cfg, dem, simTypeActual, resLine, reportAreaInfo, thres
     return cResRaster, detRaster, reportAreaInfo
 
 
-def DFAIterate(cfg, particles, fields, dem, inputSimLines, simHash=""):
+def DFAIterate(
+    cfg,
+    particles,
+    fields,
+    dem,
+    inputSimLines,
+    simHash="",
+    resultWriter=None,
+    checkpoint=None,
+    checkpointInfo=None,
+):
     """Perform time loop for DFA simulation
      Save results at desired intervals
 
@@ -1672,6 +2021,17 @@ def DFAIterate(cfg, particles, fields, dem, inputSimLines, simHash=""):
         dictionary with dem information
     inputSimLines : dict
         dictionary with input data dictionaries (releaseLine, entLine, ...)
+    simHash: str
+        unique sim ID
+    resultWriter: dict
+        optional - result writer (see startResultWriter); if provided, the saved time steps are
+        written to disk by the writer and only the first and last time step are kept in the lists
+    checkpoint: dict
+        optional - iteration state read with readCheckpoint, if provided the computation resumes from it
+        (particles and fields are then taken from the checkpoint)
+    checkpointInfo: dict
+        optional - information saved with every checkpoint, not used by the time loop (e.g. results of the
+        initialisation that are not computed again when resuming)
 
     Returns
     -------
@@ -1702,6 +2062,7 @@ def DFAIterate(cfg, particles, fields, dem, inputSimLines, simHash=""):
     dtSave = fU.splitTimeValueToArrayInterval(cfgGen["tSteps"], tEnd)
     sphOption = cfgGen.getint("sphOption")
     log.debug("using sphOption %s:" % sphOption)
+    reorderParticlesStep = cfgGen.getint("reorderParticlesStep")
     # desired output fields
     resTypes = fU.splitIniValueToArraySteps(cfgGen["resType"])
     # add particles to the results type if trackParticles option is activated
@@ -1728,54 +2089,103 @@ def DFAIterate(cfg, particles, fields, dem, inputSimLines, simHash=""):
     frictType = frictModelsList.index(frictModel) + 1
     log.debug("Friction Model used: %s, %s" % (frictModelsList[frictType - 1], frictType))
 
-    # Initialise Lists to save fields and add initial time step
-    particlesList = []
-    fieldsList = []
-    timeM = []
-    massEntrained = []
-    massDetrained = []
-    massTotal = []
-
-    # setup a result fields info data frame to save max values of fields and avalanche front
-    resultsDF = setupresultsDF(resTypesLast, cfg["VISUALISATION"].getboolean("createRangeTimeDiagram"))
-
-    # TODO: add here different time stepping options
-    log.debug("Use standard time stepping")
-    # Initialize time and counters
-    nSave = 1
-    tCPU["nSave"] = nSave
-    nIter = 1
-    nIter0 = 1
-    particles["iterate"] = True
-    t = particles["t"]
-    log.debug("Saving results for time step t = %f s", t)
-    fieldsList, particlesList = appendFieldsParticles(
-        fieldsList, particlesList, particles, fields, resTypesLast
-    )
-    zPartArray0 = copy.deepcopy(particles["z"])
+    if cfgGen.getboolean("cflTimeStepping"):
+        log.debug("Use CFL time stepping")
+    else:
+        log.debug("Use standard time stepping")
+    if cfgGen.getboolean("sphKernelRadiusTimeStepping"):
+        dtSPHKR = tD.getSphKernelRadiusTimeStep(dem, cfgGen)
+    # checkpoints of the iteration state, the saved time steps have to be written during the computation
+    # so that only the current state needs to be saved
+    checkpointInterval = cfgGen.getfloat("checkpointInterval")
+    if checkpointInterval > 0 and resultWriter is None:
+        log.warning("No checkpoints are written for simulation %s, a result writer is required" % simHash)
+        checkpointInterval = 0
+
+    if checkpoint is None:
+        # Initialise Lists to save fields and add initial time step
+        particlesList = []
+        fieldsList = []
+        timeM = []
+        massEntrained = []
+        massDetrained = []
+        massTotal = []
+
+        # setup a result fields info data frame to save max values of fields and avalanche front
+        resultsDF = setupresultsDF(resTypesLast, cfg["VISUALISATION"].getboolean("createRangeTimeDiagram"))
+
+        # Initialize time and counters
+        nSave = 1
+        tCPU["nSave"] = nSave
+        nIter = 1
+        nIter0 = 1
+        particles["iterate"] = True
+        t = particles["t"]
+        log.debug("Saving results for time step t = %f s", t)
+        # add initial time step to Tsave array
+        Tsave = [0]
+        fieldsList, particlesList = appendFieldsParticles(
+            fieldsList, particlesList, particles, fields, resTypesLast
+        )
+        if resultWriter is not None:
+            queueResultTimeStep(resultWriter, Tsave[-1], fieldsList[-1], particlesList[-1:])
+        zPartArray0 = copy.deepcopy(particles["z"])
+        tCheckpoint = checkpointInterval
+    else:
+        # resume the iteration state
+        log.info("Resuming computation of simulation %s at time t = %f s" % (simHash, checkpoint["t"]))
+        particles = particleTools.ParticleContainer(checkpoint["particles"])
+        fields = checkpoint["fields"]
+        zPartArray0 = checkpoint["zPartArray0"]
+        particlesList = checkpoint["particlesList"]
+        fieldsList = checkpoint["fieldsList"]
+        Tsave = checkpoint["Tsave"]
+        dtSave = checkpoint["dtSave"]
+        resultsDF = checkpoint["resultsDF"]
+        timeM = checkpoint["timeM"]
+        massEntrained = checkpoint["massEntrained"]
+        massDetrained = checkpoint["massDetrained"]
+        massTotal = checkpoint["massTotal"]
+        tCPU = checkpoint["tCPU"]
+        nSave = checkpoint["nSave"]
+        nIter = checkpoint["nIter"]
+        nIter0 = checkpoint["nIter0"]
+        t = checkpoint["t"]
+        dt = checkpoint["dt"]
+        tCheckpoint = checkpoint["tCheckpoint"]
+    # work buffers reused at every time step
+    workspace = initializeWorkspace(cfgGen, particles, fields, dem)
 
     # create range time diagram
     # check if range-time diagram should be performed, if yes - initialize
     if cfg["VISUALISATION"].getboolean("createRangeTimeDiagram"):
         demRT = dtAna.setDemOrigin(dem)
         mtiInfo, dtRangeTime, cfgRangeTime = dtAna.initializeRangeTime(dtAna, cfg, demRT, simHash)
-        # fetch initial time step too
-        mtiInfo, dtRangeTime = dtAna.fetchRangeTimeInfo(
-            cfgRangeTime, cfg, dtRangeTime, t, demRT["header"], fields, mtiInfo
-        )
+        if checkpoint is None:
+            # fetch initial time step too
+            mtiInfo, dtRangeTime = dtAna.fetchRangeTimeInfo(
+                cfgRangeTime, cfg, dtRangeTime, t, demRT["header"], fields, mtiInfo
+            )
+        else:
+            mtiInfo = checkpoint["mtiInfo"]
+            dtRangeTime = checkpoint["dtRangeTime"]
         cfgRangeTime["GENERAL"]["simHash"] = simHash
 
-    # add initial time step to Tsave array
-    Tsave = [0]
     # derive time step for first iteration
-    if cfgGen.getboolean("sphKernelRadiusTimeStepping"):
-        dtSPHKR = tD.getSphKernelRadiusTimeStep(dem, cfgGen)
+    if checkpoint is not None:
+        # time step already derived before the checkpoint was written
+        pass
+    elif cfgGen.getboolean("cflTimeStepping"):
+        # particles are not moving yet, use the fixed time step
+        dt = tD.limitTimeStepToSaveTime(cfgGen.getfloat("dt"), t, min(dtSave[0], tEnd))
+    elif cfgGen.getboolean("sphKernelRadiusTimeStepping"):
         dt = dtSPHKR
     else:
         # get time step
         dt = cfgGen.getfloat("dt")
-    particles["dt"] = dt
-    t = t + dt
+    if checkpoint is None:
+        particles["dt"] = dt
+        t = t + dt
 
     # Start time step computation
     while t <= tEnd * (1.0 + 1.0e-13) and particles["iterate"]:
@@ -1783,14 +2193,21 @@ def DFAIterate(cfg, particles, fields, dem, inputSimLines, simHash=""):
         log.debug("Computing time step t = %f s, dt = %f s" % (t, dt))
         # Perform computations
         particles, fields, zPartArray0, tCPU = computeEulerTimeStep(
-            cfgGen, particles, fields, zPartArray0, dem, tCPU, frictType
+            cfgGen, particles, fields, zPartArray0, dem, tCPU, frictType, workspace=workspace
         )
+        # reorder particles in memory following the neighbour search grid
+        if reorderParticlesStep > 0 and nIter % reorderParticlesStep == 0:
+            startTimeReorder = time.time()
+            particles = particleTools.reorderParticles(particles, snowSlide=cfgGen.getint("snowSlide"))
+            tCPU["timeNeigh"] = tCPU["timeNeigh"] + time.time() - startTimeReorder
         # set max values of fields to dataframe
         if cfg["VISUALISATION"].getboolean("createRangeTimeDiagram"):
             rangeValue = mtiInfo["rangeList"][-1]
         else:
             rangeValue = ""
-        resultsDF = addMaxValuesToDF(resultsDF, fields, t, resTypesLast, rangeValue=rangeValue)
+        resultsDF = addMaxValuesToDF(
+            resultsDF, fields, t, resTypesLast, rangeValue=rangeValue, window=workspace["updateWindow"]
+        )
 
         tCPU["nSave"] = nSave
         particles["t"] = t
@@ -1833,9 +2250,14 @@ def DFAIterate(cfg, particles, fields, dem, inputSimLines, simHash=""):
             log.debug(("cpu time Position = %s s" % (tCPU["timePos"] / nIter)))
             log.debug(("cpu time Neighbour = %s s" % (tCPU["timeNeigh"] / nIter)))
             log.debug(("cpu time Fields = %s s" % (tCPU["timeField"] / nIter)))
-            fieldsList, particlesList = appendFieldsParticles(
-                fieldsList, particlesList, particles, fields, resTypes
-            )
+            if resultWriter is None:
+                fieldsList, particlesList = appendFieldsParticles(
+                    fieldsList, particlesList, particles, fields, resTypes
+                )
+            else:
+                # only keep the copies until they are written
+                fieldsSave, particlesSave = appendFieldsParticles([], [], particles, fields, resTypes)
+                queueResultTimeStep(resultWriter, t, fieldsSave[0], particlesSave)
 
             # remove saving time steps that have already been saved
             dtSave = updateSavingTimeStep(dtSave, cfg["GENERAL"], t)
@@ -1845,7 +2267,11 @@ def DFAIterate(cfg, particles, fields, dem, inputSimLines, simHash=""):
                 debPlot.plotBondsSnowSlideFinal(cfg, particles, dem, inputSimLines)
 
         # derive time step
-        if cfgGen.getboolean("sphKernelRadiusTimeStepping"):
+        if cfgGen.getboolean("cflTimeStepping"):
+            # from the current max particle velocity, shortened to hit the next saving time
+            dt = tD.getcflTimeStep(particles, dem, cfgGen)
+            dt = tD.limitTimeStepToSaveTime(dt, t, min(dtSave[0], tEnd))
+        elif cfgGen.getboolean("sphKernelRadiusTimeStepping"):
             dt = dtSPHKR
         else:
             # get time step
@@ -1858,6 +2284,37 @@ def DFAIterate(cfg, particles, fields, dem, inputSimLines, simHash=""):
         tCPUtimeLoop = time.time() - startTime
         tCPU["timeLoop"] = tCPU["timeLoop"] + tCPUtimeLoop
 
+        # write the iteration state to resume the computation from this point
+        if checkpointInterval > 0 and (t - dt) >= (tCheckpoint - 1.0e-8):
+            tCheckpoint = t - dt + checkpointInterval
+            checkpointState = {
+                "particles": particles,
+                "fields": fields,
+                "zPartArray0": zPartArray0,
+                "particlesList": particlesList,
+                "fieldsList": fieldsList,
+                "Tsave": Tsave,
+                "dtSave": dtSave,
+                "resultsDF": resultsDF,
+                "timeM": timeM,
+                "massEntrained": massEntrained,
+                "massDetrained": massDetrained,
+                "massTotal": massTotal,
+                "tCPU": tCPU,
+                "nSave": nSave,
+                "nIter": nIter,
+                "nIter0": nIter0,
+                "t": t,
+                "dt": dt,
+                "tCheckpoint": tCheckpoint,
+                "resultWriter": getResultWriterState(resultWriter),
+                "checkpointInfo": checkpointInfo,
+            }
+            if cfg["VISUALISATION"].getboolean("createRangeTimeDiagram"):
+                checkpointState["mtiInfo"] = mtiInfo
+                checkpointState["dtRangeTime"] = dtRangeTime
+            writeCheckpoint(checkpointState, cfgGen["avalancheDir"], simHash)
+
     tCPU["nIter"] = nIter
     log.info("Ending computation at time t = %f s", t - dt)
     log.debug("Saving results for time step t = %f s", t - dt)
@@ -1889,6 +2346,8 @@ def DFAIterate(cfg, particles, fields, dem, inputSimLines, simHash=""):
     fieldsList, particlesList = appendFieldsParticles(
         fieldsList, particlesList, particles, fields, resTypesLast
     )
+    if resultWriter is not None:
+        queueResultTimeStep(resultWriter, Tsave[-1], fieldsList[-1], particlesList[-1:], final=True)
     # debugg plot
     if debugPlot:
         debPlot.plotBondsSnowSlideFinal(cfg, particles, dem, inputSimLines)
@@ -1945,9 +2404,80 @@ def DFAIterate(cfg, particles, fields, dem, inputSimLines, simHash=""):
     resultsDFPath = pathlib.Path(cfgGen["avalancheDir"], "Outputs", "com1DFA", "resultsDF_%s.csv" % simHash)
     resultsDF.to_csv(resultsDFPath)
 
+    # the computation is done, the checkpoint is not needed anymore
+    checkpointPath = getCheckpointPath(cfgGen["avalancheDir"], simHash)
+    if checkpointPath.is_file():
+        checkpointPath.unlink()
+
     return Tsave, particlesList, fieldsList, infoDict
 
 
+def getCheckpointPath(avalancheDir, simHash):
+    """Get the path of the checkpoint file of a simulation
+
+    Parameters
+    -----------
+    avalancheDir: str or pathlib object
+        path to avalanche directory
+    simHash: str
+        unique sim ID
+
+    Returns
+    --------
+    checkpointPath: pathlib object
+        path to the checkpoint file in Outputs/com1DFA/checkpoints
+    """
+    return pathlib.Path(avalancheDir, "Outputs", "com1DFA", "checkpoints", "checkpoint_%s.pickle" % simHash)
+
+
+def writeCheckpoint(checkpointState, avalancheDir, simHash):
+    """Write the iteration state of a simulation to its checkpoint file
+
+    The previous checkpoint is only replaced once the new one is completely written
+
+    Parameters
+    -----------
+    checkpointState: dict
+        iteration state of DFAIterate: current particles and fields and the time loop variables, the saved
+        time steps are already written by the result writer, only their times (Tsave), the first time step
+        and the writer state (number of written time steps) are saved
+    avalancheDir: str or pathlib object
+        path to avalanche directory
+    simHash: str
+        unique sim ID
+    """
+    checkpointPath = getCheckpointPath(avalancheDir, simHash)
+    fU.makeADir(checkpointPath.parent)
+    tmpPath = checkpointPath.with_suffix(".tmp")
+    with open(tmpPath, "wb") as fi:
+        pickle.dump(checkpointState, fi, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmpPath, checkpointPath)
+    log.debug("Checkpoint written for time step t = %f s" % (checkpointState["t"] - checkpointState["dt"]))
+
+
+def readCheckpoint(avalancheDir, simHash):
+    """Read the latest checkpoint of a simulation
+
+    Parameters
+    -----------
+    avalancheDir: str or pathlib object
+        path to avalanche directory
+    simHash: str
+        unique sim ID
+
+    Returns
+    --------
+    checkpointState: dict
+        iteration state to resume DFAIterate from, None if there is no checkpoint for this simulation
+    """
+    checkpointPath = getCheckpointPath(avalancheDir, simHash)
+    if not checkpointPath.is_file():
+        return None
+    with open(checkpointPath, "rb") as fi:
+        checkpointState = pickle.load(fi)
+    return checkpointState
+
+
 def setupresultsDF(resTypes, cfgRangeTime):
     """setup result fields max values dataframe for initial time step
     for all resTypes used and optional for avalanche front
@@ -1977,9 +2507,12 @@ def setupresultsDF(resTypes, cfgRangeTime):
     return resultsDF
 
 
-def addMaxValuesToDF(resultsDF, fields, timeStep, resTypes, rangeValue=""):
+def addMaxValuesToDF(resultsDF, fields, timeStep, resTypes, rangeValue="", window=None):
     """add max values of peakFields to dataframe and optionally rangeValue
 
+    If a window is given, the flow fields are 0 outside of it and the peak fields only changed inside of it
+    since the last line of the dataframe, so only the window is searched
+
     Parameters
     -----------
     fields: dict
@@ -1992,6 +2525,8 @@ def addMaxValuesToDF(resultsDF, fields, timeStep, resTypes, rangeValue=""):
         list of all resultTypes
     rangeValue: float
         avalanche front location -optional
+    window: tuple
+        (jStart, jEnd, iStart, iEnd) window of the fields updated in the last time step -optional
 
     Returns
     --------
@@ -1999,10 +2534,23 @@ def addMaxValuesToDF(resultsDF, fields, timeStep, resTypes, rangeValue=""):
         updated data frame
     """
 
+    if window is not None:
+        jStart, jEnd, iStart, iEnd = window
+        fullWindow = (jEnd - jStart) * (iEnd - iStart) == np.size(fields["FT"])
     newLine = []
     for resT in resTypes:
-        if resT != "particles":
+        if resT == "particles":
+            continue
+        if window is None or fullWindow or resT not in peakFieldTypes + flowFieldTypes:
             newLine.append(np.nanmax(fields[resT]))
+        elif jStart >= jEnd or iStart >= iEnd:
+            # no particle left, nothing changed
+            newLine.append(0.0 if resT in flowFieldTypes else resultsDF["max" + resT].iloc[-1])
+        elif resT in peakFieldTypes:
+            windowMax = np.nanmax(fields[resT][jStart:jEnd, iStart:iEnd])
+            newLine.append(max(resultsDF["max" + resT].iloc[-1], windowMax))
+        else:
+            newLine.append(max(np.nanmax(fields[resT][jStart:jEnd, iStart:iEnd]), 0.0))
 
     if rangeValue != "":
         newLine.append(rangeValue)
@@ -2062,6 +2610,7 @@ def appendFieldsParticles(fieldsList, particlesList, particles, fields, resTypes
     fieldAppend = {}
     for resType in resTypes:
         if resType == "particles":
+            # a copy is required, the arrays of the particle container are compacted in place
             particlesList.append(copy.deepcopy(particles))
         elif resType != "":
             fieldAppend[resType] = copy.deepcopy(fields[resType])
@@ -2098,7 +2647,7 @@ def writeMBFile(infoDict, avaDir, logName):
                                                                     massDetrained[m]))
 
 
-def computeEulerTimeStep(cfg, particles, fields, zPartArray0, dem, tCPU, frictType):
+def computeEulerTimeStep(cfg, particles, fields, zPartArray0, dem, tCPU, frictType, workspace=None):
     """compute next time step using an euler forward scheme
 
     Parameters
@@ -2117,6 +2666,8 @@ def computeEulerTimeStep(cfg, particles, fields, zPartArray0, dem, tCPU, frictTy
         computation time dictionary
     frictType: int
         indicator for chosen type of friction model
+    workspace: dict
+        optional, work buffers reused at every time step (see initializeWorkspace)
 
     Returns
     -------
@@ -2129,23 +2680,30 @@ def computeEulerTimeStep(cfg, particles, fields, zPartArray0, dem, tCPU, frictTy
     """
     # get forces
     startTime = time.time()
+    if workspace is not None:
+        workspace = updateWorkspace(workspace, particles["nPart"])
 
     # loop version of the compute force
     log.debug("Compute Force C")
-    particles, force, fields = DFAfunC.computeForceC(cfg, particles, fields, dem, frictType)
+    particles, force, fields = DFAfunC.computeForceC(cfg, particles, fields, dem, frictType, workspace=workspace)
     tCPUForce = time.time() - startTime
     tCPU["timeForce"] = tCPU["timeForce"] + tCPUForce
 
     # compute lateral force (SPH component of the calculation)
     startTime = time.time()
     if cfg.getint("sphOption") == 0:
-        force["forceSPHX"] = np.zeros(np.shape(force["forceX"]))
-        force["forceSPHY"] = np.zeros(np.shape(force["forceY"]))
-        force["forceSPHZ"] = np.zeros(np.shape(force["forceZ"]))
+        if workspace is None:
+            force["forceSPHX"] = np.zeros(np.shape(force["forceX"]))
+            force["forceSPHY"] = np.zeros(np.shape(force["forceY"]))
+            force["forceSPHZ"] = np.zeros(np.shape(force["forceZ"]))
+        else:
+            for key in ["forceSPHX", "forceSPHY", "forceSPHZ"]:
+                force[key] = workspace[key][: particles["nPart"]]
+                force[key].fill(0)
     else:
         log.debug("Compute Force SPH C")
         particles, force = DFAfunC.computeForceSPHC(
-            cfg, particles, force, dem, cfg.getint("sphOption"), gradient=0
+            cfg, particles, force, dem, cfg.getint("sphOption"), gradient=0, workspace=workspace
         )
     tCPUForceSPH = time.time() - startTime
     tCPU["timeForceSPH"] = tCPU["timeForceSPH"] + tCPUForceSPH
@@ -2174,7 +2732,7 @@ def computeEulerTimeStep(cfg, particles, fields, zPartArray0, dem, tCPU, frictTy
         # ToDo: we could skip the update field and directly do the split merge. This means we would use the old h
         startTime = time.time()
         log.debug("update Fields C")
-        particles, fields = DFAfunC.updateFieldsC(cfg, particles, dem, fields)
+        particles, fields = DFAfunC.updateFieldsC(cfg, particles, dem, fields, workspace=workspace)
         tcpuField = time.time() - startTime
         tCPU["timeField"] = tCPU["timeField"] + tcpuField
         # Then split merge particles
@@ -2188,7 +2746,10 @@ def computeEulerTimeStep(cfg, particles, fields, zPartArray0, dem, tCPU, frictTy
     # get particles location (neighbours for sph)
     startTime = time.time()
     log.debug("get Neighbours C")
-    particles = DFAfunC.getNeighborsC(particles, dem)
+    if cfg.getboolean("incrementalNeighbourSearch"):
+        particles = DFAfunC.getNeighborsC(particles, dem, workspace=workspace)
+    else:
+        particles = DFAfunC.getNeighborsC(particles, dem)
 
     tCPUNeigh = time.time() - startTime
     tCPU["timeNeigh"] = tCPU["timeNeigh"] + tCPUNeigh
@@ -2198,7 +2759,10 @@ def computeEulerTimeStep(cfg, particles, fields, zPartArray0, dem, tCPU, frictTy
     log.debug("update Fields C")
     if fields["computeTA"]:
         particles = DFAfunC.computeTrajectoryAngleC(particles, zPartArray0)
-    particles, fields = DFAfunC.updateFieldsC(cfg, particles, dem, fields)
+    if workspace is not None:
+        # particles may have been added by splitting or a secondary release
+        workspace = updateWorkspace(workspace, particles["nPart"])
+    particles, fields = DFAfunC.updateFieldsC(cfg, particles, dem, fields, workspace=workspace)
     tCPUField = time.time() - startTime
     tCPU["timeField"] = tCPU["timeField"] + tCPUField
 
@@ -2279,6 +2843,210 @@ def savePartToPickle(dictList, outDir, logName):
         fi.close()
 
 
+def startResultWriter(cfg, dem, outDir, logName, writerState=None):
+    """Start a background thread that writes the saved time steps to disk while the simulation runs
+
+    Time steps are handed over with queueResultTimeStep, the writer is finished with stopResultWriter
+
+    Parameters
+    ----------
+    cfg: configparser object
+        configuration object for simulation
+    dem: dict
+        dictionary with dem information
+    outDir: pathlib object
+        path to Outputs
+    logName : str
+        simulation Id
+    writerState: dict
+        optional - writer state saved with a checkpoint (see getResultWriterState), the writer continues
+        after the time steps already written
+
+    Returns
+    -------
+    resultWriter: dict
+        dictionary with the queue, the writer thread and the writer state
+    """
+
+    outDirData = outDir / "particles"
+    fU.makeADir(outDirData)
+    resultWriter = {
+        "cfg": cfg,
+        "dem": dem,
+        "outDir": outDir,
+        "outDirData": outDirData,
+        "logName": logName,
+        # bounded queue: the time loop waits if the writer falls behind instead of piling up copies
+        "queue": queue.Queue(maxsize=2),
+        "countFields": 0,
+        "countParticles": 0,
+        "error": None,
+    }
+    if writerState is not None:
+        resultWriter["countFields"] = writerState["countFields"]
+        resultWriter["countParticles"] = writerState["countParticles"]
+    if cfg["EXPORTS"]["particleFormat"] == "columnar":
+        if writerState is not None:
+            resultWriter["particleStore"] = particleTools.reopenParticleStore(writerState["particleStore"])
+        else:
+            resultWriter["particleStore"] = particleTools.initializeParticleStore(outDirData, logName)
+    resultWriter["thread"] = threading.Thread(
+        target=resultWriterWorker, args=(resultWriter,), name="resultWriter_%s" % logName, daemon=True
+    )
+    resultWriter["thread"].start()
+
+    return resultWriter
+
+
+def resultWriterWorker(resultWriter):
+    """Write the time steps found in the queue of the resultWriter until None is received
+
+    Parameters
+    ----------
+    resultWriter: dict
+        dictionary created by startResultWriter
+    """
+
+    cfg = resultWriter["cfg"]
+    while True:
+        item = resultWriter["queue"].get()
+        if item is None:
+            resultWriter["queue"].task_done()
+            break
+        # after an error keep emptying the queue so that the time loop is not blocked
+        if resultWriter["error"] is None:
+            try:
+                writeResultTimeStep(resultWriter, cfg, item)
+            except Exception as e:
+                resultWriter["error"] = e
+        resultWriter["queue"].task_done()
+
+
+def writeResultTimeStep(resultWriter, cfg, item):
+    """Write the fields and particles of one saved time step
+
+    Parameters
+    ----------
+    resultWriter: dict
+        dictionary created by startResultWriter
+    cfg: configparser object
+        configuration object for simulation
+    item: tuple
+        timeStep, fields dictionary, list of particles dictionaries, final flag
+    """
+
+    timeStep, fieldsDict, particlesSave, final = item
+    for particles in particlesSave:
+        if "particleStore" in resultWriter:
+            particleTools.appendParticlesToStore(resultWriter["particleStore"], particles)
+        else:
+            savePartToPickle(particles, resultWriter["outDirData"], resultWriter["logName"])
+        # export particles properties for visulation
+        if cfg["VISUALISATION"].getboolean("writePartToCSV"):
+            particleTools.savePartToCsv(
+                cfg["VISUALISATION"]["visuParticleProperties"],
+                [particles],
+                resultWriter["outDir"],
+                countStart=resultWriter["countParticles"],
+            )
+        resultWriter["countParticles"] = resultWriter["countParticles"] + 1
+
+    if cfg["EXPORTS"].getboolean("exportData"):
+        exportFieldsTimeStep(
+            cfg,
+            timeStep,
+            fieldsDict,
+            resultWriter["dem"],
+            resultWriter["outDir"],
+            resultWriter["logName"],
+            firstOrLast=(final or resultWriter["countFields"] == 0),
+            final=final,
+        )
+    resultWriter["countFields"] = resultWriter["countFields"] + 1
+
+
+def queueResultTimeStep(resultWriter, timeStep, fieldsDict, particlesSave, final=False):
+    """Hand over one saved time step to the result writer
+
+    The dictionaries are written as they are, hence they must not be modified afterwards
+    (use copies as created by appendFieldsParticles)
+
+    Parameters
+    ----------
+    resultWriter: dict
+        dictionary created by startResultWriter
+    timeStep: float
+        time of the saved time step
+    fieldsDict: dict
+        dictionary with the result fields to save
+    particlesSave: list
+        list with the particles dictionary to save (empty if particles are not saved)
+    final: bool
+        True for the last time step
+    """
+
+    resultWriter["queue"].put((timeStep, fieldsDict, particlesSave, final))
+
+
+def getResultWriterState(resultWriter):
+    """Wait until all queued time steps are written and return the state of the result writer
+
+    The state is saved with a checkpoint, a resumed simulation passes it to startResultWriter
+
+    Parameters
+    ----------
+    resultWriter: dict
+        dictionary created by startResultWriter
+
+    Returns
+    -------
+    writerState: dict
+        number of fields and particles time steps written and the columnar particle store info
+    """
+
+    resultWriter["queue"].join()
+    if resultWriter["error"] is not None:
+        raise resultWriter["error"]
+    writerState = {
+        "countFields": resultWriter["countFields"],
+        "countParticles": resultWriter["countParticles"],
+    }
+    if "particleStore" in resultWriter:
+        writerState["particleStore"] = copy.deepcopy(resultWriter["particleStore"])
+
+    return writerState
+
+
+def stopResultWriter(resultWriter, discard=False):
+    """Wait until all queued time steps are written and stop the result writer
+
+    Parameters
+    ----------
+    resultWriter: dict
+        dictionary created by startResultWriter
+    discard: bool
+        if True (simulation failed), the columnar particle store is removed instead of being closed and an
+        error of the writer is only logged
+    """
+
+    resultWriter["queue"].put(None)
+    resultWriter["thread"].join()
+    if discard:
+        if resultWriter["error"] is not None:
+            log.error("Writing results of %s failed: %s" % (resultWriter["logName"], resultWriter["error"]))
+        if "particleStore" in resultWriter:
+            storeDir = resultWriter["particleStore"]["storeDir"]
+            log.warning("Removing the incomplete particle store %s" % storeDir)
+            shutil.rmtree(storeDir, ignore_errors=True)
+        return
+    if resultWriter["error"] is None and "particleStore" in resultWriter:
+        particleTools.closeParticleStore(resultWriter["particleStore"])
+    if resultWriter["error"] is not None:
+        message = "Writing results of %s failed" % resultWriter["logName"]
+        log.error(message)
+        raise resultWriter["error"]
+
+
 def trackParticles(cfgTrackPart, dem, particlesList):
     """track particles from initial area
 
@@ -2346,7 +3114,7 @@ def trackParticles(cfgTrackPart, dem, particlesList):
 
 
 def readFields(inDir, resType, simName="", flagAvaDir=True, comModule="com1DFA", timeStep="", atol=1.0e-6):
-    """Read ascii files within a directory and return List of dictionaries
+    """Read raster files (ascii or binary npy) within a directory and return List of dictionaries
 
     Parameters
     -----------
@@ -2391,10 +3159,10 @@ def readFields(inDir, resType, simName="", flagAvaDir=True, comModule="com1DFA",
     for r in resType:
         # search for all files within directory
         if simName:
-            name = "*" + simName + "*" + r + "*.asc"
+            name = "*" + simName + "*" + r + "*"
         else:
-            name = "*" + r + "*.asc"
-        FieldsNameList = list(inDir.glob(name))
+            name = "*" + r + "*"
+        FieldsNameList = IOf.listRasterFiles(inDir, name)
         timeListTemp = [float(element.stem.split("_t")[-1]) for element in FieldsNameList]
         FieldsNameList = [x for _, x in sorted(zip(timeListTemp, FieldsNameList))]
         count = 0
@@ -2440,52 +3208,99 @@ def exportFields(cfg, Tsave, fieldsList, dem, outDir, logName):
     exported peak fields are saved in Outputs/com1DFA/peakFiles
     """
 
+    numberTimes = len(Tsave) - 1
+    countTime = 0
+    for timeStep in Tsave:
+        exportFieldsTimeStep(
+            cfg,
+            timeStep,
+            fieldsList[countTime],
+            dem,
+            outDir,
+            logName,
+            firstOrLast=((countTime == numberTimes) or (countTime == 0)),
+            final=(countTime == numberTimes),
+        )
+        countTime = countTime + 1
+
+
+def exportFieldsTimeStep(cfg, timeStep, fieldsDict, dem, outDir, logName, firstOrLast=False, final=False):
+    """export the result fields of one saving time step to Outputs directory
+
+    Parameters
+    -----------
+    cfg: dict
+        configurations
+    timeStep: float
+        time step that corresponds to fieldsDict
+    fieldsDict: dict
+        dictionary with result fields of this time step
+    dem: dict
+        dictionary with dem information (originalHeader and areaRaster)
+    outDir: str
+        outputs Directory
+    logName: str
+        simulation name
+    firstOrLast: bool
+        if True also export the report fields (first and last time step)
+    final: bool
+        if True this is the last time step and the fields are also exported as peak fields
+
+    Returns
+    --------
+    exported fields are saved in Outputs/com1DFA/peakFiles/timeSteps (and Outputs/com1DFA/peakFiles
+    if final)
+    """
+
     resTypesGen = fU.splitIniValueToArraySteps(cfg["GENERAL"]["resType"])
     resTypesReport = fU.splitIniValueToArraySteps(cfg["REPORT"]["plotFields"])
     if "particles" in resTypesGen:
         resTypesGen.remove("particles")
     if "particles" in resTypesReport:
         resTypesReport.remove("particles")
-    numberTimes = len(Tsave) - 1
-    countTime = 0
-    for timeStep in Tsave:
-        if (countTime == numberTimes) or (countTime == 0):
-            # for last time step we need to add the report fields
-            resTypes = list(set(resTypesGen + resTypesReport))
-        else:
-            resTypes = resTypesGen
-        for resType in resTypes:
-            resField = fieldsList[countTime][resType]
-            if resType == "ppr":
-                # convert from Pa to kPa
-                resField = resField * 0.001
-            if resType == "pke":
-                # convert from J/cell to kJ/m²
-                # (by dividing the peak kinetic energy per cell by the real area of the cell)
-                resField = resField * 0.001 / dem["areaRaster"]
-            dataName = logName + "_" + resType + "_" + "t%.2f" % (Tsave[countTime]) + ".asc"
+    if firstOrLast:
+        # for first and last time step we need to add the report fields
+        resTypes = list(set(resTypesGen + resTypesReport))
+    else:
+        resTypes = resTypesGen
+    # format of the exported fields
+    rasterFormat = cfg["EXPORTS"]["rasterFormat"]
+    npyDtype = cfg["EXPORTS"]["npyDtype"]
+    for resType in resTypes:
+        resField = fieldsDict[resType]
+        if resType == "ppr":
+            # convert from Pa to kPa
+            resField = resField * 0.001
+        if resType == "pke":
+            # convert from J/cell to kJ/m²
+            # (by dividing the peak kinetic energy per cell by the real area of the cell)
+            resField = resField * 0.001 / dem["areaRaster"]
+        dataName = logName + "_" + resType + "_" + "t%.2f" % (timeStep) + ".asc"
+        # create directory
+        outDirPeak = outDir / "peakFiles" / "timeSteps"
+        fU.makeADir(outDirPeak)
+        outFile = outDirPeak / dataName
+        IOf.writeResultToRaster(
+            dem["originalHeader"], resField, outFile, flip=True, rasterFormat=rasterFormat, npyDtype=npyDtype
+        )
+        if final:
+            log.debug(
+                "Results parameter: %s exported to Outputs/peakFiles for time step: %.2f - FINAL time step "
+                % (resType, timeStep)
+            )
+            dataName = logName + "_" + resType + ".asc"
             # create directory
-            outDirPeak = outDir / "peakFiles" / "timeSteps"
-            fU.makeADir(outDirPeak)
-            outFile = outDirPeak / dataName
-            IOf.writeResultToAsc(dem["originalHeader"], resField, outFile, flip=True)
-            if countTime == numberTimes:
-                log.debug(
-                    "Results parameter: %s exported to Outputs/peakFiles for time step: %.2f - FINAL time step "
-                    % (resType, Tsave[countTime])
-                )
-                dataName = logName + "_" + resType + ".asc"
-                # create directory
-                outDirPeakAll = outDir / "peakFiles"
-                fU.makeADir(outDirPeakAll)
-                outFile = outDirPeakAll / dataName
-                IOf.writeResultToAsc(dem["originalHeader"], resField, outFile, flip=True)
-            else:
-                log.debug(
-                    "Results parameter: %s has been exported to Outputs/peakFiles for time step: %.2f "
-                    % (resType, Tsave[countTime])
-                )
-        countTime = countTime + 1
+            outDirPeakAll = outDir / "peakFiles"
+            fU.makeADir(outDirPeakAll)
+            outFile = outDirPeakAll / dataName
+            IOf.writeResultToRaster(
+                dem["originalHeader"], resField, outFile, flip=True, rasterFormat=rasterFormat, npyDtype=npyDtype
+            )
+        else:
+            log.debug(
+                "Results parameter: %s has been exported to Outputs/peakFiles for time step: %.2f "
+                % (resType, timeStep)
+            )
 
 
 def prepareVarSimDict(standardCfg, inputSimFiles, variationDict, simNameExisting=""):
@@ -8,10 +8,13 @@ import logging
 import math
 import pathlib
 
+import numpy as np
+import pandas as pd
 from deepdiff import DeepDiff
 
 # local imports
 import avaframe.com1DFA.deriveParameterSet as dP
+import avaframe.in2Trans.shpConversion as shpConv
 import avaframe.in3Utils.initialiseDirs as inDirs
 from avaframe.com1DFA import com1DFA
 from avaframe.in1Data import getInput as gI
@@ -68,6 +71,81 @@ def getPartInitMethod(cfg, csz, relThForPart):
     return massPerPart, nPPK
 
 
+def estimateSimCost(simDict, simDFExisting=None):
+    """Estimate the computational cost of the simulations to perform
+
+    The cost is the number of particles times the number of time steps (tEnd / dt). The number of particles
+    is derived from the release volume (area of the release polygons times the release thickness) and the
+    mass per particle (see getPartInitMethod). If simulations of the same release scenario have already been
+    performed, the cost is converted to seconds with their measured cpu time per particle and time step
+    (the median over all performed simulations is used for the other release scenarios)
+
+    Parameters
+    -----------
+    simDict: dict
+        dictionary with one key per simulation to perform including its config object and release file
+    simDFExisting: pandas DataFrame
+        configuration (and cpu time) of the already performed simulations - optional
+
+    Returns
+    --------
+    simCost: dict
+        estimated cost of each simulation of simDict
+    """
+
+    # measured cpu time per particle and time step
+    timeFactors = {}
+    timeColumns = {"timeLoop", "nPart", "nIter", "releaseScenario"}
+    if isinstance(simDFExisting, pd.DataFrame) and timeColumns <= set(simDFExisting.columns):
+        timeLoop = pd.to_numeric(simDFExisting["timeLoop"], errors="coerce")
+        nPartIter = pd.to_numeric(simDFExisting["nPart"], errors="coerce") * pd.to_numeric(
+            simDFExisting["nIter"], errors="coerce"
+        )
+        timePerPartIter = (timeLoop / nPartIter).replace([np.inf, -np.inf], np.nan)
+        timePerPartIter = timePerPartIter[timePerPartIter > 0]
+        if len(timePerPartIter) > 0:
+            timeFactors = timePerPartIter.groupby(simDFExisting["releaseScenario"]).median().to_dict()
+            timeFactors[""] = timePerPartIter.median()
+
+    # area of each release polygon, every release file is only read once
+    relAreas = {}
+    for simInfo in simDict.values():
+        relFile = simInfo["relFile"]
+        if relFile not in relAreas:
+            relLine = shpConv.SHP2Array(relFile)
+            relAreas[relFile] = []
+            for start, length, id in zip(relLine["Start"], relLine["Length"], relLine["id"]):
+                x = relLine["x"][int(start) : int(start + length)]
+                y = relLine["y"][int(start) : int(start + length)]
+                area = 0.5 * np.abs(np.dot(x, np.roll(y, 1)) - np.dot(y, np.roll(x, 1)))
+                relAreas[relFile].append((id, area))
+
+    simCost = {}
+    for simName, simInfo in simDict.items():
+        cfgGen = simInfo["cfgSim"]["GENERAL"]
+        # release volume
+        relVolume = 0
+        relArea = 0
+        for id, area in relAreas[simInfo["relFile"]]:
+            if cfgGen.getboolean("relThFromShp"):
+                thickness = cfgGen.getfloat("relTh" + id)
+            elif cfgGen["relTh"] != "":
+                thickness = cfgGen.getfloat("relTh")
+            else:
+                # thickness read from a raster
+                thickness = 1.0
+            relVolume = relVolume + area * thickness
+            relArea = relArea + area
+        relThMean = relVolume / relArea if relArea > 0 else 1.0
+        massPerPart, _ = getPartInitMethod(cfgGen, cfgGen.getfloat("meshCellSize"), relThMean)
+        nPart = max(relVolume * cfgGen.getfloat("rho") / massPerPart, 1.0)
+        nIter = cfgGen.getfloat("tEnd") / cfgGen.getfloat("dt")
+        timeFactor = timeFactors.get(simInfo["releaseScenario"], timeFactors.get("", 1.0))
+        simCost[simName] = nPart * nIter * timeFactor
+
+    return simCost
+
+
 def setFrictTypeIndicator(simCfg):
     """Sets the friction type indicator for the simname
     Default is L, otherwise M for samosATMedium, S for samosATSmall
@@ -14,6 +14,7 @@ import pickle
 # Local imports
 import avaframe.in3Utils.fileHandlerUtils as fU
 import avaframe.com1DFA.DFAtools as DFAtls
+import avaframe.in3Utils.geoTrans as geoTrans
 import avaframe.com1DFA.DFAfunctionsCython as DFAfunC
 
 
@@ -22,6 +23,241 @@ import avaframe.com1DFA.DFAfunctionsCython as DFAfunC
 log = logging.getLogger(__name__)
 
 
+class ParticleContainer(dict):
+    """ particles dictionary with preallocated capacity for the particle arrays
+
+    Behaves like the particles dictionary (dict-style access, the particle arrays are plain contiguous
+    numpy arrays that can directly be used in the cython functions), but each array is a view on the first
+    elements of a larger buffer (growthFactor times the size of the array when the buffer is created).
+    Values can be appended to an array (amortised, the buffer grows by growthFactor) and an array can be
+    compacted in place, the dtype of the arrays does not change.
+    Assigning an array to a key copies the values into the buffer of this key if they fit (same dtype and
+    size smaller than the capacity), otherwise a new buffer is created. The cython functions write their
+    results directly to a second buffer of the key (see outputArray), assigning it back swaps the buffers
+    without copy. Copies and pickles of the container are plain particles dictionaries.
+
+    Note: the arrays obtained from the container (e.g. a = particles['x']) are views on the buffers: they
+    see the new values after an assignment to the key or after removing particles, and the values of the
+    spare buffer are overwritten by the next outputArray call. Anything kept beyond the current time step
+    (saved time steps, results passed to the result writer) has to be a copy (copy.deepcopy(particles),
+    as done in com1DFA.appendFieldsParticles).
+    """
+
+    growthFactor = 1.5
+    # number of values compacted at once by extractValues
+    chunkSize = 8192
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.buffers = {}
+        self.spareBuffers = {}
+        self.update(*args, **kwargs)
+
+    def __setitem__(self, key, value):
+        if not (isinstance(value, np.ndarray) and value.ndim == 1):
+            self.buffers.pop(key, None)
+            self.spareBuffers.pop(key, None)
+            super().__setitem__(key, value)
+            return
+        n = value.shape[0]
+        buffer = self.buffers.get(key)
+        spare = self.spareBuffers.get(key)
+        if spare is not None and _isBufferStart(value, spare):
+            # the values were written to the spare buffer (see outputArray), swap the buffers
+            self.buffers[key] = spare
+            self.spareBuffers[key] = buffer
+            buffer = spare
+        elif buffer is None or buffer.dtype != value.dtype or n > buffer.shape[0]:
+            buffer = np.empty(int(self.growthFactor * n), dtype=value.dtype)
+            buffer[:n] = value
+            self.buffers[key] = buffer
+            self.spareBuffers.pop(key, None)
+        elif not _isBufferStart(value, buffer):
+            # values modified in place by the cython functions are already in the buffer
+            buffer[:n] = value
+        super().__setitem__(key, buffer[:n])
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.buffers.pop(key, None)
+        self.spareBuffers.pop(key, None)
+
+    def __reduce__(self):
+        # copies and pickles are plain dictionaries
+        return (dict, (dict(self), ))
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def pop(self, key, *args):
+        self.buffers.pop(key, None)
+        self.spareBuffers.pop(key, None)
+        return super().pop(key, *args)
+
+    def capacity(self, key):
+        """ number of elements the array of key can hold without reallocation """
+        return self.buffers[key].shape[0]
+
+    def outputArray(self, key):
+        """ array to write the new values of the array of key to
+
+        The returned array has the size of the array of key and is a view on a second buffer of the same
+        capacity (allocated on the first call only). Its values are undefined, every element needs to be
+        written before assigning it back to key (particles[key] = array), which swaps the two buffers. The
+        previous values then stay valid until the next outputArray call for key.
+
+        Parameters
+        ----------
+        key : str
+            key of the array
+
+        Returns
+        -------
+        array : 1D numpy array
+            view on the spare buffer of key
+        """
+        buffer = self.buffers[key]
+        spare = self.spareBuffers.get(key)
+        if spare is None or spare.shape != buffer.shape or spare.dtype != buffer.dtype:
+            spare = np.empty_like(buffer)
+            self.spareBuffers[key] = spare
+        return spare[:self[key].shape[0]]
+
+    def appendValues(self, key, values):
+        """ append values at the end of the array of key
+
+        Parameters
+        ----------
+        key : str
+            key of the array
+        values : numpy array
+            values to append (cast to the dtype of the array)
+        """
+        array = self[key]
+        buffer = self.buffers[key]
+        n = array.shape[0]
+        nNew = n + np.size(values)
+        if nNew > buffer.shape[0]:
+            buffer = np.empty(max(nNew, int(self.growthFactor * buffer.shape[0])), dtype=array.dtype)
+            buffer[:n] = array
+            self.buffers[key] = buffer
+            # the spare buffer is reallocated with the new capacity when needed
+            self.spareBuffers.pop(key, None)
+        buffer[n:nNew] = np.ravel(values)
+        super().__setitem__(key, buffer[:nNew])
+
+    def extractValues(self, key, mask):
+        """ keep only the values of the array of key where mask is True (in place)
+
+        The kept values are moved to the front of the buffer chunk by chunk (chunkSize values), only
+        temporaries of the size of a chunk are needed. Views on the previous array share the buffer and
+        see the compacted values
+
+        Parameters
+        ----------
+        key : str
+            key of the array
+        mask : 1D numpy array
+            boolean array, True for the values to keep
+        """
+        buffer = self.buffers[key]
+        n = self[key].shape[0]
+        nKeep = 0
+        for start in range(0, n, self.chunkSize):
+            end = min(start + self.chunkSize, n)
+            keep = np.asarray(mask[start:end], dtype=bool)
+            nChunk = np.count_nonzero(keep)
+            if nChunk == end - start and nKeep == start:
+                # nothing removed so far, the values are already in place
+                nKeep = end
+                continue
+            # nKeep <= start, the kept values only move towards the front
+            np.compress(keep, buffer[start:end], out=buffer[nKeep:nKeep + nChunk])
+            nKeep = nKeep + nChunk
+        super().__setitem__(key, buffer[:nKeep])
+
+
+def _isBufferStart(array, buffer):
+    """ True if array is a contiguous view on the first elements of buffer """
+    return (array.dtype == buffer.dtype and array.shape[0] <= buffer.shape[0]
+            and array.__array_interface__['data'][0] == buffer.__array_interface__['data'][0]
+            and (array.shape[0] < 2 or array.strides[0] == array.itemsize))
+
+
+def getOutputArray(particles, key, nPart, workspace=None):
+    """ get the array the new values of a particles array are written to
+
+    For a ParticleContainer this is a view on the spare buffer of key (see
+    ParticleContainer.outputArray, every element needs to be written), for a particles dictionary a view on
+    the work buffer of key if a workspace is given or a new array filled with zeros
+
+    Parameters
+    ----------
+    particles : dict
+        particles dictionary or ParticleContainer
+    key : str
+        key of the array
+    nPart : int
+        number of particles
+    workspace : dict
+        optional, work buffers (see com1DFA.initializeWorkspace)
+
+    Returns
+    -------
+    array : 1D numpy array
+        float64 array of size nPart
+    """
+    if isinstance(particles, ParticleContainer) and key in particles.buffers:
+        if particles[key].shape == (nPart, ) and particles[key].dtype == np.float64:
+            return particles.outputArray(key)
+    if workspace is not None:
+        return workspace[key][:nPart]
+    return np.zeros(nPart)
+
+
+def appendParticleValues(particles, key, values):
+    """ append values to a particles array
+
+    For a ParticleContainer the values are appended in place (amortised, same dtype), for a particles
+    dictionary a new array is created with np.append
+
+    Parameters
+    ----------
+    particles : dict
+        particles dictionary or ParticleContainer
+    key : str
+        key of the array
+    values : numpy array
+        values to append
+    """
+    if isinstance(particles, ParticleContainer):
+        particles.appendValues(key, values)
+    else:
+        particles[key] = np.append(particles[key], values)
+
+
+def extractParticleValues(particles, key, mask):
+    """ keep only the values of a particles array where mask is True
+
+    For a ParticleContainer the array is compacted in place, for a particles dictionary a new array is
+    created with np.extract
+
+    Parameters
+    ----------
+    particles : dict
+        particles dictionary or ParticleContainer
+    key : str
+        key of the array
+    mask : 1D numpy array
+        boolean array, True for the values to keep
+    """
+    if isinstance(particles, ParticleContainer):
+        particles.extractValues(key, mask)
+    else:
+        particles[key] = np.extract(mask, particles[key])
+
+
 def initialiseParticlesFromFile(cfg, avaDir, releaseScenario):
     # TODO: this is for development purposes, change or remove in the future
     # If initialisation from file
@@ -229,32 +465,87 @@ def removePart(particles, mask, nRemove, reasonString='', snowSlide=0):
         # for all keys in particles that are arrays of size nPart do:
         elif type(particles[key]).__module__ == np.__name__:
             if np.size(particles[key]) == nPart:
-                particles[key] = np.extract(mask, particles[key])
+                extractParticleValues(particles, key, mask)
 
     particles['mTot'] = np.sum(particles['m'])
 
     return particles
 
 
+def reorderParticles(particles, snowSlide=0):
+    """ reorder the particles arrays following the neighbour search grid cells
+
+    Particles located in the same neighbour search grid cell are placed next to each other
+    in memory, which speeds up the SPH and force loops. The new order is given by the
+    partInCell array (from getNeighborsC) which needs to be up to date.
+    All arrays of size nPart are permuted (including ID and parentID), bonds are
+    renumbered accordingly.
+
+    Parameters
+    ----------
+    particles : dict
+        particles dictionary (with up to date partInCell)
+    snowSlide: int
+        1 if snowSlide is activated (bonds need to be reordered)
+
+    Returns
+    -------
+    particles : dict
+        particles dictionary with reordered particles (partInCell is updated accordingly)
+    """
+    nPart = particles['nPart']
+    newOrder = particles['partInCell']
+    if snowSlide == 1:
+        # renumber the bonds before the particles are moved
+        # oldToNew gives the new index of each particle
+        oldToNew = np.empty(nPart, dtype=np.int32)
+        oldToNew[newOrder] = np.arange(nPart, dtype=np.int32)
+        bondStart = particles['bondStart']
+        nBonds = (bondStart[1:] - bondStart[:-1])[newOrder]
+        bondStartNew = np.zeros(nPart + 1, dtype=np.int32)
+        bondStartNew[1:] = np.cumsum(nBonds)
+        # index of each new bond in the old bond arrays
+        indBond = np.repeat(bondStart[:-1][newOrder] - bondStartNew[:-1], nBonds)
+        indBond = indBond + np.arange(bondStartNew[-1])
+        particles['bondStart'] = bondStartNew
+        particles['bondPart'] = oldToNew[particles['bondPart'][indBond]]
+        particles['bondDist'] = particles['bondDist'][indBond]
+    # these are not particle properties (or are updated separately)
+    skipKeys = ['partInCell', 'indPartInCell', 'bondStart', 'bondPart', 'bondDist']
+    for key in particles:
+        # for all keys in particles that are arrays of size nPart do:
+        if key not in skipKeys and isinstance(particles[key], np.ndarray):
+            if np.shape(particles[key]) == (nPart, ):
+                particles[key] = particles[key][newOrder]
+    # particles are now sorted by cell
+    particles['partInCell'] = np.arange(nPart).astype('intc')
+
+    return particles
+
+
 def addParticles(particles, nAdd, ind, mNew, xNew, yNew, zNew):
     """ add particles
 
+    Several particles can be split at once (ind, mNew are arrays and xNew, yNew, zNew 2D arrays), the
+    particle arrays are then only grown once. For a ParticleContainer the new particles are written to
+    the spare capacity of the buffers, which are only reallocated (by growthFactor) when it is used up
+
     Parameters
     ----------
     particles : dict
         particles dictionary
     nAdd : int
-        number of particles added (one particles is modified, nAdd are added)
-    ind : int
-        index of particle modified
-    mNew: float
-        new mass of the particles
+        number of particles added per modified particle (one particles is modified, nAdd are added)
+    ind : int or numpy array
+        index of particle(s) modified
+    mNew: float or numpy array
+        new mass of the particle(s)
     xNew: numpy array
-        new x position of the particles
+        new x position of the particles (one row per modified particle if ind is an array)
     yNew: numpy array
-        new y position of the particles
+        new y position of the particles (one row per modified particle if ind is an array)
     zNew: numpy array
-        new z position of the particles
+        new z position of the particles (one row per modified particle if ind is an array)
 
     Returns
     -------
@@ -264,36 +555,37 @@ def addParticles(particles, nAdd, ind, mNew, xNew, yNew, zNew):
     # get old values
     nPart = particles['nPart']
     nID = particles['nID']
+    nAddTot = nAdd * np.size(ind)
     # update total number of particles and number of IDs used so far
-    particles['nPart'] = particles['nPart'] + nAdd
-    particles['nID'] = nID + nAdd
+    particles['nPart'] = particles['nPart'] + nAddTot
+    particles['nID'] = nID + nAddTot
     # log.info('Spliting particle %s in %s' % (ind, nAdd))
+    # update splitted particle mass
+    # first update the old particle
+    particles['m'][ind] = mNew
+    particles['x'][ind] = xNew[..., 0]
+    particles['y'][ind] = yNew[..., 0]
+    particles['z'][ind] = zNew[..., 0]
     for key in particles:
-        # update splitted particle mass
-        # first update the old particle
-        particles['m'][ind] = mNew
-        particles['x'][ind] = xNew[0]
-        particles['y'][ind] = yNew[0]
-        particles['z'][ind] = zNew[0]
         # add new particles at the end of the arrays
         # for all keys in particles that are arrays of size nPart do:
         if type(particles[key]).__module__ == np.__name__:
             # create unique ID for the new particles
             if key == 'ID':
-                particles['ID'] = np.append(particles['ID'], np.arange(nID, nID + nAdd, 1))
+                appendParticleValues(particles, 'ID', np.arange(nID, nID + nAddTot, 1))
             elif key == 'x':
-                particles[key] = np.append(particles[key], xNew[1:])
+                appendParticleValues(particles, key, xNew[..., 1:])
             elif key == 'y':
-                particles[key] = np.append(particles[key], yNew[1:])
+                appendParticleValues(particles, key, yNew[..., 1:])
             elif key == 'z':
-                particles[key] = np.append(particles[key], zNew[1:])
+                appendParticleValues(particles, key, zNew[..., 1:])
             elif key == 'bondStart':
                 # no bonds for added particles:
                 nBondsParts = np.size(particles['bondPart'])
-                particles[key] = np.append(particles[key], nBondsParts*np.ones((nAdd)))
+                appendParticleValues(particles, key, nBondsParts*np.ones((nAddTot)))
             # set the parent properties to new particles due to splitting
             elif np.size(particles[key]) == nPart:
-                particles[key] = np.append(particles[key], particles[key][ind]*np.ones((nAdd)))
+                appendParticleValues(particles, key, np.repeat(particles[key][ind], nAdd)*np.ones((nAddTot)))
             # ToDo: maybe also update the h smartly
     return particles
 
@@ -326,14 +618,14 @@ def splitPartMass(particles, cfg):
     # decide which particles to split
     nSplit = np.ceil(mPart/(massPerPart*thresholdMassSplit))
     Ind = np.where(nSplit > 1)[0]
-    # loop on particles to split
-    for ind in Ind:
+    # split all particles at once
+    if np.size(Ind) > 0:
         # compute new mass (split particle in 2)
-        mNew = mPart[ind] / 2  # nSplit[ind]
+        mNew = mPart[Ind] / 2  # nSplit[ind]
         nAdd = 1  # (nSplit[ind]-1).astype('int')
-        xNew, yNew, zNew = getSplitPartPositionSimple(particles, rho, distSplitPart, ind)
+        xNew, yNew, zNew = getSplitPartPositionSimple(particles, rho, distSplitPart, Ind)
         # add new particles
-        particles = addParticles(particles, nAdd, ind, mNew, xNew, yNew, zNew)
+        particles = addParticles(particles, nAdd, Ind, mNew, xNew, yNew, zNew)
 
     particles['mTot'] = np.sum(particles['m'])
     return particles
@@ -383,17 +675,16 @@ def splitPartArea(particles, cfg, dem):
     # find particles to split
     tooBig = np.where((aPart > aMax) & (mPart/nSplit > mMin))[0]
     # count new particles
-    nNewPart = 0
-    # loop on particles to split
-    for ind in tooBig:
-        # compute new mass and particles to add
-        mNew = mPart[ind] / nSplit
-        nAdd = nSplit-1
-        nNewPart = nNewPart + nAdd
+    nAdd = nSplit-1
+    nNewPart = nAdd * np.size(tooBig)
+    # split all particles at once
+    if nNewPart > 0:
+        # compute new mass
+        mNew = mPart[tooBig] / nSplit
         # get position of new particles
-        xNew, yNew, zNew = getSplitPartPosition(cfg, particles, aPart, Nx, Ny, Nz, csz, nSplit, ind)
+        xNew, yNew, zNew = getSplitPartPosition(cfg, particles, aPart, Nx, Ny, Nz, csz, nSplit, tooBig)
         # add new particles
-        particles = addParticles(particles, nAdd, ind, mNew, xNew, yNew, zNew)
+        particles = addParticles(particles, nAdd, tooBig, mNew, xNew, yNew, zNew)
     log.debug('Added %s because of splitting' % (nNewPart))
 
     particles['mTot'] = np.sum(particles['m'])
@@ -405,7 +696,8 @@ def mergePartArea(particles, cfg, dem):
 
     merge particles to avoid too many particles within the kernel radius.
     place the new merge particle between the two old ones. The new position and velocity are the
-    mass averaged ones
+    mass averaged ones. The closest neighbour is searched in the neighbouring cells of the
+    neighbour search grid (see DFAfunctionsCython.mergeParticlesC)
 
     Parameters
     ----------
@@ -414,7 +706,7 @@ def mergePartArea(particles, cfg, dem):
     cfg : configParser
         GENERAL configuration for com1DFA
     dem : dict
-        dem dictionary
+        dem dictionary (with neighbour search grid header)
 
     Returns
     -------
@@ -432,32 +724,13 @@ def mergePartArea(particles, cfg, dem):
     # get particle area
     mPart = particles['m']
     hPart = particles['h']
-    xPart = particles['x']
-    yPart = particles['y']
-    zPart = particles['z']
     aPart = mPart/(rho*hPart)
     # find particles to merge
     tooSmall = np.where(aPart < aMin)[0]
-    keepParticle = np.ones((particles['nPart']), dtype=bool)
-    nRemoved = 0
-    # loop on particles to merge
-    for ind in tooSmall:
-        if keepParticle[ind]:
-            # find nearest particle
-            rMerge, neighbourInd = getClosestNeighbour(xPart, yPart, zPart, ind, sphKernelRadius, keepParticle)
-            # only merge a particle if it is closer thant the kernel radius
-            if rMerge < sphKernelRadius:
-                # remove neighbourInd from tooSmall if possible
-                keepParticle[neighbourInd] = False
-                nRemoved = nRemoved + 1
-                # compute new mass and particles to add
-                mNew = mPart[ind] + mPart[neighbourInd]
-                # compute mass averaged values
-                for key in ['x', 'y', 'z', 'ux', 'uy', 'uz']:
-                    particles[key][ind] = (mPart[ind]*particles[key][ind] +
-                                           mPart[neighbourInd]*particles[key][neighbourInd]) / mNew
-                particles['m'][ind] = mNew
-                # ToDo: mabe also update h
+    # merge them with their closest neighbour (found using the neighbour search grid)
+    keepParticle, nRemoved = DFAfunC.mergeParticlesC(particles, dem, tooSmall.astype(np.intc),
+                                                     sphKernelRadius)
+    # ToDo: mabe also update h
 
     particles = removePart(particles, keepParticle, nRemoved, reasonString='')  # 'because of colocation')
     return particles
@@ -502,6 +775,8 @@ def getClosestNeighbour(xPartArray, yPartArray, zPartArray, ind, sphKernelRadius
 def mergeParticleDict(particles1, particles2):
     """Merge two particles dictionary
 
+    If particles1 is a ParticleContainer, its arrays are extended in place and particles1 is returned
+
     Parameters
     ----------
     particles1 : dict
@@ -515,10 +790,14 @@ def mergeParticleDict(particles1, particles2):
         merged particles dictionary
 
     """
-    particles = {}
+    if isinstance(particles1, ParticleContainer):
+        particles = particles1
+    else:
+        particles = dict(particles1)
     nPart1 = particles1['nPart']
+    nID1 = particles1.get('nID')
     # loop on the keys from particles1 dicionary
-    for key in particles1:
+    for key in list(particles1):
         # deal with specific cases
         # nPart: just sum them up
         if key == 'nPart':
@@ -537,11 +816,11 @@ def mergeParticleDict(particles1, particles2):
             # of particles2 so that the ID stays a unique identifier and
             # that the parentID is consistent with this shift.
             if (key == 'ID') or (key == 'parentID'):
-                particles[key] = np.append(particles1[key], (particles2[key] + particles1['nID']))
+                appendParticleValues(particles, key, particles2[key] + nID1)
             # general case where the key value is an array with as many elements
             # as particles
             elif np.size(particles1[key]) == nPart1:
-                particles[key] = np.append(particles1[key], particles2[key])
+                appendParticleValues(particles, key, particles2[key])
             # if the array is of size one, (potential energy, mTot...) we just
             # sum the 2 values
             else:
@@ -550,10 +829,8 @@ def mergeParticleDict(particles1, particles2):
         # number (int, double, float) then we sum the 2 values
         elif (key in particles2) and (isinstance(particles1[key], numbers.Number)):
             particles[key] = particles1[key] + particles2[key]
-        # finaly, if the key is only in particles1 then we give this value to
-        # the new particles
-        else:
-            particles[key] = particles1[key]
+        # finaly, if the key is only in particles1 then the new particles keep
+        # this value
     return particles
 
 
@@ -578,17 +855,17 @@ def getSplitPartPosition(cfg, particles, aPart, Nx, Ny, Nz, csz, nSplit, ind):
         grid cell size
     nSplit : int
         in how many particles do we split?
-    ind : int
-        index of the particle to split
+    ind : int or numpy array
+        index of the particle(s) to split
 
     Returns
     -------
     xNew : numpy array
-        x components of the splitted particles
+        x components of the splitted particles (one row per particle if ind is an array)
     yNew : numpy array
-        y components of the splitted particles
+        y components of the splitted particles (one row per particle if ind is an array)
     zNew : numpy array
-        z components of the splitted particles
+        z components of the splitted particles (one row per particle if ind is an array)
     """
     rng = np.random.default_rng(int(cfg['seed']))
     x = particles['x']
@@ -599,13 +876,16 @@ def getSplitPartPosition(cfg, particles, aPart, Nx, Ny, Nz, csz, nSplit, ind):
     uz = particles['uz']
     rNew = np.sqrt(aPart[ind] / (math.pi * nSplit))
     alpha = 2*math.pi*(np.arange(nSplit)/nSplit + rng.random(1))
-    cos = rNew*np.cos(alpha)
-    sin = rNew*np.sin(alpha)
-    nx, ny, nz = DFAtls.getNormalArray(np.array([x[ind]]), np.array([y[ind]]), Nx, Ny, Nz, csz)
-    e1x, e1y, e1z, e2x, e2y, e2z = getTangenVectors(nx, ny, nz, np.array([ux[ind]]), np.array([uy[ind]]), np.array([uz[ind]]))
-    xNew = x[ind] + cos * e1x + sin * e2x
-    yNew = y[ind] + cos * e1y + sin * e2y
-    zNew = z[ind] + cos * e1z + sin * e2z
+    cos = np.multiply.outer(rNew, np.cos(alpha))
+    sin = np.multiply.outer(rNew, np.sin(alpha))
+    nx, ny, nz = geoTrans.getNormalArray(np.atleast_1d(x[ind]), np.atleast_1d(y[ind]), Nx, Ny, Nz, csz)
+    uxInd, uyInd, uzInd = np.atleast_1d(ux[ind]), np.atleast_1d(uy[ind]), np.atleast_1d(uz[ind])
+    e1x, e1y, e1z, e2x, e2y, e2z = getTangenVectors(nx, ny, nz, uxInd, uyInd, uzInd)
+    # one row per split particle
+    shape = np.shape(rNew) + (1, )
+    xNew = x[ind][..., np.newaxis] + cos * e1x.reshape(shape) + sin * e2x.reshape(shape)
+    yNew = y[ind][..., np.newaxis] + cos * e1y.reshape(shape) + sin * e2y.reshape(shape)
+    zNew = z[ind][..., np.newaxis] + cos * e1z.reshape(shape) + sin * e2z.reshape(shape)
     # toDo: do we need to reproject the particles on the dem?
     return xNew, yNew, zNew
 
@@ -621,17 +901,17 @@ def getSplitPartPositionSimple(particles, rho, distSplitPart, ind):
         density
     distSplitPart : float
         distance coefficient
-    ind : int
-        index of the particle to split
+    ind : int or numpy array
+        index of the particle(s) to split
 
     Returns
     -------
     xNew : numpy array
-        x components of the splitted particles
+        x components of the splitted particles (one row per particle if ind is an array)
     yNew : numpy array
-        y components of the splitted particles
+        y components of the splitted particles (one row per particle if ind is an array)
     zNew : numpy array
-        z components of the splitted particles
+        z components of the splitted particles (one row per particle if ind is an array)
     """
     mPart = particles['m'][ind]
     hPart = particles['h'][ind]
@@ -645,12 +925,12 @@ def getSplitPartPositionSimple(particles, rho, distSplitPart, ind):
     # note that if we did not update the particles FT, we use here the h from the previous time step
     aPart = mPart/(rho*hPart)
     rNew = distSplitPart * np.sqrt(aPart/math.pi)
-    cos = rNew*np.array([-1, 1])
+    cos = np.multiply.outer(rNew, np.array([-1, 1]))
     # compute velocity mag to get the direction of the flow (e_1)
-    uMag = DFAtls.norm(uxPart, uyPart, uzPart)
-    xNew = xPart + cos * uxPart/uMag
-    yNew = yPart + cos * uyPart/uMag
-    zNew = zPart + cos * uzPart/uMag
+    uMag = DFAtls.norm(uxPart, uyPart, uzPart)[..., np.newaxis]
+    xNew = xPart[..., np.newaxis] + cos * uxPart[..., np.newaxis]/uMag
+    yNew = yPart[..., np.newaxis] + cos * uyPart[..., np.newaxis]/uMag
+    zNew = zPart[..., np.newaxis] + cos * uzPart[..., np.newaxis]/uMag
     # toDo: do we need to reproject the particles on the dem?
     return xNew, yNew, zNew
 
@@ -661,6 +941,7 @@ def getTangenVectors(nx, ny, nz, ux, uy, uz):
     If possible, e1 is in the velocity direction, if not possible,
     use the tangent vector in x direction for e1 (not that any other u vector could be provided,
     it does not need to be the velocity vector, it only needs to be in the tangent plane)
+    The components can also be numpy arrays (one vector per element)
 
     Parameters
     ----------
@@ -694,16 +975,21 @@ def getTangenVectors(nx, ny, nz, ux, uy, uz):
     """
     # compute the velocity magnitude
     velMag = DFAtls.norm(ux, uy, uz)
-    if velMag > 0:
+    if np.all(velMag > 0):
         e1x = ux / velMag
         e1y = uy / velMag
         e1z = uz / velMag
     else:
         # if vector u is zero use the tangent vector in x direction for e1
-        e1x = np.array([1])
-        e1y = np.array([0])
+        e1x = np.ones(np.shape(nx), dtype=int)
+        e1y = np.zeros(np.shape(nx), dtype=int)
         e1z = -nx/nz
         e1x, e1y, e1z = DFAtls.normalize(e1x, e1y, e1z)
+        moving = velMag > 0
+        velMag = np.where(moving, velMag, 1)
+        e1x = np.where(moving, ux / velMag, e1x)
+        e1y = np.where(moving, uy / velMag, e1y)
+        e1z = np.where(moving, uz / velMag, e1z)
     # compute the othe tengent vector
     e2x, e2y, e2z = DFAtls.crossProd(nx, ny, nz, e1x, e1y, e1z)
     e2x, e2y, e2z = DFAtls.normalize(e2x, e2y, e2z)
@@ -867,7 +1153,260 @@ def readPartFromPickle(inDir, simName='', flagAvaDir=False, comModule='com1DFA')
     return Particles, timeStepInfo
 
 
-def savePartToCsv(particleProperties, dictList, outDir):
+def initializeParticleStore(outDir, simName):
+    """ Initialize a columnar particle store for one simulation
+
+        The store is a directory (outDir/particlesStore_simName) with one binary file per particle
+        property (all saved time steps appended one after the other) and an index.npz file with the
+        offsets of each time step and the scalar properties (t, nPart, ...). It allows to read one
+        property for all time steps without loading the others (see readPartFromStore).
+        Time steps are added with appendParticlesToStore, the store is finalized with closeParticleStore
+
+        Parameters
+        -----------
+        outDir: pathlib path
+            path to output directory
+        simName : str
+            simulation name
+
+        Returns
+        --------
+        store: dict
+            dictionary with the store info
+    """
+
+    storeDir = outDir / ('particlesStore_%s' % simName)
+    fU.makeADir(storeDir)
+    # remove files from a previous run of the same simulation
+    for fileName in storeDir.glob('*'):
+        fileName.unlink()
+    store = {'storeDir': storeDir, 'columns': {}, 'scalars': {}, 'offsets': [0]}
+
+    return store
+
+
+def appendParticlesToStore(store, particles):
+    """ Append the particle properties of one time step to the columnar particle store
+
+        All arrays of size nPart are saved as columns, int, float, bool and str values are saved as
+        scalars. Bond arrays and other entries are not saved. If a property is not available for a
+        time step, it is filled with zeros (empty strings)
+
+        Parameters
+        -----------
+        store: dict
+            dictionary with the store info (from initializeParticleStore)
+        particles: dict
+            particles dictionary of the time step
+
+        Returns
+        --------
+        store: dict
+            updated store
+    """
+
+    nPart = particles['nPart']
+    nTimes = len(store['offsets']) - 1
+    # these are not particle properties
+    skipKeys = ['indPartInCell', 'bondStart', 'bondPart', 'bondDist']
+    columnsSaved = []
+    for key, value in particles.items():
+        if key in skipKeys:
+            continue
+        if isinstance(value, np.ndarray) and np.shape(value) == (nPart, ):
+            fileName = store['storeDir'] / ('%s.bin' % key)
+            with open(fileName, 'ab') as fi:
+                if key not in store['columns']:
+                    store['columns'][key] = value.dtype.str
+                    # property not available for the previous time steps
+                    np.zeros(store['offsets'][-1], dtype=value.dtype).tofile(fi)
+                value.astype(store['columns'][key], copy=False).tofile(fi)
+            columnsSaved.append(key)
+        elif isinstance(value, (numbers.Number, np.bool_, str)):
+            if key not in store['scalars']:
+                store['scalars'][key] = [('' if isinstance(value, str) else 0)] * nTimes
+            store['scalars'][key].append(value)
+
+    for key, dtype in store['columns'].items():
+        if key not in columnsSaved:
+            with open(store['storeDir'] / ('%s.bin' % key), 'ab') as fi:
+                np.zeros(nPart, dtype=dtype).tofile(fi)
+    for key, values in store['scalars'].items():
+        if len(values) == nTimes:
+            values.append('' if isinstance(values[0], str) else 0)
+    store['offsets'].append(store['offsets'][-1] + nPart)
+
+    return store
+
+
+def reopenParticleStore(store):
+    """ Reopen a columnar particle store to append further time steps
+
+        Used to resume a simulation from a checkpoint: values appended after the store info was saved
+        (time steps computed after the checkpoint) are removed from the property files
+
+        Parameters
+        -----------
+        store: dict
+            dictionary with the store info as it was when the checkpoint was written
+
+        Returns
+        --------
+        store: dict
+            store info to continue appending time steps
+    """
+
+    nValues = store['offsets'][-1]
+    for fileName in store['storeDir'].glob('*.bin'):
+        if fileName.stem in store['columns']:
+            with open(fileName, 'r+b') as fi:
+                fi.truncate(nValues * np.dtype(store['columns'][fileName.stem]).itemsize)
+        else:
+            # property that first appeared after the checkpoint
+            fileName.unlink()
+    # the index is written again when the store is closed
+    indexFile = store['storeDir'] / 'index.npz'
+    if indexFile.is_file():
+        indexFile.unlink()
+
+    return store
+
+
+def closeParticleStore(store):
+    """ Write the index of the columnar particle store
+
+        Parameters
+        -----------
+        store: dict
+            dictionary with the store info (from initializeParticleStore)
+    """
+
+    index = {'offsets': np.asarray(store['offsets'], dtype=np.int64),
+             'columnNames': np.asarray(list(store['columns'].keys()), dtype=str),
+             'columnDtypes': np.asarray(list(store['columns'].values()), dtype=str)}
+    for key, values in store['scalars'].items():
+        index['scalar_' + key] = np.asarray(values)
+    np.savez(store['storeDir'] / 'index.npz', **index)
+
+
+def savePartToStore(dictList, outDir, simName):
+    """ Save a list of particle dictionaries (one per time step) to a columnar particle store
+
+        Parameters
+        -----------
+        dictList: list
+            list of particles dictionaries
+        outDir: pathlib path
+            path to output directory
+        simName : str
+            simulation name
+    """
+
+    store = initializeParticleStore(outDir, simName)
+    for particles in dictList:
+        store = appendParticlesToStore(store, particles)
+    closeParticleStore(store)
+
+
+def readPartFromStore(inDir, simName='', flagAvaDir=False, comModule='com1DFA', properties=''):
+    """ Read columnar particle stores within a directory and return list of particle dicionaries
+
+        The particle properties are memory mapped: only the data of the properties that are used
+        is read from disk. Modifying the arrays does not change the files
+
+        Parameters
+        -----------
+        inDir: str
+            path to input directory
+        simName : str
+            simulation name
+        flagAvaDir: bool
+            if True inDir corresponds to an avalanche directory and stores are
+            read from avaDir/Outputs/com1DFA/particles
+        comModule: str
+            module that computed the particles
+        properties: list
+            list of particle properties (arrays) to read, if '' all are read
+
+        Returns
+        --------
+        Particles: list
+            list of particles dictionaries, one per time step
+        timeStepInfo: list
+            list of corresponding time steps
+    """
+
+    if flagAvaDir:
+        inDir = pathlib.Path(inDir, 'Outputs', comModule, 'particles')
+
+    # search for all stores within directory
+    if simName:
+        name = 'particlesStore_*' + simName + '*'
+    else:
+        name = 'particlesStore_*'
+    storeDirs = sorted(list(inDir.glob(name)))
+
+    Particles = []
+    timeStepInfo = []
+    for storeDir in storeDirs:
+        with np.load(storeDir / 'index.npz') as index:
+            offsets = index['offsets']
+            columns = dict(zip(index['columnNames'], index['columnDtypes']))
+            scalars = {key[len('scalar_'):]: index[key] for key in index.files if key.startswith('scalar_')}
+        if properties != '':
+            columns = {key: dtype for key, dtype in columns.items() if key in properties}
+        columnArrays = {}
+        for key, dtype in columns.items():
+            if offsets[-1] > 0:
+                columnArrays[key] = np.memmap(storeDir / ('%s.bin' % key), dtype=dtype, mode='c')
+            else:
+                columnArrays[key] = np.zeros(0, dtype=dtype)
+        for nTime in range(len(offsets) - 1):
+            particles = {key: values[nTime].item() for key, values in scalars.items()}
+            for key, values in columnArrays.items():
+                particles[key] = values[offsets[nTime]:offsets[nTime+1]]
+            Particles.append(particles)
+            timeStepInfo.append(particles['t'])
+
+    return Particles, timeStepInfo
+
+
+def readParticles(inDir, simName='', flagAvaDir=False, comModule='com1DFA', properties=''):
+    """ Read particles from columnar particle store if available, otherwise from pickles
+
+        Parameters
+        -----------
+        inDir: str
+            path to input directory
+        simName : str
+            simulation name
+        flagAvaDir: bool
+            if True inDir corresponds to an avalanche directory and particles are
+            read from avaDir/Outputs/com1DFA/particles
+        comModule: str
+            module that computed the particles
+        properties: list
+            list of particle properties (arrays) to read from the store, if '' all are read
+            (pickles are always read completely)
+
+        Returns
+        --------
+        Particles: list
+            list of particles dictionaries, one per time step
+        timeStepInfo: list
+            list of corresponding time steps
+    """
+
+    Particles, timeStepInfo = readPartFromStore(inDir, simName=simName, flagAvaDir=flagAvaDir,
+                                                comModule=comModule, properties=properties)
+    if Particles == []:
+        Particles, timeStepInfo = readPartFromPickle(inDir, simName=simName, flagAvaDir=flagAvaDir,
+                                                     comModule=comModule)
+
+    return Particles, timeStepInfo
+
+
+def savePartToCsv(particleProperties, dictList, outDir, countStart=0):
     """ Save each particle dictionary from a list to a csv file;
         works also for one dictionary instead of list
 
@@ -915,7 +1454,7 @@ def savePartToCsv(particleProperties, dictList, outDir):
         csvData['time'] = particles['t']
 
         # create pandas dataFrame and save to csv
-        outFile = outDir / ('particles%s.csv.%04d' % (simName, count))
+        outFile = outDir / ('particles%s.csv.%04d' % (simName, count + countStart))
         particlesData = pd.DataFrame(data=csvData)
         particlesData.to_csv(outFile, index=False)
         count = count + 1
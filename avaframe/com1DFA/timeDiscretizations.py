@@ -4,6 +4,10 @@
 
 # Load modules
 import logging
+import numpy as np
+
+# Local imports
+import avaframe.com1DFA.DFAtools as DFAtls
 
 # create local logger
 # change log level in calling module to DEBUG to see log messages
@@ -41,3 +45,79 @@ def getSphKernelRadiusTimeStep(dem, cfg):
 
     # return stable time step
     return dtStable
+
+
+def getcflTimeStep(particles, dem, cfg):
+    """ Compute the time step from the CFL condition using the max particle velocity
+
+    dt = cflCoefficient x csz / max velocity, where csz is the minimum of the DEM cell size and
+    the sph kernel radius. The time step is bounded by dtMin and dtMax (dtMax is used if
+    no particle is moving).
+
+    Parameters
+    -----------
+    particles: dict
+        particles dictionary (with particle velocities)
+    dem: dict
+        dem dictionary (with info about sph kernel radius and mesh size)
+    cfg: configparser
+        the cfg with cflCoefficient, dtMin and dtMax
+
+    Returns
+    --------
+    dtStable: float
+        corresponding time step
+    """
+    # get cell size
+    cszDEM = dem['header']['cellsize']
+    cszNeighbourGrid = dem['headerNeighbourGrid']['cellsize']
+    # use the minimum of those two values
+    csz = min(cszDEM, cszNeighbourGrid)
+
+    # max particle velocity
+    if particles['nPart'] > 0:
+        maxV = np.max(DFAtls.norm(particles['ux'], particles['uy'], particles['uz']))
+    else:
+        maxV = 0.
+
+    dtMin = cfg.getfloat('dtMin')
+    dtMax = cfg.getfloat('dtMax')
+    if maxV > 0:
+        dtStable = min(max(cfg.getfloat('cflCoefficient') * csz / maxV, dtMin), dtMax)
+    else:
+        dtStable = dtMax
+    log.debug('dtStable with max velocity %.2f m/s is: %.4f' % (maxV, dtStable))
+
+    # return stable time step
+    return dtStable
+
+
+def limitTimeStepToSaveTime(dt, t, tSave):
+    """ Shorten the time step so that the next saving time is hit exactly
+
+    If the saving time is reached within two time steps, the remaining time is split
+    in two equal time steps (avoids very short time steps)
+
+    Parameters
+    -----------
+    dt: float
+        time step
+    t: float
+        current time
+    tSave: float
+        next saving time
+
+    Returns
+    --------
+    dt: float
+        time step (shortened if required)
+    """
+    tRemaining = tSave - t
+    # the saving time was already reached
+    if tRemaining <= 1.e-8:
+        return dt
+    if dt >= tRemaining:
+        dt = tRemaining
+    elif 2 * dt > tRemaining:
+        dt = tRemaining / 2
+    return dt
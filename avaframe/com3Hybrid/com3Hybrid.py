@@ -94,8 +94,8 @@ def maincom3Hybrid(cfgMain, cfgHybrid):
         initProj.cleanModuleFiles(avalancheDir, com1DFA, deleteOutput=False)
         dem, _, _, simDF = com1DFA.com1DFAMain(cfgMain, cfgInfo=com1DFACfgFile)
         simID = simDF.index[0]
-        particlesList, timeStepInfo = particleTools.readPartFromPickle(avalancheDir, simName=simID, flagAvaDir=True,
-                                                                       comModule='com1DFA')
+        particlesList, timeStepInfo = particleTools.readParticles(avalancheDir, simName=simID, flagAvaDir=True,
+                                                                  comModule='com1DFA')
 
         # ++++++++++ GENERATE PATH +++++++++++
         # postprocess to extract path and energy line
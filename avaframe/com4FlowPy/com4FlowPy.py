@@ -58,6 +58,8 @@ def com4FlowPyMain(cfgPath, cfgSetup):
     modelParameters["exp"] = cfgSetup.getfloat("exp")  # float(cfgSetup["exp"])
     modelParameters["flux_threshold"] = cfgSetup.getfloat("flux_threshold")  # float(cfgSetup["flux_threshold"])
     modelParameters["max_z"] = cfgSetup.getfloat("max_z")  # float(cfgSetup["max_z"])
+    # path engine: 'cell' (flowClass.Cell objects) or 'array' (flat path arrays, same results)
+    modelParameters["pathEngine"] = cfgSetup.get("pathEngine")
 
     # Flags for use of Forest and/or Infrastructure
     modelParameters["infraBool"] = cfgSetup.getboolean("infra")
@@ -92,6 +94,7 @@ def com4FlowPyMain(cfgPath, cfgSetup):
     MPOptions["procPerCPU"] = cfgSetup.getint("procPerCPUCore")  # int(cfgSetup["procPerCPUCore"]) #processes per core
     MPOptions["chunkSize"] = cfgSetup.getint("chunkSize")  # int(cfgSetup["chunkSize"]) # default task size for MP
     MPOptions["maxChunks"] = cfgSetup.getint("maxChunks")  # int(cfgSetup["maxChunks"]) # max number of tasks for MP
+    MPOptions["sharedInputs"] = cfgSetup.getboolean("sharedInputs")  # workers attach to memory-mapped tile inputs
 
     # check if calculation with infrastructure
     if modelParameters["infraBool"]:
@@ -172,6 +175,7 @@ def startLogging(modelParameters, forestParams, modelPaths, MPOptions):
     log.info(f"{'Exponent:' : <20}{modelParameters['exp'] : <5}")
     log.info(f"{'Flux Threshold:' : <20}{modelParameters['flux_threshold'] : <5}")
     log.info(f"{'Max Z_delta:' : <20}{modelParameters['max_z'] : <5}")
+    log.info(f"{'Path engine:' : <20}{modelParameters['pathEngine'] : <5}")
     log.info("------------------------")
     # Also log the used input-files
     log.info(f"{'DEM:' : <5}{'%s'%modelPaths['demPath'] : <5}")
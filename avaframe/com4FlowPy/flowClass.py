@@ -4,6 +4,176 @@
 import numpy as np
 import math
 
+# distance factors to the cells of the 3x3 neighbourhood (z_delta and tan_beta)
+_SQRT2 = np.sqrt(2.0)
+_DS_ZDELTA = np.array([[_SQRT2, 1, _SQRT2], [1, 0, 1], [_SQRT2, 1, _SQRT2]])
+_DS_TANBETA = np.array([[_SQRT2, 1, _SQRT2], [1, 1, 1], [_SQRT2, 1, _SQRT2]])
+_RAD90 = np.deg2rad(90.0)
+
+
+# NOTE: the functions below hold the cell level computations, they are used by the Cell class and by the
+# array based path engine (flowCore.calculationArrays) so that both engines give identical results
+def noEffectZdelta(velocityThreshold):
+    """z_delta (kinetic energy height) corresponding to the velocity threshold of the forest effects"""
+    return (velocityThreshold * velocityThreshold) / (_SQRT2 * 9.81)
+
+
+def useForestDetrainment(forestParams):
+    """return True if the forest detrainment has to be computed
+    NOTE: This is a quick hack to check if all values for Detrainment are set to 0 (as provided in the
+         .ini file)
+         if this is the case, then the forest detrainment does not have to be computed
+    TO-DO: clean this up and handle it better
+    """
+    forestModule = forestParams["forestModule"]
+    if (forestModule == "forestFriction") or (forestModule == "forestFrictionLayer"):
+        return False
+    elif (
+        (forestParams["maxDetrainment"] == 0)
+        and (forestParams["minDetrainment"] == 0)
+        and (forestParams["velThForDetrain"] == 0)
+    ):
+        return False
+    return True
+
+
+def forestFrictionLayerAlpha(alpha, FSI, fFrLayerType):
+    """alpha angle on a cell of the forest friction layer ('absolute' or 'relative' layer values)"""
+    if fFrLayerType == "absolute":
+        AlphaFor = FSI
+    elif fFrLayerType == "relative":
+        AlphaFor = alpha + FSI
+    return max(AlphaFor, alpha)  # Friction in Forest can't be lower than without forest
+
+
+def forestFrictionAlpha(alpha, FSI, z_delta, maxAddedFriction, minAddedFriction, noFrictionEffectZdelta):
+    """alpha angle on a forested cell (forestFriction and forestDetrainment modules)
+    NOTE-TODO: The rest of this implementation is also just copy+pasted from 'foreste_detraiment'
+         branch and not yet fully tested!!
+    """
+    if z_delta < noFrictionEffectZdelta:
+        # friction at rest v=0 would be applied to start cells
+        _rest = maxAddedFriction * FSI
+        # rise over run
+        _slope = (_rest - minAddedFriction) / (0 - noFrictionEffectZdelta)
+        # y = mx + b, shere z_delta is the x
+        friction = max(minAddedFriction, _slope * z_delta + _rest)
+
+        return alpha + max(0, friction)  # NOTE: not sure what this does, seems redundant!
+    return alpha + minAddedFriction
+
+
+def forestDetrainment(FSI, z_delta, maxDetrainment, minDetrainment, noDetrainmentEffectZdelta):
+    """detrainment on a forested cell (see Cell.forest_detrainment)"""
+    # detrainment effect scaled to forest, 0 for non-forest
+    _rest = maxDetrainment * FSI
+    # rise over run (should be negative slope)
+    slope = (_rest - minDetrainment) / (0 - noDetrainmentEffectZdelta)
+    # y=mx+b, where zDelta is x
+    return max(minDetrainment, slope * z_delta + _rest)
+
+
+def calcZDeltaNeighbour(z_delta, z_gamma, cellsize, tanAlpha, max_z_delta):
+    """z_delta to the cells of the 3x3 neighbourhood, limited to [0, max_z_delta]"""
+    z_alpha = _DS_ZDELTA * cellsize * tanAlpha
+    z_delta_neighbour = z_delta + z_gamma - z_alpha
+    z_delta_neighbour[z_delta_neighbour < 0] = 0
+    z_delta_neighbour[z_delta_neighbour > max_z_delta] = max_z_delta
+    return z_alpha, z_delta_neighbour
+
+
+def addParentPersistence(persistence, dx, dy, maxweight):
+    """add the persistence of a parent at the offset (dx, dy) to the 3x3 persistence array (in place)"""
+    # Old Calculation
+    if dx == -1:
+        if dy == -1:
+            persistence[2, 2] += maxweight
+            persistence[2, 1] += 0.707 * maxweight
+            persistence[1, 2] += 0.707 * maxweight
+        if dy == 0:
+            persistence[1, 2] += maxweight
+            persistence[2, 2] += 0.707 * maxweight
+            persistence[0, 2] += 0.707 * maxweight
+        if dy == 1:
+            persistence[0, 2] += maxweight
+            persistence[0, 1] += 0.707 * maxweight
+            persistence[1, 2] += 0.707 * maxweight
+
+    if dx == 0:
+        if dy == -1:
+            persistence[2, 1] += maxweight
+            persistence[2, 0] += 0.707 * maxweight
+            persistence[2, 2] += 0.707 * maxweight
+        if dy == 1:
+            persistence[0, 1] += maxweight
+            persistence[0, 0] += 0.707 * maxweight
+            persistence[0, 2] += 0.707 * maxweight
+
+    if dx == 1:
+        if dy == -1:
+            persistence[2, 0] += maxweight
+            persistence[1, 0] += 0.707 * maxweight
+            persistence[2, 1] += 0.707 * maxweight
+        if dy == 0:
+            persistence[1, 0] += maxweight
+            persistence[0, 0] += 0.707 * maxweight
+            persistence[2, 0] += 0.707 * maxweight
+        if dy == 1:
+            persistence[0, 0] += maxweight
+            persistence[0, 1] += 0.707 * maxweight
+            persistence[1, 0] += 0.707 * maxweight
+
+
+def calcTanBeta(altitude, dem_ng, cellsize, z_delta_neighbour, persistence, exp, r_t):
+    """tan_beta to the cells of the 3x3 neighbourhood and routing weights r_t
+    (r_t is returned unchanged if no neighbour is eligible)"""
+    _distance = _DS_TANBETA * cellsize
+
+    _beta = np.arctan((altitude - dem_ng) / _distance) + _RAD90
+    tan_beta = np.tan(_beta / 2)
+
+    tan_beta[z_delta_neighbour <= 0] = 0
+    tan_beta[persistence <= 0] = 0
+    tan_beta[1, 1] = 0
+    if abs(np.sum(tan_beta)) > 0:
+        r_t = tan_beta**exp / np.sum(tan_beta**exp)
+    return tan_beta, r_t
+
+
+def travelDistance(dx, dy, cellsize):
+    """horizontal distance between two cells with index offsets dx, dy"""
+    return math.sqrt(dx * dx + dy * dy) * cellsize
+
+
+def travelAngle(dh, ds):
+    """travel angle in degrees for the elevation difference dh over the distance ds"""
+    return np.rad2deg(np.arctan(dh / ds))
+
+
+def distributeFlux(persistence, r_t, flux, threshold, dist):
+    """distribute the flux of a cell to the 3x3 neighbourhood
+    (dist is returned unchanged if no neighbour is eligible)"""
+    if np.sum(r_t) > 0:
+        dist = (persistence * r_t) / np.sum(persistence * r_t) * flux
+
+    # This handles (local) flux re-distribution if n cells are below threshold, but lager 0 and m cells are
+    # still above threshold
+    # NOTE: this only works if "0 < n < 8" AND "0 < m < 8", the case where
+    # "0<n<8" AND "m=0" is not handled!!! (in this case flux is "lost")
+    count = ((0 < dist) & (dist < threshold)).sum()
+    # count = (dist >= threshold).sum() #this is the correct way to calculate count
+    # TODO: make this the default, but keep option to use "old" version with minor Bug for backward compatibility of
+    # model results
+    mass_to_distribute = np.sum(dist[dist < threshold])
+    """Checking if flux is distributed to a field that isn't taking in account, when then distribute it equally to
+     the other fields"""
+    if mass_to_distribute > 0 and count > 0:
+        dist[dist > threshold] += mass_to_distribute / count
+        dist[dist < threshold] = 0
+    if np.sum(dist) < flux and count > 0:
+        dist[dist > threshold] += (flux - np.sum(dist)) / count
+    return dist
+
 
 class Cell:
     """This is the com4FlowPy 'Cell ' class
@@ -55,9 +225,6 @@ class Cell:
         self.max_gamma = 0
         self.sl_gamma = 0
 
-        self._SQRT2 = np.sqrt(2.0)
-        self._RAD90 = np.deg2rad(90.0)
-
         # NOTE: Forest Interaction included here
         # if FSI != None AND forestParams != None - then self.ForestBool = True and forestParams and
         # FSI are accordingly initialized
@@ -85,38 +252,18 @@ class Cell:
                 self.minAddedDetrainmentForest = forestParams["minDetrainment"]
                 self.noDetrainmentEffectV = forestParams["velThForDetrain"]
 
-                _vThFr = self.noFrictionEffectV
-                _vThDe = self.noDetrainmentEffectV
-                _sqrt2xG = self._SQRT2 * 9.81
-                self.noFricitonEffectZdelta = (_vThFr * _vThFr) / _sqrt2xG
-                self.noDetrainmentEffectZdelta = (_vThDe * _vThDe) / _sqrt2xG
+                self.noFricitonEffectZdelta = noEffectZdelta(self.noFrictionEffectV)
+                self.noDetrainmentEffectZdelta = noEffectZdelta(self.noDetrainmentEffectV)
 
             elif self.forestModule == "forestFrictionLayer":
 
-                if forestParams["fFrLayerType"] == "absolute":
-                    self.AlphaFor = FSI
-                elif forestParams["fFrLayerType"] == "relative":
-                    self.AlphaFor = self.alpha + FSI
-
-                self.AlphaFor = max(self.AlphaFor, self.alpha)  # Friction in Forest can't be lower than without forest
+                self.AlphaFor = forestFrictionLayerAlpha(self.alpha, FSI, forestParams["fFrLayerType"])
                 self.tanAlphaFor = np.tan(np.deg2rad(self.AlphaFor))
                 self.nSkipForestCells = forestParams["nSkipForest"]
 
-            # NOTE: This is a quick hack to check if all values for Detrainment are set to 0 (as provided in the
-            #      .ini file)
-            #      if this is the case, then the self.forest_detrainment function does not have to be called inside
-            #      self.calc_distribution
-            # TO-DO: clean this up and handle it better
-            if (self.forestModule == "forestFriction") or (self.forestModule == "forestFrictionLayer"):
-                self.forestDetrainmentBool = False
-            elif (
-                (self.maxAddedDetrainmentForest == 0)
-                and (self.minAddedDetrainmentForest == 0)
-                and (self.noDetrainmentEffectV == 0)
-            ):
-                self.forestDetrainmentBool = False
-            else:
-                self.forestDetrainmentBool = True
+            # if forest detrainment is not used, the self.forest_detrainment function does not have to be called
+            # inside self.calc_distribution
+            self.forestDetrainmentBool = useForestDetrainment(forestParams)
 
         else:
             self.forestBool = False
@@ -166,26 +313,24 @@ class Cell:
         for parent in self.lOfParents:
             _dx = abs(parent.colindex - self.colindex)
             _dy = abs(parent.rowindex - self.rowindex)
-            _ldistMin.append(math.sqrt(_dx * _dx + _dy * _dy) * self.cellsize + parent.min_distance)
+            _ldistMin.append(travelDistance(_dx, _dy, self.cellsize) + parent.min_distance)
         self.min_distance = np.amin(_ldistMin)
-        self.max_gamma = np.rad2deg(np.arctan(_dh / self.min_distance))
+        self.max_gamma = travelAngle(_dh, self.min_distance)
 
     def calc_sl_travelangle(self):
         _dx = abs(self.startcell.colindex - self.colindex)
         _dy = abs(self.startcell.rowindex - self.rowindex)
         _dh = self.startcell.altitude - self.altitude
 
-        _ds = math.sqrt(_dx * _dx + _dy * _dy) * self.cellsize
-        self.sl_gamma = np.rad2deg(np.arctan(_dh / _ds))
+        _ds = travelDistance(_dx, _dy, self.cellsize)
+        self.sl_gamma = travelAngle(_dh, _ds)
 
     def calc_z_delta(self):
         """
         function calculates zDelta to the eligible neighbours
         NOTE: forestFriction related mechanics are implemented here!
         """
-        self.z_delta_neighbour = np.zeros((3, 3))
         self.z_gamma = self.altitude - self.dem_ng
-        ds = np.array([[self._SQRT2, 1, self._SQRT2], [1, 0, 1], [self._SQRT2, 1, self._SQRT2]])
 
         if self.forestBool:
             if self.forestModule == "forestFrictionLayer":
@@ -206,19 +351,10 @@ class Cell:
                     # and if FSI > 0 then we also calculate _tanAlpha with forestEffect
                     # NOTE: We also don't assume a forest Effect on potential Start Zells, since this should
                     #      ideally be handled by a separate release-area algorithm in the pre-processing
-                    # NOTE-TODO: The rest of this implementation is also just copy+pasted from 'foreste_detraiment'
-                    #      branch and not yet fully tested!!
-                    if self.z_delta < self.noFricitonEffectZdelta:
-                        # friction at rest v=0 would be applied to start cells
-                        _rest = self.maxAddedFrictionForest * self.FSI
-                        # rise over run
-                        _slope = (_rest - self.minAddedFrictionForest) / (0 - self.noFricitonEffectZdelta)
-                        # y = mx + b, shere z_delta is the x
-                        friction = max(self.minAddedFrictionForest, _slope * self.z_delta + _rest)
-
-                        _alpha_calc = self.alpha + max(0, friction)  # NOTE: not sure what this does, seems redundant!
-                    else:
-                        _alpha_calc = self.alpha + self.minAddedFrictionForest
+                    _alpha_calc = forestFrictionAlpha(
+                        self.alpha, self.FSI, self.z_delta,
+                        self.maxAddedFrictionForest, self.minAddedFrictionForest, self.noFricitonEffectZdelta,
+                    )
 
                     _tanAlpha = np.tan(np.deg2rad(_alpha_calc))
 
@@ -229,23 +365,14 @@ class Cell:
             # else simply use tanAlpha
             _tanAlpha = self.tanAlpha
 
-        self.z_alpha = ds * self.cellsize * _tanAlpha
-        self.z_delta_neighbour = self.z_delta + self.z_gamma - self.z_alpha
-        self.z_delta_neighbour[self.z_delta_neighbour < 0] = 0
-        self.z_delta_neighbour[self.z_delta_neighbour > self.max_z_delta] = self.max_z_delta
+        self.z_alpha, self.z_delta_neighbour = calcZDeltaNeighbour(
+            self.z_delta, self.z_gamma, self.cellsize, _tanAlpha, self.max_z_delta
+        )
 
     def calc_tanbeta(self):
-        _ds = np.array([[self._SQRT2, 1, self._SQRT2], [1, 1, 1], [self._SQRT2, 1, self._SQRT2]])
-        _distance = _ds * self.cellsize
-
-        _beta = np.arctan((self.altitude - self.dem_ng) / _distance) + self._RAD90
-        self.tan_beta = np.tan(_beta / 2)
-
-        self.tan_beta[self.z_delta_neighbour <= 0] = 0
-        self.tan_beta[self.persistence <= 0] = 0
-        self.tan_beta[1, 1] = 0
-        if abs(np.sum(self.tan_beta)) > 0:
-            self.r_t = self.tan_beta**self.exp / np.sum(self.tan_beta**self.exp)
+        self.tan_beta, self.r_t = calcTanBeta(
+            self.altitude, self.dem_ng, self.cellsize, self.z_delta_neighbour, self.persistence, self.exp, self.r_t
+        )
 
     def calc_persistence(self):
         self.persistence = np.zeros_like(self.dem_ng)
@@ -260,45 +387,7 @@ class Cell:
 
                 self.no_flow[dy + 1, dx + 1] = 0  # 3x3 Matrix of ones, every parent gets a 0, no flow to a parent field
 
-                maxweight = parent.z_delta
-                # Old Calculation
-                if dx == -1:
-                    if dy == -1:
-                        self.persistence[2, 2] += maxweight
-                        self.persistence[2, 1] += 0.707 * maxweight
-                        self.persistence[1, 2] += 0.707 * maxweight
-                    if dy == 0:
-                        self.persistence[1, 2] += maxweight
-                        self.persistence[2, 2] += 0.707 * maxweight
-                        self.persistence[0, 2] += 0.707 * maxweight
-                    if dy == 1:
-                        self.persistence[0, 2] += maxweight
-                        self.persistence[0, 1] += 0.707 * maxweight
-                        self.persistence[1, 2] += 0.707 * maxweight
-
-                if dx == 0:
-                    if dy == -1:
-                        self.persistence[2, 1] += maxweight
-                        self.persistence[2, 0] += 0.707 * maxweight
-                        self.persistence[2, 2] += 0.707 * maxweight
-                    if dy == 1:
-                        self.persistence[0, 1] += maxweight
-                        self.persistence[0, 0] += 0.707 * maxweight
-                        self.persistence[0, 2] += 0.707 * maxweight
-
-                if dx == 1:
-                    if dy == -1:
-                        self.persistence[2, 0] += maxweight
-                        self.persistence[1, 0] += 0.707 * maxweight
-                        self.persistence[2, 1] += 0.707 * maxweight
-                    if dy == 0:
-                        self.persistence[1, 0] += maxweight
-                        self.persistence[0, 0] += 0.707 * maxweight
-                        self.persistence[2, 0] += 0.707 * maxweight
-                    if dy == 1:
-                        self.persistence[0, 0] += maxweight
-                        self.persistence[0, 1] += 0.707 * maxweight
-                        self.persistence[1, 0] += 0.707 * maxweight
+                addParentPersistence(self.persistence, dx, dy, parent.z_delta)
 
     def calc_distribution(self):
 
@@ -324,25 +413,7 @@ class Cell:
                 self.flux = max(0.0003, self.flux - self.detrainment)
 
         threshold = self.flux_threshold
-        if np.sum(self.r_t) > 0:
-            self.dist = (self.persistence * self.r_t) / np.sum(self.persistence * self.r_t) * self.flux
-
-        # This handles (local) flux re-distribution if n cells are below threshold, but lager 0 and m cells are
-        # still above threshold
-        # NOTE: this only works if "0 < n < 8" AND "0 < m < 8", the case where
-        # "0<n<8" AND "m=0" is not handled!!! (in this case flux is "lost")
-        count = ((0 < self.dist) & (self.dist < threshold)).sum()
-        # count = (self.dist >= threshold).sum() #this is the correct way to calculate count
-        # TODO: make this the default, but keep option to use "old" version with minor Bug for backward compatibility of
-        # model results
-        mass_to_distribute = np.sum(self.dist[self.dist < threshold])
-        """Checking if flux is distributed to a field that isn't taking in account, when then distribute it equally to
-         the other fields"""
-        if mass_to_distribute > 0 and count > 0:
-            self.dist[self.dist > threshold] += mass_to_distribute / count
-            self.dist[self.dist < threshold] = 0
-        if np.sum(self.dist) < self.flux and count > 0:
-            self.dist[self.dist > threshold] += (self.flux - np.sum(self.dist)) / count
+        self.dist = distributeFlux(self.persistence, self.r_t, self.flux, threshold, self.dist)
 
         row_local, col_local = np.where(self.dist > threshold)
 
@@ -360,11 +431,7 @@ class Cell:
         NOTE: This is more or less copied+pasted from 'foreste_detrainment' branch in avaframe/FlowPy repo
         TODO: Definitely re-check/test this function!!
         """
-        _noDetrainmentEffectZdelta = self.noDetrainmentEffectZdelta
-
-        # detrainment effect scaled to forest, 0 for non-forest
-        _rest = (self.maxAddedDetrainmentForest * self.FSI)
-        # rise over run (should be negative slope)
-        slope = (_rest - self.minAddedDetrainmentForest) / (0 - _noDetrainmentEffectZdelta)
-        # y=mx+b, where zDelta is x
-        self.detrainment = max(self.minAddedDetrainmentForest, slope * self.z_delta + _rest)
+        self.detrainment = forestDetrainment(
+            self.FSI, self.z_delta,
+            self.maxAddedDetrainmentForest, self.minAddedDetrainmentForest, self.noDetrainmentEffectZdelta,
+        )
@@ -18,6 +18,7 @@ else:
     from multiprocessing import Pool
 
 from avaframe.com4FlowPy.flowClass import Cell
+import avaframe.com4FlowPy.flowClass as flowClass
 
 
 def get_start_idx(dem, release):
@@ -68,6 +69,35 @@ def split_release(release, pieces):
     release_list:    A list with the tiles(arrays) in it [array0, array1, ..]
     """
 
+    flat_release = release.flatten()
+
+    release_list = []
+    for start_index, split_index in split_release_indices(release, pieces):
+        # Create a new array for this split
+        split_flat = np.zeros_like(flat_release)
+        split_flat[start_index:split_index] = flat_release[start_index:split_index]
+
+        # Reshape the flat array back to 2D and add to the list
+        release_list.append(split_flat.reshape(release.shape))
+
+    return release_list
+
+
+def split_release_indices(release, pieces):
+    """Split the release layer in several pieces along the flattened 2D-array
+    (same split as in split_release), but only return the index ranges of the
+    pieces instead of full size release arrays
+
+    Parameters
+    -----------
+    release: np.array - assumes a binary 0|1 array with  release pixels designated by '1'
+    pieces:  int - number of chunck in which the release layer should be split
+
+    Returns
+    -----------
+    index_list:    A list with the (start, stop) indices of the pieces in the flattened release array
+    """
+
     # Flatten the array and compute the cumulative sum
     flat_release = release.flatten()
     cumulative_sum = np.cumsum(flat_release)
@@ -75,28 +105,19 @@ def split_release(release, pieces):
     total_sum = cumulative_sum[-1]
     sum_per_split = total_sum / pieces
 
-    release_list = []
+    index_list = []
     start_index = 0
 
     for i in range(1, pieces):
         # Find the split point in the flattened array
         split_index = np.searchsorted(cumulative_sum, sum_per_split * i)
-
-        # Create a new array for this split
-        split_flat = np.zeros_like(flat_release)
-        split_flat[start_index:split_index] = flat_release[start_index:split_index]
-
-        # Reshape the flat array back to 2D and add to the list
-        release_list.append(split_flat.reshape(release.shape))
-
+        index_list.append((int(start_index), int(split_index)))
         start_index = split_index
 
     # Handle the last piece
-    split_flat = np.zeros_like(flat_release)
-    split_flat[start_index:] = flat_release[start_index:]
-    release_list.append(split_flat.reshape(release.shape))
+    index_list.append((int(start_index), flat_release.size))
 
-    return release_list
+    return index_list
 
 
 def back_calculation(back_cell):
@@ -164,6 +185,12 @@ def run(optTuple):
 
     MPOptions = optTuple[6]  # CPU, Multiprocessing options ...
 
+    # select the path engine (both give the same results)
+    if optTuple[2]["pathEngine"] == "array":
+        calcFunction = calculationArrays
+    else:
+        calcFunction = calculation
+
     dem = np.load(tempDir / ("dem_%s_%s.npy" % (optTuple[0], optTuple[1])))
     release = np.load(tempDir / ("init_%s_%s.npy" % (optTuple[0], optTuple[1])))
     if infraBool:
@@ -197,13 +224,38 @@ def run(optTuple):
         chunkSize=MPOptions["chunkSize"],
     )
 
-    release_list = split_release(release, nChunks)
     log.info("Multiprocessing starts, used Cores/Processes/Chunks: %i/%i/%i" % (MPOptions["nCPU"], nProcesses, nChunks))
 
-    if forestBool:
+    if MPOptions["sharedInputs"]:
+        # the workers attach read-only to the tile inputs in tempDir (memory-mapped .npy files), so only
+        # the paths and the index range of the release cells of each chunk are sent to the workers
+        inputPaths = {
+            "dem": tempDir / ("dem_%s_%s.npy" % (optTuple[0], optTuple[1])),
+            "release": tempDir / ("init_%s_%s.npy" % (optTuple[0], optTuple[1])),
+            "infra": tempDir / ("infra_%s_%s.npy" % (optTuple[0], optTuple[1])) if infraBool else None,
+            "forest": tempDir / ("forest_%s_%s.npy" % (optTuple[0], optTuple[1])) if forestBool else None,
+        }
+        with Pool(processes=nProcesses) as pool:
+            results = pool.map(
+                calculationShared,
+                [
+                    [
+                        calcFunction, inputPaths, releaseRange,
+                        alpha, exp, flux_threshold, max_z_delta,
+                        nodata, cellsize,
+                        infraBool, forestBool,
+                        forestParams if forestBool else None,
+                    ]
+                    for releaseRange in split_release_indices(release, nChunks)
+                ],
+            )
+            pool.close()
+            pool.join()
+    elif forestBool:
+        release_list = split_release(release, nChunks)
         with Pool(processes=nProcesses) as pool:
             results = pool.map(
-                calculation,
+                calcFunction,
                 [
                     [
                         dem, infra, release_sub,
@@ -218,9 +270,10 @@ def run(optTuple):
             pool.close()
             pool.join()
     else:
+        release_list = split_release(release, nChunks)
         with Pool(processes=nProcesses) as pool:
             results = pool.map(
-                calculation,
+                calcFunction,
                 [
                     [
                         dem, infra, release_sub,
@@ -305,6 +358,50 @@ def run(optTuple):
         np.save(tempDir / ("res_forestInt_%s_%s" % (optTuple[0], optTuple[1])), forestIntArray)
 
 
+def calculationShared(args):
+    """Wrapper around calculation()/calculationArrays() for the sharedInputs mode: the tile inputs are
+    attached read-only as memory-mapped .npy files instead of being sent (pickled) with every task,
+    and the release array of the chunk is built from the flat index range of its release cells
+
+    Input parameters:
+        args[0]     calculation function (calculation or calculationArrays)
+        args[1]     dict with the paths to the dem, release, infra (or None) and forest (or None) tiles
+        args[2]     tuple (start, stop) of the chunk in the flattened release array
+        args[3:11]  alpha, exp, flux_threshold, max_z_delta, nodata, cellsize, infraBool, forestBool
+        args[11]    forestParams (or None)
+
+    Output parameters:
+        same as calculation()
+    """
+
+    calcFunction = args[0]
+    inputPaths = args[1]
+    start, stop = args[2]
+    infraBool = args[9]
+    forestBool = args[10]
+
+    # np.asarray to work with plain (read-only) ndarrays on the memory-mapped buffers
+    dem = np.asarray(np.load(inputPaths["dem"], mmap_mode="r"))
+    if infraBool:
+        infra = np.asarray(np.load(inputPaths["infra"], mmap_mode="r"))
+    else:
+        infra = np.zeros_like(dem)
+
+    # release array of this chunk, converted to binary like in run()
+    releaseTile = np.load(inputPaths["release"], mmap_mode="r")
+    release = np.zeros(releaseTile.shape, dtype=releaseTile.dtype)
+    release.reshape(-1)[start:stop] = releaseTile.reshape(-1)[start:stop]
+    release[release < 0] = 0
+    release[release > 0] = 1
+
+    calcArgs = [dem, infra, release] + list(args[3:11])
+    if forestBool:
+        forestArray = np.asarray(np.load(inputPaths["forest"], mmap_mode="r"))
+        calcArgs = calcArgs + [forestArray, args[11]]
+
+    return calcFunction(calcArgs)
+
+
 def calculation(args):
     """This is the core function where all the data handling and calculation is
     done.
@@ -510,6 +607,446 @@ def calculation(args):
             travelLengthArray
 
 
+def calculationArrays(args):
+    """Alternative to calculation() that keeps the path of each release cell in flat preallocated arrays
+    instead of one flowClass.Cell object per visited cell.
+
+    Cells that are still waiting to be processed are found with a grid index (one entry per raster cell)
+    instead of scanning the list of cells, parents are stored as a linked list of indices.
+    The cell-level computations use the same functions as flowClass.Cell (see flowClass), hence the results
+    are identical to calculation().
+
+    Input and output parameters: see calculation()
+    """
+    handleMemoryAvailability()
+
+    dem = args[0]
+    infra = args[1]
+    release = args[2]
+    alpha = args[3]
+    exp = args[4]
+    flux_threshold = args[5]
+    max_z_delta = args[6]
+    nodata = args[7]
+    cellsize = args[8]
+    infraBool = args[9]
+    forestBool = args[10]
+
+    if forestBool:
+        forestArray = args[11]
+        forestParams = args[12]
+        forestInteraction = forestParams["forestInteraction"]
+    else:
+        forestInteraction = False
+        forestArray = None
+        forestParams = None
+
+    zDeltaArray = np.zeros_like(dem, dtype=np.float32)
+    zDeltaSumArray = np.zeros_like(dem, dtype=np.float32)
+    fluxArray = np.zeros_like(dem, dtype=np.float32)
+    countArray = np.zeros_like(dem, dtype=np.int32)
+
+    fpTravelAngleArray = np.zeros_like(dem, dtype=np.float32)  # fp = Flow Path
+    slTravelAngleArray = np.zeros_like(dem, dtype=np.float32) * 90  # sl = Straight Line
+
+    travelLengthArray = np.zeros_like(dem, dtype=np.float32)
+
+    backcalc = np.zeros_like(dem, dtype=np.int32)
+
+    if forestInteraction:
+        forestIntArray = np.ones_like(dem, dtype=np.float32) * -9999
+
+    modelConsts = getPathModelConstants(alpha, exp, flux_threshold, max_z_delta, cellsize, forestParams)
+
+    # index of the path cell at each raster cell that still has to be processed (-1 if none)
+    activeIndex = np.full(np.shape(dem), -1, dtype=np.int64)
+    # raster cells already processed for the current release cell
+    processedFlag = np.zeros(np.shape(dem), dtype=bool)
+    path = initializePathArrays(1024)
+
+    row_list, col_list = get_start_idx(dem, release)
+
+    startcell_idx = 0
+    while startcell_idx < len(row_list):
+
+        row_idx = row_list[startcell_idx]
+        col_idx = col_list[startcell_idx]
+        dem_ng = dem[row_idx - 1: row_idx + 2, col_idx - 1: col_idx + 2]  # neighbourhood DEM
+
+        if (nodata in dem_ng) or np.size(dem_ng) < 9:
+            startcell_idx += 1
+            continue
+
+        path["nCells"] = 0
+        path["nEdges"] = 0
+        path = appendPathCell(path, row_idx, col_idx, 1, 0, -1, forestArray, forestInteraction)
+        activeIndex[row_idx, col_idx] = 0
+        startAltitude = dem_ng[1, 1]
+
+        idx = 0
+        while idx < path["nCells"]:
+            cellRow = path["row"][idx]
+            cellCol = path["col"][idx]
+
+            row, col, flux, z_delta = calcDistributionArrays(path, idx, dem, startAltitude, forestArray,
+                                                             modelConsts)
+
+            if len(flux) > 0:
+                z_delta, flux, row, col = list(zip(*sorted(zip(z_delta, flux, row, col), reverse=False)))
+                # Sort this lists by elh, to start with the highest cell
+
+            for k in range(len(row)):
+                # check if cell already exists in the cells that still have to be processed
+                existing = activeIndex[row[k], col[k]]
+                if existing >= 0:
+                    path["flux"][existing] += flux[k]
+                    path = addPathParent(path, existing, idx, forestInteraction)
+                    if z_delta[k] > path["zDelta"][existing]:
+                        path["zDelta"][existing] = z_delta[k]
+                    continue
+
+                dem_ng = dem[row[k] - 1: row[k] + 2, col[k] - 1: col[k] + 2]  # neighbourhood DEM
+                # no calculation if nodata in the 3x3 neighbourhood (see calculation())
+                if (nodata in dem_ng) or np.size(dem_ng) < 9:
+                    continue
+
+                path = appendPathCell(path, row[k], col[k], flux[k], z_delta[k], idx, forestArray,
+                                      forestInteraction)
+                activeIndex[row[k], col[k]] = path["nCells"] - 1
+
+            cellZDelta = path["zDelta"][idx]
+            zDeltaArray[cellRow, cellCol] = max(zDeltaArray[cellRow, cellCol], cellZDelta)
+            fluxArray[cellRow, cellCol] = max(fluxArray[cellRow, cellCol], path["flux"][idx])
+            zDeltaSumArray[cellRow, cellCol] += cellZDelta
+            fpTravelAngleArray[cellRow, cellCol] = max(fpTravelAngleArray[cellRow, cellCol],
+                                                       path["maxGamma"][idx])
+            slTravelAngleArray[cellRow, cellCol] = max(slTravelAngleArray[cellRow, cellCol],
+                                                       path["slGamma"][idx])
+            travelLengthArray[cellRow, cellCol] = max(travelLengthArray[cellRow, cellCol],
+                                                      path["minDistance"][idx])
+            if not processedFlag[cellRow, cellCol]:
+                countArray[cellRow, cellCol] += int(1)
+                processedFlag[cellRow, cellCol] = True
+
+            # Backcalculation
+            if infraBool:
+                if infra[cellRow, cellCol] > 0:
+                    for bIdx in backCalculationArrays(path, idx):
+                        bRow = path["row"][bIdx]
+                        bCol = path["col"][bIdx]
+                        backcalc[bRow, bCol] = max(backcalc[bRow, bCol], infra[cellRow, cellCol])
+            if forestInteraction:
+                cellForestIntCount = path["forestIntCount"][idx]
+                if forestIntArray[cellRow, cellCol] >= 0 and cellForestIntCount >= 0:
+                    forestIntArray[cellRow, cellCol] = min(forestIntArray[cellRow, cellCol],
+                                                           cellForestIntCount)
+                else:
+                    forestIntArray[cellRow, cellCol] = max(forestIntArray[cellRow, cellCol],
+                                                           cellForestIntCount)
+
+            # the cell is processed, it can not receive flux anymore
+            activeIndex[cellRow, cellCol] = -1
+            idx += 1
+
+        processedFlag[path["row"][:path["nCells"]], path["col"][:path["nCells"]]] = False
+
+        if infraBool:
+            release[zDeltaArray > 0] = 0
+            # Check if i hit a release Cell, if so set it to zero and get again the indexes of release cells
+            row_list, col_list = get_start_idx(dem, release)
+
+        startcell_idx += 1
+
+    gc.collect()
+    if forestInteraction:
+        return zDeltaArray, fluxArray, countArray, zDeltaSumArray, backcalc, fpTravelAngleArray, slTravelAngleArray, \
+            travelLengthArray, forestIntArray
+    else:
+        return zDeltaArray, fluxArray, countArray, zDeltaSumArray, backcalc, fpTravelAngleArray, slTravelAngleArray, \
+            travelLengthArray
+
+
+def getPathModelConstants(alpha, exp, flux_threshold, max_z_delta, cellsize, forestParams):
+    """collect the model parameters and derived constants used by calcDistributionArrays()
+    (same values as computed in the flowClass.Cell constructor)
+
+    Parameters
+    -----------
+    alpha, exp, flux_threshold, max_z_delta: model parameters
+    cellsize: float - cellsize of the raster
+    forestParams: dict - forest parameters or None if no forest is used
+
+    Returns
+    -----------
+    modelConsts: dict
+    """
+    modelConsts = {
+        "alpha": float(alpha),
+        "exp": int(exp),
+        "flux_threshold": float(flux_threshold),
+        "max_z_delta": float(max_z_delta),
+        "cellsize": cellsize,
+        "tanAlpha": np.tan(np.deg2rad(float(alpha))),
+        "forestBool": forestParams is not None,
+    }
+
+    if forestParams is not None:
+        forestModule = forestParams["forestModule"]
+        modelConsts["forestModule"] = forestModule
+        if (forestModule == "forestFriction") or (forestModule == "forestDetrainment"):
+            modelConsts["maxAddedFrictionForest"] = forestParams["maxAddedFriction"]
+            modelConsts["minAddedFrictionForest"] = forestParams["minAddedFriction"]
+            modelConsts["maxAddedDetrainmentForest"] = forestParams["maxDetrainment"]
+            modelConsts["minAddedDetrainmentForest"] = forestParams["minDetrainment"]
+            modelConsts["noFricitonEffectZdelta"] = flowClass.noEffectZdelta(
+                forestParams["velThForFriction"])
+            modelConsts["noDetrainmentEffectZdelta"] = flowClass.noEffectZdelta(
+                forestParams["velThForDetrain"])
+        elif forestModule == "forestFrictionLayer":
+            modelConsts["fFrLayerType"] = forestParams["fFrLayerType"]
+            modelConsts["nSkipForestCells"] = forestParams["nSkipForest"]
+        modelConsts["forestDetrainmentBool"] = flowClass.useForestDetrainment(forestParams)
+
+    return modelConsts
+
+
+def initializePathArrays(nMax):
+    """initialize the arrays holding the path (visited cells) of one release cell
+
+    Parameters
+    -----------
+    nMax: int - initial number of cells (arrays grow if required)
+
+    Returns
+    -----------
+    path: dict
+        row, col: raster indices of the path cells
+        flux, zDelta: flux and z_delta of the path cells
+        minDistance, maxGamma, slGamma: travel length and travel angles of the path cells
+        isForest, forestIntCount: forest interaction info of the path cells
+        firstEdge, lastEdge: first and last parent edge of each cell (-1 if none)
+        edgeParent, edgeNext: parent cell of each edge and next edge of the same cell (-1 if none)
+        nCells, nEdges: number of cells and edges in use
+    """
+    path = {
+        "row": np.zeros(nMax, dtype=np.int64),
+        "col": np.zeros(nMax, dtype=np.int64),
+        "flux": np.zeros(nMax, dtype=np.float64),
+        "zDelta": np.zeros(nMax, dtype=np.float64),
+        "minDistance": np.zeros(nMax, dtype=np.float64),
+        "maxGamma": np.zeros(nMax, dtype=np.float64),
+        "slGamma": np.zeros(nMax, dtype=np.float64),
+        "isForest": np.zeros(nMax, dtype=np.int64),
+        "forestIntCount": np.zeros(nMax, dtype=np.int64),
+        "firstEdge": np.zeros(nMax, dtype=np.int64),
+        "lastEdge": np.zeros(nMax, dtype=np.int64),
+        "edgeParent": np.zeros(nMax, dtype=np.int64),
+        "edgeNext": np.zeros(nMax, dtype=np.int64),
+        "nCells": 0,
+        "nEdges": 0,
+    }
+    return path
+
+
+def growPathArrays(path, cellArrays=True):
+    """double the size of the cell arrays (cellArrays=True) or of the edge arrays of the path"""
+    if cellArrays:
+        keys = ["row", "col", "flux", "zDelta", "minDistance", "maxGamma", "slGamma", "isForest",
+                "forestIntCount", "firstEdge", "lastEdge"]
+    else:
+        keys = ["edgeParent", "edgeNext"]
+    for key in keys:
+        path[key] = np.concatenate((path[key], np.zeros_like(path[key])))
+    return path
+
+
+def appendPathCell(path, row, col, flux, z_delta, parent, forestArray, forestInteraction):
+    """append a cell to the path (parent=-1 for the start cell)"""
+    idx = path["nCells"]
+    if idx == len(path["row"]):
+        path = growPathArrays(path)
+    path["nCells"] = idx + 1
+    path["row"][idx] = row
+    path["col"][idx] = col
+    path["flux"][idx] = flux
+    path["zDelta"][idx] = z_delta
+    path["minDistance"][idx] = 0
+    path["maxGamma"][idx] = 0
+    path["slGamma"][idx] = 0
+    path["firstEdge"][idx] = -1
+    path["lastEdge"][idx] = -1
+    if forestInteraction:
+        path["isForest"][idx] = 1 if forestArray[row, col] > 0 else 0
+        path["forestIntCount"][idx] = path["isForest"][idx]
+        if parent >= 0:
+            path["forestIntCount"][idx] += path["forestIntCount"][parent]
+    if parent >= 0:
+        path = addPathEdge(path, idx, parent)
+    return path
+
+
+def addPathEdge(path, idx, parent):
+    """add parent to the (ordered) list of parents of the path cell idx"""
+    edge = path["nEdges"]
+    if edge == len(path["edgeParent"]):
+        path = growPathArrays(path, cellArrays=False)
+    path["nEdges"] = edge + 1
+    path["edgeParent"][edge] = parent
+    path["edgeNext"][edge] = -1
+    if path["firstEdge"][idx] < 0:
+        path["firstEdge"][idx] = edge
+    else:
+        path["edgeNext"][path["lastEdge"][idx]] = edge
+    path["lastEdge"][idx] = edge
+    return path
+
+
+def addPathParent(path, idx, parent, forestInteraction):
+    """add an additional parent to path cell idx (see flowClass.Cell.add_parent)"""
+    path = addPathEdge(path, idx, parent)
+    if forestInteraction:
+        # check if new/ younger parent has a lower forest interaction number
+        # than the older one -> take minimum!
+        if path["forestIntCount"][parent] < (path["forestIntCount"][idx] - path["isForest"][idx]):
+            path["forestIntCount"][idx] = path["forestIntCount"][parent] + path["isForest"][idx]
+    return path
+
+
+def getPathParents(path, idx):
+    """return the list of parents of path cell idx (in the order they were added)"""
+    parents = []
+    edge = path["firstEdge"][idx]
+    while edge >= 0:
+        parents.append(path["edgeParent"][edge])
+        edge = path["edgeNext"][edge]
+    return parents
+
+
+def backCalculationArrays(path, idx):
+    """return the indices of all path cells on the way from the start cell to the path cell idx
+    (see back_calculation())"""
+    backList = []
+    backSet = set()
+    for parent in getPathParents(path, idx):
+        if parent not in backSet:
+            backList.append(parent)
+            backSet.add(parent)
+    for cell in backList:
+        for parent in getPathParents(path, cell):
+            if parent not in backSet:
+                backList.append(parent)
+                backSet.add(parent)
+    return backList
+
+
+def calcDistributionArrays(path, idx, dem, startAltitude, forestArray, modelConsts):
+    """compute the flux distribution from path cell idx to its neighbours
+    same computation as flowClass.Cell.calc_distribution() (using the cell level functions of flowClass),
+    the travel angles, travel length
+    and flux (forest detrainment) of the cell are updated in path
+
+    Returns
+    -----------
+    row, col: raster indices of the neighbours receiving flux
+    flux, z_delta: flux and z_delta passed to these neighbours
+    """
+    rowindex = path["row"][idx]
+    colindex = path["col"][idx]
+    dem_ng = dem[rowindex - 1: rowindex + 2, colindex - 1: colindex + 2]
+    altitude = dem_ng[1, 1]
+    cellsize = modelConsts["cellsize"]
+    flux = path["flux"][idx]
+    z_delta = path["zDelta"][idx]
+    is_start = idx == 0
+    parents = getPathParents(path, idx)
+    if modelConsts["forestBool"]:
+        FSI = forestArray[rowindex, colindex]
+
+    # z_delta to the neighbours (see Cell.calc_z_delta)
+    z_gamma = altitude - dem_ng
+    _tanAlpha = modelConsts["tanAlpha"]
+    if modelConsts["forestBool"]:
+        forestModule = modelConsts["forestModule"]
+        if forestModule == "forestFrictionLayer":
+            AlphaFor = flowClass.forestFrictionLayerAlpha(modelConsts["alpha"], FSI,
+                                                          modelConsts["fFrLayerType"])
+            nSkipForestCells = modelConsts["nSkipForestCells"]
+            if (nSkipForestCells == 1) and (not is_start):
+                _tanAlpha = np.tan(np.deg2rad(AlphaFor))
+            elif (nSkipForestCells == 2) and (not is_start) and (0 not in parents):
+                _tanAlpha = np.tan(np.deg2rad(AlphaFor))
+        elif (forestModule == "forestFriction") or (forestModule == "forestDetrainment"):
+            if (FSI > 0.0) and (not is_start):
+                _alpha_calc = flowClass.forestFrictionAlpha(
+                    modelConsts["alpha"], FSI, z_delta,
+                    modelConsts["maxAddedFrictionForest"], modelConsts["minAddedFrictionForest"],
+                    modelConsts["noFricitonEffectZdelta"],
+                )
+                _tanAlpha = np.tan(np.deg2rad(_alpha_calc))
+    _, z_delta_neighbour = flowClass.calcZDeltaNeighbour(z_delta, z_gamma, cellsize, _tanAlpha,
+                                                         modelConsts["max_z_delta"])
+
+    # persistence (see Cell.calc_persistence)
+    persistence = np.zeros_like(dem_ng)
+    no_flow = np.ones_like(dem_ng)
+    if is_start:
+        persistence += 1
+    elif parents[0] == 0:
+        persistence += 1
+    else:
+        for parent in parents:
+            dx = path["col"][parent] - colindex
+            dy = path["row"][parent] - rowindex
+            no_flow[dy + 1, dx + 1] = 0
+            flowClass.addParentPersistence(persistence, dx, dy, path["zDelta"][parent])
+    persistence *= no_flow
+
+    # routing (see Cell.calc_tanbeta)
+    _, r_t = flowClass.calcTanBeta(altitude, dem_ng, cellsize, z_delta_neighbour, persistence,
+                                   modelConsts["exp"], np.zeros_like(dem_ng))
+
+    if not is_start:
+        forestDetrainment = modelConsts["forestBool"] and modelConsts["forestDetrainmentBool"]
+        if forestDetrainment:
+            detrainment = flowClass.forestDetrainment(
+                FSI, z_delta,
+                modelConsts["maxAddedDetrainmentForest"], modelConsts["minAddedDetrainmentForest"],
+                modelConsts["noDetrainmentEffectZdelta"],
+            )
+
+        # travel angle along the shortest flow path (see Cell.calc_fp_travelangle)
+        _ldistMin = []
+        _dh = startAltitude - altitude
+        for parent in parents:
+            _dx = abs(path["col"][parent] - colindex)
+            _dy = abs(path["row"][parent] - rowindex)
+            _ldistMin.append(flowClass.travelDistance(_dx, _dy, cellsize) + path["minDistance"][parent])
+        min_distance = np.amin(_ldistMin)
+        path["minDistance"][idx] = min_distance
+        path["maxGamma"][idx] = flowClass.travelAngle(_dh, min_distance)
+
+        # straight line travel angle (see Cell.calc_sl_travelangle)
+        _dx = abs(path["col"][0] - colindex)
+        _dy = abs(path["row"][0] - rowindex)
+        path["slGamma"][idx] = flowClass.travelAngle(_dh, flowClass.travelDistance(_dx, _dy, cellsize))
+
+        if forestDetrainment:
+            flux = max(0.0003, flux - detrainment)
+            path["flux"][idx] = flux
+
+    threshold = modelConsts["flux_threshold"]
+    dist = flowClass.distributeFlux(persistence, r_t, flux, threshold, np.zeros_like(dem_ng))
+
+    row_local, col_local = np.where(dist > threshold)
+
+    return (
+        rowindex - 1 + row_local,
+        colindex - 1 + col_local,
+        dist[row_local, col_local],
+        z_delta_neighbour[row_local, col_local],
+    )
+
+
 def enoughMemoryAvailable(limit=0.05):
     """simple function to monitor memory(RAM) availability during parallel processing
     of calculation() inside run(). utilizing psutil
@@ -3,10 +3,15 @@
 
 """
 
+import json
 import logging
+import pathlib
+import re
 
 import numpy as np
 
+import avaframe.in2Trans.ascUtilsCython as ascUtilsC
+
 # create local logger
 log = logging.getLogger(__name__)
 
@@ -26,6 +31,10 @@ def readASCheader(fname):
         information that is stored in header (ncols, nrows, xllcenter, yllcenter, nodata_value)
     """
 
+    # binary raster: header is saved in a json file next to the npy file
+    if pathlib.Path(fname).suffix == ".npy":
+        return readNpyHeader(fname)
+
     # read header
     headerRows = 6  # six rows for header information
     headerInfo = (
@@ -90,23 +99,50 @@ def isEqualASCheader(headerA, headerB):
     )
 
 
-def readASCdata2numpyArray(fName):
+def readASCdata2numpyArray(fName, chunkSize=2**24):
     """Read ascii matrix as numpy array
 
+    The data part is read and parsed in chunks of about chunkSize bytes. If the data can not be parsed this
+    way (e.g. comments, rows of different lengths), it is read with numpy.loadtxt
+
     Parameters
     -----------
 
     fname: str or pathlib object
         path to ascii file
+    chunkSize: int
+        approximate number of bytes read and parsed at once
 
     Returns
     --------
     -rasterdata : 2D numpy array
             2D numpy array of ascii matrix
     """
-    infile = open(fName, "r")
-    rasterdata = np.loadtxt(fName, skiprows=6)
-    infile.close()
+    # binary raster: saved with the rows from south to north
+    if pathlib.Path(fName).suffix == ".npy":
+        return np.flipud(np.asarray(np.load(fName, mmap_mode="c")))
+
+    chunks = []
+    with open(fName, "rb") as infile:
+        # skip the header
+        for _ in range(6):
+            infile.readline()
+        while True:
+            lines = infile.readlines(chunkSize)
+            if not lines:
+                break
+            chunk = ascUtilsC.parseAsciiRows(b"".join(lines))
+            if chunk is None or (len(chunks) > 0 and chunk.size > 0 and chunk.shape[1] != chunks[0].shape[1]):
+                chunks = []
+                break
+            if chunk.size > 0:
+                chunks.append(chunk)
+
+    if len(chunks) == 0:
+        rasterdata = np.loadtxt(fName, skiprows=6)
+    else:
+        # squeeze dimensions of length one like numpy.loadtxt
+        rasterdata = np.squeeze(np.concatenate(chunks, axis=0))
     return rasterdata
 
 
@@ -132,19 +168,122 @@ def readRaster(fname, noDataToNan=True):
 
     log.debug("Reading dem : %s", fname)
     header = readASCheader(fname)
-    rasterdata = readASCdata2numpyArray(fname)
+    if pathlib.Path(fname).suffix == ".npy":
+        # binary raster: memory mapped (copy on write), already with the rows from south to north
+        rasterdata = np.asarray(np.load(fname, mmap_mode="c"))
+    else:
+        rasterdata = np.flipud(readASCdata2numpyArray(fname))
+
+    data = {}
+    data["header"] = header
+    if noDataToNan:
+        noDataMask = rasterdata == header["nodata_value"]
+        if noDataMask.any():
+            rasterdata[noDataMask] = np.nan
+        data["header"]["nodata_value"] = np.nan
+    data["rasterData"] = rasterdata
+
+    return data
+
+
+def readRasterWindow(fname, rowStart, rowEnd, noDataToNan=True):
+    """Read the rows rowStart to rowEnd (excluded) of a raster file (.asc or .npy)
+
+    The rows are counted like in the rasterData returned by readRaster (first row is the southern row).
+    For npy files only these rows are read from disk, for asc files only these rows are parsed
+
+    Parameters
+    -----------
+    fname: str or pathlib object
+        path to raster file
+    rowStart: int
+        first row of the window
+    rowEnd: int
+        end of the window (row not included)
+    noDataToNan: bool
+        if True convert nodata_values to nan and set nodata_value to nan
+
+    Returns
+    --------
+    data: dict
+        -header: dict
+            header of the complete raster
+        -rasterData : 2D numpy array
+            rows rowStart to rowEnd of the raster
+    """
+
+    header = readASCheader(fname)
+    nRows = header["nrows"]
+    if pathlib.Path(fname).suffix == ".npy":
+        rasterdata = np.array(np.load(fname, mmap_mode="r")[rowStart:rowEnd], dtype=np.float64)
+    else:
+        rasterdata = None
+        with open(fname, "rb") as infile:
+            # skip the header and the rows north of the window (rows are saved from north to south)
+            for _ in range(6 + nRows - rowEnd):
+                infile.readline()
+            lines = [infile.readline() for _ in range(rowEnd - rowStart)]
+        chunk = ascUtilsC.parseAsciiRows(b"".join(lines))
+        if chunk is not None and chunk.shape == (rowEnd - rowStart, header["ncols"]):
+            rasterdata = np.flipud(chunk)
+        else:
+            # rows not saved one per line - read the complete raster
+            rasterdata = np.flipud(np.atleast_2d(readASCdata2numpyArray(fname)))[rowStart:rowEnd].copy()
 
     data = {}
     data["header"] = header
     if noDataToNan:
         rasterdata[rasterdata == header["nodata_value"]] = np.nan
         data["header"]["nodata_value"] = np.nan
-    data["rasterData"] = np.flipud(rasterdata)
+    data["rasterData"] = rasterdata
 
     return data
 
 
-def writeResultToAsc(header, resultArray, outFileName, flip=False):
+def readNpyHeader(fname):
+    """Read the header of a binary raster file (.npy) from the json file next to it
+
+    Parameters
+    -----------
+    fname: str or pathlib object
+        path to npy file
+
+    Returns
+    --------
+    headerInfo: dict
+        information that is stored in header (ncols, nrows, xllcenter, yllcenter, cellsize, nodata_value)
+    """
+    headerFile = pathlib.Path(fname).with_suffix(".json")
+    with open(headerFile, "r") as fileH:
+        headerInfo = json.load(fileH)
+    headerInfo["ncols"] = int(headerInfo["ncols"])
+    headerInfo["nrows"] = int(headerInfo["nrows"])
+
+    return headerInfo
+
+
+def listRasterFiles(inputDir, pattern="*"):
+    """List the raster files (.asc and binary .npy) of a directory matching the pattern
+
+    Parameters
+    -----------
+    inputDir: pathlib object
+        path to directory
+    pattern: str
+        glob pattern of the file names without suffix
+
+    Returns
+    --------
+    rasterFiles: list
+        list of paths of the raster files
+    """
+    inputDir = pathlib.Path(inputDir)
+    rasterFiles = list(inputDir.glob(pattern + ".asc")) + list(inputDir.glob(pattern + ".npy"))
+
+    return rasterFiles
+
+
+def writeResultToAsc(header, resultArray, outFileName, flip=False, fmt="%.16g"):
     """Write 2D array to an ascii file with header and save to location of outFileName
 
     Parameters
@@ -158,8 +297,15 @@ def writeResultToAsc(header, resultArray, outFileName, flip=False):
         path incl. name of file to be written
     flip: boolean
         if True, flip the rows of the resultArray when writing
+    fmt: str
+        format of the values, e.g. %.9g to write values with float32 precision or %.3f for a fixed
+        number of decimals - optional, default %.16g
     """
 
+    # formats %.<precision>g and %.<precision>f are written in chunks of rows with the cython formatter
+    fmtMatch = re.fullmatch(r"%\.(\d+)([gf])", fmt)
+    fastFormat = fmtMatch is not None and resultArray.dtype.kind in "fiub" and resultArray.ndim == 2
+
     # Open outfile
     with open(outFileName, "w") as outFile:
         # write the header and array values to file
@@ -171,11 +317,168 @@ def writeResultToAsc(header, resultArray, outFileName, flip=False):
         outFile.write("nodata_value %.2f\n" % header["nodata_value"])
 
         M = resultArray.shape[0]
-        for m in range(M):
-            if flip:
-                line = np.array([resultArray[M - m - 1, :]])
-            else:
-                line = np.array([resultArray[m, :]])
-            np.savetxt(outFile, line, fmt="%.16g")
+        if fastFormat:
+            precision = int(fmtMatch.group(1))
+            fmtType = fmtMatch.group(2)
+            # about 2**20 values per chunk
+            chunkRows = max(2**20 // max(resultArray.shape[1], 1), 1)
+            for m in range(0, M, chunkRows):
+                if flip:
+                    rows = resultArray[max(M - m - chunkRows, 0) : M - m][::-1]
+                else:
+                    rows = resultArray[m : m + chunkRows]
+                rows = np.ascontiguousarray(rows, dtype=np.float64)
+                outFile.write(ascUtilsC.formatAsciiRows(rows, precision, fmtType).decode("ascii"))
+        else:
+            for m in range(M):
+                if flip:
+                    line = np.array([resultArray[M - m - 1, :]])
+                else:
+                    line = np.array([resultArray[m, :]])
+                np.savetxt(outFile, line, fmt=fmt)
 
         outFile.close()
+
+
+def writeResultToNpy(header, resultArray, outFileName, flip=False, dtype="float64"):
+    """Write 2D array to a binary npy file and its header to a json file next to it
+
+    The rows are saved from south to north, i.e. like the rasterData returned by readRaster, so that the
+    file can be read memory mapped without copy. With float64 the file needs 8 bytes per cell,
+    with float32 4 bytes per cell (values rounded to about 7 significant digits)
+
+    Parameters
+    ----------
+    header : dict
+        header with cellsize, nrows, ncols, xllcenter, yllcenter, nodata_value
+    resultArray : 2D numpy array
+        2D numpy array of values that shall be written to file
+    outFileName : str or pathlib object
+        path incl. name of file to be written (suffix is set to .npy)
+    flip: boolean
+        same meaning as for writeResultToAsc: if True, the first row of resultArray is the southern row
+    dtype: str
+        data type of the saved values: float64 or float32
+    """
+
+    if dtype not in ["float64", "float32"]:
+        message = "Data type %s not supported for npy rasters - use float64 or float32" % dtype
+        log.error(message)
+        raise ValueError(message)
+    outFileName = setRasterSuffix(outFileName, ".npy")
+    if flip:
+        rasterData = resultArray
+    else:
+        rasterData = np.flipud(resultArray)
+    np.save(outFileName, np.ascontiguousarray(rasterData, dtype=dtype))
+    writeNpyHeader(header, outFileName)
+
+
+def createNpyRaster(header, outFileName):
+    """Create a binary npy raster file (and its json header) that can be filled row by row
+
+    Parameters
+    ----------
+    header : dict
+        header with cellsize, nrows, ncols, xllcenter, yllcenter, nodata_value
+    outFileName : str or pathlib object
+        path incl. name of file to be written (suffix is set to .npy)
+
+    Returns
+    --------
+    rasterData: numpy memmap
+        writeable memory mapped raster of shape (nrows, ncols), the first row is the southern row
+        (like the rasterData returned by readRaster)
+    """
+
+    outFileName = setRasterSuffix(outFileName, ".npy")
+    rasterData = np.lib.format.open_memmap(
+        outFileName, mode="w+", dtype=np.float64, shape=(int(header["nrows"]), int(header["ncols"]))
+    )
+    writeNpyHeader(header, outFileName)
+
+    return rasterData
+
+
+def writeNpyHeader(header, outFileName):
+    """Write the header of a binary npy raster to the json file next to it
+
+    Parameters
+    ----------
+    header : dict
+        header with cellsize, nrows, ncols, xllcenter, yllcenter, nodata_value
+    outFileName : pathlib object
+        path of the npy file
+    """
+
+    headerInfo = {}
+    for key in ["ncols", "nrows"]:
+        headerInfo[key] = int(header[key])
+    for key in ["xllcenter", "yllcenter", "cellsize", "nodata_value"]:
+        headerInfo[key] = float(header[key])
+    with open(outFileName.with_suffix(".json"), "w") as outFile:
+        json.dump(headerInfo, outFile)
+
+
+def writeResultToRaster(
+    header, resultArray, outFileName, flip=False, rasterFormat="asc", npyDtype="float64"
+):
+    """Write 2D array to a raster file in the desired format
+
+    Parameters
+    ----------
+    header : dict
+        header with cellsize, nrows, ncols, xllcenter, yllcenter, nodata_value
+    resultArray : 2D numpy array
+        2D numpy array of values that shall be written to file
+    outFileName : pathlib object
+        path incl. name of file to be written, the suffix is set according to rasterFormat
+    flip: boolean
+        if True, flip the rows of the resultArray when writing
+    rasterFormat: str
+        asc (ascii raster) or npy (binary numpy file with json header)
+    npyDtype: str
+        data type of the values in npy files: float64 or float32, see writeResultToNpy
+
+    Returns
+    --------
+    outFileName: pathlib object
+        path to the written file
+    """
+
+    if rasterFormat == "npy":
+        outFileName = setRasterSuffix(outFileName, ".npy")
+        writeResultToNpy(header, resultArray, outFileName, flip=flip, dtype=npyDtype)
+    elif rasterFormat == "asc":
+        outFileName = setRasterSuffix(outFileName, ".asc")
+        writeResultToAsc(header, resultArray, outFileName, flip=flip)
+    else:
+        message = "Raster format %s not supported - use asc or npy" % rasterFormat
+        log.error(message)
+        raise ValueError(message)
+
+    return outFileName
+
+
+def setRasterSuffix(fileName, suffix):
+    """Set the suffix of a raster file name (file names of time steps contain dots, e.g. _t1.50)
+
+    Parameters
+    ----------
+    fileName : str or pathlib object
+        path incl. name of the file, with or without .asc or .npy suffix
+    suffix: str
+        .asc or .npy
+
+    Returns
+    --------
+    fileName: pathlib object
+        path with the suffix
+    """
+    fileName = pathlib.Path(fileName)
+    if fileName.suffix in [".asc", ".npy"]:
+        fileName = fileName.with_suffix(suffix)
+    else:
+        fileName = fileName.parent / (fileName.name + suffix)
+
+    return fileName
@@ -0,0 +1,292 @@
+#!python
+# cython: boundscheck=False, wraparound=False, cdivision=True, linetrace=False, profile=False
+"""
+    functions to parse and format the data part of ascii raster files
+    to build: go to repository containing this file and run:
+    python setup.py build_ext --inplace
+"""
+
+# Load modules
+import logging
+import numpy as np
+cimport numpy as np
+from libc.stdlib cimport strtod, malloc, realloc, free
+from libc.stdio cimport snprintf
+from libc.math cimport fabs, floor, signbit
+from libc.stdint cimport uint64_t
+
+# create local logger
+# change log level in calling module to DEBUG to see log messages
+log = logging.getLogger(__name__)
+
+
+# powers of ten that are exactly represented as double
+cdef double[23] powersOfTen = [1e0, 1e1, 1e2, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9, 1e10, 1e11, 1e12, 1e13, 1e14,
+                               1e15, 1e16, 1e17, 1e18, 1e19, 1e20, 1e21, 1e22]
+
+
+cdef inline bint isSpace(char c) noexcept nogil:
+    return c == b' ' or c == b'\t' or c == b'\n' or c == b'\r' or c == b'\v' or c == b'\f'
+
+
+cdef const char *parseDouble(const char *p, double *value) noexcept nogil:
+    """ Parse one value starting at p (leading whitespaces are skipped)
+
+    Decimal numbers with a mantissa up to 2**53 and a power of ten up to 22 are exactly
+    represented by one multiplication or division of doubles (same result as strtod), other
+    values are parsed with strtod. Returns the end of the value (p if no value was found)
+    """
+    cdef const char *start
+    cdef const char *q
+    cdef char *strtodEnd
+    cdef uint64_t mantissa = 0
+    cdef int exp10 = 0
+    cdef int expValue = 0
+    cdef bint negative = False
+    cdef bint expNegative = False
+    cdef bint fastPath = True
+    cdef int nDigits = 0
+    cdef double result
+    while isSpace(p[0]):
+        p = p + 1
+    start = p
+    q = p
+    if q[0] == c'-' or q[0] == c'+':
+        negative = q[0] == c'-'
+        q = q + 1
+    while c'0' <= q[0] <= c'9':
+        if mantissa > 900719925474099ULL:
+            fastPath = False
+        else:
+            mantissa = 10 * mantissa + (q[0] - c'0')
+        nDigits = nDigits + 1
+        q = q + 1
+    if q[0] == c'.':
+        q = q + 1
+        while c'0' <= q[0] <= c'9':
+            if mantissa > 900719925474099ULL:
+                fastPath = False
+            else:
+                mantissa = 10 * mantissa + (q[0] - c'0')
+                exp10 = exp10 - 1
+            nDigits = nDigits + 1
+            q = q + 1
+    if nDigits == 0:
+        # no digits: nan, inf or not a number
+        fastPath = False
+    elif q[0] == c'e' or q[0] == c'E':
+        q = q + 1
+        if q[0] == c'-' or q[0] == c'+':
+            expNegative = q[0] == c'-'
+            q = q + 1
+        if not (c'0' <= q[0] <= c'9'):
+            fastPath = False
+        while c'0' <= q[0] <= c'9' and fastPath:
+            expValue = 10 * expValue + (q[0] - c'0')
+            if expValue > 400:
+                fastPath = False
+            q = q + 1
+        if expNegative:
+            exp10 = exp10 - expValue
+        else:
+            exp10 = exp10 + expValue
+    if mantissa > 9007199254740992ULL or exp10 > 22 or exp10 < -22:
+        fastPath = False
+    if not fastPath:
+        value[0] = strtod(start, &strtodEnd)
+        return strtodEnd
+    result = <double> mantissa
+    if exp10 < 0:
+        result = result / powersOfTen[-exp10]
+    else:
+        result = result * powersOfTen[exp10]
+    if negative:
+        result = -result
+    value[0] = result
+    return q
+
+
+cdef Py_ssize_t writeInteger(char *buf, double val) noexcept nogil:
+    """ Write the integer value val (absolute value smaller than 1e15) to buf, return the number of characters """
+    cdef char[20] digits
+    cdef Py_ssize_t nDigits = 0
+    cdef Py_ssize_t pos = 0
+    cdef uint64_t intValue = <uint64_t> fabs(val)
+    if signbit(val):
+        buf[0] = c'-'
+        pos = 1
+    while True:
+        digits[nDigits] = c'0' + <char> (intValue % 10)
+        intValue = intValue // 10
+        nDigits = nDigits + 1
+        if intValue == 0:
+            break
+    while nDigits > 0:
+        nDigits = nDigits - 1
+        buf[pos] = digits[nDigits]
+        pos = pos + 1
+    return pos
+
+
+def parseAsciiRows(bytes data):
+    """ Parse rows of whitespace separated numbers
+
+    Parameters
+    -----------
+    data: bytes
+        rows of the data part of an ascii file (complete lines)
+
+    Returns
+    --------
+    values: 2D numpy array
+        values (one row per non empty line), None if the rows do not have the same number of
+        values or if one of the values is not a number
+    """
+    cdef const char *buf = data
+    cdef Py_ssize_t nChar = len(data)
+    cdef Py_ssize_t i
+    cdef Py_ssize_t nRows = 0
+    cdef Py_ssize_t nCols = -1
+    cdef Py_ssize_t nInRow = 0
+    cdef bint inToken = False
+    cdef char c
+    cdef const char *tokenEnd
+    cdef const char *p
+    cdef double[:] valuesView
+    cdef bint irregular = False
+
+    # first pass: count values per row (without the gil so that files can be parsed in parallel threads)
+    with nogil:
+        for i in range(nChar):
+            c = buf[i]
+            if isSpace(c):
+                if inToken:
+                    nInRow = nInRow + 1
+                    inToken = False
+                if c == b'\n':
+                    if nInRow > 0:
+                        if nCols == -1:
+                            nCols = nInRow
+                        elif nInRow != nCols:
+                            irregular = True
+                            break
+                        nRows = nRows + 1
+                    nInRow = 0
+            else:
+                inToken = True
+        if inToken:
+            nInRow = nInRow + 1
+        if nInRow > 0 and not irregular:
+            if nCols == -1:
+                nCols = nInRow
+            elif nInRow != nCols:
+                irregular = True
+            nRows = nRows + 1
+    if irregular:
+        return None
+    if nRows == 0:
+        return np.zeros((0, 0))
+
+    # second pass: convert values
+    values = np.empty(nRows * nCols)
+    valuesView = values
+    p = buf
+    with nogil:
+        for i in range(nRows * nCols):
+            tokenEnd = parseDouble(p, &valuesView[i])
+            # the value has to be followed by a whitespace or by the end of the data
+            if tokenEnd == p or not (isSpace(tokenEnd[0]) or tokenEnd[0] == 0):
+                irregular = True
+                break
+            p = tokenEnd
+    if irregular:
+        return None
+
+    return values.reshape((nRows, nCols))
+
+
+def formatAsciiRows(double[:, :] values, int precision, str fmtType):
+    """ Format rows of values to whitespace separated text
+
+    Gives the same text as the python formatting "%.<precision><fmtType>" of each value
+
+    Parameters
+    -----------
+    values: 2D numpy array
+        values to format (one line per row)
+    precision: int
+        precision of the format
+    fmtType: str
+        g or f
+
+    Returns
+    --------
+    text: bytes
+        formatted rows, values separated by a space, rows ended by a newline
+    """
+    cdef Py_ssize_t nRows = values.shape[0]
+    cdef Py_ssize_t nCols = values.shape[1]
+    cdef Py_ssize_t i, j
+    cdef Py_ssize_t pos = 0
+    cdef Py_ssize_t bufSize
+    # maximal length of one value: sign, up to 309 digits before the point (f), point, digits, exponent (g)
+    cdef Py_ssize_t maxLength = precision + 320
+    cdef int n
+    cdef double val
+    cdef const char *fmt
+    cdef char *buf
+    cdef char *newBuf
+    # integers with less digits than the precision are written without exponent by the g format
+    cdef double integerLimit = 1e15
+    if fmtType == "g":
+        fmt = b"%.*g"
+        if precision < 15:
+            integerLimit = powersOfTen[precision] if precision > 0 else 0
+    elif fmtType == "f":
+        fmt = b"%.*f"
+    else:
+        raise ValueError("Format type %s not supported" % fmtType)
+
+    bufSize = nRows * nCols * (precision + 8) + nRows + maxLength
+    buf = <char *> malloc(bufSize * sizeof(char))
+    if buf == NULL:
+        raise MemoryError()
+    try:
+        for i in range(nRows):
+            for j in range(nCols):
+                # make sure there is space left for the separator, the value and the newline
+                if pos + maxLength + 2 > bufSize:
+                    bufSize = 2 * bufSize
+                    newBuf = <char *> realloc(buf, bufSize * sizeof(char))
+                    if newBuf == NULL:
+                        raise MemoryError()
+                    buf = newBuf
+                if j > 0:
+                    buf[pos] = b' '
+                    pos = pos + 1
+                val = values[i, j]
+                if val != val:
+                    # python writes nan without sign
+                    buf[pos] = b'n'
+                    buf[pos + 1] = b'a'
+                    buf[pos + 2] = b'n'
+                    pos = pos + 3
+                elif val == floor(val) and fabs(val) < integerLimit:
+                    # integer values (e.g. zeros) are written without snprintf
+                    pos = pos + writeInteger(buf + pos, val)
+                    if fmtType == "f" and precision > 0:
+                        buf[pos] = b'.'
+                        pos = pos + 1
+                        for n in range(precision):
+                            buf[pos] = b'0'
+                            pos = pos + 1
+                else:
+                    n = snprintf(buf + pos, bufSize - pos, fmt, precision, val)
+                    pos = pos + n
+            buf[pos] = b'\n'
+            pos = pos + 1
+        text = buf[:pos]
+    finally:
+        free(buf)
+
+    return text
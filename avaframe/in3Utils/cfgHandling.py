@@ -253,7 +253,7 @@ def fetchAndOrderSimFiles(avalancheDir, inputDir, varParList, ascendingOrder, sp
 
     if resFiles:
         # create dataframe for simulation results in inputDir
-        dataDF = fU.makeSimDF(inputDir)
+        dataDF = fU.makeSimDF(inputDir, useIndex=True)
         if isinstance(varParList, str):
             varParList = [varParList]
         # append 'simName' for merging of dataframes according to simNames
@@ -299,7 +299,7 @@ def orderSimFiles(avalancheDir, inputDir, varParList, ascendingOrder, specDir=""
 
     if resFiles:
         # create dataframe for simulation results in inputDir
-        dataDF = fU.makeSimDF(inputDir)
+        dataDF = fU.makeSimDF(inputDir, useIndex=True)
         # append 'simName' for merging of dataframes according to simNames
         columnNames = ["simName"] + varParList
         # merge varParList parameters as columns to dataDF for matching simNames
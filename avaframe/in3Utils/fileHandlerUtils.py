@@ -5,8 +5,10 @@
 # Load modules
 import os
 import glob
+import json
 import logging
 import pathlib
+import re
 import numpy as np
 import pandas as pd
 import shutil
@@ -489,10 +491,10 @@ def fetchFlowFields(flowFieldsDir, suffix=''):
         flowFieldsDir = pathlib.Path(flowFieldsDir)
 
     if suffix == '':
-        searchString = '*.asc'
+        searchString = '*'
     else:
-        searchString = '*%s*.asc' % suffix
-    flowFields = list(flowFieldsDir.glob(searchString))
+        searchString = '*%s*' % suffix
+    flowFields = IOf.listRasterFiles(flowFieldsDir, searchString)
 
     return flowFields
 
@@ -512,7 +514,7 @@ def fileNotFoundMessage(messageName):
 
 
 # ToDo Maybe try to use makeSimFromResDF instead of makeSimDF
-def makeSimDF(inputDir, avaDir='', simID='simID'):
+def makeSimDF(inputDir, avaDir='', simID='simID', useIndex=False):
     """ Create a  dataFrame that contains all info on simulations
 
         this can then be used to filter simulations for example
@@ -527,6 +529,9 @@ def makeSimDF(inputDir, avaDir='', simID='simID'):
             optional - simulation identification, depending on the computational module:
             com1DFA: simHash
             com1DFAOrig: Mu or parameter that has been used in parameter variation
+        useIndex : bool
+            optional - if True, the info of the result files is kept in an index file in inputDir
+            and only new or modified files are parsed (see updateResultFilesIndex)
 
         Returns
         -------
@@ -539,12 +544,17 @@ def makeSimDF(inputDir, avaDir='', simID='simID'):
     # Load input datasets from input directory
     if isinstance(inputDir, pathlib.Path) is False:
         inputDir = pathlib.Path(inputDir)
-    datafiles = list(inputDir.glob('*.asc'))
+    datafiles = IOf.listRasterFiles(inputDir)
 
-    # Sort datafiles by name
-    datafiles = sorted(datafiles)
+    # Sort datafiles by name (all in inputDir, same order as sorting the paths)
+    datafiles = sorted(datafiles, key=lambda dataFile: dataFile.name)
+
+    # fetch info from file names and headers
+    if useIndex:
+        fileInfos = updateResultFilesIndex(inputDir, datafiles)
+    else:
+        fileInfos = [getResultFileInfo(dataFile) for dataFile in datafiles]
 
-    # Set name of avalanche if avaDir is given
     # Make dictionary of input data info
     data = {'files': [], 'names': [], 'resType': [], 'simType': [], 'isDefault': [],
             'frictCalib': [], 'simName': [],
@@ -556,65 +566,13 @@ def makeSimDF(inputDir, avaDir='', simID='simID'):
         avaName = avaDir.name
         data.update({'avaName': []})
 
-    for m in range(len(datafiles)):
-        data['files'].append(datafiles[m])
-        name = datafiles[m].stem
-        data['names'].append(name)
-        if '_AF_' in name:
-            nameParts = name.split('_AF_')
-            fNamePart = nameParts[0] + '_AF'
-            relNameSim = nameParts[0]
-            infoParts = nameParts[1].split('_')
-
-        else:
-            nameParts = name.split('_')
-            fNamePart = nameParts[0]
-            relNameSim = nameParts[0]
-            infoParts = nameParts[1:]
-
-        data['releaseArea'].append(relNameSim)
-        data[simID].append(infoParts[0])
-
-        indiStr = ['_C_', '_D_']
-        if any(x in name for x in indiStr):
-            data['isDefault'].append(infoParts[1])
-            # now check for friction calibration info
-            frictIndi = ['_S_', '_M_', '_L_']
-            if any(x in name for x in frictIndi):
-                data['frictCalib'].append(infoParts[2])
-                j = 1  # j indicates whether there's an additional info
-            else:
-                data['frictCalib'].append(None)
-                j = 0
-
-            data['simType'].append(infoParts[2+j])
-            data['modelType'].append(infoParts[3+j])
-            data['resType'].append(infoParts[4+j])
-            data['simName'].append(fNamePart + '_' + ('_'.join(infoParts[0:(4+j)])))
-
-            header = IOf.readASCheader(datafiles[m])
-            data['cellSize'].append(header['cellsize'])
-            if len(infoParts) == (6+j):
-                data['timeStep'].append(infoParts[5+j])
-            else:
-                data['timeStep'].append('')
-
-        # If it still is an 'old' simname
-        # This can be removed at one point
-        else:
-            data['isDefault'].append(None)
-            data['frictCalib'].append(None)
-            data['simType'].append(infoParts[1])
-            data['modelType'].append(infoParts[2])
-            data['resType'].append(infoParts[3])
-            data['simName'].append(fNamePart + '_' + ('_'.join(infoParts[0:3])))
-
-            header = IOf.readASCheader(datafiles[m])
-            data['cellSize'].append(header['cellsize'])
-            if len(infoParts) == 5:
-                data['timeStep'].append(infoParts[4])
-            else:
-                data['timeStep'].append('')
+    for dataFile, fileInfo in zip(datafiles, fileInfos):
+        data['files'].append(dataFile)
+        for key in ['names', 'resType', 'simType', 'isDefault', 'frictCalib', 'simName', 'modelType',
+                    'releaseArea', 'timeStep']:
+            data[key].append(fileInfo[key])
+        data[simID].append(fileInfo['simID'])
+        data['cellSize'].append(fileInfo['header']['cellsize'])
 
         # Set name of avalanche if avaDir is given
         if avaDir != '':
@@ -625,6 +583,164 @@ def makeSimDF(inputDir, avaDir='', simID='simID'):
     return dataDF
 
 
+def getResultFileInfo(dataFile):
+    """ Get the simulation info of a result file from its name and its header
+
+        Parameters
+        ----------
+        dataFile : pathlib path
+            path to result file
+
+        Returns
+        -------
+        fileInfo : dict
+            file name (names), release area scenario, simID, isDefault, frictCalib, simulation type,
+            model type, result type, simulation name, time step and raster header
+    """
+
+    name = dataFile.stem
+    fileInfo = {'names': name}
+    if '_AF_' in name:
+        nameParts = name.split('_AF_')
+        fNamePart = nameParts[0] + '_AF'
+        relNameSim = nameParts[0]
+        infoParts = nameParts[1].split('_')
+
+    else:
+        nameParts = name.split('_')
+        fNamePart = nameParts[0]
+        relNameSim = nameParts[0]
+        infoParts = nameParts[1:]
+
+    fileInfo['releaseArea'] = relNameSim
+    fileInfo['simID'] = infoParts[0]
+
+    indiStr = ['_C_', '_D_']
+    if any(x in name for x in indiStr):
+        fileInfo['isDefault'] = infoParts[1]
+        # now check for friction calibration info
+        frictIndi = ['_S_', '_M_', '_L_']
+        if any(x in name for x in frictIndi):
+            fileInfo['frictCalib'] = infoParts[2]
+            j = 1  # j indicates whether there's an additional info
+        else:
+            fileInfo['frictCalib'] = None
+            j = 0
+
+        fileInfo['simType'] = infoParts[2+j]
+        fileInfo['modelType'] = infoParts[3+j]
+        fileInfo['resType'] = infoParts[4+j]
+        fileInfo['simName'] = fNamePart + '_' + ('_'.join(infoParts[0:(4+j)]))
+        if len(infoParts) == (6+j):
+            fileInfo['timeStep'] = infoParts[5+j]
+        else:
+            fileInfo['timeStep'] = ''
+
+    # If it still is an 'old' simname
+    # This can be removed at one point
+    else:
+        fileInfo['isDefault'] = None
+        fileInfo['frictCalib'] = None
+        fileInfo['simType'] = infoParts[1]
+        fileInfo['modelType'] = infoParts[2]
+        fileInfo['resType'] = infoParts[3]
+        fileInfo['simName'] = fNamePart + '_' + ('_'.join(infoParts[0:3]))
+        if len(infoParts) == 5:
+            fileInfo['timeStep'] = infoParts[4]
+        else:
+            fileInfo['timeStep'] = ''
+
+    fileInfo['header'] = IOf.readASCheader(dataFile)
+
+    return fileInfo
+
+
+def getProbMapInfo(probMapFile):
+    """ Get the probability configuration, result type and threshold of a probability map from its name
+
+        probability maps are named avaName_prob_probConf_peakVar_limPeakLim (see ana4Stats.probAna)
+
+        Parameters
+        ----------
+        probMapFile : str or pathlib path
+            path to probability map
+
+        Returns
+        -------
+        probMapInfo : dict
+            avaName, probConf, peakVar and peakLim (as string, as used in the file name)
+    """
+
+    name = pathlib.Path(probMapFile).stem
+    namePattern = r'(?P<avaName>.*)_prob_(?P<probConf>.*)_(?P<peakVar>[^_]+)_lim(?P<peakLim>[^_]+)'
+    nameMatch = re.fullmatch(namePattern, name)
+    if nameMatch is None:
+        message = '%s is not named like a probability map (avaName_prob_probConf_peakVar_limPeakLim)' % name
+        log.error(message)
+        raise ValueError(message)
+
+    return nameMatch.groupdict()
+
+
+def updateResultFilesIndex(inputDir, dataFiles):
+    """ Get the info of result files using the index file of their directory
+
+        The index file (resultFilesIndex.json in inputDir) holds the info (see getResultFileInfo), size and
+        modification time of each result file. Only files that are not in the index or whose size or
+        modification time changed are parsed and opened, the index is then updated (entries of files that
+        do not exist anymore are removed). If the index can not be written, the info is still returned
+
+        Parameters
+        ----------
+        inputDir : pathlib path
+            path to directory of the result files
+        dataFiles : list
+            paths to the result files in inputDir
+
+        Returns
+        -------
+        fileInfos : list
+            info dictionary of each result file (same order as dataFiles)
+    """
+
+    indexFile = inputDir / 'resultFilesIndex.json'
+    indexEntries = {}
+    if indexFile.is_file():
+        try:
+            with open(indexFile, 'r') as fi:
+                indexEntries = json.load(fi)['files']
+        except (OSError, ValueError, KeyError, TypeError):
+            log.warning('Index file %s could not be read - it is rebuilt' % indexFile)
+            indexEntries = {}
+
+    fileInfos = []
+    newEntries = {}
+    nUpdated = 0
+    for dataFile in dataFiles:
+        fileStat = dataFile.stat()
+        entry = indexEntries.get(dataFile.name)
+        if entry is None or entry['size'] != fileStat.st_size or entry['mtimeNs'] != fileStat.st_mtime_ns:
+            entry = {'size': fileStat.st_size, 'mtimeNs': fileStat.st_mtime_ns,
+                     'info': getResultFileInfo(dataFile)}
+            nUpdated = nUpdated + 1
+        newEntries[dataFile.name] = entry
+        fileInfos.append(entry['info'])
+
+    if nUpdated > 0 or len(newEntries) != len(indexEntries):
+        log.debug('Updating index file %s: %d new or modified result files' % (indexFile, nUpdated))
+        # write to a temporary file first so that the index is never read partially written
+        tmpFile = indexFile.with_name('%s.%d.tmp' % (indexFile.name, os.getpid()))
+        try:
+            with open(tmpFile, 'w') as fi:
+                json.dump({'files': newEntries}, fi)
+            os.replace(tmpFile, indexFile)
+        except OSError:
+            log.warning('Index file %s could not be written' % indexFile)
+            tmpFile.unlink(missing_ok=True)
+
+    return fileInfos
+
+
 def makeSimFromResDF(avaDir, comModule, inputDir='', simName=''):
     """ Create a  dataFrame that contains all info on simulations in output/comModule/peakFiles
 
@@ -665,10 +781,10 @@ def makeSimFromResDF(avaDir, comModule, inputDir='', simName=''):
 
     # Load input datasets from input directory
     if simName != '':
-        name = '*' + simName + '*.asc'
+        name = '*' + simName + '*'
     else:
-        name = '*.asc'
-    datafiles = list(inputDir.glob(name))
+        name = '*'
+    datafiles = IOf.listRasterFiles(inputDir, name)
 
     # build the result data frame
     resTypeListFromFiles = list(set([file.stem.split('_')[-1] for file in datafiles]))
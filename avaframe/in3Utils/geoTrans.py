@@ -1097,6 +1097,8 @@ def prepareArea(line, dem, radius, thList="", combine=True, checkOverlap=True):
     LengthRel = line["Length"]
     RasterList = []
 
+    # features are rasterized and combined one after the other, only within their bounding box window
+    Raster = np.zeros(np.shape(dem["rasterData"]))
     for i in range(len(NameRel)):
         name = NameRel[i]
         start = StartRel[i]
@@ -1106,23 +1108,24 @@ def prepareArea(line, dem, radius, thList="", combine=True, checkOverlap=True):
             "y": line["y"][int(start) : int(end)],
             "Name": name,
         }
+        maskWindow, window = polygon2RasterWindow(dem["originalHeader"], avapath, radius)
         # if relTh is given - set relTh
         if thList != "":
             log.info(
                 "%s feature %s, thickness: %.2f - read from %s"
                 % (line["type"], name, thList[i], line["thicknessSource"][i])
             )
-            Raster = polygon2Raster(dem["originalHeader"], avapath, radius, th=thList[i])
+            rast = np.where(maskWindow, thList[i], 0.0)
         else:
-            Raster = polygon2Raster(dem["originalHeader"], avapath, radius)
-        RasterList.append(Raster)
-
-    # if RasterList not empty check for overlap between features
-    Raster = np.zeros(np.shape(dem["rasterData"]))
-    for rast in RasterList:
-        ind1 = Raster > 0
-        ind2 = rast > 0
-        indMatch = np.logical_and(ind1, ind2)
+            rast = np.where(maskWindow, 1.0, 0.0)
+        if not combine:
+            rasterFull = np.zeros(np.shape(dem["rasterData"]))
+            rasterFull[window[0] : window[1], window[2] : window[3]] = rast
+            RasterList.append(rasterFull)
+
+        # check for overlap between features
+        RasterWindow = Raster[window[0] : window[1], window[2] : window[3]]
+        indMatch = np.logical_and(RasterWindow > 0, rast > 0)
         if indMatch.any():
             # if there is an overlap, raise error
             if checkOverlap:
@@ -1131,9 +1134,9 @@ def prepareArea(line, dem, radius, thList="", combine=True, checkOverlap=True):
                 raise AssertionError(message)
             else:
                 # if there is an overlap, take average of values for the overlapping cells
-                Raster = np.where(((Raster > 0) & (rast > 0)), (Raster + rast) / 2, Raster + rast)
+                RasterWindow[:] = np.where(indMatch, (RasterWindow + rast) / 2, RasterWindow + rast)
         else:
-            Raster = Raster + rast
+            RasterWindow += rast
 
     if combine:
         line["rasterData"] = Raster
@@ -1162,6 +1165,42 @@ def polygon2Raster(demHeader, Line, radius, th=""):
     Mask : 2D numpy array
         updated raster
     """
+    ncols = demHeader["ncols"]
+    nrows = demHeader["nrows"]
+    maskWindow, window = polygon2RasterWindow(demHeader, Line, radius)
+    Mask = np.zeros((nrows, ncols))
+    # thickness field is provided, then return array with ones
+    if th != "":
+        log.debug("REL set from dict, %.2f" % th)
+        Mask[window[0] : window[1], window[2] : window[3]] = np.where(maskWindow, th, 0.0)
+    else:
+        Mask[window[0] : window[1], window[2] : window[3]] = np.where(maskWindow, 1.0, 0.0)
+
+    return Mask
+
+
+def polygon2RasterWindow(demHeader, Line, radius):
+    """convert line to raster only within the bounding box of the polygon
+
+    Only the cells inside the bounding box of the polygon (extended to account for the radius tolerance)
+    can be inside the polygon, so only these cells are tested
+
+    Parameters
+    ----------
+    demHeader: dict
+        dem header dictionary
+    Line : dict
+        line dictionary
+    radius : float
+        include all cells which center is in the polygon or close enough
+
+    Returns
+    -------
+    maskWindow : 2D numpy array
+        boolean mask of the cells of the window that are in the polygon
+    window: tuple
+        (rowStart, rowEnd, colStart, colEnd) indices of the window in the raster
+    """
     # adim and center dem and polygon
     ncols = demHeader["ncols"]
     nrows = demHeader["nrows"]
@@ -1185,22 +1224,26 @@ def polygon2Raster(demHeader, Line, radius, th=""):
     # to decide if the radius should be positive or negative in contains_points
     is_ccw = isCounterClockWise(path)
     r = radius * is_ccw - radius * (1 - is_ccw)
-    x = np.linspace(0, ncols - 1, ncols)
-    y = np.linspace(0, nrows - 1, nrows)
+    # window of the cells to test: bounding box of the polygon extended by the maximal offset of the
+    # contour used by contains_points (miter joins reach at most 2*|r| from the polygon)
+    margin = 4 * abs(r) + 1
+    rowStart = min(max(int(np.floor(np.min(yCoord) - margin)), 0), nrows)
+    rowEnd = max(min(int(np.ceil(np.max(yCoord) + margin)) + 1, nrows), rowStart)
+    colStart = min(max(int(np.floor(np.min(xCoord) - margin)), 0), ncols)
+    colEnd = max(min(int(np.ceil(np.max(xCoord) + margin)) + 1, ncols), colStart)
+    x = np.arange(colStart, colEnd, dtype=float)
+    y = np.arange(rowStart, rowEnd, dtype=float)
     X, Y = np.meshgrid(x, y)
     X = X.flatten()
     Y = Y.flatten()
     points = np.stack((X, Y), axis=-1)
-    mask = path.contains_points(points, radius=r)
-    Mask = mask.reshape((nrows, ncols)).astype(int)
-    # thickness field is provided, then return array with ones
-    if th != "":
-        log.debug("REL set from dict, %.2f" % th)
-        Mask = np.where(Mask > 0, th, 0.0)
+    if len(points) > 0:
+        mask = path.contains_points(points, radius=r)
     else:
-        Mask = np.where(Mask > 0, 1.0, 0.0)
+        mask = np.zeros(0, dtype=bool)
+    maskWindow = mask.reshape((rowEnd - rowStart, colEnd - colStart))
 
-    return Mask
+    return maskWindow, (rowStart, rowEnd, colStart, colEnd)
 
 
 def checkParticlesInRelease(particles, line, radius):
@@ -1287,9 +1330,19 @@ def pointInPolygon(demHeader, points, Line, radius):
     # to decide if the radius should be positif or negatif in contains_points
     is_ccw = isCounterClockWise(path)
     r = radius * is_ccw - radius * (1 - is_ccw)
-    points2Check = np.stack((points["x"], points["y"]), axis=-1)
-    mask = path.contains_points(points2Check, radius=r)
-    mask = np.where(mask > 0, True, False)
+    # only the points within the bounding box of the polygon (extended by the maximal offset of the contour
+    # used by contains_points) can be in the polygon
+    margin = 4 * abs(r)
+    inBox = (
+        (points["x"] >= np.min(xCoord) - margin)
+        & (points["x"] <= np.max(xCoord) + margin)
+        & (points["y"] >= np.min(yCoord) - margin)
+        & (points["y"] <= np.max(yCoord) + margin)
+    )
+    mask = np.zeros(np.size(points["x"]), dtype=bool)
+    if inBox.any():
+        points2Check = np.stack((points["x"][inBox], points["y"][inBox]), axis=-1)
+        mask[inBox] = path.contains_points(points2Check, radius=r)
 
     return mask
 
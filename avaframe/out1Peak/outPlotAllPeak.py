@@ -20,7 +20,7 @@ import avaframe.in2Trans.ascUtils as IOf
 log = logging.getLogger(__name__)
 
 
-def plotAllPeakFields(avaDir, cfgFLAGS, modName, demData=""):
+def plotAllPeakFields(avaDir, cfgFLAGS, modName, demData="", simName=""):
     """Plot all peak fields and return dictionary with paths to plots
     with DEM in background
 
@@ -34,6 +34,8 @@ def plotAllPeakFields(avaDir, cfgFLAGS, modName, demData=""):
         name of module that has been used to produce data to be plotted
     demData: dictionary
         optional - if not the dem in the avaDir/Inputs folder has been used but a different one
+    simName: str
+        optional - only plot the peak fields of this simulation
 
     Returns
     -------
@@ -44,7 +46,9 @@ def plotAllPeakFields(avaDir, cfgFLAGS, modName, demData=""):
     # Load all infos on simulations
     avaDir = pathlib.Path(avaDir)
     inputDir = avaDir / "Outputs" / modName / "peakFiles"
-    peakFilesDF = fU.makeSimDF(inputDir, avaDir=avaDir)
+    peakFilesDF = fU.makeSimDF(inputDir, avaDir=avaDir, useIndex=True)
+    if simName != "":
+        peakFilesDF = peakFilesDF[peakFilesDF["simName"] == simName].reset_index(drop=True)
 
     if demData == "":
         demFile = gI.getDEMPath(avaDir)
@@ -208,7 +212,7 @@ def plotAllFields(avaDir, inputDir, outDir, unit="", constrainData=True):
     if outDir.is_dir() is False:
         # create out dir if not already existing
         outDir.mkdir()
-    peakFiles = list(inputDir.glob("*.asc"))
+    peakFiles = IOf.listRasterFiles(inputDir)
 
     # Loop through peakFiles and generate plot
     for filename in peakFiles:
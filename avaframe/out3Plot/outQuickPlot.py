@@ -622,7 +622,7 @@ def plotAllContours(avaDir, modName, resType, level, specDir=''):
         raise AssertionError(message)
 
     # fetch all files for resType (file format needs to be of type _resType.asc)
-    pFiles = list(inDir.glob('*_%s.asc' % resType))
+    pFiles = IOf.listRasterFiles(inDir, '*_%s' % resType)
 
     # loop over all pFiles and create contourLines dictionary
     contourDict = {}
@@ -309,11 +309,19 @@ def plotProbMap(avaDir, inDir, cfgFull, demPlot=False):
         # create figure and add title
         fig = plt.figure(figsize=(pU.figW*2, pU.figH))
 
+        # peak field parameter and threshold from the file name
+        probMapInfo = fU.getProbMapInfo(data)
+        peakVar = probMapInfo['peakVar']
+        peakLim = probMapInfo['peakLim']
+        if peakVar == cfgFull['GENERAL']['peakVar']:
+            unitPeakVar = cfgFull['GENERAL']['unit']
+        else:
+            unitPeakVar = pU.cfgPlotUtils['unit%s' % peakVar]
         fullTitle = '%s %s based on %s $>$ %s %s' % (avaName,
                                                      cfg['name'],
-                                                     cfgFull['GENERAL']['peakVar'],
-                                                     cfgFull['GENERAL']['peakLim'],
-                                                     cfgFull['GENERAL']['unit'])
+                                                     peakVar,
+                                                     peakLim,
+                                                     unitPeakVar)
         suptitle = fig.suptitle(fullTitle, fontsize=14, color='0.5')
         ax1 = fig.add_subplot(121)
 
@@ -63,7 +63,7 @@ def runRockAvalanche(avalancheDir=""):
     # Get peakfiles to return to QGIS
     avaDir = pathlib.Path(avalancheDir)
     inputDir = avaDir / "Outputs" / "com1DFA" / "peakFiles"
-    peakFilesDF = fU.makeSimDF(inputDir, avaDir=avaDir)
+    peakFilesDF = fU.makeSimDF(inputDir, avaDir=avaDir, useIndex=True)
 
     # Print time needed
     endTime = time.time()
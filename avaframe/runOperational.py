@@ -76,7 +76,7 @@ def runOperational(avalancheDir=''):
     # Get peakfiles to return to QGIS
     avaDir = pathlib.Path(avalancheDir)
     inputDir = avaDir / 'Outputs' / 'com1DFA' / 'peakFiles'
-    peakFilesDF = fU.makeSimDF(inputDir, avaDir=avaDir)
+    peakFilesDF = fU.makeSimDF(inputDir, avaDir=avaDir, useIndex=True)
 
     # Check if profile and splitpoint exist, and only run if available
     try:
@@ -68,17 +68,13 @@ def runProbAna(avalancheDir="", modName="com1DFA"):
     if anaPerformed is False:
         log.warning("No files found")
 
-    # make a plot of the contours
+    # make a plot of the contours (fetched for the first peakVar and peakLim)
     inputDir = pathlib.Path(avalancheDir, "Outputs", "ana4Stats")
-    outName = "%s_prob_%s_lim%s" % (
-        str(avalancheDir.stem),
-        cfgProb["GENERAL"]["peakVar"],
-        cfgProb["GENERAL"]["peakLim"],
-    )
-    pathDict = {"pathResult": str(inputDir / "plots"), "avaDir": str(avalancheDir), "plotScenario": outName}
-    oP.plotContours(
-        contourDict, cfgProb["GENERAL"]["peakVar"], cfgProb["GENERAL"]["peakLim"], pathDict, addLegend=False
-    )
+    contourVar, contourLim = probAna.fetchPeakVarLims(cfgProb["GENERAL"])[0]
+    if cfgProb["GENERAL"].getboolean("fetchContours"):
+        outName = "%s_prob_%s_lim%s" % (str(avalancheDir.stem), contourVar, contourLim)
+        pathDict = {"pathResult": str(inputDir / "plots"), "avaDir": str(avalancheDir), "plotScenario": outName}
+        oP.plotContours(contourDict, contourVar, contourLim, pathDict, addLegend=False)
 
     # plot probability maps
     sP.plotProbMap(avalancheDir, inputDir, cfgProb, demPlot=True)
@@ -0,0 +1,40 @@
+"""
+    Run script for computing per cell statistics (mean, variance, exceedance probabilities and quantiles)
+    over all com1DFA peak files of one result type
+"""
+
+# Load modules
+import pathlib
+
+# Local imports
+from avaframe.ana4Stats import getStats
+from avaframe.in3Utils import fileHandlerUtils as fU
+from avaframe.in3Utils import cfgUtils
+from avaframe.in3Utils import logUtils
+
+
+# log file name; leave empty to use default runLog.log
+logName = 'runEnsembleStats'
+modName = 'com1DFA'
+
+# Load general configuration file
+cfgMain = cfgUtils.getGeneralConfig()
+avaDir = cfgMain['MAIN']['avalancheDir']
+cfgStats = cfgUtils.getModuleConfig(getStats)
+peakVar = cfgStats['ENSEMBLESTATS']['peakVar']
+
+# set output directory
+outDir = pathlib.Path(avaDir, 'Outputs', 'ana4Stats')
+fU.makeADir(outDir)
+
+# Start logging
+log = logUtils.initiateLogger(outDir, logName)
+
+# fetch the peak files of the chosen result type
+inputDir = pathlib.Path(avaDir, 'Outputs', modName, 'peakFiles')
+peakFilesDF = fU.makeSimDF(inputDir, avaDir=avaDir, useIndex=True)
+peakFiles = list(peakFilesDF['files'][peakFilesDF['resType'] == peakVar])
+
+# compute the statistics
+outName = '%s_%s_ensemble' % (pathlib.Path(avaDir).name, peakVar)
+statFiles = getStats.computeEnsembleStats(peakFiles, cfgStats['ENSEMBLESTATS'], outDir, outName)
@@ -117,7 +117,7 @@ for i, simIndex in enumerate(SimDF.index):
     simName = SimDF['simName'].loc[simIndex]
 
     # fetch particle dicts from sim
-    particlesList, _ = particleTools.readPartFromPickle(inputDir,
+    particlesList, _ = particleTools.readParticles(inputDir,
         simName=SimDF['simName'].loc[simIndex], flagAvaDir=False, comModule=modName)
     #
     # add aimec (thalweg) s, l coordinates to particle dicts and save to pickle
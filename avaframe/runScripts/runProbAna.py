@@ -79,19 +79,19 @@ for avaDir in avalancheDirectories:
             log.warning('No files found for configuration: %s' % probConf)
 
 
-        # make a plot of the contours
+        # make a plot of the contours (fetched for the first peakVar and peakLim)
         inputDir = pathlib.Path(avaDir, 'Outputs', 'ana4Stats')
-        outName = '%s_prob_%s_%s_lim%s' % (str(avaDir.stem),
-                                           probConf,
-                                           cfgProb['GENERAL']['peakVar'],
-                                           cfgProb['GENERAL']['peakLim'])
-        pathDict = {'pathResult': str(inputDir / 'plots'),
-                    'avaDir': str(avaDir),
-                    'plotScenario': outName
-                    }
-        oP.plotContours(contourDict,
-                        cfgProb['GENERAL']['peakVar'],
-                        cfgProb['GENERAL']['peakLim'], pathDict)
+        contourVar, contourLim = probAna.fetchPeakVarLims(cfgProb['GENERAL'])[0]
+        if cfgProb['GENERAL'].getboolean('fetchContours'):
+            outName = '%s_prob_%s_%s_lim%s' % (str(avaDir.stem),
+                                               probConf,
+                                               contourVar,
+                                               contourLim)
+            pathDict = {'pathResult': str(inputDir / 'plots'),
+                        'avaDir': str(avaDir),
+                        'plotScenario': outName
+                        }
+            oP.plotContours(contourDict, contourVar, contourLim, pathDict)
 
     # plot probability maps
     sP.plotProbMap(avaDir, inputDir, cfgProb, demPlot=True)
@@ -1,6 +1,7 @@
 ""
 import numpy as np
 import math
+import copy
 import configparser
 import pytest
 import matplotlib.tri as tri
@@ -8,6 +9,9 @@ import matplotlib.tri as tri
 # Local imports
 import avaframe.com1DFA.DFAfunctionsCython as DFAfunC
 import avaframe.com1DFA.DFAtools as DFAtls
+import avaframe.com1DFA.com1DFA as com1DFA
+import avaframe.in3Utils.geoTrans as geoTrans
+from avaframe.in3Utils import cfgUtils
 
 
 def test_getNeighborsC(capfd):
@@ -78,6 +82,55 @@ def test_getNeighborsC(capfd):
     assert np.allclose(particles['partInCell'], pInC, atol=atol)
 
 
+def test_getNeighborsCIncremental():
+    """ Test that the incremental neighbour search update gives the same result as a full rebuild"""
+    header = {'ncols': 20, 'nrows': 15, 'cellsize': 5.}
+    dem = {'header': header, 'headerNeighbourGrid': header}
+    rng = np.random.default_rng(12345)
+    nPart = 500
+    particles = {'nPart': nPart, 'ID': np.arange(nPart)}
+    particles['x'] = rng.uniform(0., 95., nPart)
+    particles['y'] = rng.uniform(0., 70., nPart)
+    workspace = {}
+    particles = DFAfunC.getNeighborsC(particles, dem, workspace=workspace)
+    keys = ['indPartInCell', 'partInCell', 'inCellDEM', 'indXDEM', 'indYDEM', 'inCellNeighbour']
+    # move some particles (none, a few, all)
+    for nMove in [0, 10, nPart]:
+        indMove = rng.choice(nPart, nMove, replace=False)
+        particles['x'][indMove] = rng.uniform(0., 95., nMove)
+        particles['y'][indMove] = rng.uniform(0., 70., nMove)
+        partInCellOld = particles['partInCell']
+        particlesFull = DFAfunC.getNeighborsC(copy.deepcopy(particles), dem)
+        particles = DFAfunC.getNeighborsC(particles, dem, workspace=workspace)
+        # buffers are reused, the work buffers are reset
+        assert np.shares_memory(particles['partInCell'], partInCellOld)
+        assert np.sum(workspace['neighbourAffectedCells']) == 0
+        assert np.sum(workspace['neighbourCount']) == 0
+        for key in keys:
+            assert np.array_equal(particles[key], particlesFull[key])
+
+    # remove particles, the arrays from the previous call can not be reused
+    mask = np.ones(nPart, dtype=bool)
+    mask[::3] = False
+    for key in ['x', 'y', 'ID', 'partInCell', 'inCellNeighbour', 'inCellDEM', 'indXDEM', 'indYDEM']:
+        particles[key] = particles[key][mask]
+    particles['nPart'] = np.sum(mask)
+    particlesFull = DFAfunC.getNeighborsC(copy.deepcopy(particles), dem)
+    particles = DFAfunC.getNeighborsC(particles, dem, workspace=workspace)
+    for key in keys:
+        assert np.array_equal(particles[key], particlesFull[key])
+
+    # reorder particles, the arrays can not be reused either
+    newOrder = rng.permutation(particles['nPart'])
+    for key in ['x', 'y', 'ID']:
+        particles[key] = particles[key][newOrder]
+    particles['x'][:5] = particles['x'][:5] + 5.
+    particlesFull = DFAfunC.getNeighborsC(copy.deepcopy(particles), dem)
+    particles = DFAfunC.getNeighborsC(particles, dem, workspace=workspace)
+    for key in keys:
+        assert np.array_equal(particles[key], particlesFull[key])
+
+
 def test_computeEntMassAndForce(capfd):
     """ Test the computeEntMassAndForce function"""
     dt = 0.1
@@ -584,7 +637,8 @@ TODO: When calling pytest, the following function raises an error ("Fatal Python
 def test_updateFieldsC():
     cfg = configparser.ConfigParser()
     cfg['GENERAL'] = {'rho': '200.',
-                      'interpOption': '2'}
+                      'interpOption': '2',
+                      'nThreads': '1'}
     header = {}
     header['nrows'] = 5
     header['ncols'] = 5
@@ -637,3 +691,239 @@ def test_updateFieldsC():
     assert np.allclose(fields['dmDet'], dmDet_calculated2, atol=atol)
     print(fields['dmDet'])
     '''
+
+
+def test_computeForceCThreads():
+    """ test that computeForceC gives the same results for any number of threads """
+    cfg = cfgUtils.getModuleConfig(com1DFA, toPrint=False, onlyDefault=True)
+    cfgGen = cfg['GENERAL']
+    # inclined plane with entrainment in the lower part and resistance in the upper part
+    header = {'ncols': 40, 'nrows': 30, 'cellsize': 5., 'xllcenter': 0., 'yllcenter': 0., 'nodata_value': -9999}
+    xGrid, yGrid = np.meshgrid(np.arange(header['ncols']) * 5., np.arange(header['nrows']) * 5.)
+    dem = {'header': header, 'rasterData': -0.5 * xGrid}
+    dem = geoTrans.getNormalMesh(dem, num=1)
+    dem = DFAtls.getAreaMesh(dem, 1)
+    dem['outOfDEM'] = np.zeros(header['ncols'] * header['nrows'], dtype=bool)
+    rng = np.random.default_rng(12345)
+    nPart = 500
+    particles = {'nPart': nPart, 'dt': 0.1}
+    particles['x'] = rng.uniform(10., 180., nPart)
+    particles['y'] = rng.uniform(10., 135., nPart)
+    particles['z'] = -0.5 * particles['x']
+    particles['ux'] = rng.uniform(1., 10., nPart)
+    particles['uy'] = rng.uniform(-1., 1., nPart)
+    particles['uz'] = -0.5 * particles['ux']
+    particles['m'] = 500. * np.ones(nPart)
+    particles['h'] = np.ones(nPart)
+    particles['ID'] = np.arange(nPart)
+    particles['totalEnthalpy'] = np.zeros(nPart)
+    particles['indXDEM'] = np.round(particles['x'] / 5.).astype('intc')
+    particles['indYDEM'] = np.round(particles['y'] / 5.).astype('intc')
+    fields = {}
+    for key in ['Vx', 'Vy', 'Vz', 'entrEnthRaster', 'detRaster']:
+        fields[key] = np.zeros((header['nrows'], header['ncols']))
+    fields['entrMassRaster'] = np.where(xGrid > 100., 30., 0.)
+    fields['cResRaster'] = np.where(yGrid > 100., 0.003, 0.)
+
+    # work buffers filled with garbage (the kernel has to reset them)
+    workspace = com1DFA.initializeWorkspace(cfgGen, particles, {'computeTA': False}, dem)
+    for key in ['forceX', 'forceY', 'forceZ', 'forceFrict', 'dM', 'dMDet', 'gEff', 'curvAcc']:
+        workspace[key][:] = np.nan
+
+    results = []
+    for nThreads, ws in [('1', None), ('3', None), ('3', workspace)]:
+        cfgGen['nThreads'] = nThreads
+        particlesT, forceT, fieldsT = DFAfunC.computeForceC(cfgGen, copy.deepcopy(particles),
+                                                            copy.deepcopy(fields), dem, 1, workspace=ws)
+        results.append([particlesT, forceT, fieldsT])
+
+    # entrainment happened and entrained mass is removed from the entrainment raster
+    dM = results[0][1]['dM']
+    assert np.sum(dM) > 0
+    assert np.sum(fields['entrMassRaster'] * dem['areaRaster']) > np.sum(results[0][2]['entrMassRaster'] *
+                                                                         dem['areaRaster'])
+    for result in results[1:]:
+        for key in ['forceX', 'forceY', 'forceZ', 'forceFrict', 'dM', 'dMDet']:
+            assert np.array_equal(results[0][1][key], result[1][key])
+        for key in ['ux', 'uy', 'uz', 'm', 'gEff', 'curvAcc', 'dmDet']:
+            assert np.array_equal(results[0][0][key], result[0][key])
+        assert np.array_equal(results[0][2]['entrMassRaster'], result[2]['entrMassRaster'])
+
+
+def test_computeForceSPHCThreads():
+    """ test that the parallel SPH force matches the serial one """
+    cfg = cfgUtils.getModuleConfig(com1DFA, toPrint=False, onlyDefault=True)
+    cfgGen = cfg['GENERAL']
+    header = {'ncols': 30, 'nrows': 20, 'cellsize': 5., 'xllcenter': 0., 'yllcenter': 0., 'nodata_value': -9999}
+    xGrid, yGrid = np.meshgrid(np.arange(header['ncols']) * 5., np.arange(header['nrows']) * 5.)
+    dem = {'header': header, 'rasterData': -0.5 * xGrid + 0.01 * (yGrid - 50.)**2}
+    dem = geoTrans.getNormalMesh(dem, num=1)
+    dem['headerNeighbourGrid'] = {'ncols': 30, 'nrows': 20, 'cellsize': 5., 'xllcenter': 0., 'yllcenter': 0.}
+    rng = np.random.default_rng(12345)
+    nPart = 1000
+    particles = {'nPart': nPart}
+    particles['x'] = rng.uniform(5., 140., nPart)
+    particles['y'] = rng.uniform(5., 90., nPart)
+    particles['z'] = -0.5 * particles['x'] + 0.01 * (particles['y'] - 50.)**2
+    particles['ux'] = rng.uniform(0., 10., nPart)
+    # some particles are not moving
+    particles['ux'][::10] = 0
+    particles['uy'] = np.zeros(nPart)
+    particles['uz'] = -0.5 * particles['ux']
+    particles['m'] = rng.uniform(100., 500., nPart)
+    particles['h'] = rng.uniform(0.5, 2., nPart)
+    particles['gEff'] = 9.81 * np.ones(nPart)
+    particles = DFAfunC.getNeighborsC(particles, dem)
+
+    atol = 1e-10
+    for sphOption in [1, 2, 3]:
+        forces = []
+        for nThreads in ['1', '4']:
+            cfgGen['nThreads'] = nThreads
+            _, force = DFAfunC.computeForceSPHC(cfgGen, particles, {}, dem, sphOption, gradient=0)
+            forces.append(force)
+        assert np.max(np.abs(forces[0]['forceSPHX'])) > 0
+        for key in ['forceSPHX', 'forceSPHY', 'forceSPHZ']:
+            assert np.allclose(forces[0][key], forces[1][key], atol=atol, rtol=0)
+
+
+def test_updateFieldsCThreads():
+    """ test that the parallel particle to grid interpolation matches the serial one """
+    header = {'ncols': 30, 'nrows': 20, 'cellsize': 5., 'xllcenter': 0., 'yllcenter': 0., 'nodata_value': -9999}
+    dem = {'header': header, 'areaRaster': 25. * np.ones((header['nrows'], header['ncols'])),
+           'outOfDEM': np.zeros(header['nrows'] * header['ncols'], dtype=bool)}
+    rng = np.random.default_rng(12345)
+    nPart = 1000
+    particles = {'nPart': nPart}
+    particles['x'] = rng.uniform(5., 140., nPart)
+    particles['y'] = rng.uniform(5., 90., nPart)
+    particles['ux'] = rng.uniform(-10., 10., nPart)
+    particles['uy'] = rng.uniform(-10., 10., nPart)
+    particles['uz'] = rng.uniform(-10., 10., nPart)
+    particles['m'] = rng.uniform(100., 500., nPart)
+    particles['dmDet'] = rng.uniform(0., 1., nPart)
+    particles['trajectoryAngle'] = rng.uniform(0., 40., nPart)
+
+    results = []
+    for nThreads, withWorkspace in [('1', False), ('4', False), ('7', True)]:
+        cfg = configparser.ConfigParser()
+        cfg['GENERAL'] = {'rho': '200.', 'interpOption': '2', 'nThreads': nThreads}
+        fields = {'computeTA': True, 'computeKE': True, 'computeP': True}
+        workspace = None
+        if withWorkspace:
+            workspace = com1DFA.initializeWorkspace(cfg['GENERAL'], particles, fields, dem)
+        for key in ['pfv', 'ppr', 'pft', 'pta', 'pke', 'dmDet']:
+            fields[key] = np.zeros((header['nrows'], header['ncols']))
+        particlesOut, fields = DFAfunC.updateFieldsC(cfg['GENERAL'], copy.deepcopy(particles), dem, fields,
+                                                     workspace=workspace)
+        results.append((particlesOut, fields))
+
+    # mass is conserved
+    assert np.sum(results[0][1]['FM']) == pytest.approx(np.sum(particles['m']), rel=1e-12)
+    # the grid points are summed up in the same order whatever the number of threads
+    fieldKeys = ['FM', 'FV', 'FT', 'Vx', 'Vy', 'Vz', 'P', 'TA', 'pfv', 'ppr', 'pft', 'pta', 'pke', 'dmDet']
+    for result in results[1:]:
+        for key in fieldKeys:
+            assert np.array_equal(results[0][1][key], result[1][key])
+        assert np.array_equal(results[0][0]['h'], result[0]['h'])
+    # each particle is in the list of the bands it touches (at most two), in particle order
+    bandStart = workspace['bandStart']
+    bandParticles = workspace['bandParticles']
+    assert nPart < bandStart[7] < 2 * nPart
+    for band in range(7):
+        assert np.all(np.diff(bandParticles[bandStart[band]:bandStart[band + 1]]) > 0)
+
+
+def test_getRowBand():
+    """ test the band of rows of a grid row and the rows touched by a particle """
+    # 10 rows from row 3 in 4 bands of 3 rows
+    assert DFAfunC.getRowBand(3, 3, 13, 3, 4) == 0
+    assert DFAfunC.getRowBand(6, 3, 13, 3, 4) == 1
+    assert DFAfunC.getRowBand(12, 3, 13, 3, 4) == 3
+    # rows outside of the window are in the first or last band
+    assert DFAfunC.getRowBand(1, 3, 13, 3, 4) == 0
+    assert DFAfunC.getRowBand(20, 3, 13, 3, 4) == 3
+
+    assert DFAfunC.getParticleRows(4, 5, False) == (4, 5)
+    assert DFAfunC.getParticleRows(4, 5, True) == (4, 5)
+    assert DFAfunC.getParticleRows(4, 7, True) == (4, 7)
+
+
+def test_updateFieldsCWorkspace():
+    """ test that the work buffers give the same fields as freshly allocated grids """
+    header = {'ncols': 30, 'nrows': 20, 'cellsize': 5., 'xllcenter': 0., 'yllcenter': 0., 'nodata_value': -9999}
+    dem = {'header': header, 'areaRaster': 25. * np.ones((header['nrows'], header['ncols'])),
+           'outOfDEM': np.zeros(header['nrows'] * header['ncols'], dtype=bool)}
+    cfg = configparser.ConfigParser()
+    cfg['GENERAL'] = {'rho': '200.', 'interpOption': '2', 'nThreads': '2'}
+    rng = np.random.default_rng(12345)
+    nPart = 100
+    particles = {'nPart': nPart}
+    particles['ux'] = rng.uniform(-10., 10., nPart)
+    particles['uy'] = rng.uniform(-10., 10., nPart)
+    particles['uz'] = rng.uniform(-10., 10., nPart)
+    particles['m'] = rng.uniform(100., 500., nPart)
+    particles['dmDet'] = rng.uniform(0., 1., nPart)
+    particles['trajectoryAngle'] = rng.uniform(0., 40., nPart)
+    fields = {'computeTA': True, 'computeKE': True, 'computeP': True}
+    workspace = com1DFA.initializeWorkspace(cfg['GENERAL'], particles, fields, dem)
+    # the second call checks that the buffers are reset
+    for xMax in [140., 70.]:
+        particles['x'] = rng.uniform(5., xMax, nPart)
+        particles['y'] = rng.uniform(5., 90., nPart)
+        results = []
+        for ws in [None, workspace]:
+            fields = {'computeTA': True, 'computeKE': True, 'computeP': True}
+            for key in ['pfv', 'ppr', 'pft', 'pta', 'pke', 'dmDet']:
+                fields[key] = np.zeros((header['nrows'], header['ncols']))
+            particlesOut, fields = DFAfunC.updateFieldsC(cfg['GENERAL'], copy.deepcopy(particles), dem, fields,
+                                                         workspace=ws)
+            results.append((particlesOut, fields))
+        for key in ['FM', 'FV', 'FT', 'Vx', 'Vy', 'Vz', 'P', 'TA', 'pfv', 'ppr', 'pft', 'pta', 'pke', 'dmDet']:
+            assert np.array_equal(results[0][1][key], results[1][1][key])
+        assert np.array_equal(results[0][0]['h'], results[1][0]['h'])
+        # the particle buffers of the workspace are used
+        assert np.shares_memory(results[1][0]['h'], workspace['h'])
+        assert workspace['nPartMax'] == 151
+        # fill them with garbage for the next call
+        for key in ['Lx0', 'Ly0', 'indxTA', 'indyTA', 'weights', 'h']:
+            workspace[key][:] = -1
+
+
+def test_getActiveWindow():
+    """ test the window of cells touched by the particles """
+    xArray = np.array([12., 3., 27.])
+    yArray = np.array([8., 19., 11.])
+    window = DFAfunC.getActiveWindow(xArray, yArray, 8, 6, 5.)
+    assert window == (1, 5, 0, 7)
+    # the window is clipped to the grid
+    window = DFAfunC.getActiveWindow(xArray, yArray, 5, 4, 5.)
+    assert window == (1, 4, 0, 5)
+    assert DFAfunC.getActiveWindow(np.zeros(0), np.zeros(0), 8, 6, 5.) == (0, 0, 0, 0)
+
+    assert DFAfunC.mergeWindows((1, 5, 0, 6), (2, 7, 3, 9)) == (1, 7, 0, 9)
+    assert DFAfunC.mergeWindows((0, 0, 0, 0), (2, 7, 3, 9)) == (2, 7, 3, 9)
+    assert DFAfunC.mergeWindows((1, 5, 0, 6), (0, 0, 0, 0)) == (1, 5, 0, 6)
+
+    # fields of a shifted window are reset
+    header = {'ncols': 30, 'nrows': 20, 'cellsize': 5., 'xllcenter': 0., 'yllcenter': 0., 'nodata_value': -9999}
+    dem = {'header': header, 'areaRaster': 25. * np.ones((header['nrows'], header['ncols'])),
+           'outOfDEM': np.zeros(header['nrows'] * header['ncols'], dtype=bool)}
+    cfg = configparser.ConfigParser()
+    cfg['GENERAL'] = {'rho': '200.', 'interpOption': '2', 'nThreads': '1'}
+    nPart = 2
+    particles = {'nPart': nPart, 'ux': np.ones(nPart), 'uy': np.zeros(nPart), 'uz': np.zeros(nPart),
+                 'm': 100. * np.ones(nPart), 'dmDet': np.zeros(nPart), 'trajectoryAngle': np.zeros(nPart)}
+    fields = {'computeTA': False, 'computeKE': False, 'computeP': False}
+    for key in ['pfv', 'ppr', 'pft', 'pta', 'pke', 'dmDet']:
+        fields[key] = np.zeros((header['nrows'], header['ncols']))
+    workspace = com1DFA.initializeWorkspace(cfg['GENERAL'], particles, fields, dem)
+    for x0 in [20., 100.]:
+        particles['x'] = np.array([x0, x0 + 12.])
+        particles['y'] = np.array([50., 52.])
+        particles, fields = DFAfunC.updateFieldsC(cfg['GENERAL'], particles, dem, fields, workspace=workspace)
+    assert workspace['activeWindow'] == (10, 12, 20, 24)
+    assert workspace['updateWindow'] == (10, 12, 4, 24)
+    assert np.sum(fields['FM']) == pytest.approx(200.)
+    assert np.sum(fields['FM'][:, 20:24]) == pytest.approx(200.)
+    assert np.sum(fields['pft'][:, 4:8] > 0) > 0
@@ -1,5 +1,6 @@
 """Tests for module com2AB"""
 import avaframe.in2Trans.ascUtils as IOf
+import numpy as np
 import pathlib
 import pytest
 
@@ -36,3 +37,109 @@ def test_readASCdata2numpyArray(capfd):
 
     assert((data[0][0] == 1752.60) and (data[2][1] == 1749.10)
            and (data[0][3] == 1742.10))
+
+    # chunked reading gives the same data, a file that can not be parsed in chunks is read with loadtxt
+    dataChunks = IOf.readASCdata2numpyArray(DGMSource, chunkSize=1000)
+    assert np.array_equal(data, dataChunks)
+    assert np.array_equal(data, np.loadtxt(DGMSource, skiprows=6))
+
+
+def test_writeResultToAsc(tmp_path):
+    '''Test writing and reading back an ascii file'''
+    header = {'ncols': 4, 'nrows': 3, 'xllcenter': 1.0, 'yllcenter': 2.0, 'cellsize': 5.0,
+              'nodata_value': -9999}
+    values = np.array([[0., -0., 1.5, 1/3], [np.nan, np.inf, -2., 1.e22], [1.e-7, 123456789012.5, 7, -1.e300]])
+    outFile = tmp_path / 'test.asc'
+
+    # call function to be tested
+    IOf.writeResultToAsc(header, values, outFile, flip=True)
+
+    # same text as formatting each value with %.16g
+    lines = outFile.read_text().splitlines()
+    assert lines[0:6] == ['ncols 4', 'nrows 3', 'xllcenter 1.00', 'yllcenter 2.00', 'cellsize 5.00',
+                          'nodata_value -9999.00']
+    for line, row in zip(lines[6:], values[::-1]):
+        assert line == ' '.join(['%.16g' % value for value in row])
+    data = IOf.readRaster(outFile, noDataToNan=False)
+    assert np.array_equal(data['rasterData'], values, equal_nan=True)
+    assert data['header']['ncols'] == 4
+
+    # fixed precision and float32 precision
+    IOf.writeResultToAsc(header, values, outFile, fmt='%.3f')
+    assert outFile.read_text().splitlines()[6] == '0.000 -0.000 1.500 0.333'
+    valuesFloat32 = values.astype(np.float32)
+    IOf.writeResultToAsc(header, valuesFloat32, outFile, fmt='%.9g')
+    assert outFile.read_text().splitlines()[7] == 'nan inf -2 9.99999978e+21'
+    dataFloat32 = IOf.readASCdata2numpyArray(outFile).astype(np.float32)
+    assert np.array_equal(dataFloat32, valuesFloat32, equal_nan=True)
+
+
+def test_writeResultToNpy(tmp_path):
+    '''Test writing and reading back a binary raster'''
+    header = {'ncols': 4, 'nrows': 3, 'xllcenter': 1.0, 'yllcenter': 2.0, 'cellsize': 5.0,
+              'nodata_value': -9999}
+    values = np.array([[0., 1.5, -9999, 1/3], [4., 5., 6., 7.], [8., 9., 10., 11.]])
+    outFileAsc = tmp_path / 'test_t1.50.asc'
+
+    # call function to be tested
+    outFileNpy = IOf.writeResultToRaster(header, values, outFileAsc, flip=True, rasterFormat='npy')
+    IOf.writeResultToRaster(header, values, outFileAsc, flip=True)
+
+    assert outFileNpy == tmp_path / 'test_t1.50.npy'
+    assert outFileNpy.with_suffix('.json').is_file()
+    assert IOf.readASCheader(outFileNpy) == IOf.readASCheader(outFileAsc)
+    assert np.array_equal(IOf.readASCdata2numpyArray(outFileNpy), IOf.readASCdata2numpyArray(outFileAsc))
+    dataNpy = IOf.readRaster(outFileNpy, noDataToNan=True)
+    dataAsc = IOf.readRaster(outFileAsc, noDataToNan=True)
+    assert np.array_equal(dataNpy['rasterData'], dataAsc['rasterData'], equal_nan=True)
+    assert np.isnan(dataNpy['rasterData'][0, 2])
+    assert sorted(IOf.listRasterFiles(tmp_path)) == [outFileAsc, outFileNpy]
+    assert IOf.setRasterSuffix(pathlib.Path('a_t1.50'), '.npy') == pathlib.Path('a_t1.50.npy')
+    assert IOf.setRasterSuffix(pathlib.Path('a.asc'), '.npy') == pathlib.Path('a.npy')
+
+    with pytest.raises(ValueError) as e:
+        IOf.writeResultToRaster(header, values, outFileAsc, rasterFormat='tif')
+    assert 'tif' in str(e.value)
+
+    # single precision: half the size of the data
+    outFileNpy32 = IOf.writeResultToRaster(header, values, tmp_path / 'test32.asc', flip=True,
+                                           rasterFormat='npy', npyDtype='float32')
+    dataNpy32 = IOf.readRaster(outFileNpy32, noDataToNan=True)
+    assert dataNpy32['rasterData'].dtype == np.float32
+    assert np.allclose(dataNpy32['rasterData'], dataAsc['rasterData'], rtol=1.e-7, equal_nan=True)
+    assert not np.array_equal(dataNpy32['rasterData'], dataAsc['rasterData'], equal_nan=True)
+
+    with pytest.raises(ValueError) as e:
+        IOf.writeResultToRaster(header, values, outFileAsc, rasterFormat='npy', npyDtype='int32')
+    assert 'int32' in str(e.value)
+
+
+def test_readRasterWindow(tmp_path):
+    '''Test reading rows of a raster and creating a binary raster'''
+    header = {'ncols': 3, 'nrows': 5, 'xllcenter': 1.0, 'yllcenter': 2.0, 'cellsize': 5.0,
+              'nodata_value': -9999}
+    values = np.arange(15.).reshape((5, 3))
+    values[1, 2] = -9999
+    outFileAsc = tmp_path / 'test.asc'
+    outFileNpy = IOf.writeResultToRaster(header, values, outFileAsc, flip=True, rasterFormat='npy')
+    IOf.writeResultToRaster(header, values, outFileAsc, flip=True)
+    rasterData = IOf.readRaster(outFileAsc)['rasterData']
+    assert np.isnan(rasterData[1, 2])
+
+    # call function to be tested
+    for rowStart, rowEnd in [(0, 5), (0, 2), (1, 4), (4, 5)]:
+        for fName in [outFileAsc, outFileNpy]:
+            window = IOf.readRasterWindow(fName, rowStart, rowEnd)
+            assert np.array_equal(window['rasterData'], rasterData[rowStart:rowEnd], equal_nan=True)
+            assert window['header']['nrows'] == 5
+    assert np.isnan(IOf.readRasterWindow(outFileNpy, 1, 2)['rasterData'][0, 2])
+    assert IOf.readRasterWindow(outFileAsc, 1, 2, noDataToNan=False)['rasterData'][0, 2] == -9999
+
+    # create a binary raster and fill it row by row
+    newFile = tmp_path / 'new.npy'
+    raster = IOf.createNpyRaster(header, newFile)
+    for row in range(5):
+        raster[row] = values[row]
+    raster.flush()
+    assert IOf.readASCheader(newFile) == IOf.readASCheader(outFileNpy)
+    assert np.array_equal(IOf.readRaster(newFile, noDataToNan=False)['rasterData'], values)
@@ -6,6 +6,7 @@ import pytest
 import configparser
 import logging
 import os
+import shutil
 
 from avaframe.in3Utils import cfgUtils
 from avaframe.in3Utils import cfgHandling
@@ -48,12 +49,14 @@ def test_orderSimFiles():
     assert message in str(e.value)
 
 
-def test_fetchAndOrderSimFiles():
+def test_fetchAndOrderSimFiles(tmp_path):
     """test generating order of simulation results"""
 
     avaTestDir = "avaHockeyChannelPytest"
     dirPath = pathlib.Path(__file__).parents[0]
-    avaDir = dirPath / ".." / ".." / "benchmarks" / avaTestDir
+    # work on a copy, an index of the result files is written to the peakFiles directory
+    avaDir = tmp_path / avaTestDir
+    shutil.copytree(dirPath / ".." / ".." / "benchmarks" / avaTestDir, avaDir)
     inputDir = avaDir / "Outputs" / "com1DFA" / "peakFiles"
 
     varParList = "releaseScenario"
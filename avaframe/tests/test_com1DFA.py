@@ -17,6 +17,7 @@ import avaframe.in2Trans.ascUtils as IOf
 import avaframe.in3Utils.fileHandlerUtils as fU
 import avaframe.in3Utils.initializeProject as initProj
 from avaframe.com1DFA import com1DFA
+from avaframe.com1DFA import particleTools
 from avaframe.in3Utils import cfgUtils
 
 
@@ -987,6 +988,7 @@ def test_releaseSecRelArea():
         "gravAcc": "9.81",
         "massPerParticleDeterminationMethod": "MPPDH",
         "interpOption": "2",
+        "nThreads": "1",
         "sphKernelRadius": "1",
         "deltaTh": "0.25",
         "seed": "12345",
@@ -1138,6 +1140,7 @@ def test_initializeParticles():
         "gravAcc": "9.81",
         "massPerParticleDeterminationMethod": "MPPDH",
         "interpOption": "2",
+        "nThreads": "1",
         "sphKernelRadius": "1",
         "deltaTh": "0.25",
         "seed": "12345",
@@ -1219,6 +1222,7 @@ def test_initializeParticles():
         "indYDEM",
         "indPartInCell",
         "partInCell",
+        "inCellNeighbour",
         "secondaryReleaseInfo",
         "iterate",
         "idFixed",
@@ -1439,6 +1443,7 @@ def test_exportFields(tmp_path):
     cfg = configparser.ConfigParser()
     cfg["GENERAL"] = {"resType": "ppr|pft|FT"}
     cfg["REPORT"] = {"plotFields": "ppr|pft|pfv|pke"}
+    cfg["EXPORTS"] = {"rasterFormat": "asc", "npyDtype": "float64"}
     Tsave = [0, 10, 15, 25, 40]
     demHeader = {}
     demHeader["cellsize"] = 1
@@ -1510,6 +1515,140 @@ def test_exportFields(tmp_path):
 
     assert len(fieldsListTest2) == 6
 
+    # call function to be tested: binary raster format
+    outDir3 = pathlib.Path(tmp_path, "testDir3")
+    outDir3.mkdir()
+    cfg["EXPORTS"]["rasterFormat"] = "npy"
+    com1DFA.exportFields(cfg, Tsave, fieldsList, dem, outDir3, logName)
+
+    fieldDirTSteps = outDir3 / "peakFiles" / "timeSteps"
+    assert len(list(fieldDirTSteps.glob("*.npy"))) == 6
+    assert len(list(fieldDirTSteps.glob("*.json"))) == 6
+    assert len(list(fieldDirTSteps.glob("*.asc"))) == 0
+    fieldNpy = IOf.readRaster(outDir3 / "peakFiles" / "simNameTest_ppr.npy")
+    fieldAsc = IOf.readRaster(outDir2 / "peakFiles" / "simNameTest_ppr.asc")
+    assert np.array_equal(fieldNpy["rasterData"], fieldAsc["rasterData"])
+    assert fieldNpy["header"] == fieldAsc["header"]
+    fieldsListRead, fieldHeader, timeList = com1DFA.readFields(fieldDirTSteps, ["pft"], flagAvaDir=False)
+    assert timeList == [0.0, 40.0]
+    assert np.array_equal(fieldsListRead[1]["pft"], pft + 6)
+
+    # call function to be tested: binary raster format with single precision
+    outDir4 = pathlib.Path(tmp_path, "testDir4")
+    outDir4.mkdir()
+    cfg["EXPORTS"]["npyDtype"] = "float32"
+    com1DFA.exportFields(cfg, Tsave, fieldsList, dem, outDir4, logName)
+
+    fieldNpy32 = IOf.readRaster(outDir4 / "peakFiles" / "simNameTest_ppr.npy")
+    assert fieldNpy32["rasterData"].dtype == np.float32
+    assert np.allclose(fieldNpy32["rasterData"], fieldAsc["rasterData"], rtol=1.0e-6)
+    assert fieldNpy32["header"] == fieldAsc["header"]
+
+
+def test_resultWriter(tmp_path):
+    """test writing the saved time steps with the background result writer"""
+
+    # setup required input
+    cfg = configparser.ConfigParser()
+    cfg["GENERAL"] = {"resType": "ppr|pft|FT"}
+    cfg["REPORT"] = {"plotFields": "ppr|pft|pfv|pke"}
+    cfg["EXPORTS"] = {
+        "exportData": "True",
+        "particleFormat": "pickle",
+        "rasterFormat": "asc",
+        "npyDtype": "float64",
+    }
+    cfg["VISUALISATION"] = {"writePartToCSV": "True", "visuParticleProperties": "m"}
+    Tsave = [0, 10, 15, 25, 40]
+    demHeader = {
+        "cellsize": 1,
+        "ncols": 5,
+        "nrows": 5,
+        "xllcenter": 0,
+        "yllcenter": 0,
+        "nodata_value": -9999,
+    }
+    dem = {"originalHeader": demHeader, "areaRaster": np.ones((5, 5))}
+    logName = "simNameTest"
+    fieldsList = []
+    particlesList = []
+    for count, timeStep in enumerate(Tsave):
+        fieldsList.append({resType: np.zeros((5, 5)) + count + 1 for resType in ["ppr", "pft", "pfv", "FT"]})
+        fieldsList[-1]["pke"] = np.zeros((5, 5)) + count + 1
+        particlesList.append(
+            {
+                "t": timeStep,
+                "simName": logName,
+                "x": np.arange(3.0),
+                "y": np.arange(3.0),
+                "z": np.arange(3.0),
+                "m": np.ones(3) * count,
+                "xllcenter": 0,
+                "yllcenter": 0,
+            }
+        )
+
+    # reference: export everything at the end
+    outDir = pathlib.Path(tmp_path, "testDir")
+    outDir.mkdir()
+    com1DFA.exportFields(cfg, Tsave, fieldsList, dem, outDir, logName)
+
+    # call function to be tested (particles only saved for first and last time step)
+    outDir2 = pathlib.Path(tmp_path, "testDir2")
+    outDir2.mkdir()
+    resultWriter = com1DFA.startResultWriter(cfg, dem, outDir2, logName)
+    for count, timeStep in enumerate(Tsave):
+        if count == 0 or count == len(Tsave) - 1:
+            particlesSave = [particlesList[count]]
+        else:
+            particlesSave = []
+        com1DFA.queueResultTimeStep(
+            resultWriter, timeStep, fieldsList[count], particlesSave, final=(count == len(Tsave) - 1)
+        )
+    com1DFA.stopResultWriter(resultWriter)
+
+    fieldFiles = sorted([f.relative_to(outDir) for f in outDir.rglob("*.asc")])
+    fieldFiles2 = sorted([f.relative_to(outDir2) for f in outDir2.rglob("*.asc")])
+    assert fieldFiles == fieldFiles2
+    assert len(fieldFiles) == 24
+    for fieldFile in fieldFiles:
+        field = np.loadtxt(outDir / fieldFile, skiprows=6)
+        field2 = np.loadtxt(outDir2 / fieldFile, skiprows=6)
+        assert np.array_equal(field, field2)
+
+    partFiles = sorted((outDir2 / "particles").glob("*.pickle"))
+    assert [f.name for f in partFiles] == [
+        "particles_simNameTest_0000.0000.pickle",
+        "particles_simNameTest_0040.0000.pickle",
+    ]
+    particlesRead = pickle.load(open(partFiles[-1], "rb"))
+    assert np.array_equal(particlesRead["m"], particlesList[-1]["m"])
+    assert (outDir2 / "particlesCSV" / "particlessimNameTest.csv.0001").is_file()
+
+    # an error in the writer thread is raised when stopping the writer
+    resultWriter = com1DFA.startResultWriter(cfg, dem, outDir2, logName)
+    com1DFA.queueResultTimeStep(resultWriter, 0, {}, [], final=True)
+    with pytest.raises(KeyError):
+        com1DFA.stopResultWriter(resultWriter)
+
+    # if the simulation failed, the writer is stopped without raising its error
+    resultWriter = com1DFA.startResultWriter(cfg, dem, outDir2, logName)
+    com1DFA.queueResultTimeStep(resultWriter, 0, {}, [], final=True)
+    com1DFA.stopResultWriter(resultWriter, discard=True)
+    assert not resultWriter["thread"].is_alive()
+
+    # and the incomplete columnar particle store is removed
+    cfg["EXPORTS"]["particleFormat"] = "columnar"
+    outDir3 = pathlib.Path(tmp_path, "testDir3")
+    outDir3.mkdir()
+    resultWriter = com1DFA.startResultWriter(cfg, dem, outDir3, logName)
+    particles = dict(particlesList[0], nPart=3)
+    com1DFA.queueResultTimeStep(resultWriter, 0, fieldsList[0], [particles], final=False)
+    storeDir = resultWriter["particleStore"]["storeDir"]
+    com1DFA.stopResultWriter(resultWriter, discard=True)
+    assert not resultWriter["thread"].is_alive()
+    assert not storeDir.is_dir()
+
 
 def test_initializeFields():
     """test initializing fieldgetSimTypeLists"""
@@ -1531,7 +1670,7 @@ def test_initializeFields():
     }
     cfg = configparser.ConfigParser()
     cfg["REPORT"] = {"plotFields": "ppr|pft|pfv"}
-    cfg["GENERAL"] = {"rho": "200.", "interpOption": "2", "resType": "ppr|pft|pfv"}
+    cfg["GENERAL"] = {"rho": "200.", "interpOption": "2", "nThreads": "1", "resType": "ppr|pft|pfv"}
 
     dem["originalHeader"] = dem["header"]
     dem["header"]["xllcenter"] = 0.0
@@ -1565,7 +1704,7 @@ def test_initializeFields():
     assert np.sum(fields["dmDet"]) == 0.0
 
     cfg["REPORT"] = {"plotFields": "pft|pfv"}
-    cfg["GENERAL"] = {"resType": "pke|pta|pft|pfv", "rho": "200.", "interpOption": "2"}
+    cfg["GENERAL"] = {"resType": "pke|pta|pft|pfv", "rho": "200.", "interpOption": "2", "nThreads": "1"}
     # call function to be tested
     particles, fields = com1DFA.initializeFields(cfg, dem, particles, "")
     assert len(fields) == 17
@@ -1574,6 +1713,40 @@ def test_initializeFields():
     assert fields["computeP"] is False
 
 
+def test_initializeWorkspace():
+    """test initializing and growing the work buffers"""
+    demHeader = {"nrows": 11, "ncols": 12, "cellsize": 1}
+    dem = {"header": demHeader, "outOfDEM": np.zeros(11 * 12, dtype=bool)}
+    cfg = configparser.ConfigParser()
+    cfg["GENERAL"] = {"nThreads": "2"}
+    particles = {"nPart": 10}
+    fields = {"computeTA": False}
+
+    workspace = com1DFA.initializeWorkspace(cfg["GENERAL"], particles, fields, dem)
+    assert workspace["nPartMax"] == 16
+    assert np.shape(workspace["forceX"]) == (16,)
+    assert np.shape(workspace["dMDet"]) == (16,)
+    assert np.shape(workspace["curvAcc"]) == (16,)
+    assert np.shape(workspace["h"]) == (16,)
+    assert workspace["Ly0"].dtype == np.intc
+    assert np.shape(workspace["weights"]) == (16, 4)
+    assert np.shape(workspace["FM"]) == (11, 12)
+    assert np.shape(workspace["TA"]) == (11, 12)
+    assert np.shape(workspace["FT"]) == (11, 12)
+    assert workspace["outOfDEM"].dtype == np.uint8
+
+    # enough room, nothing changes
+    forceX = workspace["forceX"]
+    workspace = com1DFA.updateWorkspace(workspace, 16)
+    assert workspace["forceX"] is forceX
+    # more particles, buffers are reallocated
+    workspace = com1DFA.updateWorkspace(workspace, 20)
+    assert workspace["nPartMax"] == 31
+    assert np.shape(workspace["forceSPHZ"]) == (31,)
+    assert np.shape(workspace["gEff"]) == (31,)
+    assert np.shape(workspace["weights"]) == (31, 4)
+
+
 def test_prepareVarSimDict(tmp_path, caplog):
     """test prepare variation sim dictionary"""
 
@@ -1812,6 +1985,7 @@ def test_initializeSimulation(tmp_path):
         "gravAcc": "9.81",
         "massPerParticleDeterminationMethod": "MPPDH",
         "interpOption": "2",
+        "nThreads": "1",
         "sphKernelRadius": "1",
         "deltaTh": "0.25",
         "seed": "12345",
@@ -2000,6 +2174,7 @@ def test_runCom1DFA(tmp_path, caplog):
         "indYDEM",
         "indPartInCell",
         "partInCell",
+        "inCellNeighbour",
         "secondaryReleaseInfo",
         "iterate",
         "velocityMag",
@@ -2174,4 +2349,324 @@ def test_fetchRelVolume(tmp_path):
     # call function
     relVolume = com1DFA.fetchRelVolume(rel1, cfg, demPath, None)
 
-    assert relVolume == 38.0
\ No newline at end of file
+    assert relVolume == 38.0
+
+
+def test_addMaxValuesToDF():
+    """test that the max values found in the updated window are the max values of the fields"""
+
+    # setup required input
+    resTypes = ["pft", "FT", "Vx", "dmDet", "particles"]
+    resultsDF = com1DFA.setupresultsDF(resTypes, False)
+    resultsDFWindow = com1DFA.setupresultsDF(resTypes, False)
+    fields = {key: np.zeros((10, 12)) for key in ["pft", "FT", "Vx", "dmDet"]}
+    windows = [(0, 10, 0, 12), (2, 5, 3, 6), (6, 9, 7, 10), (0, 0, 0, 0)]
+    for timeStep, window in enumerate(windows):
+        for key in ["FT", "Vx"]:
+            fields[key] = np.zeros((10, 12))
+        jStart, jEnd, iStart, iEnd = window
+        if jEnd > jStart:
+            fields["FT"][jStart + 1, iStart + 1] = 3.0 - timeStep
+            fields["Vx"][jStart + 1, iStart + 1] = -2.0
+            fields["pft"] = np.maximum(fields["pft"], fields["FT"])
+            fields["dmDet"][jStart + 1, iStart + 1] = 1.0 + timeStep
+
+        # call function to be tested
+        resultsDF = com1DFA.addMaxValuesToDF(resultsDF, fields, float(timeStep + 1), resTypes)
+        resultsDFWindow = com1DFA.addMaxValuesToDF(
+            resultsDFWindow, fields, float(timeStep + 1), resTypes, window=window
+        )
+
+    assert resultsDF.equals(resultsDFWindow)
+    assert resultsDFWindow["maxpft"].tolist() == [0.0, 3.0, 3.0, 3.0, 3.0]
+    assert resultsDFWindow["maxFT"].tolist() == [0.0, 3.0, 2.0, 1.0, 0.0]
+    assert resultsDFWindow["maxVx"].tolist() == [0.0, 0.0, 0.0, 0.0, 0.0]
+
+
+def test_writeReadCheckpoint(tmp_path):
+    """test writing and reading the checkpoint of a simulation"""
+
+    # setup required input
+    avaDir = tmp_path / "avaTest"
+    checkpointState = {
+        "particles": {"nPart": 2, "x": np.array([1.0, 2.0])},
+        "Tsave": [0, 1.0],
+        "t": 1.6,
+        "dt": 0.1,
+    }
+
+    # call function to be tested
+    assert com1DFA.readCheckpoint(avaDir, "abc123") is None
+    com1DFA.writeCheckpoint(checkpointState, avaDir, "abc123")
+    checkpointPath = com1DFA.getCheckpointPath(avaDir, "abc123")
+    checkpointRead = com1DFA.readCheckpoint(avaDir, "abc123")
+
+    assert checkpointPath == avaDir / "Outputs" / "com1DFA" / "checkpoints" / "checkpoint_abc123.pickle"
+    assert checkpointPath.is_file()
+    assert not checkpointPath.with_suffix(".tmp").is_file()
+    assert np.array_equal(checkpointRead["particles"]["x"], np.array([1.0, 2.0]))
+    assert checkpointRead["Tsave"] == [0, 1.0]
+    assert checkpointRead["t"] == 1.6
+    assert com1DFA.readCheckpoint(avaDir, "def456") is None
+
+
+def test_checkpointResume(tmp_path, monkeypatch):
+    """test that a simulation interrupted and resumed from its checkpoint gives the same results as an
+    uninterrupted one"""
+
+    # setup required input: small dam break simulation
+    sourceDir = pathlib.Path(__file__).parents[1] / "data" / "avaDamBreak" / "Inputs"
+
+    def runSimulation(avaDir, checkpointInterval):
+        cfgMain = cfgUtils.getGeneralConfig()
+        cfgMain["MAIN"]["avalancheDir"] = str(avaDir)
+        cfgMain["MAIN"]["nCPU"] = "1"
+        cfgMain["FLAGS"]["createReport"] = "False"
+        cfgMain["FLAGS"]["savePlot"] = "False"
+        cfg = cfgUtils.getModuleConfig(com1DFA, toPrint=False, onlyDefault=True)
+        cfg["GENERAL"]["simTypeList"] = "null"
+        cfg["GENERAL"]["relThFromShp"] = "False"
+        cfg["GENERAL"]["relTh"] = "1"
+        cfg["GENERAL"]["tEnd"] = "5"
+        cfg["GENERAL"]["tSteps"] = "0:1"
+        cfg["GENERAL"]["resType"] = "ppr|pft|pfv|FT|particles"
+        cfg["GENERAL"]["meshCellSize"] = "5"
+        cfg["GENERAL"]["secRelArea"] = "False"
+        cfg["GENERAL"]["checkpointInterval"] = str(checkpointInterval)
+        com1DFA.com1DFAMain(cfgMain, cfgInfo=cfg)
+
+    avaDirRef = tmp_path / "avaRef"
+    avaDir = tmp_path / "avaResume"
+    for dirName in [avaDirRef, avaDir]:
+        shutil.copytree(sourceDir, dirName / "Inputs")
+    runSimulation(avaDirRef, 1)
+
+    # interrupt the simulation after t = 3.5 s, checkpoints are written every second
+    computeEulerTimeStep = com1DFA.computeEulerTimeStep
+
+    def computeEulerTimeStepInterrupted(cfg, particles, *args, **kwargs):
+        if particles["t"] > 3.5:
+            raise RuntimeError("interrupted")
+        return computeEulerTimeStep(cfg, particles, *args, **kwargs)
+
+    monkeypatch.setattr(com1DFA, "computeEulerTimeStep", computeEulerTimeStepInterrupted)
+    with pytest.raises(RuntimeError, match="interrupted"):
+        runSimulation(avaDir, 1)
+    checkpointFiles = list((avaDir / "Outputs" / "com1DFA" / "checkpoints").glob("*.pickle"))
+    assert len(checkpointFiles) == 1
+    with open(checkpointFiles[0], "rb") as fi:
+        checkpoint = pickle.load(fi)
+    # only the current state and the first saved time step are in the checkpoint
+    assert len(checkpoint["particlesList"]) == 1
+    assert len(checkpoint["fieldsList"]) == 1
+    assert checkpoint["resultWriter"]["countFields"] == len(checkpoint["Tsave"]) == 4
+
+    # call function to be tested: run again, the simulation resumes from the checkpoint
+    monkeypatch.setattr(com1DFA, "computeEulerTimeStep", computeEulerTimeStep)
+    monkeypatch.setattr(com1DFA, "initializeSimulation", None)
+    shutil.rmtree(avaDir / "Work")
+    runSimulation(avaDir, 1)
+
+    assert not checkpointFiles[0].is_file()
+    outDirRef = avaDirRef / "Outputs" / "com1DFA"
+    outDir = avaDir / "Outputs" / "com1DFA"
+    # the simHash differs as the avalancheDir is part of the configuration
+    simHashRef = list(outDirRef.glob("resultsDF_*.csv"))[0].stem.split("_")[1]
+    simHash = list(outDir.glob("resultsDF_*.csv"))[0].stem.split("_")[1]
+    resultFilesRef = sorted(
+        [f.relative_to(outDirRef) for f in (outDirRef / "peakFiles").rglob("*.asc")]
+        + [f.relative_to(outDirRef) for f in (outDirRef / "particles").glob("*.pickle")]
+        + [f.relative_to(outDirRef) for f in outDirRef.glob("*_%s*.*" % simHashRef)]
+    )
+    assert len(resultFilesRef) > 30
+    for fileRef in resultFilesRef:
+        resultFile = outDir / str(fileRef).replace(simHashRef, simHash)
+        if fileRef.suffix == ".asc":
+            assert np.array_equal(IOf.readRaster(outDirRef / fileRef)["rasterData"],
+                                  IOf.readRaster(resultFile)["rasterData"])
+        elif fileRef.suffix == ".pickle":
+            with open(outDirRef / fileRef, "rb") as fi:
+                particlesRef = pickle.load(fi)
+            with open(resultFile, "rb") as fi:
+                particles = pickle.load(fi)
+            for key in ["x", "y", "z", "m", "h", "ux", "uy", "uz"]:
+                assert np.array_equal(particlesRef[key], particles[key])
+        else:
+            assert resultFile.read_text() == (outDirRef / fileRef).read_text()
+
+
+def test_particleBuffersTimeStep(tmp_path, monkeypatch):
+    """test that the particle arrays keep their buffers (and spare capacity) over the time steps"""
+
+    # setup required input: small dam break simulation
+    sourceDir = pathlib.Path(__file__).parents[1] / "data" / "avaDamBreak" / "Inputs"
+    avaDir = tmp_path / "avaTest"
+    shutil.copytree(sourceDir, avaDir / "Inputs")
+    cfgMain = cfgUtils.getGeneralConfig()
+    cfgMain["MAIN"]["avalancheDir"] = str(avaDir)
+    cfgMain["MAIN"]["nCPU"] = "1"
+    cfgMain["FLAGS"]["createReport"] = "False"
+    cfgMain["FLAGS"]["savePlot"] = "False"
+    cfg = cfgUtils.getModuleConfig(com1DFA, toPrint=False, onlyDefault=True)
+    cfg["GENERAL"]["simTypeList"] = "null"
+    cfg["GENERAL"]["relThFromShp"] = "False"
+    cfg["GENERAL"]["relTh"] = "1"
+    cfg["GENERAL"]["tEnd"] = "1"
+    cfg["GENERAL"]["tSteps"] = "0"
+    cfg["GENERAL"]["resType"] = "pft"
+    cfg["GENERAL"]["meshCellSize"] = "5"
+    cfg["GENERAL"]["secRelArea"] = "False"
+
+    keys = ["x", "y", "z", "m", "h", "ux", "uy", "uz", "velocityMag", "trajectoryLengthXY",
+            "trajectoryAngle"]
+    computeEulerTimeStep = com1DFA.computeEulerTimeStep
+    # the simulation can run in a child process, count the time steps in a file
+    stepFile = tmp_path / "nSteps.txt"
+
+    def computeEulerTimeStepChecked(cfg, particles, *args, **kwargs):
+        buffers = {key: particles.buffers[key] for key in keys}
+        capacity = {key: particles.capacity(key) for key in keys}
+        particles, fields, zPartArray0, tCPU = computeEulerTimeStep(cfg, particles, *args, **kwargs)
+        for key in keys:
+            # no reallocation: the kernels wrote to the spare buffer or the values were copied to the buffer
+            assert particles.capacity(key) == capacity[key] > particles["nPart"]
+            if particles.buffers[key] is not buffers[key]:
+                assert particles.spareBuffers[key] is buffers[key]
+            assert np.shares_memory(particles[key], particles.buffers[key])
+        with open(stepFile, "a") as fi:
+            fi.write("1")
+        return particles, fields, zPartArray0, tCPU
+
+    # call function to be tested
+    monkeypatch.setattr(com1DFA, "computeEulerTimeStep", computeEulerTimeStepChecked)
+    com1DFA.com1DFAMain(cfgMain, cfgInfo=cfg)
+    assert len(stepFile.read_text()) > 5
+
+
+def test_splitPartAreaTimeStep(tmp_path, monkeypatch):
+    """test that splitting particles in the time loop uses the spare capacity of the particle arrays"""
+
+    # setup required input: small dam break simulation with split and merge
+    sourceDir = pathlib.Path(__file__).parents[1] / "data" / "avaDamBreak" / "Inputs"
+    avaDir = tmp_path / "avaTest"
+    shutil.copytree(sourceDir, avaDir / "Inputs")
+    cfgMain = cfgUtils.getGeneralConfig()
+    cfgMain["MAIN"]["avalancheDir"] = str(avaDir)
+    cfgMain["MAIN"]["nCPU"] = "1"
+    cfgMain["FLAGS"]["createReport"] = "False"
+    cfgMain["FLAGS"]["savePlot"] = "False"
+    cfg = cfgUtils.getModuleConfig(com1DFA, toPrint=False, onlyDefault=True)
+    cfg["GENERAL"]["simTypeList"] = "null"
+    cfg["GENERAL"]["relThFromShp"] = "False"
+    cfg["GENERAL"]["relTh"] = "1"
+    cfg["GENERAL"]["tEnd"] = "5"
+    cfg["GENERAL"]["tSteps"] = "0"
+    cfg["GENERAL"]["resType"] = "pft"
+    cfg["GENERAL"]["meshCellSize"] = "5"
+    cfg["GENERAL"]["secRelArea"] = "False"
+    cfg["GENERAL"]["splitOption"] = "1"
+
+    keys = ["x", "y", "z", "m", "h", "ux", "uy", "uz", "ID", "parentID", "trajectoryLengthXY"]
+    splitPartArea = particleTools.splitPartArea
+    # the simulation can run in a child process, count the splits in a file
+    splitFile = tmp_path / "nSplits.txt"
+
+    def splitPartAreaChecked(particles, cfg, dem):
+        nPart = particles["nPart"]
+        buffers = {key: particles.buffers[key] for key in keys}
+        capacity = {key: particles.capacity(key) for key in keys}
+        particles = splitPartArea(particles, cfg, dem)
+        if nPart < particles["nPart"] <= min(capacity.values()):
+            # the new particles fit in the spare capacity: no reallocation
+            for key in keys:
+                assert particles.capacity(key) == capacity[key]
+                assert particles.buffers[key] is buffers[key]
+                assert np.size(particles[key]) == particles["nPart"]
+            with open(splitFile, "a") as fi:
+                fi.write("1")
+        return particles
+
+    # call function to be tested
+    monkeypatch.setattr(particleTools, "splitPartArea", splitPartAreaChecked)
+    com1DFA.com1DFAMain(cfgMain, cfgInfo=cfg)
+    assert splitFile.is_file()
+    assert len(splitFile.read_text()) > 0
+
+
+def test_getMeshFromCache(tmp_path):
+    """test that the cached mesh arrays are the computed ones"""
+
+    # setup required input
+    nrows, ncols = 8, 10
+    x, y = np.meshgrid(np.arange(ncols) * 5.0, np.arange(nrows) * 5.0)
+    demData = 100.0 - 0.5 * x - 0.2 * y + 0.01 * x * y
+    demData[0, 0] = np.nan
+    header = {"ncols": ncols, "nrows": nrows, "cellsize": 5.0, "xllcenter": 10.0, "yllcenter": 20.0,
+              "nodata_value": -9999}
+    demOri = {"header": header, "rasterData": demData}
+    cfg = configparser.ConfigParser()
+    cfg["GENERAL"] = {"sphKernelRadius": "5"}
+    cacheDir = tmp_path / "meshCache"
+
+    for num in [1, 4]:
+        # call function to be tested
+        dem = com1DFA.initializeMesh(cfg["GENERAL"], demOri, num)
+        demCacheNew = com1DFA.initializeMesh(cfg["GENERAL"], demOri, num, cacheDir=cacheDir)
+        demCache = com1DFA.initializeMesh(cfg["GENERAL"], demOri, num, cacheDir=cacheDir)
+
+        assert isinstance(demCache["Nx"], np.memmap)
+        for key in ["Nx", "Ny", "Nz", "areaRaster", "outOfDEM"]:
+            assert np.array_equal(dem[key], demCacheNew[key])
+            assert np.array_equal(dem[key], demCache[key])
+            assert demCache[key].dtype == dem[key].dtype
+        assert demCache["headerNeighbourGrid"] == dem["headerNeighbourGrid"]
+        assert demCache["originalHeader"]["xllcenter"] == 10.0
+
+    # one cache entry per normal computation method, no temporary files left
+    assert len(list(cacheDir.glob("mesh_*"))) == 2
+    assert len(list(cacheDir.glob("mesh_*/*.npy"))) == 10
+    assert list(cacheDir.glob("mesh_*/*.tmp")) == []
+
+
+def test_prepareSharedInputs(tmp_path):
+    """test that the shared DEM is the DEM read from Inputs and only prepared for sims with sharedInputs"""
+
+    # setup required input
+    testDir = pathlib.Path(__file__).parents[0]
+    avaDir = pathlib.Path(tmp_path, "testCom1DFA")
+    fU.makeADir(avaDir / "Inputs")
+    shutil.copy(testDir / "data" / "testCom1DFA" / "Inputs" / "DEM_PF_Topo.asc", avaDir / "Inputs")
+    shutil.copy(avaDir / "Inputs" / "DEM_PF_Topo.asc", avaDir / "Inputs" / "DEM2.asc")
+    simDict = {}
+    for simName, demPath, sharedInputs in [
+        ("sim1", "DEM_PF_Topo.asc", "True"),
+        ("sim2", "DEM_PF_Topo.asc", "True"),
+        ("sim3", "DEM2.asc", "False"),
+    ]:
+        cfgSim = configparser.ConfigParser()
+        cfgSim["GENERAL"] = {"sharedInputs": sharedInputs}
+        cfgSim["INPUT"] = {"DEM": demPath}
+        simDict[simName] = {"cfgSim": cfgSim}
+    inputSimFiles = {"demFile": avaDir / "Inputs" / "DEM_PF_Topo.asc"}
+
+    # call function to be tested
+    inputSimFiles = com1DFA.prepareSharedInputs(simDict, inputSimFiles, avaDir)
+    demOri = IOf.readRaster(avaDir / "Inputs" / "DEM_PF_Topo.asc", noDataToNan=True)
+    demShared = com1DFA.readSharedDEM(inputSimFiles["sharedDEMs"]["DEM_PF_Topo.asc"])
+
+    assert list(inputSimFiles["sharedDEMs"].keys()) == ["DEM_PF_Topo.asc"]
+    assert "rasterData" not in inputSimFiles["sharedDEMs"]["DEM_PF_Topo.asc"]
+    assert len(list((avaDir / "Work" / "com1DFA" / "sharedInputs").glob("*.npy"))) == 1
+    assert isinstance(demShared["rasterData"], np.memmap)
+    assert np.array_equal(demShared["rasterData"], demOri["rasterData"], equal_nan=True)
+    assert demShared["header"] == demOri["header"]
+    assert "rasterFile" not in demShared
+    # the simulations only modify their own copy
+    demShared["rasterData"][0, 0] = -1.0
+    demShared2 = com1DFA.readSharedDEM(inputSimFiles["sharedDEMs"]["DEM_PF_Topo.asc"])
+    assert demShared2["rasterData"][0, 0] == demOri["rasterData"][0, 0]
+
+    # the files are removed once the simulations are done
+    com1DFA.removeSharedInputs(inputSimFiles)
+    assert "sharedDEMs" not in inputSimFiles
+    assert list((avaDir / "Work" / "com1DFA" / "sharedInputs").glob("*.npy")) == []
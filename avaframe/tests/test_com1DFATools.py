@@ -8,6 +8,7 @@ import pytest
 import configparser
 import pathlib
 import shutil
+import pandas as pd
 
 from avaframe.com1DFA import com1DFATools
 
@@ -34,6 +35,46 @@ def test_getPartInitMethod(capfd):
     assert nPPK == 25
 
 
+def test_estimateSimCost(monkeypatch):
+    """ test estimating the cost of the simulations to perform """
+
+    dirPath = pathlib.Path(__file__).parents[0]
+    relFile = dirPath / 'data' / 'testCom1DFA' / 'Inputs' / 'REL' / 'relParabola.shp'
+    simDict = {}
+    for simName, relTh, tEnd in [('simA', '1', '10'), ('simB', '2', '10'), ('simC', '1', '40')]:
+        cfg = configparser.ConfigParser()
+        cfg['GENERAL'] = {'rho': '200', 'massPerPart': '1000', 'deltaTh': '0.25', 'sphKernelRadius': '5',
+                          'nPPK0': '5', 'aPPK': '-1', 'sphKR0': '5', 'meshCellSize': '5',
+                          'massPerParticleDeterminationMethod': 'MPPDIR', 'relThFromShp': 'False',
+                          'relTh': relTh, 'tEnd': tEnd, 'dt': '0.1'}
+        simDict[simName] = {'cfgSim': cfg, 'relFile': relFile, 'releaseScenario': 'relParabola'}
+
+    # count how often the release file is read
+    readFiles = []
+    SHP2Array = com1DFATools.shpConv.SHP2Array
+
+    def countSHP2Array(fileName, *args, **kwargs):
+        readFiles.append(fileName)
+        return SHP2Array(fileName, *args, **kwargs)
+
+    monkeypatch.setattr(com1DFATools.shpConv, 'SHP2Array', countSHP2Array)
+
+    # call function to be tested
+    simCost = com1DFATools.estimateSimCost(simDict)
+
+    assert readFiles == [relFile]
+    assert simCost['simA'] > 1
+    assert simCost['simB'] == pytest.approx(2 * simCost['simA'])
+    assert simCost['simC'] == pytest.approx(4 * simCost['simA'])
+
+    # calibrate with the cpu time of an existing simulation
+    simDFExisting = pd.DataFrame({'releaseScenario': ['relParabola'], 'timeLoop': [2.], 'nPart': ['100'],
+                                  'nIter': [1000]})
+    simCostTime = com1DFATools.estimateSimCost(simDict, simDFExisting)
+    assert simCostTime['simA'] == pytest.approx(simCost['simA'] * 2 / 1.e5)
+    assert sorted(simCostTime, key=simCostTime.get) == ['simA', 'simB', 'simC']
+
+
 def test_createSimDictFromCfgs(tmp_path):
     """ test creating a simDict from multiple cfg files """
 
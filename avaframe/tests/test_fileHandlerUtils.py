@@ -132,6 +132,62 @@ def test_makeSimDF():
     assert dataDF['test'][0] == '0.888'
 
 
+def test_updateResultFilesIndex(tmp_path, monkeypatch):
+    """ Test if the result files index is created and updated incrementally """
+
+    dirPath = pathlib.Path(__file__).parents[0]
+    inputDir = tmp_path / 'peakFiles'
+    inputDir.mkdir()
+    testFile = dirPath / 'data' / 'testSim' / 'releaseTest1_0.888_entres_dfa_ppr.asc'
+    shutil.copy(testFile, inputDir)
+    shutil.copy(testFile, inputDir / 'release1HS_b1d2e3f4a5_C_M_null_dfa_pft.asc')
+
+    # call function to be tested
+    dataDF = fU.makeSimDF(inputDir, simID='simHash', useIndex=True)
+    indexFile = inputDir / 'resultFilesIndex.json'
+    assert indexFile.is_file()
+    assert dataDF.equals(fU.makeSimDF(inputDir, simID='simHash'))
+    assert list(dataDF['frictCalib'].isna()) == [False, True]
+    assert list(dataDF['cellSize']) == [5.0, 5.0]
+
+    # files in the index are not parsed again, new files are added, removed ones are dropped
+    calls = []
+    getResultFileInfo = fU.getResultFileInfo
+    monkeypatch.setattr(fU, 'getResultFileInfo', lambda dataFile: calls.append(dataFile.name)
+                        or getResultFileInfo(dataFile))
+    dataDF2 = fU.makeSimDF(inputDir, simID='simHash', useIndex=True)
+    assert calls == []
+    assert dataDF2.equals(dataDF)
+    (inputDir / 'releaseTest1_0.888_entres_dfa_ppr.asc').unlink()
+    shutil.copy(testFile, inputDir / 'release1HS_b1d2e3f4a5_C_M_null_dfa_ppr.asc')
+    dataDF3 = fU.makeSimDF(inputDir, simID='simHash', useIndex=True)
+    assert calls == ['release1HS_b1d2e3f4a5_C_M_null_dfa_ppr.asc']
+    assert list(dataDF3['resType']) == ['pft', 'ppr']
+    assert dataDF3.equals(fU.makeSimDF(inputDir, simID='simHash'))
+
+    # a corrupt index is rebuilt
+    calls.clear()
+    indexFile.write_text('{"files": ')
+    dataDF4 = fU.makeSimDF(inputDir, simID='simHash', useIndex=True)
+    assert dataDF4.equals(dataDF3)
+    assert len(calls) == 2
+
+
+def test_getProbMapInfo():
+    """ Test getting the info of a probability map from its name """
+
+    probMapInfo = fU.getProbMapInfo(pathlib.Path('avaParabola_prob__ppr_lim1.0.asc'))
+    assert probMapInfo == {'avaName': 'avaParabola', 'probConf': '', 'peakVar': 'ppr', 'peakLim': '1.0'}
+
+    probMapInfo = fU.getProbMapInfo('ava_Test_prob_includeMu_xi_pft_lim0.5.asc')
+    assert probMapInfo == {'avaName': 'ava_Test', 'probConf': 'includeMu_xi', 'peakVar': 'pft',
+                           'peakLim': '0.5'}
+
+    with pytest.raises(ValueError) as e:
+        fU.getProbMapInfo('avaParabola_ppr_lim1.0.asc')
+    assert 'avaParabola_ppr_lim1.0 is not named like a probability map' in str(e.value)
+
+
 def test_makeSimFromResDF():
     """ Test if simulation dataFrame is generated correctly """
 
@@ -0,0 +1,118 @@
+"""
+Pytest for com4FlowPy flowCore
+"""
+
+import numpy as np
+
+import avaframe.com4FlowPy.flowCore as fc
+
+
+def test_calculationArrays():
+    """test that the array path engine gives the same results as the Cell engine"""
+
+    # setup required inputs: inclined plane with a bump and a few release cells
+    nrows, ncols = 30, 20
+    cellsize = 10.0
+    x, y = np.meshgrid(np.arange(ncols) * cellsize, np.arange(nrows) * cellsize)
+    dem = 1000.0 - 0.8 * y + 20.0 * np.exp(-((x - 100.0) ** 2 + (y - 150.0) ** 2) / 2000.0)
+    dem[-1, 5] = -9999
+    release = np.zeros_like(dem)
+    release[2, 9:11] = 1
+    infra = np.zeros_like(dem)
+    infra[22, 3:17] = 2
+    rng = np.random.default_rng(12345)
+    forestArray = (rng.random(dem.shape) > 0.5) * rng.random(dem.shape)
+    forestParams = {
+        "forestModule": "forestFriction",
+        "maxAddedFriction": 10.0,
+        "minAddedFriction": 2.0,
+        "velThForFriction": 30.0,
+        "maxDetrainment": 0.0,
+        "minDetrainment": 0.0,
+        "velThForDetrain": 0.0,
+        "fFrLayerType": "absolute",
+        "nSkipForest": 1,
+        "forestInteraction": True,
+    }
+    # forest friction layer: alpha values of 20 to 40 degrees on the forested cells
+    forestLayer = (forestArray > 0) * (20.0 + 20.0 * forestArray)
+    forestLayerParams = dict(forestParams, forestModule="forestFrictionLayer", nSkipForest=2)
+    forestLayerRelParams = dict(forestParams, forestModule="forestFrictionLayer", fFrLayerType="relative")
+    forestDetrainmentParams = dict(
+        forestParams, forestModule="forestDetrainment", maxDetrainment=1.0e-4, minDetrainment=1.0e-5,
+        velThForDetrain=20.0
+    )
+    modelArgs = [25.0, 8.0, 3.0e-4, 8848.0, -9999, cellsize]
+
+    for infraBool, forestBool, forest, params in [
+        (False, False, None, None),
+        (True, False, None, None),
+        (False, True, forestArray, forestParams),
+        (False, True, forestLayer, forestLayerParams),
+        (False, True, forestArray * 10.0, forestLayerRelParams),
+        (True, True, forestArray, forestDetrainmentParams),
+    ]:
+        args = [dem, infra, release.copy()] + modelArgs + [infraBool, forestBool]
+        argsArrays = [dem, infra, release.copy()] + modelArgs + [infraBool, forestBool]
+        if forestBool:
+            args = args + [forest, params]
+            argsArrays = argsArrays + [forest, params]
+
+        # call function to be tested
+        results = fc.calculation(args)
+        resultsArrays = fc.calculationArrays(argsArrays)
+
+        assert len(results) == len(resultsArrays)
+        assert np.sum(results[0] > 0) > 50
+        for result, resultArrays in zip(results, resultsArrays):
+            assert result.dtype == resultArrays.dtype
+            assert np.array_equal(result, resultArrays)
+        if infraBool:
+            assert np.sum(resultsArrays[4] > 0) > 0
+
+
+def test_runSharedInputs(tmp_path):
+    """test that run gives the same results with and without sharedInputs"""
+
+    # setup required inputs: tile files in the temp folder
+    nrows, ncols = 30, 20
+    cellsize = 10.0
+    x, y = np.meshgrid(np.arange(ncols) * cellsize, np.arange(nrows) * cellsize)
+    dem = 1000.0 - 0.8 * y + 20.0 * np.exp(-((x - 100.0) ** 2 + (y - 150.0) ** 2) / 2000.0)
+    release = np.zeros_like(dem)
+    release[2, 4:16] = 1
+    release[4, 6:9] = 2
+    infra = np.zeros_like(dem)
+    infra[22, 3:17] = 2
+    modelParameters = {
+        "alpha": 25.0,
+        "exp": 8.0,
+        "flux_threshold": 3.0e-4,
+        "max_z": 8848.0,
+        "infraBool": True,
+        "forestBool": False,
+        "forestInteraction": False,
+        "pathEngine": "array",
+    }
+    rasterAttributes = {"cellsize": cellsize, "nodata": -9999}
+    resultFiles = {}
+    for sharedInputs in [False, True]:
+        tempDir = tmp_path / ("shared%s" % sharedInputs)
+        tempDir.mkdir()
+        np.save(tempDir / "dem_0_0.npy", dem)
+        np.save(tempDir / "init_0_0.npy", release)
+        np.save(tempDir / "infra_0_0.npy", infra)
+        MPOptions = {
+            "nCPU": 2, "procPerCPU": 1, "chunkSize": 4, "maxChunks": 500, "sharedInputs": sharedInputs
+        }
+        optTuple = (0, 0, modelParameters, {"tempDir": tempDir}, rasterAttributes, {}, MPOptions)
+
+        # call function to be tested
+        fc.run(optTuple)
+        resultFiles[sharedInputs] = sorted(tempDir.glob("res_*.npy"))
+
+    assert len(resultFiles[True]) == 8
+    assert [file.name for file in resultFiles[False]] == [file.name for file in resultFiles[True]]
+    for file, fileShared in zip(resultFiles[False], resultFiles[True]):
+        assert np.array_equal(np.load(file), np.load(fileShared))
+    assert np.sum(np.load(tmp_path / "sharedTrue" / "res_count_0_0.npy") > 0) > 50
@@ -457,6 +457,38 @@ def test_polygon2Raster():
     assert np.array_equal(maskTest3, Mask3)
 
 
+def test_polygon2RasterWindow():
+    """test if only the window around the polygon is tested and gives the same mask as all cells"""
+
+    # setup required inputs
+    demHeader = {"cellsize": 2.0, "ncols": 80, "nrows": 60, "xllcenter": 10.0, "yllcenter": -5.0}
+    angle = np.linspace(0, 2 * np.pi, 9)[:-1]
+    Line = {"x": 40 + 12 * np.cos(angle), "y": 20 + 6 * np.sin(angle)}
+    x, y = np.meshgrid(np.arange(80.0), np.arange(60.0))
+    points = np.stack((x.flatten(), y.flatten()), axis=-1)
+
+    for radius in [0.0001, 0.5, 3.0]:
+        # call function to be tested
+        maskWindow, window = geoTrans.polygon2RasterWindow(demHeader, Line, radius)
+
+        # setup test output: test all cells of the raster
+        path = mpltPath.Path(np.stack(((Line["x"] - 10.0) / 2.0, (Line["y"] + 5.0) / 2.0), axis=-1))
+        isCcw = geoTrans.isCounterClockWise(path)
+        r = radius * isCcw - radius * (1 - isCcw)
+        maskTest = path.contains_points(points, radius=r).reshape((60, 80))
+
+        assert window[1] - window[0] < 60 and window[3] - window[2] < 80
+        assert np.sum(maskWindow) > 0
+        assert np.array_equal(maskTest[window[0] : window[1], window[2] : window[3]], maskWindow)
+        assert np.sum(maskTest) == np.sum(maskWindow)
+
+    # polygon outside of the raster
+    Line = {"x": np.asarray([200.0, 210.0, 210.0]), "y": np.asarray([0.0, 0.0, 10.0])}
+    maskWindow, window = geoTrans.polygon2RasterWindow(demHeader, Line, 0.0001)
+    assert np.size(maskWindow) == 0
+    assert np.sum(geoTrans.polygon2Raster(demHeader, Line, 0.0001)) == 0
+
+
 def test_checkParticlesInRelease():
     """test if particles are within release polygon and removed if not"""
 
@@ -13,6 +13,7 @@ from avaframe.com1DFA import com1DFA
 import avaframe.in3Utils.fileHandlerUtils as fU
 from avaframe.in3Utils import cfgUtils
 from avaframe.ana4Stats import getStats
+import avaframe.in2Trans.ascUtils as IOf
 import pytest
 import configparser
 import shutil
@@ -69,3 +70,101 @@ def test_getStats(tmp_path):
     assert peakValues['release1_null_dfa_2000000']['ppr']['min'] == 1.0
     assert peakValues['release1_null_dfa_2000000']['ppr']['mean'] == 3.0
     assert peakValues2['release1_null_dfa_1000000']['scenario'] == 'release1'
+
+
+def test_computeEnsembleStats(tmp_path):
+    """ test per cell statistics of an ensemble computed tile by tile """
+
+    header = {'ncols': 7, 'nrows': 11, 'xllcenter': 0.0, 'yllcenter': 0.0, 'cellsize': 5.0,
+              'nodata_value': -9999}
+    rng = np.random.default_rng(12)
+    ensemble = rng.exponential(5., (30, 11, 7))
+    ensemble[rng.random(ensemble.shape) < 0.3] = 0.
+    ensemble[:, 0, 0] = -9999
+    ensemble[3:, 0, 1] = -9999
+    peakFiles = []
+    for m, values in enumerate(ensemble):
+        rasterFormat = 'npy' if m % 2 else 'asc'
+        peakFiles.append(IOf.writeResultToRaster(header, values, tmp_path / ('sim%d_ppr.asc' % m),
+                                                 flip=True, rasterFormat=rasterFormat))
+    ensemble[ensemble == -9999] = np.nan
+
+    cfg = configparser.ConfigParser()
+    cfg['ENSEMBLESTATS'] = {'peakLims': '1.0|10.0', 'quantiles': '0.5|0.9', 'tileMemory': '2048'}
+
+    # call function to be tested - one tile and several tiles
+    statFiles = getStats.computeEnsembleStats(peakFiles, cfg['ENSEMBLESTATS'], tmp_path, 'oneTile')
+    cfg['ENSEMBLESTATS']['tileMemory'] = '0.001'
+    statFilesTiles = getStats.computeEnsembleStats(peakFiles, cfg['ENSEMBLESTATS'], tmp_path, 'tiles')
+
+    assert sorted(statFiles) == ['mean', 'prob_lim1.0', 'prob_lim10.0', 'q0.5', 'q0.9', 'var']
+    assert statFiles['q0.9'] == tmp_path / 'oneTile_q0.9.npy'
+    stats = {}
+    for statName in statFiles:
+        stats[statName] = IOf.readRaster(statFiles[statName])['rasterData']
+        statTiles = IOf.readRaster(statFilesTiles[statName])['rasterData']
+        assert np.array_equal(stats[statName], statTiles, equal_nan=True)
+    valid = ~np.isnan(ensemble[0])
+    assert np.allclose(stats['mean'][valid], np.nanmean(ensemble, axis=0)[valid], rtol=1.e-12)
+    assert np.allclose(stats['var'][valid], np.nanvar(ensemble, axis=0)[valid], rtol=1.e-12)
+    assert np.isnan(stats['mean'][0, 0]) and np.isnan(stats['q0.5'][0, 0])
+    assert np.array_equal(stats['prob_lim10.0'], np.sum(ensemble > 10., axis=0) / 30)
+    # quantiles are exact for up to five values and approximate otherwise
+    assert stats['q0.5'][0, 1] == np.quantile(ensemble[:3, 0, 1], 0.5)
+    assert np.all(stats['q0.9'][valid] >= np.nanmin(ensemble, axis=0)[valid])
+    assert np.all(stats['q0.9'][valid] <= np.nanmax(ensemble, axis=0)[valid])
+
+    with pytest.raises(FileNotFoundError):
+        getStats.computeEnsembleStats([], cfg['ENSEMBLESTATS'], tmp_path, 'empty')
+    header['ncols'] = 6
+    IOf.writeResultToAsc(header, np.zeros((11, 6)), tmp_path / 'other_ppr.asc')
+    with pytest.raises(AssertionError) as e:
+        getStats.computeEnsembleStats(peakFiles + [tmp_path / 'other_ppr.asc'], cfg['ENSEMBLESTATS'],
+                                      tmp_path, 'other')
+    assert 'same extent' in str(e.value)
+
+
+def test_getTileBytesPerCell():
+    """ test memory per cell of the arrays of one tile of the ensemble statistics """
+
+    tileShape = (3, 4)
+    nCells = 12
+    # statistics arrays as allocated in computeEnsembleStats
+    arrays = [np.zeros(tileShape, dtype=np.int32), np.zeros(tileShape), np.zeros(tileShape)]
+    arrays = arrays + [np.zeros(tileShape, dtype=np.int32) for _ in range(2)]
+    for quantile in [0.5, 0.9, 0.95]:
+        p2State = getStats.initializeP2Quantiles(tileShape, quantile)
+        arrays = arrays + [p2State[key] for key in ['count', 'heights', 'positions', 'desired']]
+    # tile of one raster
+    arrays.append(np.zeros(tileShape))
+    # temporary arrays alive at the same time in the Welford update of m2
+    data = arrays[-1]
+    mean = arrays[1]
+    valid = ~np.isnan(data)
+    delta = np.where(valid, data - mean, 0.)
+    dataMinusMean = data - mean
+    deltaNew = np.where(valid, dataMinusMean, 0.)
+    arrays = arrays + [valid, delta, dataMinusMean, deltaNew, delta * deltaNew]
+
+    # call function to be tested
+    bytesPerCell = getStats.getTileBytesPerCell(2, 3)
+
+    assert bytesPerCell == sum(array.nbytes for array in arrays) / nCells
+    assert getStats.getTileBytesPerCell(0, 1) - getStats.getTileBytesPerCell(0, 0) == 124
+
+
+def test_updateP2Quantiles():
+    """ test approximation of quantiles with the P-square algorithm """
+
+    rng = np.random.default_rng(5)
+    values = rng.normal(0., 1., (2000, 50))
+    values[:1995, 0] = np.nan
+    p2State = getStats.initializeP2Quantiles((5, 10), 0.9)
+
+    # call function to be tested
+    for data in values:
+        getStats.updateP2Quantiles(p2State, data.reshape((5, 10)))
+    quantileValues = getStats.fetchP2Quantiles(p2State).ravel()
+
+    assert quantileValues[0] == np.quantile(values[1995:, 0], 0.9)
+    assert np.allclose(quantileValues[1:], np.quantile(values[:, 1:], 0.9, axis=0), atol=0.1)
@@ -66,8 +66,15 @@ def test_plotAllPeakFields(tmp_path):
     assert 'relAlr_125e697996_null_dfa' in plotDict
     assert plotDict['relAlr_125e697996_null_dfa']['pft'] == plotPath
 
+    # only the peak fields of the requested simulation are plotted
+    plotDictSim = oP.plotAllPeakFields(avaDirTmp2, cfg['FLAGS'], modName, demData='',
+                                       simName='relAlr_0000000000_null_dfa')
+    assert plotDictSim == {}
+    assert not (avaDirTmp2 / 'Outputs' / 'out1Peak' / 'relAlr_125e697996_null_dfa_pft.png').is_file()
+
     # call function to be tested
-    plotDict2 = oP.plotAllPeakFields(avaDirTmp2, cfg['FLAGS'], modName, demData='')
+    plotDict2 = oP.plotAllPeakFields(avaDirTmp2, cfg['FLAGS'], modName, demData='',
+                                     simName='relAlr_125e697996_null_dfa')
     plotPath = avaDirTmp2 / 'Outputs' / 'out1Peak' / 'relAlr_125e697996_null_dfa_pft.png'
     print(plotDict2)
     assert 'relAlr_125e697996_null_dfa' in plotDict2
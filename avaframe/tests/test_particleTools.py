@@ -1,5 +1,6 @@
 """Tests for module DFAtools"""
 import numpy as np
+import copy
 import pickle
 import configparser
 import pathlib
@@ -8,6 +9,7 @@ import pandas as pd
 
 # Local imports
 import avaframe.com1DFA.particleTools as particleTools
+import avaframe.com1DFA.DFAfunctionsCython as DFAfunC
 
 
 def test_placeParticles():
@@ -119,6 +121,50 @@ def test_removePart(capfd):
     assert np.allclose(particles['ID'], res, atol=atol)
 
 
+def test_reorderParticles():
+    header = {'ncols': 4, 'nrows': 3, 'cellsize': 1.}
+    dem = {'header': header, 'headerNeighbourGrid': header}
+    particles = {}
+    particles['nPart'] = 6
+    particles['nID'] = 6
+    particles['mTot'] = np.float64(6)
+    particles['ID'] = np.arange(6)
+    particles['x'] = np.array([3., 0., 2., 1., 0., 3.])
+    particles['y'] = np.array([2., 0., 1., 0., 2., 0.])
+    particles['m'] = np.linspace(1, 6, 6)
+    # bonds: 0-1, 0-2, 3-5
+    particles['bondStart'] = np.array([0, 2, 3, 4, 5, 5, 6], dtype=np.int32)
+    particles['bondPart'] = np.array([1, 2, 0, 0, 5, 3], dtype=np.int32)
+    particles['bondDist'] = np.array([1., 2., 1., 2., 3., 3.])
+    particles = DFAfunC.getNeighborsC(particles, dem)
+
+    def getBonds(particles):
+        bonds = set()
+        for k in range(particles['nPart']):
+            for ib in range(particles['bondStart'][k], particles['bondStart'][k+1]):
+                bondPart = particles['bondPart'][ib]
+                bonds.add((particles['ID'][k], particles['ID'][bondPart], particles['bondDist'][ib]))
+        return bonds
+
+    bonds = getBonds(particles)
+    particles = particleTools.reorderParticles(particles, snowSlide=1)
+
+    # particles are now sorted by cell
+    inCell = particles['x'] + header['ncols'] * particles['y']
+    assert np.array_equal(inCell, np.sort(inCell))
+    assert np.array_equal(particles['inCellDEM'], inCell)
+    assert np.array_equal(particles['ID'], [1, 3, 5, 2, 4, 0])
+    assert np.array_equal(particles['m'], particles['ID'] + 1)
+    assert np.array_equal(particles['partInCell'], np.arange(6))
+    assert particles['mTot'] == 6
+    # same bonds between the same particles
+    assert getBonds(particles) == bonds
+    # neighbour search is still consistent
+    particlesNew = DFAfunC.getNeighborsC(copy.deepcopy(particles), dem)
+    assert np.array_equal(particlesNew['indPartInCell'], particles['indPartInCell'])
+    assert np.array_equal(np.sort(particlesNew['partInCell']), particles['partInCell'])
+
+
 def test_splitPartMass(capfd):
     cfg = configparser.ConfigParser()
     cfg['GENERAL'] = {'rho': '1', 'thresholdMassSplit': '1.5', 'distSplitPart': '0.5'}
@@ -161,6 +207,142 @@ def test_splitPartMass(capfd):
     assert np.allclose(particles['ID'], np.arange(14), atol=atol)
 
 
+def test_splitPartArea():
+    """ test that splitting all particles at once gives the same result as splitting one after the other """
+    cfg = configparser.ConfigParser()
+    cfg['GENERAL'] = {'rho': '1', 'sphKernelRadius': '1', 'cMinNPPK': '0.5', 'cMinMass': '0.1',
+                      'nSplit': '3', 'seed': '12'}
+    rng = np.random.default_rng(1)
+    nPart = 50
+    particles = {'nPart': nPart, 'nID': nPart, 'massPerPart': 1., 'nPPK': 10, 'mTot': 0}
+    particles['ID'] = np.arange(nPart)
+    particles['parentID'] = np.arange(nPart)
+    particles['m'] = rng.random(nPart) * 3 + 0.2
+    particles['h'] = rng.random(nPart) + 0.5
+    for key in ['x', 'y']:
+        particles[key] = rng.random(nPart) * 40 + 5
+    for key in ['z', 'ux', 'uy', 'uz']:
+        particles[key] = rng.random(nPart) - 0.5
+    # some particles are not moving
+    for key in ['ux', 'uy', 'uz']:
+        particles[key][::7] = 0
+    dem = {'header': {'cellsize': 5}, 'Nx': rng.random((11, 11)) * 0.3, 'Ny': rng.random((11, 11)) * 0.3,
+           'Nz': np.ones((11, 11))}
+
+    # call function to be tested
+    particlesBatch = particleTools.splitPartArea(copy.deepcopy(particles), cfg['GENERAL'], dem)
+
+    # reference: split the same particles one after the other, appending the new particles to each array
+    # (per particle loop used before splitting all particles at once)
+    aPart = particles['m'] / particles['h']
+    aMax = np.pi / (0.5 * 10)
+    tooBig = np.where((aPart > aMax) & (particles['m'] / 3 > 0.1))[0]
+    for ind in tooBig:
+        xNew, yNew, zNew = particleTools.getSplitPartPosition(cfg['GENERAL'], particles, aPart, dem['Nx'],
+                                                              dem['Ny'], dem['Nz'], 5, 3, ind)
+        nPartOld = particles['nPart']
+        nID = particles['nID']
+        particles['m'][ind] = particles['m'][ind] / 3
+        particles['x'][ind] = xNew[0]
+        particles['y'][ind] = yNew[0]
+        particles['z'][ind] = zNew[0]
+        for key in ['ID', 'parentID', 'm', 'h', 'x', 'y', 'z', 'ux', 'uy', 'uz']:
+            if key == 'ID':
+                newValues = np.arange(nID, nID + 2)
+            elif key in ['x', 'y', 'z']:
+                newValues = {'x': xNew, 'y': yNew, 'z': zNew}[key][1:]
+            else:
+                newValues = particles[key][ind] * np.ones(2)
+            particles[key] = np.append(particles[key][:nPartOld], newValues)
+        particles['nPart'] = nPartOld + 2
+        particles['nID'] = nID + 2
+
+    assert len(tooBig) > 10
+    assert particlesBatch['nPart'] == nPart + 2 * len(tooBig)
+    assert particlesBatch['nID'] == particles['nID']
+    for key in ['ID', 'parentID', 'm', 'h', 'x', 'y', 'z', 'ux', 'uy', 'uz']:
+        assert np.array_equal(particlesBatch[key], particles[key])
+    assert particlesBatch['mTot'] == pytest.approx(np.sum(particles['m']), rel=1e-12)
+
+    # hard coded expected values: only the first of two particles is split in three
+    particles = {'nPart': 2, 'nID': 2, 'massPerPart': 1., 'nPPK': 10, 'mTot': 0}
+    particles['ID'] = np.array([0, 1])
+    particles['parentID'] = np.array([0, 1])
+    particles['m'] = np.array([3., 0.3])
+    particles['h'] = np.array([1., 1.])
+    particles['x'] = np.array([10., 20.])
+    particles['y'] = np.array([10., 20.])
+    particles['z'] = np.zeros(2)
+    particles['ux'] = np.array([1., 2.])
+    particles['uy'] = np.zeros(2)
+    particles['uz'] = np.zeros(2)
+    dem = {'header': {'cellsize': 5}, 'Nx': np.zeros((11, 11)), 'Ny': np.zeros((11, 11)),
+           'Nz': np.ones((11, 11))}
+
+    # call function to be tested
+    particles = particleTools.splitPartArea(particles, cfg['GENERAL'], dem)
+
+    assert particles['nPart'] == 4
+    assert particles['nID'] == 4
+    assert np.array_equal(particles['ID'], [0, 1, 2, 3])
+    assert np.array_equal(particles['parentID'], [0, 1, 0, 0])
+    assert np.allclose(particles['m'], [1., 0.3, 1., 1.], rtol=1e-12)
+    assert np.array_equal(particles['ux'], [1., 2., 1., 1.])
+    assert particles['mTot'] == pytest.approx(3.3, rel=1e-12)
+    # the three parts lie on a circle of radius sqrt(aPart / (pi * nSplit)) = 1 / sqrt(pi) around the
+    # original position (flat dem, e1 is the flow direction x, e2 the y direction), 120 degrees apart
+    dx = particles['x'][[0, 2, 3]] - 10
+    dy = particles['y'][[0, 2, 3]] - 10
+    assert np.allclose(dx**2 + dy**2, 1 / np.pi, rtol=1e-12)
+    assert np.allclose(particles['z'], 0, atol=1e-12)
+    assert particles['x'][1] == 20
+    angles = np.sort(np.mod(np.arctan2(dy, dx) - np.arctan2(dy[0], dx[0]), 2 * np.pi))
+    assert np.allclose(angles, [0, 2 * np.pi / 3, 4 * np.pi / 3], atol=1e-12)
+
+
+def test_mergePartArea():
+    """ test that merging with the neighbour search grid gives the same result as the search over all
+    particles """
+    cfg = configparser.ConfigParser()
+    cfg['GENERAL'] = {'rho': '1', 'sphKernelRadius': '5', 'cMaxNPPK': '2'}
+    rng = np.random.default_rng(2)
+    nPart = 500
+    particles = {'nPart': nPart, 'nID': nPart, 'nPPK': 10, 'mTot': 0}
+    particles['ID'] = np.arange(nPart)
+    particles['m'] = rng.random(nPart) * 3 + 0.2
+    particles['h'] = rng.random(nPart) * 5 + 0.5
+    for key in ['x', 'y']:
+        particles[key] = rng.random(nPart) * 60 + 2
+    for key in ['z', 'ux', 'uy', 'uz']:
+        particles[key] = rng.random(nPart)
+    dem = {'header': {'cellsize': 5, 'ncols': 14, 'nrows': 14},
+           'headerNeighbourGrid': {'cellsize': 5, 'ncols': 14, 'nrows': 14}}
+
+    # call function to be tested
+    particlesMerged = particleTools.mergePartArea(copy.deepcopy(particles), cfg['GENERAL'], dem)
+
+    # merge the same particles searching the closest neighbour among all particles
+    tooSmall = np.where(particles['m'] / particles['h'] < np.pi * 25 / 20)[0]
+    keepParticle = np.ones(nPart, dtype=bool)
+    for ind in tooSmall:
+        if keepParticle[ind]:
+            rMerge, neighbourInd = particleTools.getClosestNeighbour(particles['x'], particles['y'],
+                                                                     particles['z'], ind, 5, keepParticle)
+            if rMerge < 5:
+                keepParticle[neighbourInd] = False
+                mNew = particles['m'][ind] + particles['m'][neighbourInd]
+                for key in ['x', 'y', 'z', 'ux', 'uy', 'uz']:
+                    particles[key][ind] = (particles['m'][ind]*particles[key][ind] +
+                                           particles['m'][neighbourInd]*particles[key][neighbourInd]) / mNew
+                particles['m'][ind] = mNew
+    nRemoved = np.sum(~keepParticle)
+
+    assert nRemoved > 100
+    assert particlesMerged['nPart'] == nPart - nRemoved
+    for key in ['ID', 'm', 'h', 'x', 'y', 'z', 'ux', 'uy', 'uz']:
+        assert np.array_equal(particlesMerged[key], particles[key][keepParticle])
+
+
 def test_mergeParticleDict(capfd):
 
     particles1 = {}
@@ -196,6 +378,130 @@ def test_mergeParticleDict(capfd):
     assert np.allclose(particles['ID'], np.arange(9), atol=atol)
 
 
+def test_particleContainer():
+    """ test the particle container with preallocated capacity """
+    particles = {}
+    particles['nPart'] = 10
+    particles['ID'] = np.arange(particles['nPart'])
+    particles['parentID'] = np.arange(particles['nPart'])
+    particles['nID'] = 10
+    particles['m'] = np.linspace(0, 9, 10)
+    particles['h'] = np.ones(10)
+    particles['x'] = np.linspace(0, 9, 10)
+    particles['y'] = np.zeros(10)
+    particles['z'] = np.zeros(10)
+    particles['ux'] = np.linspace(0, 9, 10)
+    particles['uy'] = np.zeros(10)
+    particles['uz'] = np.zeros(10)
+    particles['mTot'] = np.sum(particles['m'])
+    particles['t'] = 0.
+
+    # call function to be tested
+    container = particleTools.ParticleContainer(copy.deepcopy(particles))
+    assert isinstance(container, dict)
+    assert container['nPart'] == 10
+    # the buffers are created with spare capacity
+    assert container.capacity('x') == 15
+
+    # appending values uses the spare capacity and keeps the dtype
+    xBuffer = container.buffers['parentID']
+    container.appendValues('parentID', np.array([1.0, 2.0]))
+    assert container['parentID'].dtype == particles['parentID'].dtype
+    assert np.array_equal(container['parentID'], np.append(particles['parentID'], [1, 2]))
+    assert container.buffers['parentID'] is xBuffer
+    container.appendValues('parentID', np.array([3]))
+    assert container.buffers['parentID'] is xBuffer
+    assert np.size(container['parentID']) == 13
+    # extracting values is done in place
+    mask = np.arange(13) % 2 == 0
+    container.extractValues('parentID', mask)
+    assert container.buffers['parentID'] is xBuffer
+    assert np.array_equal(container['parentID'], np.array([0, 2, 4, 6, 8, 1, 3]))
+    # appending beyond the capacity grows the buffer by growthFactor
+    container.appendValues('parentID', np.arange(10))
+    assert container.capacity('parentID') == 22
+    assert np.array_equal(container['parentID'], np.append([0, 2, 4, 6, 8, 1, 3], np.arange(10)))
+    # assigning an array that fits copies it to the buffer
+    xBuffer = container.buffers['parentID']
+    container['parentID'] = np.arange(10)
+    assert container.buffers['parentID'] is xBuffer
+    assert np.shares_memory(container['parentID'], xBuffer)
+    assert np.array_equal(container['parentID'], np.arange(10))
+    # a different dtype replaces the buffer
+    container['parentID'] = np.arange(10.)
+    assert container['parentID'].dtype == np.float64
+    assert container.capacity('parentID') == 15
+    container['parentID'] = np.arange(10)
+
+    # the new values can be written to the spare buffer, assigning it swaps the buffers
+    xBuffer = container.buffers['x']
+    xOld = container['x']
+    xNew = particleTools.getOutputArray(container, 'x', 10)
+    assert not np.shares_memory(xNew, xBuffer)
+    xNew[:] = np.arange(10) + 1
+    container['x'] = xNew
+    assert container.buffers['x'] is not xBuffer
+    assert container.spareBuffers['x'] is xBuffer
+    assert np.shares_memory(container['x'], xNew)
+    assert np.array_equal(container['x'], np.arange(10) + 1)
+    assert np.array_equal(xOld, particles['x'])
+    # the next output array is the previous buffer
+    assert np.shares_memory(particleTools.getOutputArray(container, 'x', 10), xBuffer)
+    container['x'] = particles['x']
+    assert np.array_equal(container['x'], particles['x'])
+    # for a particles dictionary a new array is created
+    assert np.array_equal(particleTools.getOutputArray(particles, 'x', 10), np.zeros(10))
+
+    # compacting works chunk by chunk
+    container.chunkSize = 3
+    xBuffer = container.buffers['ux']
+    mask = np.ones(10, dtype=bool)
+    mask[[1, 4, 5, 9]] = False
+    container.extractValues('ux', mask)
+    assert container.buffers['ux'] is xBuffer
+    assert np.array_equal(container['ux'], particles['ux'][mask])
+    container['ux'] = particles['ux']
+    container.chunkSize = particleTools.ParticleContainer.chunkSize
+
+    # copies and pickles are plain dictionaries
+    assert type(copy.deepcopy(container)) is dict
+    assert type(pickle.loads(pickle.dumps(container))) is dict
+    particlesCopy = copy.deepcopy(container)
+    assert particlesCopy.keys() == container.keys()
+    assert np.array_equal(particlesCopy['x'], container['x'])
+
+    # adding, removing and merging particles gives the same result as with a dictionary
+    xNew = np.array([[4., 3.5, 4.5], [7., 6.5, 7.5]])
+    ind = np.array([4, 7])
+    particles = particleTools.addParticles(particles, 2, ind, np.array([1., 2.]), xNew, xNew, xNew)
+    container = particleTools.addParticles(container, 2, ind, np.array([1., 2.]), xNew, xNew, xNew)
+    mask = np.ones(14, dtype=bool)
+    mask[[0, 5, 11]] = False
+    particles = particleTools.removePart(particles, mask, 3)
+    container = particleTools.removePart(container, mask, 3)
+    particles = particleTools.mergeParticleDict(particles, copy.deepcopy(particles))
+    containerMerged = particleTools.mergeParticleDict(container, copy.deepcopy(container))
+    assert containerMerged is container
+    assert container.keys() == particles.keys()
+    for key in particles:
+        assert np.array_equal(container[key], particles[key])
+    assert container['nPart'] == 22
+    assert container['nID'] == 28
+    assert container.capacity('x') == 22
+
+    # removing particles compacts the buffers: a saved copy keeps its values, a view sees shifted values
+    particlesSaved = copy.deepcopy(container)
+    xView = container['x']
+    xSaved = container['x'].copy()
+    mask = np.ones(22, dtype=bool)
+    mask[0] = False
+    container = particleTools.removePart(container, mask, 1)
+    assert np.array_equal(particlesSaved['x'], xSaved)
+    assert np.array_equal(container['x'], xSaved[1:])
+    assert np.shares_memory(xView, container['x'])
+    assert np.array_equal(xView[:21], xSaved[1:])
+
+
 def test_readPartFromPickle(tmp_path):
     """ test reading particle properties from pickle """
 
@@ -225,6 +531,54 @@ def test_readPartFromPickle(tmp_path):
     assert TimeStepInfo2 == [0.]
 
 
+def test_particleStore(tmp_path):
+    """ test saving and reading particles with the columnar particle store """
+
+    # setup required inputs (number of particles and properties change between time steps)
+    particles1 = {'nPart': 3, 't': 0., 'simName': 'simTest', 'iterate': True,
+                  'x': np.asarray([1., 2., 3.]), 'm': np.asarray([10., 11., 11.]),
+                  'ID': np.asarray([0, 1, 2]), 'bondStart': np.asarray([0, 0, 0, 0])}
+    particles2 = {'nPart': 4, 't': 1.5, 'simName': 'simTest', 'iterate': False, 'mTot': 42.,
+                  'x': np.asarray([4., 5., 6., 7.]), 'm': np.asarray([5., 5., 11., 11.]),
+                  'ID': np.asarray([0, 1, 2, 3]), 'ux': np.asarray([1., 2., 3., 4.])}
+    outDir = pathlib.Path(tmp_path, 'avaTest', 'Outputs', 'com1DFA', 'particles')
+    outDir.mkdir(parents=True)
+
+    # call function to be tested
+    particleTools.savePartToStore([particles1, particles2], outDir, 'simTest')
+    Particles, timeStepInfo = particleTools.readPartFromStore(outDir, simName='simTest')
+
+    assert timeStepInfo == [0., 1.5]
+    assert Particles[0]['nPart'] == 3 and Particles[1]['nPart'] == 4
+    assert Particles[0]['simName'] == 'simTest'
+    assert Particles[0]['iterate'] and not Particles[1]['iterate']
+    assert np.array_equal(Particles[0]['x'], particles1['x'])
+    assert np.array_equal(Particles[1]['x'], particles2['x'])
+    assert np.array_equal(Particles[1]['ID'], particles2['ID'])
+    assert Particles[1]['ID'].dtype == particles2['ID'].dtype
+    # properties not available for a time step are filled with zeros
+    assert np.array_equal(Particles[0]['ux'], np.zeros(3))
+    assert Particles[0]['mTot'] == 0
+    assert Particles[1]['mTot'] == 42.
+    # bond arrays are not saved
+    assert 'bondStart' not in Particles[0]
+
+    # read only one property
+    Particles, timeStepInfo = particleTools.readParticles(pathlib.Path(tmp_path, 'avaTest'), flagAvaDir=True,
+                                                          properties=['m'])
+    assert 'x' not in Particles[1]
+    assert np.array_equal(Particles[1]['m'], particles2['m'])
+    # modifying the arrays does not modify the store
+    Particles[1]['m'][0] = 100.
+    Particles, timeStepInfo = particleTools.readPartFromStore(outDir, properties=['m'])
+    assert np.array_equal(Particles[1]['m'], particles2['m'])
+
+    # without store, pickles are read
+    pickle.dump(particles1, open(outDir / 'particles_simPickle_0000.0000.pickle', "wb"))
+    Particles, timeStepInfo = particleTools.readParticles(outDir, simName='simPickle')
+    assert np.array_equal(Particles[0]['bondStart'], particles1['bondStart'])
+
+
 def test_savePartToCsv(tmp_path):
     """ test saving particle infos to csv file """
 
@@ -12,6 +12,9 @@ from avaframe.com1DFA import com1DFA
 import avaframe.in3Utils.fileHandlerUtils as fU
 from avaframe.in3Utils import cfgUtils
 from avaframe.ana4Stats import probAna as pA
+import avaframe.in2Trans.ascUtils as IOf
+import avaframe.in3Utils.geoTrans as gT
+import avaframe.out3Plot.plotUtils as pU
 import pytest
 import configparser
 import shutil
@@ -37,7 +40,7 @@ def test_probAna(tmp_path):
 
     # Initialise input in correct format
     cfg = configparser.ConfigParser()
-    cfg['GENERAL'] = {'peakLim': 1.0, 'peakVar': 'ppr'}
+    cfg['GENERAL'] = {'peakLim': 1.0, 'peakVar': 'ppr', 'nThreads': 'auto', 'fetchContours': 'True'}
     cfg['FILTER'] = {}
 
     # provide optional filter criteria for simulations
@@ -74,6 +77,74 @@ def test_probAna(tmp_path):
     assert (testRes2 is True)
 
 
+def test_probAnaMultiple(tmp_path):
+    """ test probAna computing several probability maps in one pass """
+
+    # set input directory
+    avaTestDir = 'avaParabolaStatsTest'
+    dirPath = pathlib.Path(__file__).parents[0]
+    avaDir = dirPath / '..' / '..' / 'benchmarks' / avaTestDir
+    avaDirtmp = pathlib.Path(tmp_path, 'avaTest')
+    shutil.copytree(avaDir, avaDirtmp)
+
+    # two thresholds for ppr - no filtering of simulations for this module name
+    cfg = configparser.ConfigParser()
+    cfg['GENERAL'] = {'peakLim': '1.0|0.0', 'peakVar': 'ppr|ppr', 'nThreads': '2', 'fetchContours': 'True'}
+
+    # call function to test
+    analysisPerformed, contourDict = pA.probAnalysis(avaDirtmp, cfg, 'com1DFAOrig',
+                                                     inputDir=avaDirtmp / 'Outputs' / 'com1DFA')
+    outDir = avaDirtmp / 'Outputs' / 'ana4Stats'
+    probTest = np.loadtxt(outDir / 'avaTest_prob__ppr_lim1.0.asc', skiprows=6)
+    probTest0 = np.loadtxt(outDir / 'avaTest_prob__ppr_lim0.0.asc', skiprows=6)
+
+    # Load reference solution
+    probSol = np.loadtxt(avaDir / 'avaParabola_prob__ppr_lim1.0.txt', skiprows=6)
+
+    # Test
+    assert analysisPerformed
+    assert np.allclose(probTest, probSol, atol=1.e-6)
+    assert np.all(probTest0 >= probTest)
+    assert np.amax(probTest0) == 1.0
+    assert len(contourDict) == 3
+    # same contour lines as fetched from the peak fields one by one
+    peakFiles = sorted((avaDirtmp / 'Outputs' / 'com1DFA' / 'peakFiles').glob('*_ppr.asc'))
+    refData = IOf.readRaster(peakFiles[0])
+    xGrid, yGrid, _, _ = gT.makeCoordGridFromHeader(refData['header'])
+    for peakFile in peakFiles:
+        contourRef = pU.fetchContourCoords(xGrid, yGrid, IOf.readRaster(peakFile)['rasterData'], 1.0)
+        assert contourDict[peakFile.stem].keys() == contourRef.keys()
+        for key in contourRef:
+            assert np.array_equal(contourDict[peakFile.stem][key]['x'], contourRef[key]['x'])
+            assert np.array_equal(contourDict[peakFile.stem][key]['y'], contourRef[key]['y'])
+
+    # contour lines are optional
+    cfg['GENERAL']['fetchContours'] = 'False'
+    analysisPerformed, contourDict = pA.probAnalysis(avaDirtmp, cfg, 'com1DFAOrig',
+                                                     inputDir=avaDirtmp / 'Outputs' / 'com1DFA')
+    assert contourDict == {}
+    assert np.array_equal(np.loadtxt(outDir / 'avaTest_prob__ppr_lim1.0.asc', skiprows=6), probTest)
+
+
+def test_fetchPeakVarLims():
+    """ test fetching the peak field parameters and thresholds """
+
+    cfg = configparser.ConfigParser()
+    cfg['GENERAL'] = {'peakLim': '1.0', 'peakVar': 'ppr'}
+    assert pA.fetchPeakVarLims(cfg['GENERAL']) == [('ppr', '1.0')]
+
+    cfg['GENERAL'] = {'peakLim': '1.0', 'peakVar': 'ppr|pft'}
+    assert pA.fetchPeakVarLims(cfg['GENERAL']) == [('ppr', '1.0'), ('pft', '1.0')]
+
+    cfg['GENERAL'] = {'peakLim': '1.0|10.0|0.5', 'peakVar': 'ppr|ppr|pft'}
+    assert pA.fetchPeakVarLims(cfg['GENERAL']) == [('ppr', '1.0'), ('ppr', '10.0'), ('pft', '0.5')]
+
+    cfg['GENERAL'] = {'peakLim': '1.0|10.0', 'peakVar': 'ppr|ppr|pft'}
+    with pytest.raises(AssertionError) as e:
+        assert pA.fetchPeakVarLims(cfg['GENERAL'])
+    assert 'One peakLim per peakVar' in str(e.value)
+
+
 def test_createComModConfig(tmp_path):
     """ test creatig a config file """
 
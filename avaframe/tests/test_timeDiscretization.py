@@ -34,3 +34,52 @@ def test_getSphKernelRadiusTimeStep(capfd):
     dtStable = tD.getSphKernelRadiusTimeStep(dem, cfg['GENERAL'])
     print(dtStable)
     assert dtStable == 0.04
+
+
+def test_getcflTimeStep(capfd):
+    cfg = configparser.ConfigParser()
+    cfg['GENERAL'] = {'cflCoefficient': '0.5', 'dtMin': '0.01', 'dtMax': '0.2'}
+    dem = {'header': {'cellsize': 5}, 'headerNeighbourGrid': {'cellsize': 4}}
+    particles = {'nPart': 3, 'ux': np.array([0., 30., 0.]), 'uy': np.array([0., 40., 1.]),
+                 'uz': np.array([0., 0., 0.])}
+
+    dtStable = tD.getcflTimeStep(particles, dem, cfg['GENERAL'])
+    assert dtStable == 0.5 * 4 / 50
+
+    particles['ux'][1] = 20
+    dtStable = tD.getcflTimeStep(particles, dem, cfg['GENERAL'])
+    assert dtStable == 0.5 * 4 / np.sqrt(20**2 + 40**2)
+
+    # bounded by dtMin and dtMax
+    particles['ux'][1] = 1000
+    dtStable = tD.getcflTimeStep(particles, dem, cfg['GENERAL'])
+    assert dtStable == 0.01
+    particles['ux'][1] = 0
+    particles['uy'][1] = 0
+    dtStable = tD.getcflTimeStep(particles, dem, cfg['GENERAL'])
+    assert dtStable == 0.2
+    particles['uy'][2] = 0
+    dtStable = tD.getcflTimeStep(particles, dem, cfg['GENERAL'])
+    assert dtStable == 0.2
+
+
+def test_limitTimeStepToSaveTime(capfd):
+    # saving time is far away
+    assert tD.limitTimeStepToSaveTime(0.1, 1., 2.) == 0.1
+    # saving time is reached within one time step
+    assert tD.limitTimeStepToSaveTime(0.3, 1.9, 2.) == np.float64(2.) - 1.9
+    # saving time is reached within two time steps
+    assert tD.limitTimeStepToSaveTime(0.1, 1.85, 2.) == (np.float64(2.) - 1.85) / 2
+    # saving time already reached
+    assert tD.limitTimeStepToSaveTime(0.1, 2., 2.) == 0.1
+
+    # the saving times are hit exactly
+    t = 0.
+    tSave = [0.5, 1., 1.3]
+    tList = []
+    while t < 1.3 - 1.e-8:
+        dt = tD.limitTimeStepToSaveTime(0.07, t, min([ts for ts in tSave if ts > t + 1.e-8]))
+        t = t + dt
+        tList.append(t)
+    for ts in tSave:
+        assert np.min(np.abs(np.array(tList) - ts)) < 1.e-12
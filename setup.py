@@ -78,11 +78,25 @@ if use_cython:
 
 ext = ".pyx" if use_cython else ".c"
 
+# OpenMP flags for the multi-threaded particle loops (nThreads in com1DFACfg.ini)
+# if the compiler does not support OpenMP (e.g. default clang on macOS), the loops run serially
+if sys.platform == "win32":
+    openmpCompileArgs = ["/openmp"]
+    openmpLinkArgs = []
+elif sys.platform == "darwin":
+    openmpCompileArgs = []
+    openmpLinkArgs = []
+else:
+    openmpCompileArgs = ["-fopenmp"]
+    openmpLinkArgs = ["-fopenmp"]
+
 extensions = [
     Extension(
         "avaframe.com1DFA.DFAfunctionsCython",
         ["avaframe/com1DFA/DFAfunctionsCython" + ext],
         include_dirs=[numpy.get_include()],
+        extra_compile_args=openmpCompileArgs,
+        extra_link_args=openmpLinkArgs,
     ),
     Extension(
         "avaframe.com1DFA.damCom1DFA",
@@ -94,6 +108,16 @@ extensions = [
         ["avaframe/com1DFA/DFAToolsCython" + ext],
         include_dirs=[numpy.get_include()],
     ),
+    Extension(
+        "avaframe.in2Trans.ascUtilsCython",
+        ["avaframe/in2Trans/ascUtilsCython" + ext],
+        include_dirs=[numpy.get_include()],
+    ),
+    Extension(
+        "avaframe.ana4Stats.getStatsCython",
+        ["avaframe/ana4Stats/getStatsCython" + ext],
+        include_dirs=[numpy.get_include()],
+    ),
 ]
 
 if use_cython: